@@ -0,0 +1,139 @@
+"""
+Đo chi phí kết nối DB trên mỗi request với các cấu hình kết nối và driver MySQL khác nhau.
+
+Mỗi "request" giả lập vòng đời request của Django (request_started -> 1 truy vấn -> request_finished)
+nên đo được cả chi phí mở kết nối (TCP + xác thực) khi CONN_MAX_AGE = 0.
+
+    # MySQL cục bộ, so sánh PyMySQL và mysqlclient
+    python benchmarks/db_connection_overhead.py --host 127.0.0.1 --user root --password ... --name gymdb
+
+    # Không có MySQL: dùng SQLite thay thế (chỉ so sánh các chế độ kết nối)
+    python benchmarks/db_connection_overhead.py --sqlite
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    # Mở kết nối mới cho mỗi request (cấu hình hiện tại)
+    'new': {'CONN_MAX_AGE': 0},
+    # Giữ kết nối giữa các request
+    'persistent': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True},
+    # Backend có pool kết nối
+    'pool': {'ENGINE': 'gymhealthapi.db.mysql_pool', 'CONN_MAX_AGE': 0,
+             'POOL': {'MAX_SIZE': 4, 'RECYCLE': 3600, 'PING_AFTER': 30}},
+}
+
+
+def run_child(config):
+    """Chạy trong tiến trình con để mỗi driver được nạp độc lập"""
+    if config['driver'] == 'pymysql':
+        import pymysql
+        pymysql.install_as_MySQLdb()
+
+    sys.path.insert(0, PROJECT_DIR)
+    import django
+    from django.conf import settings
+
+    settings.configure(DATABASES={'default': config['database']}, USE_TZ=True, INSTALLED_APPS=[])
+    django.setup()
+
+    from django.core.signals import request_finished, request_started
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+
+    opened = []
+    connection_created.connect(lambda **kwargs: opened.append(1), weak=False)
+
+    def one_request():
+        request_started.send(sender=None)
+        with connection.cursor() as cursor:
+            cursor.execute(config['query'])
+            cursor.fetchall()
+        request_finished.send(sender=None)
+
+    for _ in range(config['warmup']):
+        one_request()
+    opened.clear()
+
+    timings = []
+    for _ in range(config['requests']):
+        start = time.perf_counter()
+        one_request()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    print(json.dumps({
+        'mean_ms': statistics.mean(timings),
+        'p50_ms': timings[len(timings) // 2],
+        'p95_ms': timings[int(len(timings) * 0.95) - 1],
+        'connections_opened': len(opened),
+    }))
+
+
+def build_configs(args):
+    configs = []
+    if args.sqlite:
+        path = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+        for mode in ('new', 'persistent'):
+            database = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}
+            database.update({k: v for k, v in MODES[mode].items() if k != 'ENGINE'})
+            configs.append(('sqlite', mode, database))
+        return configs
+
+    for driver in args.driver or ['pymysql', 'mysqlclient']:
+        for mode in args.mode or list(MODES):
+            database = {
+                'ENGINE': 'django.db.backends.mysql',
+                'NAME': args.name, 'USER': args.user, 'PASSWORD': args.password,
+                'HOST': args.host, 'PORT': args.port,
+            }
+            database.update(MODES[mode])
+            configs.append((driver, mode, database))
+    return configs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sqlite', action='store_true', help="Dùng SQLite thay cho MySQL")
+    parser.add_argument('--driver', action='append', choices=['pymysql', 'mysqlclient'])
+    parser.add_argument('--mode', action='append', choices=list(MODES))
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--query', default='SELECT 1')
+    parser.add_argument('--host', default=os.environ.get('GYMHEALTH_DB_HOST', '127.0.0.1'))
+    parser.add_argument('--port', default=os.environ.get('GYMHEALTH_DB_PORT', '3306'))
+    parser.add_argument('--user', default=os.environ.get('GYMHEALTH_DB_USER', 'root'))
+    parser.add_argument('--password', default=os.environ.get('GYMHEALTH_DB_PASSWORD', ''))
+    parser.add_argument('--name', default=os.environ.get('GYMHEALTH_DB_NAME', 'gymdb'))
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(json.loads(args.child))
+        return
+
+    print(f"{'driver':<12}{'mode':<12}{'mean (ms)':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}{'connects':>10}")
+    for driver, mode, database in build_configs(args):
+        config = {'driver': driver, 'database': database, 'requests': args.requests, 'warmup': args.warmup,
+                  'query': args.query}
+        result = subprocess.run([sys.executable, __file__, '--child', json.dumps(config)],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            error = (result.stderr.strip().splitlines() or ['unknown error'])[-1]
+            print(f"{driver:<12}{mode:<12}  lỗi: {error}")
+            continue
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{driver:<12}{mode:<12}{stats['mean_ms']:>10.3f}{stats['p50_ms']:>10.3f}"
+              f"{stats['p95_ms']:>10.3f}{stats['connections_opened']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+So sánh thời gian render JSON của JSONRenderer (json chuẩn) và FastJSONRenderer (orjson), cùng kích thước/thời gian
+nén gzip và brotli, trên các payload giống dữ liệu thật: biểu đồ tiến độ (chart_data), danh sách buổi tập của PT
+(trainer_all_sessions) và lịch tuần (weekly_schedule).
+
+    python benchmarks/json_rendering.py
+    python benchmarks/json_rendering.py --rows 2000 --repeat 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from decimal import Decimal
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    sys.path.insert(0, PROJECT_DIR)
+    from django.conf import settings
+    settings.configure(USE_TZ=True, DEFAULT_CHARSET='utf-8', INSTALLED_APPS=['rest_framework'])
+    import django
+    django.setup()
+
+
+def chart_payload(rng, rows):
+    # Giống TrainingProgressViewSet.chart_data: chuỗi ngày và các chỉ số dạng float
+    start = date(2024, 1, 1)
+    metrics = ('weight', 'body_fat_percentage', 'muscle_mass', 'chest', 'waist', 'hips', 'thighs', 'arms')
+    return {
+        'dates': [start + timedelta(days=3 * i) for i in range(rows)],
+        **{name: [round(rng.uniform(10, 120), 2) for _ in range(rows)] for name in metrics},
+        'summary': {name: {'first': rng.uniform(10, 120), 'last': rng.uniform(10, 120)} for name in metrics},
+    }
+
+
+def sessions_payload(rng, rows):
+    # Giống TrainerAllSessionsSerializer: phần lớn đã là chuỗi, kèm dict gói tập lồng nhau
+    now = datetime(2026, 10, 1, 8, 0, tzinfo=timezone.utc)
+    results = []
+    for i in range(rows):
+        day = date(2026, 1, 1) + timedelta(days=i % 300)
+        results.append({
+            'id': i + 1, 'member_id': rng.randint(1, 100000), 'trainer_id': 42,
+            'member_name': 'Nguyễn Văn Minh', 'member_username': f'member{i:06d}', 'member_phone': None,
+            'session_date': day.isoformat(), 'start_time': '07:00:00', 'end_time': '08:00:00',
+            'session_duration': 60, 'session_type': 'pt_session', 'status': rng.choice(['pending', 'confirmed']),
+            'notes': '<p>Tập trung nhóm cơ chân</p>', 'trainer_notes': None, 'time_until_session': '3 ngày 2 giờ',
+            'subscription_info': {
+                'id': rng.randint(1, 100000), 'package_name': 'Gói 6 tháng',
+                'remaining_pt_sessions': rng.randint(0, 24), 'end_date': day + timedelta(days=90),
+            },
+            'created_at': now - timedelta(days=i % 300, seconds=i),
+            'updated_at': now - timedelta(seconds=i),
+        })
+    return {'count': rows, 'next': None, 'previous': None, 'results': results,
+            'statistics': {'total_sessions': rows, 'revenue': Decimal('12500000.00')}}
+
+
+def weekly_payload(rng, rows):
+    # Giống HomeService.weekly_schedule: dict theo ngày, ngày/giờ là đối tượng date/time
+    monday = date(2026, 10, 19)
+    schedule = {}
+    for offset in range(6):
+        day = monday + timedelta(days=offset)
+        schedule[day.isoformat()] = {
+            'day_of_week': day.isoweekday(), 'date': day,
+            'sessions': [{
+                'id': offset * rows + i, 'session_date': day, 'start_time': dt_time(6 + i % 14, 0),
+                'end_time': dt_time(7 + i % 14, 0), 'session_type': 'pt_session', 'status': 'confirmed',
+                'notes': None, 'member_name': 'Trần Thị Lan', 'trainer_name': 'Lê Hoàng Nam',
+            } for i in range(rows // 6)],
+        }
+    return {'week_info': {'start_date': monday, 'end_date': monday + timedelta(days=5), 'week_offset': 0,
+                          'current_week': True}, 'schedule': schedule}
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500, help='Số phần tử của mỗi payload')
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from django.utils.text import compress_string
+    from gymhealth.renderers import FastJSONRenderer, orjson
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+    if orjson is None:
+        print("Chưa cài orjson: FastJSONRenderer dùng json chuẩn, kết quả hai cột sẽ giống nhau")
+
+    rng = random.Random(42)
+    payloads = {
+        'chart_data': chart_payload(rng, args.rows),
+        'trainer_all_sessions': sessions_payload(rng, args.rows),
+        'weekly_schedule': weekly_payload(rng, args.rows),
+    }
+    stdlib, fast = JSONRenderer(), FastJSONRenderer()
+
+    print(f"{'payload':<22} {'json ms':>8} {'orjson ms':>10} {'speedup':>8} {'same':>5} {'bytes':>9} "
+          f"{'gzip':>8} {'gzip ms':>8} {'br':>8} {'br ms':>7}")
+    for name, payload in payloads.items():
+        expected, stdlib_ms = timed(lambda: stdlib.render(payload), args.repeat)
+        body, fast_ms = timed(lambda: fast.render(payload), args.repeat)
+        gzipped, gzip_ms = timed(lambda: compress_string(body), args.repeat)
+        line = (f"{name:<22} {stdlib_ms:>8.2f} {fast_ms:>10.2f} {stdlib_ms / fast_ms:>7.1f}x "
+                f"{'yes' if body == expected else 'NO':>5} {len(body):>9} {len(gzipped):>8} {gzip_ms:>8.2f} ")
+        if brotli is not None:
+            compressed, br_ms = timed(lambda: brotli.compress(body, quality=4), args.repeat)
+            line += f"{len(compressed):>8} {br_ms:>7.2f}"
+        else:
+            line += f"{'-':>8} {'-':>7}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Đo thời gian ghi log trên mỗi request thanh toán (VNPay IPN) với cấu hình logging cũ
+(FileHandler đồng bộ + f-string) và cấu hình mới (QueueListenerHandler + định dạng lười kiểu %).
+
+    python benchmarks/logging_overhead.py
+    # Giả lập ổ đĩa chậm: cứ 50 bản ghi thì một lần ghi file bị chặn 20ms (fsync)
+    python benchmarks/logging_overhead.py --stall-every 50 --stall-ms 20
+"""
+import argparse
+import logging
+import logging.config
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IPN_DATA = {
+    'vnp_Amount': '50000000', 'vnp_BankCode': 'NCB', 'vnp_BankTranNo': 'VNP14422574',
+    'vnp_CardType': 'ATM', 'vnp_OrderInfo': 'Thanh toan goi tap 3 thang', 'vnp_PayDate': '20240601103000',
+    'vnp_ResponseCode': '00', 'vnp_TmnCode': 'DEMOV210', 'vnp_TransactionNo': '14422574',
+    'vnp_TransactionStatus': '00', 'vnp_TxnRef': '151717228800000',
+    'vnp_SecureHash': 'a' * 128,
+}
+
+
+class StallingFileHandler(logging.FileHandler):
+    """FileHandler giả lập fsync chậm: cứ stall_every bản ghi thì chặn stall_ms"""
+
+    def __init__(self, filename, stall_every=0, stall_ms=0, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.stall_every = stall_every
+        self.stall_ms = stall_ms
+        self._count = 0
+
+    def emit(self, record):
+        super().emit(record)
+        self._count += 1
+        if self.stall_every and self._count % self.stall_every == 0:
+            time.sleep(self.stall_ms / 1000)
+
+
+def before_config(log_dir, stall):
+    """settings.LOGGING trước khi chuyển sang hàng đợi"""
+    return {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {
+            'verbose': {'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}', 'style': '{'},
+        },
+        'handlers': {
+            'file': {'level': 'INFO', '()': StallingFileHandler, 'filename': os.path.join(log_dir, 'vnpay.log'),
+                     'formatter': 'verbose', **stall},
+            'console': {'level': 'INFO', 'class': 'logging.StreamHandler', 'formatter': 'verbose',
+                        'stream': open(os.devnull, 'w')},
+        },
+        'root': {'handlers': ['console', 'file'], 'level': 'INFO'},
+    }
+
+
+def after_config(log_dir, stall):
+    """settings.LOGGING hiện tại, thay file log thanh toán bằng StallingFileHandler và console bằng /dev/null"""
+    os.environ['GYMHEALTH_LOG_DIR'] = log_dir
+    sys.path.insert(0, PROJECT_DIR)
+    from gymhealthapi.settings import LOGGING
+
+    config = dict(LOGGING, handlers=dict(LOGGING['handlers']))
+    payment_file = dict(config['handlers']['payment_file'])
+    config['handlers']['payment_file'] = {
+        '()': StallingFileHandler, 'level': payment_file['level'], 'formatter': payment_file['formatter'],
+        'filename': payment_file['filename'], **stall,
+    }
+    config['handlers']['console'] = dict(config['handlers']['console'], stream=open(os.devnull, 'w'))
+    return config
+
+
+def request_before(logger, data, payment_id):
+    # Các dòng log của VNPayIPNView trước khi sửa
+    logger.info("=== VNPay IPN View Called ===")
+    logger.info(f"Method: GET")
+    logger.info(f"Data: {dict(data)}")
+    ipn_data = dict(data)
+    logger.info(f"Processed IPN data: {ipn_data}")
+    logger.info(f"IPN Found payment: {payment_id}, status: pending")
+    amount = data['vnp_Amount']
+    vnpay_amount = float(amount)
+    payment_amount = 50000000.0
+    logger.info(f"Raw VNPay amount: {amount}")
+    logger.info(f"VNPay amount (no conversion): {vnpay_amount}")
+    logger.info(f"Payment amount in DB: {payment_amount}")
+    logger.info(f"Amount comparison: VNPay={vnpay_amount}, Payment={payment_amount}")
+    logger.info("IPN Processing successful payment...")
+    logger.info(f"IPN: Payment {payment_id} completed successfully")
+
+
+def request_after(logger, data, payment_id):
+    # Các dòng log của VNPayIPNView sau khi sửa
+    logger.debug("VNPay IPN %s data: %s", 'GET', data)
+    logger.info("VNPay IPN received for order %s", data.get('vnp_TxnRef'))
+    logger.debug("IPN Found payment: %s, status: %s", payment_id, 'pending')
+    amount = data['vnp_Amount']
+    vnpay_amount = float(amount)
+    payment_amount = 50000000.0
+    logger.debug("IPN Amount comparison: VNPay=%s (raw %s), Payment=%s", vnpay_amount, amount, payment_amount)
+    logger.debug("IPN Processing successful payment %s", payment_id)
+    logger.info("IPN: Payment %s completed successfully", payment_id)
+
+
+def measure(request, logger, requests):
+    timings = []
+    for i in range(requests):
+        start = time.perf_counter()
+        request(logger, IPN_DATA, i)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'mean_ms': statistics.mean(timings),
+        'p50_ms': timings[len(timings) // 2],
+        'p99_ms': timings[int(len(timings) * 0.99) - 1],
+        'max_ms': timings[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--stall-every', type=int, default=0, help='Số bản ghi giữa hai lần ghi file bị chặn')
+    parser.add_argument('--stall-ms', type=float, default=0)
+    args = parser.parse_args()
+    stall = {'stall_every': args.stall_every, 'stall_ms': args.stall_ms}
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        logging.config.dictConfig(before_config(log_dir, stall))
+        before = measure(request_before, logging.getLogger('gymhealth.payments'), args.requests)
+
+        logging.config.dictConfig(after_config(log_dir, stall))
+        after = measure(request_after, logging.getLogger('gymhealth.payments'), args.requests)
+        # Chờ thread ghi log xử lý hết hàng đợi trước khi xóa thư mục tạm
+        logging.shutdown()
+
+    print(f"{'config':<8} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, result in (('before', before), ('after', after)):
+        print(f"{name:<8} {result['mean_ms']:>9.4f} {result['p50_ms']:>9.4f} "
+              f"{result['p99_ms']:>9.4f} {result['max_ms']:>9.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -12,8 +12,13 @@ from gymhealth.models import (
     Exercise, Notification, Payment, PaymentReceipt, TrainerRating, GymRating,
     FeedbackResponse, Gym, MemberProxy, TrainerProxy, ManagerProxy
 )
-from django.db.models import Count, Sum, Avg
-from django.db.models.functions import ExtractHour
+from django.db.models import Avg, Count, Exists, OuterRef
+from django.utils.dateparse import parse_date
+from gymhealth.utils.stats_service import StatsService
+from gymhealth.utils.notification_service import NotificationService
+from gymhealth.paginators import ApproximateCountPaginator
+
+EXACT_COUNT_VAR = 'exact_count'
 
 
 class MembershipStatusFilter(SimpleListFilter):
@@ -42,6 +47,40 @@ class MembershipStatusFilter(SimpleListFilter):
         return queryset
 
 
+class CachedDateHierarchyMixin:
+    """Dùng template có date_hierarchy được lưu cache (thay cho MIN/MAX + DISTINCT trên bảng lớn)"""
+    change_list_template = 'admin/large_change_list.html'
+
+
+class ApproximateCountMixin(CachedDateHierarchyMixin):
+    """
+    Trang danh sách cho bảng rất lớn: hiển thị tổng số ước lượng thay vì COUNT(*) chính xác
+    và bỏ lượt đếm toàn bảng thứ hai; thêm ?exact_count=1 để đếm chính xác.
+    """
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page,
+                              exact=getattr(request, '_exact_count', False))
+
+    def changelist_view(self, request, extra_context=None):
+        # Bỏ tham số exact_count trước khi ChangeList đọc GET (nếu không sẽ bị coi là bộ lọc không hợp lệ)
+        if EXACT_COUNT_VAR in request.GET:
+            request.GET = request.GET.copy()
+            request._exact_count = request.GET.pop(EXACT_COUNT_VAR)[0] == '1'
+
+        response = super().changelist_view(request, extra_context)
+
+        context = getattr(response, 'context_data', None)
+        if context and 'cl' in context:
+            params = request.GET.copy()
+            params[EXACT_COUNT_VAR] = '1'
+            context['approximate_count'] = context['cl'].paginator.is_approximate
+            context['exact_count_url'] = '?' + params.urlencode()
+        return response
+
+
 # Hiển thị mỗi bản ghi dưới dạng khối (stacked) — mỗi trường nằm trên một dòng
 class HealthInfoInline(admin.StackedInline):
     model = HealthInfo
@@ -127,7 +166,7 @@ class MemberAdmin(MyUserAdmin):
     inlines = [HealthInfoInline, MemberProfileInline]
 
     def get_queryset(self, request):
-        return super().get_queryset(request).filter(role='MEMBER')
+        return super().get_queryset(request).filter(role='MEMBER').select_related('member_profile')
 
     def membership_status(self, obj):
         try:
@@ -139,6 +178,7 @@ class MemberAdmin(MyUserAdmin):
             return "Chưa kích hoạt"
 
     membership_status.short_description = "Trạng thái hội viên"
+    membership_status.admin_order_field = 'member_profile__membership_end_date'
 
 
 class TrainerAdmin(MyUserAdmin):
@@ -147,7 +187,11 @@ class TrainerAdmin(MyUserAdmin):
     inlines = [TrainerProfileInline]
 
     def get_queryset(self, request):
-        return super().get_queryset(request).filter(role='TRAINER')
+        # Lấy sẵn hồ sơ và điểm đánh giá trong cùng một truy vấn để tránh truy vấn theo từng dòng
+        return super().get_queryset(request).filter(role='TRAINER').select_related('trainer_profile').annotate(
+            rating_avg=Avg('ratings__score'),
+            rating_count=Count('ratings')
+        )
 
     def specialized_in(self, obj):
         try:
@@ -156,14 +200,14 @@ class TrainerAdmin(MyUserAdmin):
             return "Chưa cập nhật"
 
     def rating(self, obj):
-        ratings = TrainerRating.objects.filter(trainer=obj)
-        if ratings.exists():
-            avg = ratings.aggregate(avg=Avg('score'))['avg']
-            return f"{avg:.1f}/5 ({ratings.count()} đánh giá)"
+        if obj.rating_count:
+            return f"{obj.rating_avg:.1f}/5 ({obj.rating_count} đánh giá)"
         return "Chưa có đánh giá"
 
     specialized_in.short_description = "Chuyên môn"
+    specialized_in.admin_order_field = 'trainer_profile__specialization'
     rating.short_description = "Đánh giá"
+    rating.admin_order_field = 'rating_avg'
 
 
 class ManagerAdmin(MyUserAdmin):
@@ -179,27 +223,35 @@ class PackagesAdmin(admin.ModelAdmin):
     search_fields = ('name', 'description')
     filter_horizontal = ('benefits',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('package_type').annotate(
+            subscriptions_total=Count('subscriptions')
+        )
+
     def subscriptions_count(self, obj):
-        return obj.subscriptions.count()
+        return obj.subscriptions_total
 
     subscriptions_count.short_description = "Số lượng đăng ký"
+    subscriptions_count.admin_order_field = 'subscriptions_total'
 
 
-class SubscriptionPackageAdmin(admin.ModelAdmin):
+class SubscriptionPackageAdmin(CachedDateHierarchyMixin, admin.ModelAdmin):
     list_display = (
         'member', 'package', 'start_date', 'end_date', 'status', 'remaining_pt_sessions', 'discounted_price')
     list_filter = (MembershipStatusFilter, 'status', 'package')
     search_fields = ('member__username', 'member__first_name', 'member__last_name')
     readonly_fields = ('created_at',)
     date_hierarchy = 'start_date'
+    list_select_related = ('member', 'package')
     inlines = [PaymentInline]
 
 
-class WorkoutSessionAdmin(admin.ModelAdmin):
+class WorkoutSessionAdmin(ApproximateCountMixin, admin.ModelAdmin):
     list_display = ('member', 'trainer', 'session_date', 'start_time', 'end_time', 'session_type', 'status')
     list_filter = ('session_type', 'status', 'session_date')
     search_fields = ('member__username', 'trainer__username', 'notes')
     date_hierarchy = 'session_date'
+    list_select_related = ('member', 'trainer')
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
@@ -214,6 +266,7 @@ class HealthInfoAdmin(admin.ModelAdmin):
     list_filter = ('training_goal',)
     search_fields = ('user__username', 'user__first_name', 'user__last_name')
     readonly_fields = ('created_at', 'updated_at', 'bmi')
+    list_select_related = ('user',)
 
 
 class TrainingProgressAdmin(admin.ModelAdmin):
@@ -221,6 +274,7 @@ class TrainingProgressAdmin(admin.ModelAdmin):
     list_filter = ('workout_session__session_date', 'created_by')
     search_fields = ('workout_session__member__username', 'notes', 'health_info__user__username')
     date_hierarchy = 'workout_session__session_date'
+    list_select_related = ('health_info__user', 'workout_session', 'created_by')
 
     def get_member_name(self, obj):
         return obj.health_info.user.username
@@ -235,20 +289,25 @@ class TrainingProgressAdmin(admin.ModelAdmin):
     get_session_date.admin_order_field = 'workout_session__session_date'
 
 
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(ApproximateCountMixin, admin.ModelAdmin):
     list_display = ('subscription', 'amount', 'payment_method', 'status', 'payment_date', 'has_receipt')
     list_filter = ('status', 'payment_method', 'payment_date')
     search_fields = ('subscription__member__username', 'transaction_id', 'notes')
     date_hierarchy = 'payment_date'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'subscription__member', 'subscription__package'
+        ).annotate(
+            receipt_exists=Exists(PaymentReceipt.objects.filter(payment=OuterRef('pk')))
+        )
+
     def has_receipt(self, obj):
-        try:
-            return obj.receipt is not None
-        except:
-            return False
+        return obj.receipt_exists
 
     has_receipt.boolean = True
     has_receipt.short_description = "Có biên lai"
+    has_receipt.admin_order_field = 'receipt_exists'
 
 
 class PaymentReceiptAdmin(admin.ModelAdmin):
@@ -256,6 +315,7 @@ class PaymentReceiptAdmin(admin.ModelAdmin):
     list_filter = ('verified', 'upload_date', 'verification_date')
     search_fields = ('payment__subscription__member__username', 'notes')
     readonly_fields = ('upload_date',)
+    list_select_related = ('payment', 'verified_by')
 
     def save_model(self, request, obj, form, change):
         if 'verified' in form.changed_data and obj.verified:
@@ -275,11 +335,19 @@ class PromotionAdmin(admin.ModelAdmin):
     readonly_fields = ('times_used',)
 
 
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(ApproximateCountMixin, admin.ModelAdmin):
     list_display = ('user', 'title', 'notification_type', 'is_read', 'created_at', 'sent')
     list_filter = ('notification_type', 'is_read', 'sent', 'created_at')
     search_fields = ('user__username', 'title', 'message')
     date_hierarchy = 'created_at'
+    list_select_related = ('user',)
+
+    # Thông báo không có tín hiệu post_delete: xóa qua NotificationService để cập nhật dữ liệu phụ thuộc
+    def delete_model(self, request, obj):
+        NotificationService.delete(Notification.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        NotificationService.delete(queryset)
 
 
 class BaseRatingAdmin(admin.ModelAdmin):
@@ -293,12 +361,14 @@ class TrainerRatingAdmin(BaseRatingAdmin):
     list_display = ('trainer', 'user', 'score', 'average_score', 'anonymous', 'created_at')
     list_filter = ('score', 'anonymous', 'created_at')
     search_fields = ('trainer__username', 'user__username', 'comment')
+    list_select_related = ('trainer', 'user')
 
 
 class GymRatingAdmin(BaseRatingAdmin):
     list_display = ('gym', 'user', 'score', 'average_score', 'anonymous', 'created_at')
     list_filter = ('score', 'anonymous', 'created_at')
     search_fields = ('gym__name', 'user__username', 'comment')
+    list_select_related = ('gym', 'user')
 
 
 class MyAdminSite(admin.AdminSite):
@@ -314,109 +384,22 @@ class MyAdminSite(admin.AdminSite):
         return my_urls + urls
 
     def gymhealth_stats(self, request):
-        package_stats = Packages.objects.annotate(
-            total_subscriptions=Count('subscriptions'),
-            total_revenue=Sum('subscriptions__discounted_price')
-        ).order_by('-total_subscriptions')
-
-        # Thống kê số lượng người dùng theo vai trò
-        user_stats = {
-            'total_members': User.objects.filter(role='MEMBER').count(),
-            'total_trainers': User.objects.filter(role='TRAINER').count(),
-            'total_managers': User.objects.filter(role='MANAGER').count(),
-            'active_members': User.objects.filter(role='MEMBER', is_active=True).count(),
-        }
-
-        # Thống kê số buổi tập theo loại và trạng thái
-        workout_stats = {
-            'pending_sessions': WorkoutSession.objects.filter(status='pending').count(),
-            'confirmed_sessions': WorkoutSession.objects.filter(status='confirmed').count(),
-            'completed_sessions': WorkoutSession.objects.filter(status='completed').count(),
-            'cancelled_sessions': WorkoutSession.objects.filter(status='cancelled').count(),
-            'pt_sessions': WorkoutSession.objects.filter(session_type='pt_session').count(),
-            'self_training': WorkoutSession.objects.filter(session_type='self_training').count(),
-        }
-        # Thống kê doanh thu theo tháng
-        from django.db.models.functions import TruncMonth
-        revenue_by_month = Payment.objects.filter(
-            status='completed'
-        ).annotate(
-            month=TruncMonth('payment_date')
-        ).values('month').annotate(
-            total=Sum('amount')
-        ).order_by('month')
-        # Tạo các khung giờ phổ biến trong phòng gym
-        time_slots = {
-            'early_morning': (5, 8),  # 5:00 - 8:59
-            'morning': (9, 11),  # 9:00 - 11:59
-            'noon': (12, 13),  # 12:00 - 13:59
-            'afternoon': (14, 16),  # 14:00 - 16:59
-            'evening': (17, 20),  # 17:00 - 20:59
-            'night': (21, 23)  # 21:00 - 23:59
-        }
-        # Truy vấn số lượng buổi tập theo giờ
-        hourly_usage = WorkoutSession.objects.filter(
-            status__in=['confirmed', 'completed']
-        ).annotate(
-            hour=ExtractHour('start_time')
-        ).values('hour').annotate(
-            count=Count('id')
-        ).order_by('hour')
-        # Chuyển đổi dữ liệu theo giờ thành dữ liệu theo khung giờ
-        time_slot_usage = {slot: 0 for slot in time_slots.keys()}
-        hourly_data = {item['hour']: item['count'] for item in hourly_usage}
-
-        for slot_name, (start_hour, end_hour) in time_slots.items():
-            for hour in range(start_hour, end_hour + 1):
-                time_slot_usage[slot_name] += hourly_data.get(hour, 0)
-
-            # Phân tích xu hướng sử dụng theo ngày trong tuần
-        from django.db.models.functions import ExtractWeekDay
-        weekday_usage = WorkoutSession.objects.filter(
-            status__in=['confirmed', 'completed']
-        ).annotate(
-            weekday=ExtractWeekDay('session_date')
-        ).values('weekday').annotate(
-            count=Count('id')
-        ).order_by('weekday')
-
-        # Chuyển đổi số ngày trong tuần (1=Sunday, 7=Saturday) sang tên ngày
-        weekday_names = {
-            1: 'Chủ nhật',
-            2: 'Thứ hai',
-            3: 'Thứ ba',
-            4: 'Thứ tư',
-            5: 'Thứ năm',
-            6: 'Thứ sáu',
-            7: 'Thứ bảy'
-        }
-
-        weekday_data = {weekday_names[item['weekday']]: item['count'] for item in weekday_usage}
-
-        # Tính tổng doanh thu
-        total_revenue = Payment.objects.filter(status='completed').aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-
-
-        stats = {
-            'package_stats': package_stats,
-            'user_stats': user_stats,
-            'workout_stats': workout_stats,
-            'revenue_by_month': revenue_by_month,
-            'hourly_usage': hourly_usage,
-            'time_slot_usage': time_slot_usage,
-            'weekday_usage': weekday_data,
-            'total_revenue': total_revenue,
-        }
+        # Số liệu được đọc từ các bảng tổng hợp theo ngày (cập nhật định kỳ bởi task refresh_daily_stats)
+        try:
+            date_from = parse_date(request.GET.get('date_from') or '')
+            date_to = parse_date(request.GET.get('date_to') or '')
+        except ValueError:
+            date_from = date_to = None
+        stats = StatsService.get_stats(date_from=date_from, date_to=date_to)
 
         return TemplateResponse(request, 'admin/stats.html', {
             'title': 'Thống kê GymHealth',
-            'stats': stats
+            'stats': stats,
+            'date_from': date_from,
+            'date_to': date_to,
         })
 
 
-
 admin_site = MyAdminSite(name='GymHealth')
 # Đăng ký User model với Admin site
 admin_site.register(User, MyUserAdmin)
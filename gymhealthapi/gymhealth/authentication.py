@@ -0,0 +1,199 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from oauth2_provider.contrib.rest_framework import OAuth2Authentication
+from oauth2_provider.models import AccessToken
+
+from gymhealth.models import User
+
+logger = logging.getLogger(__name__)
+
+# Không lưu mật khẩu (hash) vào cache; field này sẽ được nạp (deferred) khi truy cập
+EXCLUDED_USER_FIELDS = ('password',)
+
+
+class _LocalLRU:
+    """LRU giới hạn kích thước trong tiến trình, mỗi mục có thời điểm hết hạn riêng"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (value, time.time() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def _setting(name, default):
+    return getattr(settings, 'OAUTH2_TOKEN_CACHE', {}).get(name, default)
+
+
+_local_cache = _LocalLRU(_setting('LOCAL_MAXSIZE', 10000))
+
+
+def _cache_key(token):
+    return 'oauth2-token:' + hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _shared_cache():
+    return caches[_setting('ALIAS', 'default')]
+
+
+# Thời điểm ghi cảnh báo cache dùng chung không truy cập được gần nhất (mỗi tiến trình)
+_last_unavailable_warning = 0.0
+
+
+def _warn_unavailable():
+    """Khi Redis ngừng hoạt động mọi request đều lỗi cache: chỉ ghi cảnh báo mỗi WARNING_INTERVAL giây"""
+    global _last_unavailable_warning
+    now = time.monotonic()
+    if now - _last_unavailable_warning < _setting('WARNING_INTERVAL', 60):
+        return
+    _last_unavailable_warning = now
+    logger.warning("Shared token cache is unavailable", exc_info=True)
+
+
+def _shared_get(key):
+    try:
+        return _shared_cache().get(key)
+    except Exception:
+        # Redis không truy cập được: chỉ dùng cache trong tiến trình
+        _warn_unavailable()
+        return None
+
+
+def _shared_set(key, value, timeout):
+    try:
+        _shared_cache().set(key, value, timeout)
+    except Exception:
+        _warn_unavailable()
+
+
+def invalidate_tokens(tokens):
+    """Xóa các access token (chuỗi token) khỏi cache, dùng khi token bị thu hồi hoặc quyền thay đổi"""
+    keys = [_cache_key(token) for token in tokens]
+    for key in keys:
+        _local_cache.delete(key)
+    if keys:
+        try:
+            _shared_cache().delete_many(keys)
+        except Exception:
+            _warn_unavailable()
+
+
+def invalidate_user_tokens(user_id):
+    invalidate_tokens(AccessToken.objects.filter(user_id=user_id).values_list('token', flat=True))
+
+
+class CachedOAuth2Authentication(OAuth2Authentication):
+    """
+    Giống OAuth2Authentication nhưng lưu kết quả xác thực token (user, vai trò, scope, hạn dùng)
+    trong LRU của tiến trình và cache dùng chung (Redis), nên request có token đã biết không cần truy vấn DB.
+    - Thời gian cache không vượt quá thời điểm token hết hạn
+    - LRU trong tiến trình chỉ giữ trong LOCAL_TIMEOUT giây để việc thu hồi token lan tới mọi tiến trình
+    """
+
+    def authenticate(self, request):
+        token = self._get_bearer_token(request)
+        if not token:
+            return super().authenticate(request)
+
+        key = _cache_key(token)
+        entry = _local_cache.get(key)
+        if entry is None:
+            entry = _shared_get(key)
+            if entry is not None:
+                self._store_local(key, entry)
+
+        if entry is not None:
+            if entry['expires'] > time.time():
+                return self._build_result(token, entry)
+            invalidate_tokens([token])
+
+        result = super().authenticate(request)
+        if result is not None:
+            self._store(key, result)
+        return result
+
+    @staticmethod
+    def _get_bearer_token(request):
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        parts = authorization.split()
+        if len(parts) == 2 and parts[0].lower() == 'bearer':
+            return parts[1]
+        return None
+
+    @staticmethod
+    def _store_local(key, entry):
+        timeout = min(_setting('LOCAL_TIMEOUT', 30), entry['expires'] - time.time())
+        if timeout > 0:
+            _local_cache.set(key, entry, timeout)
+
+    def _store(self, key, result):
+        user, access_token = result
+        if not user.is_active:
+            return
+        entry = {
+            'user': {
+                field.attname: getattr(user, field.attname)
+                for field in User._meta.concrete_fields if field.attname not in EXCLUDED_USER_FIELDS
+            },
+            'token_id': access_token.pk,
+            'application_id': access_token.application_id,
+            'scope': access_token.scope,
+            'expires': access_token.expires.timestamp(),
+        }
+        timeout = min(_setting('TIMEOUT', 300), entry['expires'] - time.time())
+        if timeout <= 0:
+            return
+        _shared_set(key, entry, int(timeout) or 1)
+        self._store_local(key, entry)
+
+    @staticmethod
+    def _build_result(token, entry):
+        # Dựng User từ dữ liệu đã cache; password được xem là deferred (nạp khi truy cập,
+        # save() không có update_fields chỉ ghi các field đã nạp). from_db cần giá trị theo thứ tự field của model
+        field_names = [f.attname for f in User._meta.concrete_fields if f.attname in entry['user']]
+        user = User.from_db(DEFAULT_DB_ALIAS, field_names, [entry['user'][name] for name in field_names])
+        access_token = AccessToken(
+            id=entry['token_id'],
+            user=user,
+            token=token,
+            application_id=entry['application_id'],
+            scope=entry['scope'],
+            expires=datetime.fromtimestamp(entry['expires'], tz=dt_timezone.utc),
+        )
+        access_token._state.adding = False
+        access_token._state.db = DEFAULT_DB_ALIAS
+        return user, access_token
@@ -0,0 +1,110 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from oauth2_provider.models import AccessToken
+
+from gymhealth.utils.realtime import get_backplane
+
+WEBSOCKET_PATH = '/ws/notifications/'
+# Gửi ping định kỳ để proxy/load balancer không đóng kết nối đang chờ
+HEARTBEAT_SECONDS = 25
+
+
+def get_user_from_token(token):
+    """Xác thực access token OAuth2 giống OAuth2Authentication của REST framework"""
+    if not token:
+        return None
+    access_token = AccessToken.objects.select_related('user').filter(token=token).first()
+    if access_token is None or not access_token.is_valid() or not access_token.user.is_active:
+        return None
+    return access_token.user
+
+
+def _bearer_token(authorization):
+    if authorization and authorization.lower().startswith('bearer '):
+        return authorization[7:].strip()
+    return None
+
+
+async def websocket_notifications(scope, receive, send):
+    """
+    Ứng dụng ASGI cho WebSocket /ws/notifications/?access_token=...
+    Sau khi kết nối, server đẩy mỗi thông báo mới của người dùng dưới dạng JSON.
+    """
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+
+    headers = {key.decode('latin1').lower(): value.decode('latin1') for key, value in scope.get('headers', [])}
+    query = parse_qs(scope.get('query_string', b'').decode())
+    token = _bearer_token(headers.get('authorization')) or query.get('access_token', [None])[0]
+
+    user = await sync_to_async(get_user_from_token)(token)
+    if user is None:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+
+    await send({'type': 'websocket.accept'})
+    subscription = get_backplane().subscribe(user.pk)
+
+    async def wait_disconnect():
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+
+    async def forward():
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                await send({'type': 'websocket.send', 'text': json.dumps({'type': 'ping'})})
+                continue
+            await send({
+                'type': 'websocket.send',
+                'text': json.dumps({'type': 'notification', 'data': message}, cls=DjangoJSONEncoder,
+                                   ensure_ascii=False)
+            })
+
+    tasks = [asyncio.ensure_future(wait_disconnect()), asyncio.ensure_future(forward())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        subscription.close()
+
+
+async def notification_stream(request):
+    """
+    Server-Sent Events: GET /notifications/stream/ (header Authorization: Bearer ... hoặc ?access_token=...)
+    Chỉ hoạt động khi chạy qua ASGI (uvicorn/daphne); dưới WSGI kết nối sẽ chiếm một worker.
+    """
+    token = _bearer_token(request.headers.get('Authorization')) or request.GET.get('access_token')
+    user = await sync_to_async(get_user_from_token)(token)
+    if user is None:
+        return JsonResponse({'error': 'Token không hợp lệ hoặc đã hết hạn'}, status=401)
+
+    async def events():
+        subscription = get_backplane().subscribe(user.pk)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                data = json.dumps(message, cls=DjangoJSONEncoder, ensure_ascii=False)
+                yield f"id: {message.get('id') or ''}\nevent: notification\ndata: {data}\n\n"
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from gymhealth.utils.retention_service import NotificationRetentionService
+
+
+class Command(BaseCommand):
+    help = ("Lưu trữ (nén) và xóa các thông báo quá thời hạn theo NOTIFICATION_RETENTION; "
+            "tùy chọn tạo/áp dụng phân vùng theo tháng cho bảng thông báo trên MySQL")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Chỉ đếm số thông báo sẽ được lưu trữ và in câu lệnh bảo trì partition")
+        parser.add_argument('--chunk-size', type=int, help="Số thông báo trong mỗi khối lưu trữ")
+        parser.add_argument('--partition', action='store_true',
+                            help="In câu lệnh SQL chuyển bảng thông báo sang partition theo tháng")
+        parser.add_argument('--apply', action='store_true', help="Thực thi câu lệnh SQL của --partition")
+        parser.add_argument('--months-ahead', type=int, default=3, help="Số tháng tạo sẵn partition")
+
+    def handle(self, *args, **options):
+        if options['partition']:
+            self.handle_partition(options)
+            return
+
+        result = NotificationRetentionService.archive_expired(
+            chunk_size=options['chunk_size'], dry_run=options['dry_run']
+        )
+        for notification_type, count in result.items():
+            self.stdout.write(f"{notification_type}: {count}")
+        verb = "Sẽ lưu trữ" if options['dry_run'] else "Đã lưu trữ"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {sum(result.values())} thông báo"))
+
+        maintained = NotificationRetentionService.maintain_partitions(
+            options['months_ahead'], dry_run=options['dry_run']
+        )
+        for statement in maintained:
+            self.stdout.write(statement + ";")
+
+    def handle_partition(self, options):
+        if NotificationRetentionService.existing_partitions():
+            raise CommandError("Bảng thông báo đã được phân vùng")
+        try:
+            statements = NotificationRetentionService.partition_sql(options['months_ahead'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for statement in statements:
+            self.stdout.write(statement + ";")
+
+        if options['apply']:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+            self.stdout.write(self.style.SUCCESS("Đã phân vùng bảng thông báo"))
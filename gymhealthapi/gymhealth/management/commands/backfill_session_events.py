@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from gymhealth.utils.session_event_service import SessionEventService
+
+
+class Command(BaseCommand):
+    help = ("Dựng lịch sử (SessionEvent) cho các buổi tập chưa có sự kiện nào từ trạng thái hiện tại; "
+            "chạy một lần sau khi triển khai, chạy lại không tạo trùng")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Số buổi tập trong mỗi lô")
+
+    def handle(self, *args, **options):
+        count = SessionEventService.backfill(batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Đã tạo {count} sự kiện"))
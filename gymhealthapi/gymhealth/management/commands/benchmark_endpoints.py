@@ -0,0 +1,252 @@
+import json
+import logging
+import platform
+import secrets
+import statistics
+import time
+import urllib.parse
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.utils import timezone
+from oauth2_provider.models import AccessToken
+
+from gymhealth.models import User, Payment
+from gymhealth.utils.vnpay_payment import VNPayUtils
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+
+class _Rollback(Exception):
+    pass
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = ("Đo p50/p95/p99 và số truy vấn của các endpoint chính (đặt lịch, lịch tuần, danh sách PT, biểu đồ "
+            "tiến độ, thông báo, màn hình chính, VNPay IPN) bằng Django test client và so sánh với baseline đã commit. "
+            "Cần dữ liệu từ 'manage.py generate_synthetic_data'.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=1,
+                            help="Chạy mỗi kịch bản N lần và giữ lần có p95 thấp nhất (giảm nhiễu trên máy dùng chung)")
+        parser.add_argument('--users', type=int, default=20, help="Số hội viên/PT được dùng luân phiên")
+        parser.add_argument('--only', nargs='*', help="Chỉ chạy các kịch bản này")
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--save-baseline', action='store_true',
+                            help="Ghi kết quả lần chạy này làm baseline (với --only: chỉ thay các kịch bản đã chạy)")
+        parser.add_argument('--max-regression', type=float, default=20.0,
+                            help="Báo lỗi khi p95 chậm hơn baseline quá số phần trăm này hoặc số truy vấn tăng")
+        parser.add_argument('--prefix', default='synthetic_', help="Tiền tố tên đăng nhập của dữ liệu giả lập")
+
+    def handle(self, *args, **options):
+        members = list(User.objects.filter(
+            username__startswith=f"{options['prefix']}member", member_profile__is_active=True,
+            subscriptions__status='active', health_info__isnull=False,
+        ).distinct().order_by('id')[:options['users']])
+        trainers = list(User.objects.filter(
+            username__startswith=f"{options['prefix']}trainer"
+        ).order_by('id')[:options['users']])
+        if not members or not trainers:
+            raise CommandError("Chưa có dữ liệu giả lập, hãy chạy 'manage.py generate_synthetic_data' trước")
+
+        tokens = self._create_tokens(members + trainers)
+        # Lỗi 5xx được đếm trong cột status thay vì in traceback cho từng request
+        request_logger = logging.getLogger('django.request')
+        request_log_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            scenarios = self._scenarios(members, trainers)
+            if options['only']:
+                scenarios = {name: scenario for name, scenario in scenarios.items() if name in options['only']}
+            results = {
+                # Nhiễu từ tiến trình khác chỉ làm chậm đi: lần chạy nhanh nhất là kết quả ổn định nhất
+                name: min((self._run(scenario, tokens, options['iterations'], options['warmup'])
+                           for _ in range(max(options['repeat'], 1))), key=lambda result: result['p95_ms'])
+                for name, scenario in scenarios.items()
+            }
+        finally:
+            request_logger.setLevel(request_log_level)
+            AccessToken.objects.filter(token__in=tokens.values()).delete()
+
+        baseline_path = Path(options['baseline'])
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else None
+        regressions = self._report(results, baseline, options['max_regression'])
+
+        if options['save_baseline']:
+            if options['only'] and baseline:
+                # Đo lại một phần: giữ kết quả của các kịch bản không chạy lần này
+                results = {**baseline.get('results', {}), **results}
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps({
+                'environment': self._environment(options),
+                'results': results,
+            }, indent=2, ensure_ascii=False) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Đã lưu baseline vào {baseline_path}"))
+        elif regressions:
+            raise CommandError("Hiệu năng giảm so với baseline: " + ', '.join(regressions))
+
+    @staticmethod
+    def _create_tokens(users):
+        expires = timezone.now() + timedelta(hours=2)
+        tokens = {user.pk: f"bench-{secrets.token_hex(16)}" for user in users}
+        AccessToken.objects.bulk_create([
+            AccessToken(user=user, token=tokens[user.pk], expires=expires, scope='read write') for user in users
+        ])
+        return tokens
+
+    def _scenarios(self, members, trainers):
+        """Mỗi kịch bản: hàm nhận chỉ số lượt chạy, trả về (user, method, path, data); rollback=True cho thao tác ghi"""
+        booking_day = timezone.localdate() + timedelta(days=14)
+        vnpay = VNPayUtils()
+        pending_payments = list(Payment.objects.filter(
+            subscription__member__in=members, payment_method='vnpay'
+        ).select_related('subscription')[:len(members)])
+
+        def booking(index):
+            member = members[index % len(members)]
+            trainer_id = member.training_sessions.filter(trainer__isnull=False).values_list('trainer_id', flat=True).first()
+            # 22:00 nằm ngoài khung giờ của dữ liệu giả lập nên không bị trùng lịch
+            data = {'session_date': booking_day.isoformat(), 'start_time': '22:00', 'end_time': '23:00',
+                    'session_type': 'pt_session' if trainer_id else 'self_training'}
+            if trainer_id:
+                data['trainer'] = trainer_id
+            return member, 'post', '/workout-sessions/member/register/', data
+
+        def ipn(index):
+            payment = pending_payments[index % len(pending_payments)]
+            params = {
+                'vnp_Amount': str(int(payment.amount * 100)), 'vnp_BankCode': 'NCB', 'vnp_CardType': 'ATM',
+                'vnp_OrderInfo': 'Thanh toan goi tap', 'vnp_PayDate': timezone.now().strftime('%Y%m%d%H%M%S'),
+                'vnp_ResponseCode': '00', 'vnp_TmnCode': vnpay.tmn_code, 'vnp_TransactionNo': str(14000000 + index),
+                'vnp_TransactionStatus': '00', 'vnp_TxnRef': payment.transaction_id,
+            }
+            query = '&'.join(f"{key}={urllib.parse.quote_plus(str(value))}" for key, value in sorted(params.items()))
+            params['vnp_SecureHash'] = vnpay.create_secure_hash(query)
+            # Đặt lại trạng thái pending trong transaction sẽ rollback để lần nào cũng xử lý đầy đủ
+            Payment.objects.filter(pk=payment.pk).update(status='pending')
+            return None, 'get', '/api/payments/vnpay/ipn/?' + urllib.parse.urlencode(params), None
+
+        scenarios = {
+            'booking': (booking, True),
+            'weekly_schedule': (lambda index: (members[index % len(members)], 'get',
+                                               '/workout-sessions/weekly-schedule/', None), False),
+            'trainer_weekly_schedule': (lambda index: (trainers[index % len(trainers)], 'get',
+                                                       '/workout-sessions/weekly-schedule/', None), False),
+            'trainer_list': (lambda index: (members[index % len(members)], 'get', '/trainers/', None), False),
+            'chart_data': (lambda index: (members[index % len(members)], 'get', '/training-progress/my-chart/',
+                                          None), False),
+            'notifications': (lambda index: (members[index % len(members)], 'get', '/notifications/my/', None),
+                              False),
+            'home': (lambda index: (members[index % len(members)], 'get', '/home/', None), False),
+            'trainer_home': (lambda index: (trainers[index % len(trainers)], 'get', '/home/', None), False),
+        }
+        if pending_payments:
+            scenarios['ipn'] = (ipn, True)
+        return scenarios
+
+    @staticmethod
+    def _request(client, tokens, user, method, path, data):
+        headers = {'HTTP_AUTHORIZATION': f"Bearer {tokens[user.pk]}"} if user is not None else {}
+        if method == 'post':
+            return client.post(path, data=json.dumps(data), content_type='application/json', **headers)
+        return client.get(path, **headers)
+
+    def _run(self, scenario, tokens, iterations, warmup):
+        build, rollback = scenario
+        client = Client(raise_request_exception=False)
+        timings = []
+        queries = []
+        statuses = {}
+        counter = _QueryCounter()
+        for index in range(warmup + iterations):
+            counter.count = 0
+            if rollback:
+                # Thao tác ghi chạy trong transaction rồi rollback để các lần chạy giống nhau
+                try:
+                    with transaction.atomic():
+                        user, method, path, data = build(index)
+                        counter.count = 0
+                        with connection.execute_wrapper(counter):
+                            start = time.perf_counter()
+                            response = self._request(client, tokens, user, method, path, data)
+                            elapsed = (time.perf_counter() - start) * 1000
+                        raise _Rollback
+                except _Rollback:
+                    pass
+            else:
+                user, method, path, data = build(index)
+                with connection.execute_wrapper(counter):
+                    start = time.perf_counter()
+                    response = self._request(client, tokens, user, method, path, data)
+                    elapsed = (time.perf_counter() - start) * 1000
+            if index < warmup:
+                continue
+            timings.append(elapsed)
+            queries.append(counter.count)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+        timings.sort()
+        return {
+            'p50_ms': round(timings[int(len(timings) * 0.50)], 2),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+            'p99_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 2),
+            'mean_ms': round(statistics.mean(timings), 2),
+            'queries': round(statistics.mean(queries), 1),
+            'max_queries': max(queries),
+            'statuses': statuses,
+        }
+
+    def _report(self, results, baseline, max_regression):
+        baseline_results = (baseline or {}).get('results', {})
+        if baseline and baseline.get('environment', {}).get('database') != connection.vendor:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline được đo trên {baseline['environment'].get('database')}, "
+                f"lần chạy này dùng {connection.vendor}: chỉ nên so sánh số truy vấn"
+            ))
+
+        self.stdout.write(f"{'endpoint':<24} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} "
+                          f"{'base p95':>9} {'base q':>7}  status")
+        regressions = []
+        for name, result in results.items():
+            base = baseline_results.get(name)
+            line = (f"{name:<24} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                    f"{result['queries']:>8.1f} ")
+            if base:
+                line += f"{base['p95_ms']:>9.2f} {base['queries']:>7.1f}  "
+                slower = result['p95_ms'] > base['p95_ms'] * (1 + max_regression / 100)
+                # Số truy vấn trung bình dao động nhẹ theo cache (token, ...): chỉ tính khi tăng từ 1 truy vấn/request
+                more_queries = result['queries'] >= base['queries'] + 1
+                if slower or more_queries:
+                    regressions.append(name)
+            else:
+                line += f"{'-':>9} {'-':>7}  "
+            line += ' '.join(f"{code}x{count}" for code, count in sorted(result['statuses'].items()))
+            style = self.style.ERROR if name in regressions else (lambda text: text)
+            self.stdout.write(style(line))
+        return regressions
+
+    @staticmethod
+    def _environment(options):
+        return {
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'iterations': options['iterations'],
+            'repeat': options['repeat'],
+            'members': User.objects.filter(role='MEMBER').count(),
+            'recorded_at': timezone.now().isoformat(timespec='seconds'),
+        }
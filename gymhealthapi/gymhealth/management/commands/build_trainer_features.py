@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from gymhealth.utils.ranking_service import TrainerRankingService
+from gymhealth.utils.recommendation_service import RecommendationService
+
+
+class Command(BaseCommand):
+    help = "Tính đặc trưng của tất cả PT cho gợi ý PT (/trainers/recommended/), giống task chạy hằng đêm"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--refresh-rankings', action='store_true',
+                            help="Tính lại điểm xếp hạng/đánh giá của PT trước khi tính đặc trưng")
+
+    def handle(self, *args, **options):
+        if options['refresh_rankings']:
+            count = TrainerRankingService.refresh()
+            self.stdout.write(f"Đã cập nhật điểm xếp hạng của {count} PT")
+        snapshot = RecommendationService.build_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã tạo snapshot #{snapshot.pk} với {snapshot.trainer_count} PT ({len(snapshot.columns)} cột)"))
@@ -0,0 +1,49 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gymhealth.utils.export_service import ExportService, ExportError, DATASETS, DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Xuất dữ liệu buổi tập, thanh toán, gói đăng ký hoặc tiến độ ra CSV/Parquet/Arrow với bộ nhớ cố định"
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('--format', dest='file_format', choices=['csv', 'parquet', 'arrow'], default='csv')
+        parser.add_argument('--output', '-o', default='-',
+                            help="Đường dẫn file kết quả ('-' để ghi CSV ra stdout)")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--filter', action='append', default=[], metavar='KEY=VALUE',
+                            help="Bộ lọc giống tham số của API, ví dụ: --filter status=completed "
+                                 "--filter date_from=2025-01-01")
+
+    def handle(self, *args, **options):
+        params = {}
+        for item in options['filter']:
+            key, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f"Bộ lọc không hợp lệ: {item} (cần dạng KEY=VALUE)")
+            params[key] = value
+
+        dataset = options['dataset']
+        file_format = options['file_format']
+        output = options['output']
+        chunk_size = options['chunk_size']
+
+        try:
+            queryset = ExportService.build_queryset(dataset, params)
+            if file_format == 'csv':
+                if output == '-':
+                    count = ExportService.write_csv(dataset, queryset, sys.stdout, chunk_size)
+                else:
+                    with open(output, 'w', newline='', encoding='utf-8') as f:
+                        count = ExportService.write_csv(dataset, queryset, f, chunk_size)
+            else:
+                if output == '-':
+                    raise CommandError("Cần chỉ định --output khi xuất Parquet/Arrow")
+                count = ExportService.write_columnar(dataset, queryset, output, file_format, chunk_size)
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        self.stderr.write(self.style.SUCCESS(f"Đã xuất {count} dòng {dataset} ({file_format})"))
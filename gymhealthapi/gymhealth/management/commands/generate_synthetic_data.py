@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gymhealth.models import User
+from gymhealth.utils.synthetic_data import SyntheticDataGenerator
+
+
+class Command(BaseCommand):
+    help = ("Sinh dữ liệu giả lập với khối lượng như production (mặc định 100k hội viên, 500 PT, 10 triệu buổi tập) "
+            "để đo hiệu năng. Dùng --scale để tạo bộ dữ liệu nhỏ hơn, vd: --scale 0.01")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=100000)
+        parser.add_argument('--trainers', type=int, default=500)
+        parser.add_argument('--sessions', type=int, default=10000000, help="Tổng số buổi tập (xấp xỉ)")
+        parser.add_argument('--notifications-per-member', type=int, default=20, help="Số thông báo trung bình")
+        parser.add_argument('--progress-ratio', type=float, default=0.5,
+                            help="Tỉ lệ buổi PT đã hoàn thành có bản ghi tiến độ")
+        parser.add_argument('--rating-ratio', type=float, default=0.3, help="Tỉ lệ hội viên đánh giá PT")
+        parser.add_argument('--scale', type=float, default=1.0, help="Nhân số hội viên, PT và buổi tập")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='synthetic_', help="Tiền tố tên đăng nhập của người dùng sinh ra")
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f"Đã có dữ liệu với tiền tố '{prefix}', hãy dùng --prefix khác")
+
+        scale = options['scale']
+        members = max(1, int(options['members'] * scale))
+        trainers = max(1, int(options['trainers'] * scale))
+        sessions = int(options['sessions'] * scale)
+
+        generator = SyntheticDataGenerator(
+            seed=options['seed'], batch_size=options['batch_size'], prefix=prefix,
+            log=lambda message: self.stdout.write(message) if options['verbosity'] > 1 else None
+        )
+        started = time.monotonic()
+        counts = generator.run(
+            members=members, trainers=trainers, sessions=sessions,
+            notifications_per_member=options['notifications_per_member'],
+            progress_ratio=options['progress_ratio'], rating_ratio=options['rating_ratio'],
+        )
+
+        for name, count in counts.items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Đã sinh dữ liệu trong {time.monotonic() - started:.1f}s"))
+        self.stdout.write("Chạy 'manage.py refresh_daily_stats --full' để cập nhật bảng thống kê")
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gymhealth.utils.occupancy_service import OccupancyService
+
+
+class Command(BaseCommand):
+    help = ("Đối soát bộ đếm số hội viên tự tập theo khung giờ (SlotOccupancy) với bảng buổi tập; "
+            "dùng sau khi triển khai lần đầu hoặc khi sửa buổi tập ngoài API")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help="Từ ngày (YYYY-MM-DD), mặc định hôm nay")
+        parser.add_argument('--to', dest='date_to', help="Đến ngày (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        try:
+            date_from, date_to = [
+                datetime.strptime(options[name], '%Y-%m-%d').date() if options[name] else None
+                for name in ('date_from', 'date_to')
+            ]
+        except ValueError:
+            raise CommandError("Ngày phải có dạng YYYY-MM-DD")
+        count = OccupancyService.rebuild(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(f"Đã cập nhật {count} bộ đếm"))
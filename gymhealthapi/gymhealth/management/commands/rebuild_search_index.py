@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from gymhealth.models import User
+from gymhealth.utils.search_service import SearchService
+
+
+class Command(BaseCommand):
+    help = ("Đánh chỉ mục lại bảng tìm kiếm người dùng (SearchToken) từ họ tên, username và chuyên môn của PT; "
+            "dùng sau khi triển khai lần đầu hoặc khi đổi cách tách từ")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--role', choices=[role for role, _ in User.ROLE], help="Chỉ đánh chỉ mục một vai trò")
+        parser.add_argument('--batch-size', type=int, help="Số người dùng trong mỗi lô")
+
+    def handle(self, *args, **options):
+        count = SearchService.rebuild(role=options['role'], batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Đã đánh chỉ mục {count} người dùng"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from gymhealth.utils.stats_service import StatsService
+
+
+class Command(BaseCommand):
+    help = "Cập nhật các bảng thống kê theo ngày (buổi tập, doanh thu, người dùng) cho trang thống kê admin"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Tính lại toàn bộ thay vì chỉ các ngày có dữ liệu thay đổi")
+
+    def handle(self, *args, **options):
+        count = StatsService.refresh(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f"Đã cập nhật thống kê cho {count} ngày"))
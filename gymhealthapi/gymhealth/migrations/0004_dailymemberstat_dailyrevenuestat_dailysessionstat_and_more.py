@@ -0,0 +1,97 @@
+# Generated by Django 5.2 on 2026-10-19 14:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gymhealth', '0003_alter_user_avatar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMemberStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('role', models.CharField(choices=[('MANAGER', 'Quản lý phòng gym'), ('TRAINER', 'Huấn luyện viên (PT)'), ('MEMBER', 'Hội viên')], max_length=20)),
+                ('is_active', models.BooleanField()),
+                ('user_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Thống kê người dùng theo ngày',
+                'verbose_name_plural': 'Thống kê người dùng theo ngày',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyRevenueStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('payment_method', models.CharField(choices=[('momo', 'MoMo'), ('vnpay', 'VNPAY'), ('bank_transfer', 'Chuyển khoản ngân hàng'), ('cash', 'Tiền mặt'), ('other', 'Khác')], max_length=20)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payment_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Thống kê doanh thu theo ngày',
+                'verbose_name_plural': 'Thống kê doanh thu theo ngày',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySessionStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Chờ duyệt'), ('confirmed', 'Đã xác nhận'), ('completed', 'Đã hoàn thành'), ('cancelled', 'Đã hủy'), ('rescheduled', 'Đã đổi lịch')], max_length=20)),
+                ('session_type', models.CharField(choices=[('pt_session', 'Buổi tập với PT'), ('self_training', 'Tự tập')], max_length=20)),
+                ('session_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Thống kê buổi tập theo ngày',
+                'verbose_name_plural': 'Thống kê buổi tập theo ngày',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyStatsRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('days_refreshed', models.PositiveIntegerField(default=0)),
+                ('full_rebuild', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name': 'Lần cập nhật thống kê',
+                'verbose_name_plural': 'Lần cập nhật thống kê',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['updated_at'], name='gymhealth_p_updated_f2226c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutsession',
+            index=models.Index(fields=['updated_at'], name='gymhealth_w_updated_aab0cb_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailymemberstat',
+            unique_together={('date', 'role', 'is_active')},
+        ),
+        migrations.AddField(
+            model_name='dailyrevenuestat',
+            name='package',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_revenue_stats', to='gymhealth.packages'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailysessionstat',
+            unique_together={('date', 'hour', 'status', 'session_type')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyrevenuestat',
+            unique_together={('date', 'package', 'payment_method')},
+        ),
+    ]
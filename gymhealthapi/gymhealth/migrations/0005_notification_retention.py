@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-19 14:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gymhealth', '0004_dailymemberstat_dailyrevenuestat_dailysessionstat_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('session_reminder', 'Nhắc nhở buổi tập'), ('subscription_expiry', 'Sắp hết hạn gói tập'), ('new_promotion', 'Ưu đãi mới'), ('payment_confirmation', 'Xác nhận thanh toán'), ('feedback_request', 'Yêu cầu đánh giá'), ('feedback_response', 'Phản hồi đánh giá'), ('system', 'Thông báo hệ thống')], max_length=30)),
+                ('first_notification_id', models.BigIntegerField()),
+                ('last_notification_id', models.BigIntegerField()),
+                ('created_from', models.DateTimeField()),
+                ('created_to', models.DateTimeField()),
+                ('row_count', models.PositiveIntegerField()),
+                ('payload', models.BinaryField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Lưu trữ thông báo',
+                'verbose_name_plural': 'Lưu trữ thông báo',
+                'ordering': ['-archived_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'created_at'], name='gymhealth_n_user_id_b539c7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['notification_type', 'is_read', 'created_at'], name='gymhealth_n_notific_391585_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationarchive',
+            index=models.Index(fields=['notification_type', 'created_from'], name='gymhealth_n_notific_11f0c4_idx'),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2 on 2026-10-19 14:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gymhealth', '0005_notification_retention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('sync_version', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Bản ghi đã xóa (đồng bộ)',
+                'verbose_name_plural': 'Bản ghi đã xóa (đồng bộ)',
+            },
+        ),
+        migrations.CreateModel(
+            name='SyncVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('allocated_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Phiên bản đồng bộ',
+                'verbose_name_plural': 'Phiên bản đồng bộ',
+            },
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='sync_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='subscriptionpackage',
+            name='sync_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='trainingprogress',
+            name='sync_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='workoutsession',
+            name='sync_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'sync_version'], name='gymhealth_n_user_id_4edfd0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscriptionpackage',
+            index=models.Index(fields=['member', 'sync_version'], name='gymhealth_s_member__f160aa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trainingprogress',
+            index=models.Index(fields=['health_info', 'sync_version'], name='gymhealth_t_health__2aff7e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trainingprogress',
+            index=models.Index(fields=['created_by', 'sync_version'], name='gymhealth_t_created_8efe69_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutsession',
+            index=models.Index(fields=['member', 'sync_version'], name='gymhealth_w_member__0a9ae3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutsession',
+            index=models.Index(fields=['trainer', 'sync_version'], name='gymhealth_w_trainer_5cd5e5_idx'),
+        ),
+        migrations.AddField(
+            model_name='synctombstone',
+            name='owner',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['owner', 'sync_version'], name='gymhealth_s_owner_i_9a93e2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['deleted_at'], name='gymhealth_s_deleted_58ae1c_idx'),
+        ),
+    ]
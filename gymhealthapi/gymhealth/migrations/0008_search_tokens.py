@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 14:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gymhealth', '0007_calendar_feed_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(max_length=20)),
+                ('field', models.CharField(choices=[('name', 'Họ tên'), ('username', 'Tên đăng nhập'), ('specialization', 'Chuyên môn')], max_length=20)),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Từ khóa tìm kiếm',
+                'verbose_name_plural': 'Từ khóa tìm kiếm',
+                'indexes': [models.Index(fields=['role', 'token'], name='gymhealth_s_role_52b2a6_idx')],
+            },
+        ),
+    ]
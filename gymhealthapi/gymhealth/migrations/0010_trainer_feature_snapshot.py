@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-19 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gymhealth', '0009_trainer_rank_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainerFeatureSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('columns', models.JSONField()),
+                ('trainer_ids', models.BinaryField()),
+                ('features', models.BinaryField()),
+                ('trainer_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Đặc trưng PT (gợi ý)',
+                'verbose_name_plural': 'Đặc trưng PT (gợi ý)',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-19 14:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gymhealth', '0010_trainer_feature_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('waiting', 'Đang chờ'), ('promoted', 'Đã được xếp lịch'), ('cancelled', 'Đã rời danh sách chờ'), ('expired', 'Hết hạn')], default='waiting', max_length=20)),
+                ('promoted_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+                ('promoted_session', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entry', to='gymhealth.workoutsession')),
+                ('trainer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trainer_waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Danh sách chờ',
+                'verbose_name_plural': 'Danh sách chờ',
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['trainer', 'session_date', 'status', 'created_at'], name='gymhealth_w_trainer_9ab40f_idx'), models.Index(fields=['member', 'status'], name='gymhealth_w_member__a0e946_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-19 14:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gymhealth', '0011_waitlist_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gym',
+            name='floor_capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='Số hội viên tự tập tối đa trong một khung giờ (để trống: không giới hạn)', null=True),
+        ),
+        migrations.AddField(
+            model_name='workoutsession',
+            name='gym',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='workout_sessions', to='gymhealth.gym'),
+        ),
+        migrations.CreateModel(
+            name='SlotOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('gym', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_occupancies', to='gymhealth.gym')),
+            ],
+            options={
+                'verbose_name': 'Số người tập theo khung giờ',
+                'verbose_name_plural': 'Số người tập theo khung giờ',
+                'unique_together': {('gym', 'date', 'hour')},
+            },
+        ),
+    ]
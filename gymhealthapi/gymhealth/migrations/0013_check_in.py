@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-19 14:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gymhealth', '0012_gym_slot_occupancy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckIn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checked_in_at', models.DateTimeField()),
+                ('pass_expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('gym', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='check_ins', to='gymhealth.gym')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='check_ins', to=settings.AUTH_USER_MODEL)),
+                ('scanned_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scanned_check_ins', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lượt vào phòng tập',
+                'verbose_name_plural': 'Lượt vào phòng tập',
+                'ordering': ['-checked_in_at'],
+                'indexes': [models.Index(fields=['member', 'checked_in_at'], name='gymhealth_c_member__b34c1e_idx'), models.Index(fields=['gym', 'checked_in_at'], name='gymhealth_c_gym_id_2df9e1_idx')],
+            },
+        ),
+    ]
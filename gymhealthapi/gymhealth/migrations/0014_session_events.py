@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-19 14:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gymhealth', '0013_check_in'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.PositiveSmallIntegerField(choices=[(1, 'Tạo buổi tập'), (2, 'Xác nhận'), (3, 'Đổi lịch'), (4, 'Hủy'), (5, 'Hoàn thành')])),
+                ('session_date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('previous_date', models.DateField(blank=True, null=True)),
+                ('previous_start_time', models.TimeField(blank=True, null=True)),
+                ('previous_end_time', models.TimeField(blank=True, null=True)),
+                ('note', models.TextField(blank=True, null=True)),
+                ('backfilled', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('member', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('session', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='gymhealth.workoutsession')),
+                ('trainer', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Lịch sử buổi tập',
+                'verbose_name_plural': 'Lịch sử buổi tập',
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['session', 'created_at'], name='gymhealth_s_session_8fb18a_idx'), models.Index(fields=['trainer', 'created_at'], name='gymhealth_s_trainer_776394_idx'), models.Index(fields=['member', 'created_at'], name='gymhealth_s_member__fc02c7_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,81 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+# Bản sao tại thời điểm viết migration của gymhealth.utils.search_service (FIELD_WEIGHTS, fold, tokenize):
+# migration không import mã ứng dụng để vẫn chạy đúng khi module đó thay đổi về sau
+FIELD_WEIGHTS = {
+    'name': 3,
+    'username': 2,
+    'specialization': 1,
+}
+TOKEN_MAX_LENGTH = 64
+_token_re = re.compile(r'[a-z0-9]+')
+
+
+def fold(text):
+    text = (text or '').replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    return ''.join(char for char in text if not unicodedata.combining(char)).lower()
+
+
+def tokenize(text):
+    return [token[:TOKEN_MAX_LENGTH] for token in _token_re.findall(fold(text))]
+
+
+def build_search_tokens(apps, schema_editor):
+    """
+    Đánh chỉ mục những người dùng chưa có SearchToken (dữ liệu trước 0008). Nếu thiếu bước này, bộ lọc ?search=,
+    ?specialization= và ?member_name= không trả về gì cho đến khi chạy rebuild_search_index. Token được tạo giống
+    SearchService.user_tokens; người dùng đã được đánh chỉ mục (qua signal) được giữ nguyên.
+    """
+    User = apps.get_model('gymhealth', 'User')
+    TrainerProfile = apps.get_model('gymhealth', 'TrainerProfile')
+    SearchToken = apps.get_model('gymhealth', 'SearchToken')
+
+    users = User.objects.filter(is_active=True).order_by('pk').only(
+        'id', 'username', 'first_name', 'last_name', 'role')
+    last_id = 0
+    while True:
+        batch = list(users.filter(pk__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].pk
+        indexed = set(SearchToken.objects.filter(
+            user_id__in=[user.pk for user in batch]).values_list('user_id', flat=True).distinct())
+        batch = [user for user in batch if user.pk not in indexed]
+        specializations = dict(TrainerProfile.objects.filter(
+            user_id__in=[user.pk for user in batch if user.role == 'TRAINER']
+        ).values_list('user_id', 'specialization'))
+
+        tokens = []
+        for user in batch:
+            sources = [
+                ('name', f"{user.last_name} {user.first_name}"),
+                ('username', user.username),
+            ]
+            if user.role == 'TRAINER':
+                sources.append(('specialization', specializations.get(user.pk)))
+            seen = set()
+            for field, text in sources:
+                for token in tokenize(text):
+                    if (field, token) in seen:
+                        continue
+                    seen.add((field, token))
+                    tokens.append(SearchToken(
+                        user_id=user.pk, role=user.role, field=field, token=token, weight=FIELD_WEIGHTS[field]))
+        SearchToken.objects.bulk_create(tokens, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gymhealth', '0014_session_events'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_search_tokens, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from datetime import datetime
 
 from django.contrib.auth.base_user import BaseUserManager
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
@@ -109,6 +110,13 @@ class TrainerProfile(models.Model):
     certification = models.CharField(max_length=255, blank=True, null=True, help_text="Chứng chỉ huấn luyện")
     experience_years = models.PositiveIntegerField(default=0)
     hourly_rate = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Các chỉ số xếp hạng được tính sẵn (gymhealth.utils.ranking_service), cập nhật khi có đánh giá/buổi tập mới
+    rating_average = models.FloatField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_sessions = models.PositiveIntegerField(default=0, editable=False)
+    booked_next_7_days = models.PositiveIntegerField(default=0, editable=False)
+    rank_score = models.FloatField(default=0, db_index=True, editable=False)
+    rank_updated_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Hồ sơ huấn luyện viên"
@@ -127,6 +135,135 @@ class BaseModel(models.Model):
         abstract = True
 
 
+#
+# Đồng bộ dữ liệu cho app (GET /sync/?since=...): mỗi lần lưu, bản ghi nhận một phiên bản mới tăng dần
+#
+class SyncVersion(models.Model):
+    # id (AUTO_INCREMENT) chính là phiên bản; mỗi lần cấp phát chỉ là một câu INSERT, không khóa dòng chung
+    allocated_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Phiên bản đồng bộ"
+        verbose_name_plural = "Phiên bản đồng bộ"
+
+    @classmethod
+    def allocate(cls):
+        return cls.objects.create().pk
+
+    def __str__(self):
+        return f"#{self.pk} ({self.allocated_at})"
+
+
+class SyncTrackedModel(models.Model):
+    # Phiên bản của lần thay đổi gần nhất; dữ liệu tạo bằng bulk_create/update() cần tự gán
+    sync_version = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.sync_version = SyncVersion.allocate()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'sync_version'}
+        super().save(*args, **kwargs)
+
+
+class SyncTombstone(models.Model):
+    # Bản ghi đã bị xóa, giữ lại để app xóa bản sao cục bộ (mỗi người sở hữu một dòng)
+    # Không dùng ràng buộc khóa ngoại: tombstone được tạo ngay trong lúc xóa cascade cả người dùng
+    owner = models.ForeignKey('User', on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    object_type = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    sync_version = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Bản ghi đã xóa (đồng bộ)"
+        verbose_name_plural = "Bản ghi đã xóa (đồng bộ)"
+        indexes = [
+            models.Index(fields=['owner', 'sync_version']),
+            models.Index(fields=['deleted_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.object_type}#{self.object_id} (v{self.sync_version})"
+
+
+class CalendarFeedToken(models.Model):
+    # Token bí mật trong URL lịch .ics: ứng dụng lịch trên điện thoại không gửi được header xác thực
+    user = models.OneToOneField('User', on_delete=models.CASCADE, related_name='calendar_feed_token')
+    token = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Token lịch (iCalendar)"
+        verbose_name_plural = "Token lịch (iCalendar)"
+
+    def __str__(self):
+        return f"Lịch của {self.user}"
+
+    @staticmethod
+    def generate_token():
+        import secrets
+        return secrets.token_urlsafe(32)
+
+    @classmethod
+    def for_user(cls, user):
+        feed_token, _ = cls.objects.get_or_create(user=user, defaults={'token': cls.generate_token()})
+        return feed_token
+
+    def regenerate(self):
+        """Cấp token mới, URL cũ không còn dùng được"""
+        self.token = self.generate_token()
+        self.save(update_fields=['token'])
+        return self
+
+
+class SearchToken(models.Model):
+    # Chỉ mục tìm kiếm người dùng: mỗi từ (chữ thường, đã bỏ dấu tiếng Việt) của họ tên, username và chuyên môn
+    # là một dòng. Tìm theo tiền tố dùng index (role, token) thay cho icontains quét toàn bảng.
+    FIELDS = (
+        ('name', 'Họ tên'),
+        ('username', 'Tên đăng nhập'),
+        ('specialization', 'Chuyên môn'),
+    )
+
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='search_tokens')
+    role = models.CharField(max_length=20)
+    field = models.CharField(max_length=20, choices=FIELDS)
+    token = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Từ khóa tìm kiếm"
+        verbose_name_plural = "Từ khóa tìm kiếm"
+        indexes = [
+            models.Index(fields=['role', 'token']),
+        ]
+
+    def __str__(self):
+        return f"{self.token} ({self.field} #{self.user_id})"
+
+
+class TrainerFeatureSnapshot(models.Model):
+    # Đặc trưng của tất cả PT tính sẵn hằng đêm cho gợi ý PT (gymhealth.utils.recommendation_service):
+    # ma trận float32 (số PT x số cột) và id PT tương ứng, lưu dạng mảng nhị phân gọn
+    created_at = models.DateTimeField(auto_now_add=True)
+    columns = models.JSONField()
+    trainer_ids = models.BinaryField()
+    features = models.BinaryField()
+    trainer_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Đặc trưng PT (gợi ý)"
+        verbose_name_plural = "Đặc trưng PT (gợi ý)"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Đặc trưng {self.trainer_count} PT lúc {self.created_at}"
+
+
 class PackageType(BaseModel):
     name = models.CharField(max_length=100, verbose_name="Tên loại gói")
     duration_months = models.PositiveIntegerField(default=1, verbose_name="Số tháng")
@@ -181,7 +318,7 @@ class Packages(BaseModel):
         return self.price
 
 
-class SubscriptionPackage(models.Model):
+class SubscriptionPackage(SyncTrackedModel):
     STATUS_CHOICES = (
         ('pending', 'Chờ thanh toán'),
         ('active', 'Đang hoạt động'),
@@ -221,6 +358,9 @@ class SubscriptionPackage(models.Model):
         verbose_name = "Đăng ký gói tập"
         verbose_name_plural = "Đăng ký gói tập"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['member', 'sync_version']),
+        ]
 
     def __str__(self):
         return f"{self.member.username} - {self.package.name} ({self.get_status_display()})"
@@ -302,6 +442,9 @@ class Payment(models.Model):
         verbose_name = "Thanh toán"
         verbose_name_plural = "Thanh toán"
         ordering = ['-payment_date']
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
 
     def __str__(self):
         return f"Thanh toán {self.amount} - {self.get_payment_method_display()} - {self.get_status_display()}"
@@ -327,7 +470,7 @@ class PaymentReceipt(models.Model):
 #
 # Lịch tập
 #
-class WorkoutSession(models.Model):
+class WorkoutSession(SyncTrackedModel):
     SESSION_STATUS = (
         ('pending', 'Chờ duyệt'),
         ('confirmed', 'Đã xác nhận'),
@@ -353,6 +496,8 @@ class WorkoutSession(models.Model):
     status = models.CharField(max_length=20, choices=SESSION_STATUS, default='pending')
     notes = RichTextField(blank=True, null=True)
     trainer_notes = RichTextField(blank=True, null=True)
+    # Phòng tập của buổi tự tập (giới hạn số người tập cùng khung giờ, xem gymhealth.utils.occupancy_service)
+    gym = models.ForeignKey('Gym', on_delete=models.SET_NULL, null=True, blank=True, related_name='workout_sessions')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -360,6 +505,11 @@ class WorkoutSession(models.Model):
         verbose_name = "Lịch tập"
         verbose_name_plural = "Lịch tập"
         ordering = ['-session_date', 'start_time']
+        indexes = [
+            models.Index(fields=['updated_at']),
+            models.Index(fields=['member', 'sync_version']),
+            models.Index(fields=['trainer', 'sync_version']),
+        ]
 
     def __str__(self):
         if self.session_type == 'pt_session':
@@ -384,7 +534,105 @@ class WorkoutSession(models.Model):
         ).exclude(id=self.id)
 
 
-class TrainingProgress(models.Model):
+class SessionEvent(models.Model):
+    # Nhật ký thay đổi buổi tập, chỉ thêm không sửa: mỗi lần tạo / xác nhận / đổi lịch / hủy / hoàn thành là một dòng
+    # với mã sự kiện kiểu số. Không dùng khóa ngoại ở DB để nhật ký còn lại sau khi buổi tập hoặc người dùng bị xóa.
+    CREATED, CONFIRMED, RESCHEDULED, CANCELLED, COMPLETED = 1, 2, 3, 4, 5
+    EVENT_TYPES = (
+        (CREATED, 'Tạo buổi tập'),
+        (CONFIRMED, 'Xác nhận'),
+        (RESCHEDULED, 'Đổi lịch'),
+        (CANCELLED, 'Hủy'),
+        (COMPLETED, 'Hoàn thành'),
+    )
+    EVENT_NAMES = {
+        CREATED: 'created',
+        CONFIRMED: 'confirmed',
+        RESCHEDULED: 'rescheduled',
+        CANCELLED: 'cancelled',
+        COMPLETED: 'completed',
+    }
+
+    session = models.ForeignKey(WorkoutSession, on_delete=models.DO_NOTHING, db_constraint=False,
+                                related_name='events')
+    member = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    trainer = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                                related_name='+')
+    # Người thực hiện; trống với sự kiện do hệ thống tạo (danh sách chờ, dữ liệu bổ sung)
+    actor = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                              related_name='+')
+    event = models.PositiveSmallIntegerField(choices=EVENT_TYPES)
+    # Khung giờ sau sự kiện; với đổi lịch, khung giờ cũ nằm ở các cột previous_*
+    session_date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    previous_date = models.DateField(null=True, blank=True)
+    previous_start_time = models.TimeField(null=True, blank=True)
+    previous_end_time = models.TimeField(null=True, blank=True)
+    note = models.TextField(blank=True, null=True)
+    # Sự kiện dựng lại từ trạng thái hiện tại (lệnh backfill_session_events), thời điểm chỉ là gần đúng
+    backfilled = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Lịch sử buổi tập"
+        verbose_name_plural = "Lịch sử buổi tập"
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['session', 'created_at']),
+            models.Index(fields=['trainer', 'created_at']),
+            models.Index(fields=['member', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"#{self.session_id} {self.EVENT_NAMES.get(self.event)} lúc {self.created_at}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Lịch sử buổi tập chỉ được thêm, không được sửa.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Lịch sử buổi tập chỉ được thêm, không được xóa.")
+
+
+class WaitlistEntry(models.Model):
+    # Danh sách chờ một khung giờ của PT: khi có buổi tập bị hủy/đổi lịch, người đứng đầu hàng chờ
+    # được tự động đặt vào khung giờ trống (gymhealth.utils.waitlist_service)
+    STATUS = (
+        ('waiting', 'Đang chờ'),
+        ('promoted', 'Đã được xếp lịch'),
+        ('cancelled', 'Đã rời danh sách chờ'),
+        ('expired', 'Hết hạn'),
+    )
+
+    member = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlist_entries')
+    trainer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='trainer_waitlist_entries')
+    session_date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    notes = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS, default='waiting')
+    promoted_session = models.OneToOneField(WorkoutSession, on_delete=models.SET_NULL, null=True, blank=True,
+                                            related_name='waitlist_entry')
+    promoted_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Danh sách chờ"
+        verbose_name_plural = "Danh sách chờ"
+        ordering = ['created_at', 'id']
+        indexes = [
+            # Hàng chờ của một PT trong một ngày theo thứ tự đăng ký: lấy người đầu hàng và vị trí bằng index
+            models.Index(fields=['trainer', 'session_date', 'status', 'created_at']),
+            models.Index(fields=['member', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.member.username} chờ {self.trainer.username} - {self.session_date} {self.start_time}"
+
+
+class TrainingProgress(SyncTrackedModel):
     workout_session = models.OneToOneField(WorkoutSession, on_delete=models.CASCADE,
                                            related_name='progress_record')
     health_info = models.ForeignKey("HealthInfo", on_delete=models.CASCADE,
@@ -420,6 +668,10 @@ class TrainingProgress(models.Model):
         verbose_name = "Bản ghi tiến độ"
         verbose_name_plural = "Bản ghi tiến độ"
         ordering = ['-id']
+        indexes = [
+            models.Index(fields=['health_info', 'sync_version']),
+            models.Index(fields=['created_by', 'sync_version']),
+        ]
 
     def save(self, *args, **kwargs):
         # Đảm bảo health_info là của member trong workout_session
@@ -431,6 +683,10 @@ class TrainingProgress(models.Model):
         return f"Tiến độ của {self.health_info.user.username} ngày {self.workout_session.session_date}"
 
 
+# Hằng số theo giới tính của công thức Mifflin-St Jeor (giới tính được nhập tự do)
+BMR_GENDER_OFFSETS = {'nam': 5, 'male': 5, 'm': 5, 'nữ': -161, 'nu': -161, 'female': -161, 'f': -161}
+
+
 class HealthInfo(models.Model):
     GOAL_CHOICES = (
         ('weight_loss', 'Giảm cân'),
@@ -469,6 +725,15 @@ class HealthInfo(models.Model):
         return today.year - self.user.date_of_birth.year - (
                 (today.month, today.day) < (self.user.date_of_birth.month, self.user.date_of_birth.day))
 
+    @property
+    def bmr(self):
+        """Chuyển hóa cơ bản (kcal/ngày) theo Mifflin-St Jeor; None khi chưa biết tuổi hoặc giới tính"""
+        age = self.age
+        gender = (self.user.gender or '').strip().lower()
+        if age is None or gender not in BMR_GENDER_OFFSETS:
+            return None
+        return round(10 * self.weight + 6.25 * self.height - 5 * age + BMR_GENDER_OFFSETS[gender])
+
 
 
 # Mô hình theo dõi các bài tập và thành tích
@@ -487,7 +752,7 @@ class Exercise(models.Model):
         return self.name
 
 
-class Notification(models.Model):
+class Notification(SyncTrackedModel):
     NOTIFICATION_TYPES = (
         ('session_reminder', 'Nhắc nhở buổi tập'),
         ('subscription_expiry', 'Sắp hết hạn gói tập'),
@@ -511,11 +776,40 @@ class Notification(models.Model):
         verbose_name = "Thông báo"
         verbose_name_plural = "Thông báo"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['notification_type', 'is_read', 'created_at']),
+            models.Index(fields=['user', 'sync_version']),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.user.username}"
 
 
+# Lưu trữ thông báo cũ đã được chuyển khỏi bảng Notification (mỗi bản ghi là một khối đã nén)
+class NotificationArchive(models.Model):
+    notification_type = models.CharField(max_length=30, choices=Notification.NOTIFICATION_TYPES)
+    first_notification_id = models.BigIntegerField()
+    last_notification_id = models.BigIntegerField()
+    created_from = models.DateTimeField()
+    created_to = models.DateTimeField()
+    row_count = models.PositiveIntegerField()
+    # JSON lines của các thông báo, nén bằng zlib
+    payload = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Lưu trữ thông báo"
+        verbose_name_plural = "Lưu trữ thông báo"
+        ordering = ['-archived_at']
+        indexes = [
+            models.Index(fields=['notification_type', 'created_from']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_notification_type_display()} #{self.first_notification_id}-{self.last_notification_id} ({self.row_count})"
+
+
 # Mô hình Ưu đãi/Khuyến mãi
 class Promotion(models.Model):
     title = models.CharField(max_length=255)
@@ -660,11 +954,54 @@ class Gym(models.Model):
     address = models.CharField(max_length=200)
     phone = models.CharField(max_length=20)
     description = RichTextField(blank=True)
+    floor_capacity = models.PositiveIntegerField(
+        null=True, blank=True, help_text='Số hội viên tự tập tối đa trong một khung giờ (để trống: không giới hạn)')
 
     def __str__(self):
         return self.name
 
 
+class SlotOccupancy(models.Model):
+    # Số hội viên tự tập đã đặt lịch trong từng khung giờ (1 giờ) của phòng tập. Tăng/giảm bằng UPDATE có điều kiện
+    # (count < sức chứa) khi đặt lịch, không đếm lại buổi tập ở mỗi request
+    gym = models.ForeignKey(Gym, on_delete=models.CASCADE, related_name='slot_occupancies')
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Số người tập theo khung giờ"
+        verbose_name_plural = "Số người tập theo khung giờ"
+        unique_together = (('gym', 'date', 'hour'),)
+
+    def __str__(self):
+        return f"{self.gym} {self.date} {self.hour}h: {self.count}"
+
+
+class CheckIn(models.Model):
+    # Lượt vào phòng tập bằng mã QR (gymhealth.utils.checkin_service). Được ghi bởi task Celery nên
+    # checked_in_at là thời điểm quét mã, không phải thời điểm insert
+    member = models.ForeignKey(User, on_delete=models.CASCADE, related_name='check_ins')
+    gym = models.ForeignKey(Gym, on_delete=models.SET_NULL, null=True, blank=True, related_name='check_ins')
+    scanned_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='scanned_check_ins')
+    checked_in_at = models.DateTimeField()
+    pass_expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Lượt vào phòng tập"
+        verbose_name_plural = "Lượt vào phòng tập"
+        ordering = ['-checked_in_at']
+        indexes = [
+            models.Index(fields=['member', 'checked_in_at']),
+            models.Index(fields=['gym', 'checked_in_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.member.username} - {self.checked_in_at}"
+
+
 # member
 class MemberProxy(User):
     class Meta:
@@ -685,3 +1022,70 @@ class ManagerProxy(User):
         proxy = True
         verbose_name = 'Quản lý'
         verbose_name_plural = 'Quản lý'
+
+
+#
+# Bảng thống kê tổng hợp theo ngày (được cập nhật bởi Celery, dùng cho trang thống kê admin)
+#
+class DailySessionStat(models.Model):
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    status = models.CharField(max_length=20, choices=WorkoutSession.SESSION_STATUS)
+    session_type = models.CharField(max_length=20, choices=WorkoutSession.SESSION_TYPE)
+    session_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Thống kê buổi tập theo ngày"
+        verbose_name_plural = "Thống kê buổi tập theo ngày"
+        unique_together = (('date', 'hour', 'status', 'session_type'),)
+
+    def __str__(self):
+        return f"{self.date} {self.hour}h - {self.status} - {self.session_type}: {self.session_count}"
+
+
+class DailyRevenueStat(models.Model):
+    date = models.DateField()
+    package = models.ForeignKey(Packages, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='daily_revenue_stats')
+    payment_method = models.CharField(max_length=20, choices=Payment.PAYMENT_METHOD)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payment_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Thống kê doanh thu theo ngày"
+        verbose_name_plural = "Thống kê doanh thu theo ngày"
+        unique_together = (('date', 'package', 'payment_method'),)
+
+    def __str__(self):
+        return f"{self.date} - {self.package_id} - {self.payment_method}: {self.total_amount}"
+
+
+class DailyMemberStat(models.Model):
+    date = models.DateField()
+    role = models.CharField(max_length=20, choices=User.ROLE)
+    is_active = models.BooleanField()
+    user_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Thống kê người dùng theo ngày"
+        verbose_name_plural = "Thống kê người dùng theo ngày"
+        unique_together = (('date', 'role', 'is_active'),)
+
+    def __str__(self):
+        return f"{self.date} - {self.role} ({'active' if self.is_active else 'inactive'}): {self.user_count}"
+
+
+class DailyStatsRefresh(models.Model):
+    # Mỗi lần chạy job tổng hợp; started_at của lần chạy thành công gần nhất là mốc cho lần chạy kế tiếp
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    days_refreshed = models.PositiveIntegerField(default=0)
+    full_rebuild = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name = "Lần cập nhật thống kê"
+        verbose_name_plural = "Lần cập nhật thống kê"
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Cập nhật thống kê lúc {self.started_at}"
@@ -1,3 +1,10 @@
+import hashlib
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
 from rest_framework.pagination import PageNumberPagination
 
 
@@ -5,3 +12,58 @@ class ItemPaginator(PageNumberPagination):
     page_size = 10  # Hoặc giá trị phù hợp
     page_size_query_param = 'page_size'  # Cho phép thay đổi qua query param
     max_page_size = 100  # Giới hạn kích thước trang tối đa
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator cho các bảng rất lớn trong trang admin: không chạy COUNT(*) chính xác mỗi lần tải trang.
+    - Không có bộ lọc + MySQL: lấy số dòng ước lượng từ information_schema (thống kê của bảng)
+    - Có bộ lọc: COUNT(*) một lần rồi lưu cache trong APPROXIMATE_COUNT_TIMEOUT giây
+    Truyền exact=True để luôn đếm chính xác.
+    """
+    # Bảng nhỏ hơn ngưỡng này thì đếm chính xác (TABLE_ROWS của InnoDB sai lệch nhiều với bảng nhỏ)
+    EXACT_COUNT_THRESHOLD = 10000
+    APPROXIMATE_COUNT_TIMEOUT = 300
+
+    def __init__(self, *args, exact=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.exact = exact
+        self.is_approximate = False
+
+    @cached_property
+    def count(self):
+        if self.exact or not isinstance(self.object_list, QuerySet):
+            return super().count
+
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self._table_estimate(queryset.model)
+            if estimate is not None and estimate >= self.EXACT_COUNT_THRESHOLD:
+                self.is_approximate = True
+                return estimate
+
+        sql, params = queryset.query.sql_with_params()
+        key = 'approx-count:%s:%s' % (
+            queryset.model._meta.label_lower,
+            hashlib.md5(('%s%r' % (sql, params)).encode('utf-8')).hexdigest()
+        )
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, self.APPROXIMATE_COUNT_TIMEOUT)
+        else:
+            self.is_approximate = True
+        return count
+
+    @staticmethod
+    def _table_estimate(model):
+        if connection.vendor != 'mysql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
@@ -1,13 +1,27 @@
 from django.contrib.auth.password_validation import validate_password
 from django.db.models import FloatField
 from rest_framework.fields import ChoiceField, FloatField, ImageField, BooleanField, SerializerMethodField, DateField, \
-    IntegerField, TimeField, ReadOnlyField, DecimalField
-from rest_framework.relations import StringRelatedField
-from rest_framework.serializers import ModelSerializer, CharField, ValidationError, Serializer
+    IntegerField, TimeField, ReadOnlyField, DecimalField, ListField
+from rest_framework.relations import StringRelatedField, PrimaryKeyRelatedField
+from rest_framework.serializers import ModelSerializer as BaseModelSerializer, CharField, ValidationError, Serializer
 from datetime import date, timedelta, datetime
 from gymhealth.models import User, HealthInfo, MemberProfile, TrainerProfile, Packages, PackageType, Benefit, \
     WorkoutSession, SubscriptionPackage, Promotion, Notification, TrainingProgress, TrainerRating, GymRating, Gym, \
-    FeedbackResponse
+    FeedbackResponse, WaitlistEntry, SessionEvent
+from gymhealth.sparse_fields import SparseFieldsMixin
+
+
+# Mọi serializer của API hỗ trợ ?fields=, ?omit= và ?compact=1 (xem gymhealth/sparse_fields.py)
+class ModelSerializer(SparseFieldsMixin, BaseModelSerializer):
+    pass
+
+
+# Tên ngắn của các field buổi tập khi ?compact=1 (dùng cho các màn hình lịch)
+SESSION_COMPACT_KEYS = {
+    'member_id': 'm', 'trainer_id': 'tr', 'member_name': 'mn', 'trainer_name': 'tn',
+    'session_date': 'd', 'start_time': 's', 'end_time': 'e', 'session_type': 't', 'status': 'st',
+    'notes': 'n', 'created_at': 'c', 'updated_at': 'u',
+}
 
 
 
@@ -164,8 +178,9 @@ class TrainerProfileSerializer(ModelSerializer):
     class Meta:
         model = TrainerProfile
         fields = ('id', 'username', 'email', 'bio', 'specialization',
-                  'certification', 'experience_years', 'hourly_rate')
-        read_only_fields = ['id', 'user']
+                  'certification', 'experience_years', 'hourly_rate',
+                  'rating_average', 'rating_count', 'completed_sessions', 'rank_score')
+        read_only_fields = ['id', 'user', 'rating_average', 'rating_count', 'completed_sessions', 'rank_score']
 
     def validate_hourly_rate(self, value):
         if value < 0:
@@ -357,6 +372,29 @@ class TrainerListSerializer(ModelSerializer):
 
 
 
+class UserSearchSerializer(ModelSerializer):
+    """Kết quả tìm kiếm người dùng (/search/users/)"""
+    full_name = SerializerMethodField()
+    avatar_url = SerializerMethodField()
+    specialization = SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'full_name', 'avatar_url', 'role', 'specialization']
+
+    def get_full_name(self, obj):
+        return obj.get_full_name() if obj.get_full_name() else obj.username
+
+    def get_avatar_url(self, obj):
+        if hasattr(obj, 'avatar') and obj.avatar:
+            return obj.avatar.url
+        return None
+
+    def get_specialization(self, obj):
+        profile = getattr(obj, 'trainer_profile', None) if obj.role == 'TRAINER' else None
+        return profile.specialization if profile else None
+
+
 class TrainerDetailSerializer(ModelSerializer):
     """Serializer cho thông tin chi tiết của một PT"""
     trainer_profile = TrainerProfileSerializer(read_only=True)
@@ -384,12 +422,21 @@ class TrainerDetailSerializer(ModelSerializer):
 class WorkoutSessionCreateSerializer(ModelSerializer):
     """Serializer để tạo buổi tập mới"""
 
+    # Lỗi trùng lịch theo lý do của BookingService.conflict; view kiểm tra sau khi khóa lịch của PT
+    CONFLICT_ERRORS = {
+        'trainer_conflict': {"trainer": "Huấn luyện viên đã có lịch tập vào thời gian này. "
+                                        "Bạn có thể đăng ký danh sách chờ (member/waitlist) để được "
+                                        "tự động xếp lịch khi khung giờ trống."},
+        'member_conflict': {"member": "Bạn đã có lịch tập vào thời gian này."},
+    }
+
     class Meta:
         model = WorkoutSession
-        fields = ['session_date', 'start_time', 'end_time', 'session_type', 'trainer', 'notes']
+        fields = ['session_date', 'start_time', 'end_time', 'session_type', 'trainer', 'notes', 'gym']
         extra_kwargs = {
             'trainer': {'required': False},
             'notes': {'required': False},
+            'gym': {'required': False},
         }
 
     def validate_session_date(self, value):
@@ -437,32 +484,8 @@ class WorkoutSessionCreateSerializer(ModelSerializer):
         if data['session_type'] == 'self_training' and data.get('trainer'):
             raise ValidationError({"trainer": "Không cần chọn huấn luyện viên cho buổi tự tập."})
 
-        # Kiểm tra xem PT đã có lịch vào thời gian này chưa
-        if data.get('trainer'):
-            conflicting_sessions = WorkoutSession.objects.filter(
-                trainer=data['trainer'],
-                session_date=data['session_date'],
-                status__in=['pending', 'confirmed'],
-                start_time__lt=data['end_time'],
-                end_time__gt=data['start_time']
-            )
-            if conflicting_sessions.exists():
-                raise ValidationError({"trainer": "Huấn luyện viên đã có lịch tập vào thời gian này."})
-
-        # Kiểm tra xem người dùng đã có lịch vào thời gian này chưa
-        request = self.context.get('request')
-        if request and hasattr(request, 'user'):
-            user = request.user
-            conflicting_sessions = WorkoutSession.objects.filter(
-                member=user,
-                session_date=data['session_date'],
-                status__in=['pending', 'confirmed'],
-                start_time__lt=data['end_time'],
-                end_time__gt=data['start_time']
-            )
-            if conflicting_sessions.exists():
-                raise ValidationError({"member": "Bạn đã có lịch tập vào thời gian này."})
-
+        # Trùng lịch với PT/hội viên được kiểm tra một lần trong view, sau khi khóa lịch của PT
+        # (kiểm tra ở đây thì hai request đồng thời vẫn có thể cùng qua)
         return data
 
     def validate_trainer(self, value):
@@ -505,12 +528,48 @@ class WorkoutSessionCreateSerializer(ModelSerializer):
         workout_session = WorkoutSession.objects.create(**validated_data)
         return workout_session
 
+class RecurringSessionSerializer(Serializer):
+    """Quy tắc đặt lịch lặp lại, vd: thứ 2/4/6 từ 18:00 đến 19:00 trong 8 tuần"""
+    weekdays = ListField(child=IntegerField(min_value=1, max_value=7), min_length=1, max_length=7,
+                         help_text="Các ngày trong tuần theo ISO: 1 = thứ 2, ..., 7 = chủ nhật")
+    start_time = TimeField()
+    end_time = TimeField()
+    start_date = DateField(required=False, help_text="Mặc định là hôm nay")
+    weeks = IntegerField(min_value=1)
+    session_type = ChoiceField(choices=WorkoutSession.SESSION_TYPE)
+    trainer = PrimaryKeyRelatedField(queryset=User.objects.filter(role='TRAINER'), required=False, allow_null=True)
+    gym = PrimaryKeyRelatedField(queryset=Gym.objects.all(), required=False, allow_null=True,
+                                 help_text="Phòng tập của buổi tự tập, mặc định là phòng tập đầu tiên")
+    notes = CharField(required=False, allow_blank=True)
+    # True: chỉ tạo khi tất cả các buổi hợp lệ; False: tạo các buổi hợp lệ và báo lỗi từng buổi còn lại
+    all_or_nothing = BooleanField(default=False)
+
+    def validate_weeks(self, value):
+        from gymhealth.utils.booking_service import booking_setting
+        max_weeks = booking_setting('MAX_WEEKS')
+        if value > max_weeks:
+            raise ValidationError(f"Chỉ có thể đặt lịch lặp lại tối đa {max_weeks} tuần.")
+        return value
+
+    def validate(self, data):
+        if data['end_time'] <= data['start_time']:
+            raise ValidationError({"end_time": "Thời gian kết thúc phải sau thời gian bắt đầu."})
+        if data['session_type'] == 'pt_session' and not data.get('trainer'):
+            raise ValidationError({"trainer": "Phải chọn huấn luyện viên cho buổi tập PT."})
+        if data['session_type'] == 'self_training' and data.get('trainer'):
+            raise ValidationError({"trainer": "Không cần chọn huấn luyện viên cho buổi tự tập."})
+        data['weekdays'] = sorted(set(data['weekdays']))
+        return data
+
+
 class WorkoutSessionListScheduleSerializer(ModelSerializer):
     member_name = SerializerMethodField()
     class Meta:
         model = WorkoutSession
         fields = ['id','member_id','trainer_id', 'member_name', 'session_date', 'start_time', 'end_time',
                   'session_type', 'status', 'notes', 'created_at']
+        field_relations = {'member_name': ['member']}
+        compact_keys = SESSION_COMPACT_KEYS
 
     def get_member_name(self, obj):
         return f"{obj.member.first_name} {obj.member.last_name}"
@@ -537,6 +596,18 @@ class TrainerAllSessionsSerializer(ModelSerializer):
             'time_until_session', 'subscription_info',
             'created_at', 'updated_at'
         ]
+        field_relations = {
+            'member_name': ['member'],
+            'member_username': ['member'],
+            'member_phone': ['member__member_profile'],
+            'subscription_info': ['subscription__package'],
+        }
+        display_fields = ['time_until_session']
+        compact_keys = {
+            **SESSION_COMPACT_KEYS,
+            'member_username': 'mu', 'member_phone': 'mp', 'session_duration': 'dur',
+            'trainer_notes': 'tnote', 'subscription_info': 'sub',
+        }
 
     def get_member_name(self, obj):
         return f"{obj.member.first_name} {obj.member.last_name}"
@@ -617,6 +688,8 @@ class CompactSessionSerializer(ModelSerializer):
             'id', 'member_name', 'session_date', 'start_time', 'end_time',
             'session_type', 'status', 'status_display'
         ]
+        field_relations = {'member_name': ['member']}
+        compact_keys = SESSION_COMPACT_KEYS
 
     def get_member_name(self, obj):
         return f"{obj.member.first_name} {obj.member.last_name}"
@@ -641,6 +714,80 @@ class WorkoutSessionUpdateSerializer(ModelSerializer):
         return value
 
 
+class BulkSessionStatusSerializer(Serializer):
+    """PT xác nhận / từ chối (hủy) / hoàn thành nhiều buổi tập cùng lúc"""
+    session_ids = ListField(child=IntegerField(min_value=1), min_length=1)
+    status = ChoiceField(choices=['confirmed', 'cancelled', 'completed'])
+    trainer_notes = CharField(required=False, allow_blank=True)
+
+    def validate_session_ids(self, value):
+        from gymhealth.utils.booking_service import MAX_BULK_SESSIONS
+        if len(set(value)) > MAX_BULK_SESSIONS:
+            raise ValidationError(f"Chỉ có thể cập nhật tối đa {MAX_BULK_SESSIONS} buổi tập mỗi lần.")
+        return value
+
+
+class WaitlistEntrySerializer(ModelSerializer):
+    """Đăng ký chờ một khung giờ đã kín lịch của PT"""
+    trainer = PrimaryKeyRelatedField(queryset=User.objects.filter(role='TRAINER', is_active=True))
+    trainer_name = SerializerMethodField()
+    position = SerializerMethodField()
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ['id', 'trainer', 'trainer_name', 'session_date', 'start_time', 'end_time', 'notes', 'status',
+                  'position', 'promoted_session', 'promoted_at', 'created_at']
+        read_only_fields = ['status', 'promoted_session', 'promoted_at', 'created_at']
+        field_relations = {'trainer_name': ['trainer']}
+
+    def get_trainer_name(self, obj):
+        return obj.trainer.get_full_name()
+
+    def get_position(self, obj):
+        # Danh sách entry: view tính sẵn vị trí (WaitlistService.positions) và truyền qua context
+        positions = self.context.get('waitlist_positions')
+        if positions is not None:
+            return positions.get(obj.pk)
+        from gymhealth.utils.waitlist_service import WaitlistService
+        return WaitlistService.position(obj)
+
+    def validate_session_date(self, value):
+        # Cùng giới hạn với đặt lịch từng buổi (member/register)
+        if value < date.today():
+            raise ValidationError("Ngày tập phải là ngày trong tương lai.")
+        if value > date.today() + timedelta(days=30):
+            raise ValidationError("Không thể đăng ký chờ lịch tập quá 30 ngày từ hiện tại.")
+        request = self.context.get('request')
+        member_profile = getattr(request.user, 'member_profile', None) if request else None
+        if member_profile and member_profile.membership_end_date and value > member_profile.membership_end_date:
+            raise ValidationError(
+                f"Không thể đăng ký chờ lịch tập sau ngày {member_profile.membership_end_date.strftime('%d/%m/%Y')}.")
+        return value
+
+    def validate(self, data):
+        if data['end_time'] <= data['start_time']:
+            raise ValidationError({"end_time": "Thời gian kết thúc phải sau thời gian bắt đầu."})
+        return data
+
+
+class SessionEventSerializer(ModelSerializer):
+    """Một dòng lịch sử buổi tập; event trả về tên sự kiện (created, confirmed, ...) thay cho mã số lưu trong DB"""
+    event = SerializerMethodField()
+    event_display = SerializerMethodField()
+
+    class Meta:
+        model = SessionEvent
+        fields = ['id', 'session', 'event', 'event_display', 'actor', 'member', 'trainer', 'session_date',
+                  'start_time', 'end_time', 'previous_date', 'previous_start_time', 'previous_end_time', 'note',
+                  'backfilled', 'created_at']
+
+    def get_event(self, obj):
+        return SessionEvent.EVENT_NAMES.get(obj.event)
+
+    def get_event_display(self, obj):
+        return obj.get_event_display()
+
+
 class RescheduleSessionSerializer(Serializer):
     # Bỏ session_id vì sẽ lấy từ URL
     new_date = DateField()
@@ -679,6 +826,8 @@ class WeeklyScheduleSerializer(ModelSerializer):
         model = WorkoutSession
         fields = ['id', 'session_date', 'start_time', 'end_time', 'session_type',
                   'status', 'notes', 'member_name', 'trainer_name']
+        field_relations = {'member_name': ['member'], 'trainer_name': ['trainer']}
+        compact_keys = SESSION_COMPACT_KEYS
 
     def get_member_name(self, obj):
         return f"{obj.member.first_name} {obj.member.last_name}" if obj.member else ""
@@ -704,6 +853,11 @@ class TrainingProgressSerializer(ModelSerializer):
             'member_username', 'trainer_username', 'workout_session'
         ]
         read_only_fields = ['id', 'created_by', 'created_at', 'updated_at', 'date']
+        field_relations = {
+            'member_username': ['health_info__user'],
+            'trainer_username': ['created_by'],
+            'date': ['workout_session'],
+        }
 
     def get_member_username(self, obj):
         return obj.health_info.user.username
@@ -787,6 +941,11 @@ class TrainingProgressListSerializer(ModelSerializer):
             'member_username', 'trainer_username', 'workout_session'
         ]
         read_only_fields = ['id', 'created_by', 'created_at', 'date']
+        field_relations = {
+            'member_username': ['health_info__user'],
+            'trainer_username': ['created_by'],
+            'date': ['workout_session'],
+        }
 
     def get_member_username(self, obj):
         return obj.health_info.user.username
@@ -1122,6 +1281,7 @@ class PaymentSerializer(ModelSerializer):
         read_only_fields = [
             'id', 'payment_date', 'confirmed_date', 'created_at', 'updated_at'
         ]
+        field_relations = {'subscription_info': ['subscription__member', 'subscription__package']}
 
     def get_subscription_info(self, obj):
         return {
@@ -1189,6 +1349,8 @@ class NotificationSerializer(ModelSerializer):
             'user_name', 'time_since'
         ]
         read_only_fields = ['created_at', 'sent', 'user']
+        field_relations = {'user_name': ['user']}
+        display_fields = ['time_since']
 
     def get_time_since(self, obj):
         from django.utils.timesince import timesince
@@ -1,11 +1,23 @@
 # signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
-from .models import Promotion, Notification, WorkoutSession
+from .models import Promotion, Notification, WorkoutSession, SubscriptionPackage, HealthInfo, TrainingProgress, \
+    TrainerProfile, TrainerRating
 from .utils.notification_service import NotificationService
+from .tasks import create_promotion_notifications
+from .utils.realtime import publish_notifications
+from .authentication import invalidate_tokens, invalidate_user_tokens
+from .utils.home_service import HomeService
+from .utils.sync_service import SyncService
+from .utils.calendar_service import CalendarService
+from .utils.search_service import SearchService
+from .utils.ranking_service import TrainerRankingService
+from .utils.occupancy_service import OccupancyService
+from oauth2_provider.models import AccessToken
 
 User = get_user_model()
 
@@ -15,37 +27,120 @@ def handle_promotion_save(sender, instance, created, **kwargs):
     Xử lý khi có promotion được tạo mới hoặc cập nhật
     """
     if created and instance.is_active:  # Chỉ khi tạo mới và promotion đang active
-        # Lấy tất cả user có role là MEMBER
-        members = User.objects.filter(role='MEMBER')
-
-        # Tạo thông báo cho từng hội viên
-        notifications = []
-        for member in members:
-            notification = Notification(
-                user=member,
-                title=f"Ưu đãi mới: {instance.title}",
-                message=f""" 
-                <h3>Chúng tôi có ưu đãi mới dành cho bạn!</h3> 
-                <p><strong>Tên ưu đãi:</strong> {instance.title}</p> 
-                <p><strong>Mô tả:</strong> {instance.description}</p> 
-                <p><strong>Mã giảm giá:</strong> <code>{instance.promo_code}</code></p> 
-                <p><strong>Hiệu lực từ:</strong> {instance.valid_from.strftime('%d/%m/%Y %H:%M')}</p> 
-                <p><strong>Hiệu lực đến:</strong> {instance.valid_to.strftime('%d/%m/%Y %H:%M')}</p> 
-                <p>Hãy sử dụng ngay để không bỏ lỡ cơ hội này!</p> 
-                """,
-                notification_type='new_promotion',
-                related_object_id=instance.id,
-                sent=True  # Đánh dấu là đã gửi
-            )
-            notifications.append(notification)
-
-            # Bulk create để tối ưu performance
-        Notification.objects.bulk_create(notifications)
-
-        print(f"Đã tạo {len(notifications)} thông báo cho promotion: {instance.title}")
+        # Tạo thông báo cho toàn bộ hội viên trong Celery worker sau khi promotion được commit
+        promotion_id = instance.id
+        transaction.on_commit(lambda: create_promotion_notifications.delay(promotion_id))
 
     elif not created:  # Khi cập nhật promotion
         # Có thể thêm logic xử lý cập nhật ở đây nếu cần
         print(f"Promotion đã được cập nhật: {instance.title}")
         pass
 
+
+@receiver(post_save, sender=Notification)
+def handle_notification_created(sender, instance, created, **kwargs):
+    """Đẩy thông báo mới tới các kết nối WebSocket/SSE của người nhận"""
+    if created:
+        publish_notifications([instance])
+
+
+@receiver(post_save, sender=AccessToken)
+@receiver(post_delete, sender=AccessToken)
+def handle_access_token_change(sender, instance, **kwargs):
+    """Token bị thu hồi (revoke/logout xóa AccessToken) hoặc thay đổi: xóa khỏi cache xác thực"""
+    invalidate_tokens([instance.token])
+
+
+@receiver(post_save, sender=User)
+def handle_user_auth_change(sender, instance, created, **kwargs):
+    """
+    Cache xác thực lưu cả dữ liệu của user (vai trò, tên, avatar...): mọi lần lưu user đều xóa cache token của user
+    """
+    if created:
+        return
+    # Xóa sau khi commit để request khác không cache lại dữ liệu cũ trước khi transaction kết thúc
+    transaction.on_commit(lambda: invalidate_user_tokens(instance.pk))
+
+
+# Điểm xếp hạng PT (TrainerProfile.rank_score) được tính lại khi có đánh giá hoặc buổi tập của PT thay đổi
+@receiver(post_save, sender=TrainerRating)
+@receiver(post_delete, sender=TrainerRating)
+def handle_trainer_rating_change(sender, instance, **kwargs):
+    TrainerRankingService.schedule_refresh(instance.trainer_id)
+
+
+@receiver(post_save, sender=WorkoutSession)
+@receiver(post_delete, sender=WorkoutSession)
+def handle_session_ranking_change(sender, instance, **kwargs):
+    TrainerRankingService.schedule_refresh(instance.trainer_id)
+
+
+# Buổi tự tập bị xóa trả lại chỗ trong phòng tập (sửa trạng thái trong trang quản trị được đối soát định kỳ)
+@receiver(post_delete, sender=WorkoutSession)
+def handle_session_occupancy_release(sender, instance, **kwargs):
+    OccupancyService.release(instance)
+
+
+# Các field của User được đánh chỉ mục tìm kiếm (SearchToken)
+SEARCH_USER_FIELDS = {'username', 'first_name', 'last_name', 'role', 'is_active'}
+
+
+@receiver(post_save, sender=User)
+def handle_user_search_index(sender, instance, created, update_fields=None, **kwargs):
+    if not created and update_fields is not None and not SEARCH_USER_FIELDS.intersection(update_fields):
+        return
+    transaction.on_commit(lambda: SearchService.index_user(instance.pk))
+
+
+@receiver(post_save, sender=TrainerProfile)
+def handle_trainer_profile_search_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: SearchService.index_user(instance.user_id))
+
+
+# Xóa cache màn hình chính (/home/) của những người dùng bị ảnh hưởng sau khi transaction commit
+@receiver(post_save, sender=SubscriptionPackage)
+@receiver(post_delete, sender=SubscriptionPackage)
+def handle_subscription_change(sender, instance, **kwargs):
+    transaction.on_commit(lambda: HomeService.invalidate(instance.member_id, 'subscription'))
+
+
+# Không dùng post_delete cho Notification: tín hiệu xóa khiến xóa hàng loạt (lưu trữ thông báo) phải nạp từng dòng;
+# nơi xóa thông báo (NotificationService.delete, lưu trữ) tự cập nhật cache và tombstone đồng bộ theo lô
+@receiver(post_save, sender=Notification)
+def handle_notification_change(sender, instance, **kwargs):
+    transaction.on_commit(lambda: HomeService.invalidate(instance.user_id, 'notifications'))
+
+
+@receiver(post_save, sender=WorkoutSession)
+@receiver(post_delete, sender=WorkoutSession)
+def handle_workout_session_change(sender, instance, **kwargs):
+    def invalidate():
+        HomeService.invalidate(instance.member_id, 'schedule')
+        if instance.trainer_id:
+            HomeService.invalidate(instance.trainer_id, 'schedule')
+        CalendarService.invalidate(instance.member_id, instance.trainer_id)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=HealthInfo)
+@receiver(post_delete, sender=HealthInfo)
+def handle_health_info_change(sender, instance, **kwargs):
+    transaction.on_commit(lambda: HomeService.invalidate(instance.user_id, 'health'))
+
+
+
+# Tombstone cho API đồng bộ (/sync/): app xóa bản sao cục bộ của bản ghi đã bị xóa.
+# Thông báo không dùng tín hiệu (xóa hàng loạt khi lưu trữ): NotificationService ghi tombstone theo lô
+SYNC_DELETE_TYPES = {
+    WorkoutSession: 'sessions',
+    SubscriptionPackage: 'subscriptions',
+    TrainingProgress: 'progress',
+}
+
+
+@receiver(post_delete, sender=WorkoutSession)
+@receiver(post_delete, sender=SubscriptionPackage)
+@receiver(post_delete, sender=TrainingProgress)
+def handle_sync_deletion(sender, instance, **kwargs):
+    SyncService.record_deletion(SYNC_DELETE_TYPES[sender], instance)
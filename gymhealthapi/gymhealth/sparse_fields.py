@@ -0,0 +1,97 @@
+"""
+Chọn field trả về qua query string cho mọi ModelSerializer của API (chỉ với request GET):
+
+    ?fields=id,session_date,start_time   chỉ trả về các field này
+    ?omit=notes,subscription_info        bỏ các field này
+    ?compact=1                           bỏ chuỗi hiển thị và dùng tên field ngắn
+
+Field không được yêu cầu bị loại khỏi serializer trước khi serialize, nên SerializerMethodField của nó
+không được tính. Dữ liệu liên quan cần nạp trước (select_related) khai báo trong Meta.field_relations để view
+chỉ join những bảng mà các field được trả về cần dùng:
+
+    class Meta:
+        field_relations = {'member_name': ['member'], 'subscription_info': ['subscription__package']}
+        display_fields = ['time_until_session']    # bỏ khi compact (cùng các field có đuôi _display)
+        compact_keys = {'session_date': 'd'}       # tên ngắn khi compact
+"""
+from rest_framework.serializers import ListSerializer
+
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+def _param_set(value):
+    return {name.strip() for name in value.split(',') if name.strip()} if value else set()
+
+
+class SparseFieldsMixin:
+
+    @classmethod
+    def _sparse_options(cls, request):
+        """(fields, omit, compact) từ query string, hoặc None khi không áp dụng cho request này"""
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None
+        params = request.query_params if hasattr(request, 'query_params') else request.GET
+        fields = _param_set(params.get('fields'))
+        omit = _param_set(params.get('omit'))
+        compact = params.get('compact', '').lower() in TRUE_VALUES
+        if not fields and not omit and not compact:
+            return None
+        return fields, omit, compact
+
+    @classmethod
+    def _keep(cls, name, options):
+        fields, omit, compact = options
+        if fields and name not in fields:
+            return False
+        if name in omit:
+            return False
+        if compact and (name.endswith('_display') or name in getattr(cls.Meta, 'display_fields', ())):
+            return False
+        return True
+
+    @classmethod
+    def related_for(cls, request, default=None):
+        """
+        Các quan hệ cần select_related cho những field sẽ được trả về.
+        default: danh sách dùng khi serializer không khai báo Meta.field_relations
+        """
+        relations = getattr(cls.Meta, 'field_relations', None)
+        if relations is None:
+            return list(default or [])
+        options = cls._sparse_options(request)
+        related = []
+        for name, paths in relations.items():
+            if options is None or cls._keep(name, options):
+                related.extend(path for path in paths if path not in related)
+        return related
+
+    def _is_root(self):
+        root = self.root
+        return root is self or (isinstance(root, ListSerializer) and root.child is self)
+
+    def _request_options(self):
+        # Chỉ áp dụng khi serialize dữ liệu trả về của serializer ngoài cùng (không áp dụng cho dữ liệu ghi)
+        if hasattr(self, 'initial_data') or not self._is_root():
+            return None
+        return self._sparse_options(self.context.get('request'))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        options = self._request_options()
+        self._compact_keys = None
+        if options is None:
+            return fields
+        if options[2]:
+            self._compact_keys = getattr(self.Meta, 'compact_keys', None)
+        for name in list(fields):
+            if not self._keep(name, options):
+                fields.pop(name)
+        return fields
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # self.fields được tạo (và _compact_keys được gán) trong lần serialize đầu tiên
+        compact_keys = getattr(self, '_compact_keys', None)
+        if compact_keys:
+            return {compact_keys.get(key, key): value for key, value in data.items()}
+        return data
@@ -13,4 +13,102 @@ def check_session_reminders():
 def check_expiry_reminders():
     """Task kiểm tra và tạo thông báo sắp hết hạn gói tập"""
     count = NotificationService.check_and_create_expiry_reminders()
-    return f"Created {count} expiry reminder notifications"
\ No newline at end of file
+    return f"Created {count} expiry reminder notifications"
+
+@shared_task
+def create_promotion_notifications(promotion_id):
+    """Task tạo và đẩy thông báo ưu đãi mới cho tất cả hội viên"""
+    from gymhealth.models import Promotion
+    promotion = Promotion.objects.filter(pk=promotion_id, is_active=True).first()
+    if promotion is None:
+        return f"Promotion {promotion_id} is not active"
+    count = NotificationService.create_promotion_notifications(promotion)
+    return f"Created {count} promotion notifications"
+
+
+@shared_task
+def refresh_daily_stats():
+    """Task cập nhật các bảng thống kê theo ngày cho trang thống kê admin"""
+    from gymhealth.utils.stats_service import StatsService
+    count = StatsService.refresh()
+    return f"Refreshed daily stats for {count} days"
+
+
+@shared_task
+def archive_notifications():
+    """Task lưu trữ thông báo quá thời hạn và bảo trì partition của bảng thông báo"""
+    from gymhealth.utils.retention_service import NotificationRetentionService
+    result = NotificationRetentionService.archive_expired()
+    NotificationRetentionService.maintain_partitions()
+    return f"Archived {sum(result.values())} notifications"
+
+
+@shared_task
+def purge_expired_tokens():
+    """Task xóa access token/refresh token/grant đã hết hạn của OAuth2"""
+    from oauth2_provider.models import clear_expired
+    clear_expired()
+    return "Purged expired OAuth2 tokens"
+
+
+@shared_task
+def prune_sync_log():
+    """Task xóa tombstone đồng bộ quá hạn và các dòng cấp phát phiên bản cũ"""
+    from gymhealth.utils.sync_service import SyncService
+    tombstones, versions = SyncService.prune()
+    return f"Pruned {tombstones} sync tombstones and {versions} sync versions"
+
+
+@shared_task
+def refresh_trainer_rankings(trainer_ids=None):
+    """
+    Task tính lại điểm xếp hạng của các PT trong trainer_ids (hẹn bởi TrainerRankingService.schedule_refresh),
+    hoặc của tất cả PT khi chạy định kỳ (mức độ trống lịch 7 ngày tới thay đổi theo ngày)
+    """
+    from gymhealth.utils.ranking_service import TrainerRankingService
+    if trainer_ids is not None:
+        # Bỏ đánh dấu trước khi tính: thay đổi xảy ra trong lúc tính sẽ hẹn một lần tính lại mới
+        TrainerRankingService.clear_pending(trainer_ids)
+    count = TrainerRankingService.refresh(trainer_ids)
+    return f"Refreshed ranking for {count} trainers"
+
+
+@shared_task
+def build_trainer_features():
+    """Task tính đặc trưng của tất cả PT cho gợi ý PT (chạy sau khi cập nhật điểm xếp hạng)"""
+    from gymhealth.utils.recommendation_service import RecommendationService
+    snapshot = RecommendationService.build_snapshot()
+    return f"Built feature snapshot for {snapshot.trainer_count} trainers"
+
+
+@shared_task
+def expire_waitlist_entries():
+    """Task đánh dấu hết hạn các đăng ký chờ của những ngày đã qua"""
+    from gymhealth.utils.waitlist_service import WaitlistService
+    count = WaitlistService.expire()
+    return f"Expired {count} waitlist entries"
+
+
+@shared_task
+def rebuild_gym_occupancy():
+    """Task đối soát bộ đếm số người tự tập theo khung giờ với bảng buổi tập"""
+    from gymhealth.utils.occupancy_service import OccupancyService
+    count = OccupancyService.rebuild()
+    return f"Corrected {count} gym occupancy counters"
+
+
+@shared_task(bind=True, max_retries=None, acks_late=True)
+def record_check_ins(self):
+    """
+    Task ghi các lượt check-in trong bộ đệm theo lô (hẹn bởi CheckInService.schedule_flush, chạy định kỳ mỗi phút);
+    DB lỗi thì thử lại sau (thời gian chờ tăng dần), các lượt chưa ghi vẫn nằm trong bộ đệm
+    """
+    from django.db import DatabaseError
+    from gymhealth.utils.checkin_service import CheckInService, checkin_setting
+    # Bỏ đánh dấu trước khi ghi: lượt quét trong lúc ghi sẽ hẹn một lần ghi mới
+    CheckInService.clear_flush_scheduled()
+    try:
+        count = CheckInService.flush()
+    except DatabaseError as exc:
+        raise self.retry(exc=exc, countdown=min(2 ** self.request.retries, checkin_setting('MAX_RETRY_DELAY')))
+    return f"Recorded {count} check-ins"
@@ -0,0 +1,38 @@
+import hashlib
+
+from django import template
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.core.cache import cache
+
+register = template.Library()
+
+# Thời gian lưu cache (giây) danh sách năm/tháng/ngày của date_hierarchy
+DATE_HIERARCHY_TIMEOUT = 600
+
+
+@register.inclusion_tag('admin/date_hierarchy.html', takes_context=True)
+def cached_date_hierarchy(context, cl):
+    """
+    Giống thẻ date_hierarchy của Django admin nhưng lưu cache kết quả (MIN/MAX và các ngày distinct)
+    theo model, người dùng và tham số lọc, tránh quét lại bảng lớn mỗi lần tải trang.
+    """
+    if not cl.date_hierarchy:
+        return {}
+
+    raw_key = '%s:%s:%s' % (cl.model._meta.label_lower, cl.model_admin.admin_site.name,
+                            cl.get_query_string())
+    # Queryset có thể khác nhau theo người dùng (vd: huấn luyện viên chỉ thấy buổi tập của mình)
+    user_id = context['request'].user.pk
+    key = 'admin-date-hierarchy:%s:%s' % (user_id, hashlib.md5(raw_key.encode('utf-8')).hexdigest())
+
+    result = cache.get(key)
+    if result is None:
+        result = date_hierarchy(cl) or {}
+        # Chuyển chuỗi lazy (gettext_lazy) thành str để lưu được vào cache
+        result = {
+            'show': result.get('show', False),
+            'back': {k: str(v) for k, v in result['back'].items()} if result.get('back') else None,
+            'choices': [{k: str(v) for k, v in choice.items()} for choice in result.get('choices', [])],
+        }
+        cache.set(key, result, DATE_HIERARCHY_TIMEOUT)
+    return result
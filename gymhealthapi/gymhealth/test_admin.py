@@ -0,0 +1,60 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from gymhealth.admin import admin_site
+from gymhealth.models import User
+from gymhealth.utils.synthetic_data import SyntheticDataGenerator
+
+PER_PAGE = 100
+
+
+class AdminChangelistQueryTests(TestCase):
+    """
+    Số truy vấn của trang danh sách trong admin không được tăng theo số dòng (truy vấn N+1 theo từng dòng):
+    mở mỗi trang danh sách, sinh thêm dữ liệu rồi mở lại, số truy vấn phải giữ nguyên.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('admin_queries', 'admin@example.com', 'admin')
+        SyntheticDataGenerator(seed=1, prefix='admin_a_').run(
+            members=5, trainers=2, sessions=20, notifications_per_member=2)
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def render_changelist(self, model, model_admin):
+        opts = model._meta
+        request = self.factory.get(f"/admin/{opts.app_label}/{opts.model_name}/")
+        request.user = self.superuser
+        original_per_page = model_admin.list_per_page
+        model_admin.list_per_page = PER_PAGE
+        try:
+            response = model_admin.changelist_view(request)
+            if hasattr(response, 'render'):
+                response.render()
+        finally:
+            model_admin.list_per_page = original_per_page
+        self.assertEqual(response.status_code, 200, opts.label)
+
+    def count_queries(self, model, model_admin):
+        # Lần mở đầu nạp cache (date_hierarchy, ContentType...), chỉ đếm truy vấn của lần mở thứ hai
+        self.render_changelist(model, model_admin)
+        with CaptureQueriesContext(connection) as context:
+            self.render_changelist(model, model_admin)
+        return len(context.captured_queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        baseline = {model: self.count_queries(model, model_admin)
+                    for model, model_admin in admin_site._registry.items()}
+
+        SyntheticDataGenerator(seed=2, prefix='admin_b_').run(
+            members=15, trainers=4, sessions=80, notifications_per_member=3)
+
+        for model, model_admin in admin_site._registry.items():
+            self.render_changelist(model, model_admin)
+            with self.subTest(model=model._meta.label), self.assertNumQueries(baseline[model]):
+                self.render_changelist(model, model_admin)
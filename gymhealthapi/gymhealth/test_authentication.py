@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from oauth2_provider.models import AccessToken, Application
+from rest_framework.test import APIClient
+
+from gymhealth import authentication
+from gymhealth.models import User
+
+
+class CachedOAuth2AuthenticationTests(TestCase):
+    """
+    Kết quả xác thực token được cache (LRU trong tiến trình + cache dùng chung): token bị thu hồi
+    phải bị từ chối ngay ở request kế tiếp, không được tiếp tục xác thực từ cache.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('auth_member', 'auth_member@example.com', 'secret', role='MEMBER')
+        cls.application = Application.objects.create(
+            name='test', user=cls.user, client_type=Application.CLIENT_CONFIDENTIAL,
+            authorization_grant_type=Application.GRANT_PASSWORD)
+
+    def setUp(self):
+        authentication._local_cache.clear()
+        authentication._shared_cache().clear()
+        self.access_token = AccessToken.objects.create(
+            user=self.user, application=self.application, token='auth-test-token', scope='read write',
+            expires=timezone.now() + timedelta(hours=1))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token.token}')
+
+    def test_cached_token_authenticates_without_query(self):
+        self.assertEqual(self.client.get('/notifications/unread/').status_code, 200)
+        # Lần thứ hai lấy user/token từ cache: chỉ còn truy vấn của view (COUNT + danh sách thông báo)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get('/notifications/unread/').status_code, 200)
+
+    def test_revoked_token_is_rejected(self):
+        self.assertEqual(self.client.get('/notifications/unread/').status_code, 200)
+        self.access_token.revoke()
+        self.assertEqual(self.client.get('/notifications/unread/').status_code, 401)
@@ -0,0 +1,193 @@
+from datetime import date, time, timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from gymhealth.models import Gym, MemberProfile, SlotOccupancy, SubscriptionPackage, User, WorkoutSession
+from gymhealth.testing import create_member, create_trainer
+from gymhealth.utils.booking_service import REJECTION_MESSAGES, BookingService
+from gymhealth.utils.occupancy_service import OccupancyService
+
+ALL_WEEKDAYS = [1, 2, 3, 4, 5, 6, 7]
+
+
+class RecurringBookingTests(TestCase):
+    """Đặt lịch định kỳ (register-recurring): số buổi PT tính cho cả đợt, lý do từ chối từng buổi, all_or_nothing"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = date.today()
+        cls.trainer = create_trainer('recurring_trainer')
+        cls.member, cls.subscription = create_member('recurring_member', pt_sessions=3)
+        cls.other, cls.other_subscription = create_member('recurring_other')
+        cls.gym = Gym.objects.create(name='Cơ sở 1', address='1 Nguyễn Huệ', phone='0280000000', floor_capacity=1)
+
+    def rule(self, **overrides):
+        rule = {
+            'weekdays': ALL_WEEKDAYS, 'start_date': self.today + timedelta(days=1), 'weeks': 1,
+            'trainer': self.trainer, 'session_type': 'pt_session', 'start_time': time(18, 0),
+            'end_time': time(19, 0), 'all_or_nothing': False,
+        }
+        rule.update(overrides)
+        return rule
+
+    def book(self, **overrides):
+        # Đọc lại hồ sơ hội viên: một số test đổi hạn hội viên
+        member = User.objects.select_related('member_profile').get(pk=self.member.pk)
+        return BookingService.book_recurring(member, self.subscription, self.rule(**overrides))
+
+    def test_pt_credits_are_counted_across_the_batch(self):
+        # 3 buổi trong gói, một buổi đã đặt (chưa hoàn thành): chỉ còn đặt được 2 buổi trong cả đợt
+        WorkoutSession.objects.create(
+            member=self.member, trainer=self.trainer, subscription=self.subscription, session_type='pt_session',
+            session_date=self.today + timedelta(days=10), start_time=time(8, 0), end_time=time(9, 0),
+            status='confirmed')
+
+        results, created = self.book()
+
+        self.assertEqual(created, 2)
+        self.assertEqual([result['status'] for result in results], ['created'] * 2 + ['rejected'] * 5)
+        self.assertEqual({result['reason'] for result in results[2:]}, {'insufficient_pt_credits'})
+        sessions = WorkoutSession.objects.filter(member=self.member, start_time=time(18, 0))
+        self.assertEqual(sorted(sessions.values_list('id', flat=True)), sorted(result['id'] for result in results[:2]))
+        self.assertEqual(len(set(sessions.values_list('sync_version', flat=True))), 1)
+        self.assertEqual(BookingService.available_pt_credits(self.subscription), 0)
+
+    @override_settings(RECURRING_BOOKING={'MAX_WEEKS': 12, 'MAX_DAYS_AHEAD': 5})
+    def test_each_rejected_occurrence_has_its_reason(self):
+        MemberProfile.objects.filter(user=self.member).update(membership_end_date=self.today + timedelta(days=4))
+        SubscriptionPackage.objects.filter(pk=self.subscription.pk).update(
+            end_date=self.today + timedelta(days=3), remaining_pt_sessions=10)
+        self.subscription.refresh_from_db()
+        # PT bận ở ngày +1 (buổi với hội viên khác), hội viên bận ở ngày +2 (buổi tự tập)
+        WorkoutSession.objects.create(
+            member=self.other, trainer=self.trainer, subscription=self.other_subscription, session_type='pt_session',
+            session_date=self.today + timedelta(days=1), start_time=time(18, 30), end_time=time(19, 30),
+            status='confirmed')
+        WorkoutSession.objects.create(
+            member=self.member, session_type='self_training', session_date=self.today + timedelta(days=2),
+            start_time=time(17, 30), end_time=time(18, 30), status='confirmed')
+
+        results, created = self.book(start_date=self.today - timedelta(days=1), weeks=2)
+
+        expected = {-1: 'past_date', 0: None, 1: 'trainer_conflict', 2: 'member_conflict', 3: None,
+                    4: 'subscription_expired', 5: 'membership_expired'}
+        expected.update({offset: 'beyond_booking_window' for offset in range(6, 13)})
+        self.assertEqual(created, 2)
+        self.assertEqual({(result['session_date'] - self.today).days: result['reason'] for result in results},
+                         expected)
+        for result in results:
+            self.assertEqual(result['status'], 'created' if result['reason'] is None else 'rejected')
+            self.assertEqual(result['message'], REJECTION_MESSAGES.get(result['reason']))
+
+    def test_all_or_nothing_rolls_back_sessions_and_gym_reservations(self):
+        full_day = self.today + timedelta(days=3)
+        # Phòng tập chỉ có một chỗ và chỗ ở ngày +3 đã được giữ cho hội viên khác
+        self.assertTrue(OccupancyService.reserve(self.gym, full_day, time(18, 0), time(19, 0)))
+
+        results, created = self.book(session_type='self_training', trainer=None, gym=self.gym, all_or_nothing=True)
+
+        self.assertEqual(created, 0)
+        statuses = {result['session_date']: (result['status'], result['reason']) for result in results}
+        self.assertEqual(statuses.pop(full_day), ('rejected', 'gym_full'))
+        self.assertEqual(set(statuses.values()), {('not_created', None)})
+        self.assertFalse(WorkoutSession.objects.filter(member=self.member).exists())
+        # Chỗ đã giữ cho các ngày còn lại được trả lại cùng transaction
+        self.assertEqual(dict(SlotOccupancy.objects.filter(gym=self.gym, count__gt=0).values_list('date', 'count')),
+                         {full_day: 1})
+
+    def test_partial_booking_keeps_gym_reservations_of_created_sessions(self):
+        full_day = self.today + timedelta(days=3)
+        self.assertTrue(OccupancyService.reserve(self.gym, full_day, time(18, 0), time(19, 0)))
+
+        results, created = self.book(session_type='self_training', trainer=None, gym=self.gym)
+
+        self.assertEqual(created, 6)
+        self.assertEqual([result['session_date'] for result in results if result['status'] == 'rejected'],
+                         [full_day])
+        self.assertEqual(WorkoutSession.objects.filter(member=self.member, gym=self.gym, status='confirmed').count(), 6)
+        self.assertEqual(set(SlotOccupancy.objects.filter(gym=self.gym, hour=18).values_list('count', flat=True)), {1})
+
+
+class BulkStatusUpdateTests(TestCase):
+    """PT cập nhật trạng thái nhiều buổi (trainer/bulk-status): lý do của từng buổi bị từ chối, trừ buổi PT theo lô"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.day = date.today() + timedelta(days=2)
+        cls.trainer = create_trainer('bulk_trainer')
+        cls.other_trainer = create_trainer('bulk_other_trainer')
+        cls.member, cls.subscription = create_member('bulk_member', pt_sessions=5)
+        cls.second, cls.second_subscription = create_member('bulk_second', pt_sessions=1)
+
+    def session(self, hour, status='pending', trainer=None, member=None, subscription=None,
+                session_type='pt_session'):
+        return WorkoutSession.objects.create(
+            member=member or self.member, trainer=trainer or self.trainer,
+            subscription=subscription or self.subscription, session_type=session_type, session_date=self.day,
+            start_time=time(hour, 0), end_time=time(hour + 1, 0), status=status)
+
+    def reasons(self, results):
+        return {result['id']: result['reason'] for result in results}
+
+    def test_each_failed_session_has_its_reason(self):
+        pending = self.session(6)
+        other_trainer = self.session(7, trainer=self.other_trainer)
+        self_training = self.session(8, session_type='self_training')
+        cancelled = self.session(9, status='cancelled')
+        missing = max(pending.pk, other_trainer.pk, self_training.pk, cancelled.pk) + 100
+
+        ids = [pending.pk, other_trainer.pk, self_training.pk, cancelled.pk, missing]
+        results, updated = BookingService.bulk_update_status(self.trainer, ids, 'confirmed')
+
+        self.assertEqual(updated, 1)
+        self.assertEqual([result['id'] for result in results], ids)
+        self.assertEqual(self.reasons(results), {
+            pending.pk: None, other_trainer.pk: 'forbidden', self_training.pk: 'not_pt_session',
+            cancelled.pk: 'invalid_transition', missing: 'not_found',
+        })
+        for result in results:
+            self.assertEqual(result['status'], 'updated' if result['reason'] is None else 'failed')
+            self.assertEqual(result['message'], REJECTION_MESSAGES.get(result['reason']))
+        self.assertEqual(dict(WorkoutSession.objects.filter(pk__in=ids).values_list('id', 'status')), {
+            pending.pk: 'confirmed', other_trainer.pk: 'pending', self_training.pk: 'pending',
+            cancelled.pk: 'cancelled',
+        })
+
+    def test_confirming_beyond_remaining_pt_sessions_is_refused(self):
+        # Gói còn 2 buổi và một buổi với PT khác đã được xác nhận: chỉ xác nhận thêm được một buổi
+        self.session(6, status='confirmed', trainer=self.other_trainer, member=self.second,
+                     subscription=self.second_subscription)
+        SubscriptionPackage.objects.filter(pk=self.second_subscription.pk).update(remaining_pt_sessions=2)
+        first = self.session(8, member=self.second, subscription=self.second_subscription)
+        later = self.session(10, member=self.second, subscription=self.second_subscription)
+
+        # Các buổi được xét theo thứ tự thời gian, không theo thứ tự id gửi lên
+        results, updated = BookingService.bulk_update_status(self.trainer, [later.pk, first.pk], 'confirmed')
+
+        self.assertEqual(updated, 1)
+        self.assertEqual(self.reasons(results), {first.pk: None, later.pk: 'insufficient_pt_credits'})
+
+    def test_completing_sessions_deducts_pt_sessions_per_subscription(self):
+        sessions = [self.session(hour, status='confirmed') for hour in (6, 8, 10)]
+        second = [self.session(hour, status='confirmed', member=self.second, subscription=self.second_subscription)
+                  for hour in (12, 14)]
+        untouched, untouched_subscription = create_member('bulk_untouched', pt_sessions=4)
+
+        with CaptureQueriesContext(connection) as context:
+            results, updated = BookingService.bulk_update_status(
+                self.trainer, [session.pk for session in sessions + second], 'completed')
+
+        self.assertEqual(updated, 5)
+        # Một lệnh UPDATE (CASE WHEN) cho mọi gói tập
+        table = SubscriptionPackage._meta.db_table
+        self.assertEqual(len([query for query in context.captured_queries
+                              if query['sql'].startswith('UPDATE') and table in query['sql']]), 1)
+        remaining = dict(SubscriptionPackage.objects.values_list('id', 'remaining_pt_sessions'))
+        # 5 - 3 buổi; gói chỉ còn 1 buổi mà hoàn thành 2 buổi thì dừng ở 0; gói không liên quan giữ nguyên
+        self.assertEqual(remaining[self.subscription.pk], 2)
+        self.assertEqual(remaining[self.second_subscription.pk], 0)
+        self.assertEqual(remaining[untouched_subscription.pk], 4)
+        self.assertEqual(set(WorkoutSession.objects.filter(
+            pk__in=[session.pk for session in sessions + second]).values_list('status', flat=True)), {'completed'})
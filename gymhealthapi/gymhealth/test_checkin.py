@@ -0,0 +1,133 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from gymhealth.models import CheckIn, MemberProfile, User
+from gymhealth.tasks import record_check_ins
+from gymhealth.utils import checkin_service
+from gymhealth.utils.checkin_service import CheckInService, InMemoryCheckInBuffer, checkin_setting
+
+
+class SharedTestBuffer(InMemoryCheckInBuffer):
+    """Bộ đệm được xem như dùng chung (như Redis): lượt check-in chờ task ghi theo lô"""
+    shared = True
+
+
+def checkin_settings(**overrides):
+    return override_settings(CHECKIN={**getattr(settings, 'CHECKIN', {}), **overrides})
+
+
+class CheckInTests(TestCase):
+    """Quét mã QR check-in: mã sai chữ ký, hết hạn, hội viên hết hạn, quét lại; ghi lượt check-in theo lô"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('checkin_manager', 'manager@example.com', 'secret', role='MANAGER')
+        cls.member = User.objects.create_user('checkin_member', 'member@example.com', 'secret', role='MEMBER')
+        cls.profile = MemberProfile.objects.create(
+            user=cls.member, membership_end_date=date.today() + timedelta(days=30))
+
+    def setUp(self):
+        caches[checkin_setting('ALIAS')].clear()
+        checkin_service.set_buffer(InMemoryCheckInBuffer())
+        self.addCleanup(checkin_service.set_buffer, None)
+        self.scanner = APIClient()
+        self.scanner.force_authenticate(self.manager)
+
+    def issue_pass(self):
+        client = APIClient()
+        client.force_authenticate(self.member)
+        response = client.get('/checkin/pass/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['pass']
+
+    def scan(self, token):
+        return self.scanner.post('/checkin/', {'pass': token}, format='json')
+
+    def test_valid_pass_is_recorded(self):
+        response = self.scan(self.issue_pass())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['allowed'])
+        self.assertEqual(response.data['member_id'], self.member.pk)
+        self.assertEqual(list(CheckIn.objects.values_list('member_id', 'scanned_by_id')),
+                         [(self.member.pk, self.manager.pk)])
+
+    def test_bad_signature_is_rejected(self):
+        token = self.issue_pass()
+        payload, signature = token.rsplit('.', 1)
+        forged = payload.replace(f'.{self.member.pk}.', f'.{self.manager.pk}.', 1)
+        for bad in (f'{forged}.{signature}', f"{payload}.{'A' * len(signature)}", 'not-a-pass'):
+            with self.subTest(token=bad):
+                response = self.scan(bad)
+                self.assertEqual(response.status_code, 403)
+                self.assertFalse(response.data['allowed'])
+        self.assertFalse(CheckIn.objects.exists())
+
+    def test_expired_pass_is_rejected(self):
+        with checkin_settings(PASS_TTL=-5):
+            token = self.issue_pass()
+        response = self.scan(token)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(CheckIn.objects.exists())
+
+    def test_expired_membership_is_rejected(self):
+        token = self.issue_pass()
+
+        class AfterMembershipEnd(date):
+            @classmethod
+            def today(cls):
+                return date.today() + timedelta(days=31)
+
+        # Mã mang hạn hội viên tại thời điểm cấp: máy quét từ chối khi hạn đó đã qua mà không cần đọc DB
+        with mock.patch.object(checkin_service, 'date', AfterMembershipEnd), self.assertNumQueries(0):
+            response = self.scan(token)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(CheckIn.objects.exists())
+
+        self.profile.membership_end_date = date.today() - timedelta(days=1)
+        self.profile.save()
+        client = APIClient()
+        client.force_authenticate(self.member)
+        self.assertEqual(client.get('/checkin/pass/').status_code, 403)
+
+    def test_second_scan_is_rejected(self):
+        token = self.issue_pass()
+        self.assertEqual(self.scan(token).status_code, 200)
+        response = self.scan(token)
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.data['allowed'])
+        self.assertEqual(CheckIn.objects.count(), 1)
+
+    def test_buffered_check_ins_are_inserted_in_batches(self):
+        checkin_service.set_buffer(SharedTestBuffer())
+        tokens = [self.issue_pass() for _ in range(5)]
+        with mock.patch.object(record_check_ins, 'apply_async') as apply_async:
+            for token in tokens:
+                self.assertEqual(self.scan(token).status_code, 200)
+        # Chưa ghi DB trong request; chỉ một task ghi được hẹn cho cả đợt quét
+        self.assertFalse(CheckIn.objects.exists())
+        apply_async.assert_called_once_with(countdown=checkin_setting('FLUSH_DELAY'))
+
+        with checkin_settings(BATCH_SIZE=2), self.assertNumQueries(3):
+            record_check_ins.apply()
+        self.assertEqual(CheckIn.objects.filter(member=self.member).count(), 5)
+
+    def test_database_error_keeps_check_ins_buffered(self):
+        buffer = SharedTestBuffer()
+        checkin_service.set_buffer(buffer)
+        with mock.patch.object(record_check_ins, 'apply_async'):
+            self.assertEqual(self.scan(self.issue_pass()).status_code, 200)
+
+        with mock.patch.object(CheckInService, 'record', side_effect=OperationalError('database is down')):
+            with self.assertRaises(OperationalError):
+                CheckInService.flush()
+        self.assertEqual(len(buffer), 1)
+
+        self.assertEqual(CheckInService.flush(), 1)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(CheckIn.objects.count(), 1)
@@ -0,0 +1,71 @@
+from datetime import date, time, timedelta
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from gymhealth.models import Gym, SlotOccupancy, WorkoutSession
+from gymhealth.testing import create_member
+from gymhealth.utils.occupancy_service import OccupancyService
+
+
+class GymOccupancyTests(TestCase):
+    """Giới hạn số hội viên tự tập theo khung giờ: chỗ cuối cùng, trả chỗ khi xóa buổi tập, đối soát bộ đếm"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.day = date.today() + timedelta(days=2)
+        cls.gym = Gym.objects.create(name='Cơ sở 1', address='1 Nguyễn Huệ', phone='0280000000', floor_capacity=2)
+        cls.members = [create_member(f'occupancy_member{index}')[0] for index in range(3)]
+
+    def register(self, member, start_time='18:00', end_time='19:00'):
+        client = APIClient()
+        client.force_authenticate(member)
+        return client.post('/workout-sessions/member/register/', {
+            'session_type': 'self_training', 'session_date': self.day.isoformat(), 'start_time': start_time,
+            'end_time': end_time, 'gym': self.gym.pk,
+        }, format='json')
+
+    def counts(self):
+        return dict(SlotOccupancy.objects.filter(gym=self.gym, date=self.day).values_list('hour', 'count'))
+
+    def test_last_seat_is_refused_at_capacity(self):
+        self.assertEqual(self.register(self.members[0]).status_code, 201)
+        self.assertEqual(self.register(self.members[1], '18:30', '19:30').status_code, 201)
+        self.assertEqual(self.counts(), {18: 2, 19: 1})
+
+        # Khung 18h đã đủ 2 người: buổi 18:30-19:30 bị từ chối dù khung 19h còn chỗ, và không giữ chỗ khung 19h
+        response = self.register(self.members[2], '18:30', '19:30')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.counts(), {18: 2, 19: 1})
+        self.assertFalse(WorkoutSession.objects.filter(member=self.members[2]).exists())
+        self.assertEqual(self.register(self.members[2], '19:00', '20:00').status_code, 201)
+
+        slots = {slot['hour']: slot for slot in OccupancyService.occupancy(self.gym, self.day)}
+        self.assertTrue(slots[18]['is_full'])
+        self.assertEqual((slots[19]['booked'], slots[19]['available']), (2, 0))
+
+    def test_release_frees_the_seat(self):
+        self.assertEqual(self.register(self.members[0]).status_code, 201)
+        self.assertEqual(self.register(self.members[1]).status_code, 201)
+        self.assertEqual(self.register(self.members[2]).status_code, 409)
+
+        WorkoutSession.objects.get(member=self.members[0]).delete()
+        self.assertEqual(self.counts(), {18: 1})
+        self.assertEqual(self.register(self.members[2]).status_code, 201)
+        self.assertEqual(self.counts(), {18: 2})
+
+    def test_rebuild_corrects_drift(self):
+        self.assertEqual(self.register(self.members[0]).status_code, 201)
+        self.assertEqual(self.register(self.members[1], '19:00', '20:00').status_code, 201)
+        # Bộ đếm lệch khỏi bảng buổi tập (buổi tập bị hủy/sửa trong trang quản trị, dữ liệu nhập ngoài API)
+        WorkoutSession.objects.filter(member=self.members[1]).update(status='cancelled')
+        SlotOccupancy.objects.filter(gym=self.gym, date=self.day, hour=18).update(count=2)
+        WorkoutSession.objects.create(
+            member=self.members[2], session_type='self_training', gym=self.gym, session_date=self.day,
+            start_time=time(20, 0), end_time=time(21, 0), status='confirmed')
+
+        self.assertEqual(OccupancyService.rebuild(self.day, self.day), 3)
+        self.assertEqual(self.counts(), {18: 1, 19: 0, 20: 1})
+        # Đã khớp: chạy lại không thay đổi gì
+        self.assertEqual(OccupancyService.rebuild(self.day, self.day), 0)
+        self.assertEqual(self.register(self.members[1], '18:00', '19:00').status_code, 201)
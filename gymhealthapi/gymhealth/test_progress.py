@@ -0,0 +1,51 @@
+from datetime import date, time, timedelta
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from gymhealth.models import HealthInfo, TrainingProgress, WorkoutSession
+from gymhealth.testing import create_member, create_trainer
+
+
+class ProgressChartTests(TestCase):
+    """Biểu đồ tiến độ (training-progress/chart/<id>/): chỉ PT hoặc chính hội viên đó xem được"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trainer = create_trainer('chart_trainer')
+        cls.member, subscription = create_member('chart_member')
+        cls.other, _ = create_member('chart_other')
+        cls.member.gender = 'Nam'
+        cls.member.date_of_birth = date(date.today().year - 31, 1, 1)
+        cls.member.save(update_fields=['gender', 'date_of_birth'])
+        health_info = HealthInfo.objects.create(user=cls.member, height=175, weight=80, training_goal='weight_loss')
+        for offset, weight in ((-14, 80), (-7, 78.5)):
+            session = WorkoutSession.objects.create(
+                member=cls.member, trainer=cls.trainer, subscription=subscription, session_type='pt_session',
+                session_date=date.today() + timedelta(days=offset), start_time=time(18, 0), end_time=time(19, 0),
+                status='confirmed')
+            TrainingProgress.objects.create(workout_session=session, health_info=health_info, weight=weight,
+                                            created_by=cls.trainer)
+
+    def chart(self, user, member_id):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(f'/training-progress/chart/{member_id}/')
+
+    def test_member_sees_own_chart(self):
+        response = self.chart(self.member, self.member.pk)
+        self.assertEqual(response.status_code, 200)
+        basic_info = response.data['basic_info']
+        self.assertEqual((basic_info['member_id'], basic_info['age']), (self.member.pk, 31))
+        # Mifflin-St Jeor, nam: 10 * 80 + 6.25 * 175 - 5 * 31 + 5
+        self.assertEqual(basic_info['bmr'], 1744)
+        self.assertEqual(len(response.data['chart_data']), 2)
+        self.assertEqual(response.data['stats']['progress']['weight_change'], -1.5)
+
+    def test_member_cannot_see_another_members_chart(self):
+        response = self.chart(self.other, self.member.pk)
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('basic_info', response.data)
+
+    def test_trainer_sees_member_chart(self):
+        self.assertEqual(self.chart(self.trainer, self.member.pk).status_code, 200)
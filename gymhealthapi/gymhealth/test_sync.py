@@ -0,0 +1,101 @@
+import base64
+import time
+from datetime import date, time as clock, timedelta
+
+from django.test import TestCase, override_settings
+
+from gymhealth.models import WorkoutSession
+from gymhealth.testing import create_member, create_trainer
+from gymhealth.utils.sync_service import SyncService, decode_token
+
+
+def token_issued_at(token, issued_at):
+    """Token có cùng con trỏ với token nhưng được cấp vào thời điểm issued_at"""
+    version, rank, object_id = decode_token(token)[0]
+    raw = f"{version}.{rank}.{object_id}.{int(issued_at)}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def synced_ids(result, sync_type):
+    return [item['id'] for item in result['changes'][sync_type]]
+
+
+# Phiên bản vừa cấp được xem là đã ổn định ngay (không chờ transaction khác)
+@override_settings(SYNC_API={'SETTLE_SECONDS': 0})
+class SyncChangesTests(TestCase):
+    """Đồng bộ tăng dần (/sync/): token next, tombstone của bản ghi đã xóa, token quá hạn, phân trang"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trainer = create_trainer('sync_trainer')
+        cls.member, cls.subscription = create_member('sync_member')
+        day = date.today() + timedelta(days=1)
+        cls.sessions = [WorkoutSession.objects.create(
+            member=cls.member, trainer=cls.trainer, subscription=cls.subscription, session_type='pt_session',
+            session_date=day, start_time=clock(hour, 0), end_time=clock(hour + 1, 0), status='pending',
+        ) for hour in (6, 8, 10)]
+
+    def test_full_sync_then_empty_follow_up(self):
+        first = SyncService.changes(self.member)
+        self.assertTrue(first['reset'])
+        self.assertFalse(first['has_more'])
+        self.assertEqual(sorted(synced_ids(first, 'sessions')), [session.pk for session in self.sessions])
+        self.assertEqual(synced_ids(first, 'subscriptions'), [self.subscription.pk])
+
+        follow_up = SyncService.changes(self.member, since=first['next'])
+        self.assertFalse(follow_up['reset'])
+        self.assertFalse(follow_up['has_more'])
+        self.assertEqual({sync_type: items for sync_type, items in follow_up['changes'].items() if items}, {})
+        self.assertEqual({sync_type: ids for sync_type, ids in follow_up['deleted'].items() if ids}, {})
+
+        # Không có thay đổi: next giữ nguyên con trỏ
+        self.assertEqual(decode_token(SyncService.changes(self.member, since=follow_up['next'])['next'])[0],
+                         decode_token(follow_up['next'])[0])
+
+    def test_changed_and_deleted_records_after_next(self):
+        since = SyncService.changes(self.member)['next']
+        changed, deleted_id = self.sessions[0], self.sessions[1].pk
+        changed.status = 'confirmed'
+        changed.save(update_fields=['status'])
+        self.sessions[1].delete()
+
+        result = SyncService.changes(self.member, since=since)
+        self.assertFalse(result['reset'])
+        self.assertEqual(synced_ids(result, 'sessions'), [changed.pk])
+        self.assertEqual(result['changes']['sessions'][0]['status'], 'confirmed')
+        self.assertEqual(result['deleted']['sessions'], [deleted_id])
+        # PT của buổi tập cũng nhận tombstone
+        self.assertEqual(SyncService.changes(self.trainer, since=since)['deleted']['sessions'], [deleted_id])
+
+    def test_token_older_than_tombstone_days_forces_reset(self):
+        since = SyncService.changes(self.member)['next']
+        self.sessions[1].delete()
+        stale = token_issued_at(since, time.time() - 31 * 86400)
+
+        result = SyncService.changes(self.member, since=stale)
+        # Đồng bộ lại từ đầu: toàn bộ dữ liệu hiện có, không kèm tombstone
+        self.assertTrue(result['reset'])
+        self.assertEqual(sorted(synced_ids(result, 'sessions')), [self.sessions[0].pk, self.sessions[2].pk])
+        self.assertEqual(synced_ids(result, 'subscriptions'), [self.subscription.pk])
+        self.assertEqual(result['deleted']['sessions'], [])
+
+        recent = token_issued_at(since, time.time() - 29 * 86400)
+        self.assertFalse(SyncService.changes(self.member, since=recent)['reset'])
+
+    def test_pages_follow_next_until_has_more_is_false(self):
+        expected = {('sessions', session.pk) for session in self.sessions} | {('subscriptions', self.subscription.pk)}
+        seen, pages, since = [], [], None
+        while True:
+            result = SyncService.changes(self.member, since=since, limit=2)
+            pages.append(result)
+            seen += [(sync_type, item['id']) for sync_type, items in result['changes'].items() for item in items]
+            since = result['next']
+            if not result['has_more']:
+                break
+            self.assertLess(len(pages), 10)
+
+        self.assertEqual([page['has_more'] for page in pages], [True, False])
+        self.assertEqual([page['reset'] for page in pages], [True, False])
+        self.assertEqual(len(seen), len(expected))
+        self.assertEqual(set(seen), expected)
+        self.assertFalse(any(SyncService.changes(self.member, since=since, limit=2)['changes'].values()))
@@ -0,0 +1,126 @@
+from datetime import date, time, timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from gymhealth.models import Notification, SubscriptionPackage, WaitlistEntry, WorkoutSession
+from gymhealth.testing import create_member, create_trainer
+from gymhealth.utils.booking_service import BookingService
+from gymhealth.utils.waitlist_service import WaitlistService
+
+SLOT = (time(18, 0), time(19, 0))
+
+
+class WaitlistTests(TestCase):
+    """Vị trí trong hàng chờ và tự động xếp lịch cho người chờ khi khung giờ của PT trống"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.day = date.today() + timedelta(days=3)
+        cls.trainer = create_trainer('waitlist_trainer')
+        cls.booked_member, cls.booked_subscription = create_member('waitlist_booked')
+        cls.first, _ = create_member('waitlist_first')
+        cls.second, _ = create_member('waitlist_second')
+        cls.booked = WorkoutSession.objects.create(
+            member=cls.booked_member, trainer=cls.trainer, subscription=cls.booked_subscription,
+            session_date=cls.day, start_time=SLOT[0], end_time=SLOT[1], session_type='pt_session', status='confirmed')
+        cls.first_entry = cls.wait(cls.first)
+        cls.second_entry = cls.wait(cls.second)
+
+    @classmethod
+    def wait(cls, member, start_time=SLOT[0], end_time=SLOT[1]):
+        return WaitlistEntry.objects.create(
+            member=member, trainer=cls.trainer, session_date=cls.day, start_time=start_time, end_time=end_time)
+
+    def free_slot(self):
+        WorkoutSession.objects.filter(pk=self.booked.pk).update(status='cancelled')
+
+    def test_positions_follow_queue_order(self):
+        # Hàng chờ tính theo PT và ngày, không theo khung giờ
+        later = self.wait(self.second, time(20, 0), time(21, 0))
+        other_day = WaitlistEntry.objects.create(member=self.second, trainer=self.trainer,
+                                                 session_date=self.day + timedelta(days=1), start_time=SLOT[0],
+                                                 end_time=SLOT[1])
+        entries = [self.first_entry, self.second_entry, later, other_day]
+        with self.assertNumQueries(1):
+            positions = WaitlistService.positions(entries)
+        self.assertEqual(positions, {self.first_entry.pk: 1, self.second_entry.pk: 2, later.pk: 3, other_day.pk: 1})
+        for entry in entries:
+            self.assertEqual(positions[entry.pk], WaitlistService.position(entry))
+
+    def test_waitlist_listing_queries_do_not_grow_with_entries(self):
+        client = APIClient()
+        client.force_authenticate(self.second)
+
+        def listing():
+            with CaptureQueriesContext(connection) as context:
+                response = client.get('/workout-sessions/member/waitlist/')
+            self.assertEqual(response.status_code, 200)
+            return response.data, len(context.captured_queries)
+
+        data, baseline = listing()
+        self.assertEqual([entry['position'] for entry in data], [2])
+
+        for hour in (6, 8, 10):
+            self.wait(self.second, time(hour, 0), time(hour + 1, 0))
+        data, queries = listing()
+        self.assertEqual(queries, baseline)
+        self.assertEqual(len(data), 4)
+
+    def test_promote_books_first_waiting_member_under_trainer_lock(self):
+        self.free_slot()
+        lock_trainer = BookingService.lock_trainer
+
+        def lock_before_queue(trainer_id):
+            # Khóa lịch PT phải được lấy trước khi đọc hàng chờ và lịch bận
+            self.assertFalse(WaitlistEntry.objects.filter(status='promoted').exists())
+            return lock_trainer(trainer_id)
+
+        with mock.patch.object(BookingService, 'lock_trainer', side_effect=lock_before_queue) as lock:
+            self.assertEqual(WaitlistService.promote(self.trainer.pk, self.day), 1)
+        lock.assert_called_once_with(self.trainer.pk)
+
+        self.first_entry.refresh_from_db()
+        self.second_entry.refresh_from_db()
+        self.assertEqual(self.first_entry.status, 'promoted')
+        self.assertEqual(self.second_entry.status, 'waiting')
+        session = self.first_entry.promoted_session
+        self.assertEqual((session.member_id, session.trainer_id, session.status),
+                         (self.first.pk, self.trainer.pk, 'pending'))
+        self.assertTrue(Notification.objects.filter(user=self.first, related_object_id=session.pk).exists())
+
+    def test_promote_skips_members_without_pt_credits(self):
+        self.free_slot()
+        # Buổi PT duy nhất còn lại của người chờ đầu tiên đã được đặt vào ngày khác
+        subscription = self.first.subscriptions.get()
+        subscription.remaining_pt_sessions = 1
+        subscription.save(update_fields=['remaining_pt_sessions'])
+        WorkoutSession.objects.create(
+            member=self.first, trainer=self.trainer, subscription=subscription,
+            session_date=self.day + timedelta(days=1), start_time=SLOT[0], end_time=SLOT[1],
+            session_type='pt_session', status='pending')
+
+        self.assertEqual(WaitlistService.promote(self.trainer.pk, self.day), 1)
+        self.assertEqual(WaitlistEntry.objects.get(pk=self.first_entry.pk).status, 'waiting')
+        self.assertEqual(WaitlistEntry.objects.get(pk=self.second_entry.pk).status, 'promoted')
+
+    def test_promote_queries_do_not_grow_with_waiting_members(self):
+        # Khung giờ trống nhưng không người chờ nào còn gói tập: mọi người chờ đều được xét, không ai được xếp lịch
+        self.free_slot()
+        SubscriptionPackage.objects.update(status='expired')
+
+        def promote():
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(WaitlistService.promote(self.trainer.pk, self.day), 0)
+            return len(context.captured_queries)
+
+        baseline = promote()
+        for index in range(5):
+            member, subscription = create_member(f'waitlist_extra{index}')
+            subscription.status = 'expired'
+            subscription.save(update_fields=['status'])
+            self.wait(member)
+        self.assertEqual(promote(), baseline)
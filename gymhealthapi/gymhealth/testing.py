@@ -0,0 +1,29 @@
+"""Dữ liệu dùng chung cho các bộ kiểm thử đặt lịch (gymhealth/test_*.py)"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from gymhealth.models import MemberProfile, PackageType, Packages, SubscriptionPackage, TrainerProfile, User
+
+
+def create_trainer(username):
+    trainer = User.objects.create_user(username, f'{username}@example.com', 'secret', role='TRAINER',
+                                       first_name='Huấn luyện viên', last_name=username)
+    TrainerProfile.objects.create(user=trainer, specialization='Gym')
+    return trainer
+
+
+def create_member(username, pt_sessions=10, days=60):
+    """Hội viên còn hạn days ngày, kèm gói tập đang hoạt động có pt_sessions buổi PT; trả về (user, gói tập)"""
+    member = User.objects.create_user(username, f'{username}@example.com', 'secret', role='MEMBER',
+                                      first_name='Hội viên', last_name=username)
+    end_date = date.today() + timedelta(days=days)
+    MemberProfile.objects.create(user=member, membership_end_date=end_date)
+    package_type, _ = PackageType.objects.get_or_create(name='Gói kiểm thử', defaults={'duration_months': 2})
+    package = Packages.objects.filter(package_type=package_type).first() or Packages.objects.create(
+        name='Gói kiểm thử', package_type=package_type, description='Gói kiểm thử', price=Decimal('500000'),
+        pt_sessions=10, image='image/upload/test.jpg')
+    subscription = SubscriptionPackage.objects.create(
+        member=member, package=package, start_date=date.today(), end_date=end_date,
+        remaining_pt_sessions=pt_sessions, status='active')
+    return member, subscription
+
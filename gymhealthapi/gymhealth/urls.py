@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
-from . import views
+from . import views, consumers
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
@@ -20,13 +20,23 @@ router.register(r'notifications', views.NotificationViewSet)
 router.register(r'gyms', views.GymListView, basename='gym')
 
 urlpatterns = [
+    path('notifications/stream/', consumers.notification_stream, name='notification-stream'),
     path('', include(router.urls)),
 
+    path('home/', views.HomeView.as_view(), name='home'),
+    path('sync/', views.SyncView.as_view(), name='sync'),
+    path('calendar/feed/', views.CalendarFeedTokenView.as_view(), name='calendar-feed-token'),
+    path('calendar/<str:token>.ics', views.CalendarFeedView.as_view(), name='calendar-feed'),
     path('profile/', views.UserProfileView.as_view(), name='profile'),
+    path('search/users/', views.UserSearchView.as_view(), name='user-search'),
     path('trainers/', views.TrainerListView.as_view(), name='trainer-list'),
+    path('checkin/', views.CheckInView.as_view(), name='checkin'),
+    path('checkin/pass/', views.CheckInPassView.as_view(), name='checkin-pass'),
+    path('trainers/recommended/', views.TrainerRecommendationView.as_view(), name='trainer-recommended'),
     path('trainers/<int:trainer_id>/', views.TrainerDetailView.as_view(), name='trainer-detail'),
     path('trainers/<int:trainer_id>/upcoming_sessions/', views.TrainerUpcomingSessionsView.as_view(),
          name='trainer-upcoming-sessions'),
+    path('exports/<str:dataset>/', views.ExportView.as_view(), name='export-data'),
         path('api/payments/momo/ipn/', views.MoMoIPNView.as_view(), name='momo-ipn'),
         path('api/payments/momo/return/', views.MoMoReturnView.as_view(), name='momo-return'),
         # VNPay URLs - QUAN TRỌNG: Đúng thứ tự và định dạng
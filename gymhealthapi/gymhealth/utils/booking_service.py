@@ -0,0 +1,387 @@
+import bisect
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Count, Case, When, Value
+from django.utils import timezone
+
+from gymhealth.models import WorkoutSession, SubscriptionPackage, SyncVersion, Notification, SessionEvent, \
+    TrainerProfile
+from gymhealth.utils.ranking_service import TrainerRankingService
+from gymhealth.utils.session_event_service import SessionEventService
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MAX_WEEKS': 12,
+    # Lịch lặp lại được đặt xa hơn giới hạn 30 ngày của đặt lịch từng buổi
+    'MAX_DAYS_AHEAD': 90,
+}
+
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+REJECTION_MESSAGES = {
+    'past_date': "Ngày tập đã qua.",
+    'beyond_booking_window': "Ngày tập vượt quá thời gian cho phép đặt lịch.",
+    'membership_expired': "Sau ngày kết thúc tư cách hội viên.",
+    'subscription_expired': "Sau ngày kết thúc gói tập.",
+    'member_conflict': "Bạn đã có lịch tập vào thời gian này.",
+    'trainer_conflict': "Huấn luyện viên đã có lịch tập vào thời gian này.",
+    'insufficient_pt_credits': "Không đủ số buổi PT còn lại trong gói tập.",
+    'not_found': "Không tìm thấy buổi tập.",
+    'forbidden': "Bạn không có quyền cập nhật buổi tập này.",
+    'not_pt_session': "Bạn chỉ có thể cập nhật buổi tập PT.",
+    'invalid_transition': "Không thể chuyển buổi tập sang trạng thái này từ trạng thái hiện tại.",
+    'no_subscription': "Không tìm thấy gói tập của hội viên.",
+    'gym_full': "Phòng tập đã kín chỗ trong khung giờ này.",
+}
+
+# Trạng thái PT được cập nhật hàng loạt và các trạng thái hiện tại được phép chuyển sang
+BULK_TRANSITIONS = {
+    'confirmed': ('pending', 'rescheduled'),
+    'cancelled': ('pending', 'confirmed', 'rescheduled'),
+    'completed': ('pending', 'confirmed'),
+}
+MAX_BULK_SESSIONS = 100
+
+
+def booking_setting(name):
+    return getattr(settings, 'RECURRING_BOOKING', {}).get(name, DEFAULTS[name])
+
+
+def _merge(intervals):
+    """Gộp các khoảng (bắt đầu, kết thúc) chồng nhau; trả về hai danh sách đầu/cuối đã sắp xếp"""
+    starts, ends = [], []
+    for start, end in sorted(intervals):
+        if ends and start < ends[-1]:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+def _overlaps(busy, start, end):
+    """Khoảng [start, end) có giao với một khoảng bận đã gộp hay không"""
+    if busy is None:
+        return False
+    starts, ends = busy
+    # Khoảng bận cuối cùng bắt đầu trước end là khoảng duy nhất có thể giao (các khoảng đã gộp không chồng nhau)
+    index = bisect.bisect_left(starts, end) - 1
+    return index >= 0 and ends[index] > start
+
+
+def status_notification(user_type, new_status, session, notes=None):
+    """Tiêu đề và nội dung thông báo khi buổi tập đổi trạng thái"""
+    if new_status == 'confirmed':
+        title = "Buổi tập đã được xác nhận"
+        message = f"{user_type} đã xác nhận buổi tập vào ngày {session.session_date} lúc {session.start_time}."
+    elif new_status == 'cancelled':
+        title = "Buổi tập đã bị hủy"
+        message = f"{user_type} đã hủy buổi tập vào ngày {session.session_date} lúc {session.start_time}."
+    elif new_status == 'rescheduled':
+        title = "Đề xuất đổi lịch buổi tập"
+        message = f"{user_type} đề xuất đổi lịch cho buổi tập vào ngày {session.session_date}."
+    else:
+        title = "Buổi tập hoàn thành"
+        message = f"{user_type} đã hoàn thành buổi tập vào ngày {session.session_date} lúc {session.start_time}."
+    if notes:
+        message += f" Ghi chú: {notes}"
+    return title, message
+
+
+class BookingService:
+    """
+    Thao tác hàng loạt trên lịch tập: đặt lịch lặp lại (kiểm tra trùng lịch cho toàn bộ các buổi bằng một truy vấn,
+    tạo bằng một lệnh insert) và PT cập nhật trạng thái nhiều buổi cùng lúc
+    """
+
+    @staticmethod
+    def expand(weekdays, start_date, weeks):
+        """Các ngày tập trong weeks tuần kể từ start_date, theo các thứ ISO trong weekdays"""
+        end_date = start_date + timedelta(weeks=weeks)
+        days = []
+        day = start_date
+        while day < end_date:
+            if day.isoweekday() in weekdays:
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+
+    @staticmethod
+    def busy_intervals(member, trainer, date_from, date_to):
+        """Khoảng thời gian bận của hội viên và PT theo ngày, lấy bằng một truy vấn cho cả khoảng ngày"""
+        owners = Q(member=member)
+        if trainer is not None:
+            owners |= Q(trainer=trainer)
+        rows = WorkoutSession.objects.filter(
+            owners,
+            session_date__range=(date_from, date_to),
+            status__in=ACTIVE_STATUSES,
+        ).values_list('member_id', 'trainer_id', 'session_date', 'start_time', 'end_time')
+
+        member_busy, trainer_busy = defaultdict(list), defaultdict(list)
+        for member_id, trainer_id, session_date, start_time, end_time in rows:
+            if member_id == member.pk:
+                member_busy[session_date].append((start_time, end_time))
+            if trainer is not None and trainer_id == trainer.pk:
+                trainer_busy[session_date].append((start_time, end_time))
+        return ({day: _merge(items) for day, items in member_busy.items()},
+                {day: _merge(items) for day, items in trainer_busy.items()})
+
+    @staticmethod
+    def lock_trainer(trainer_id):
+        """
+        Khóa hồ sơ PT (select_for_update) đến hết transaction hiện tại. Mọi đường tạo buổi tập với PT
+        (member/register, register-recurring, danh sách chờ) lấy khóa này trước khi kiểm tra trùng lịch,
+        nên hai lần đặt lịch đồng thời với cùng PT được xử lý lần lượt.
+        """
+        TrainerProfile.objects.select_for_update().filter(user_id=trainer_id).values_list('id', flat=True).first()
+
+    @staticmethod
+    def conflict(member, trainer, session_date, start_time, end_time):
+        """'trainer_conflict'/'member_conflict' khi khung giờ trùng lịch của PT/hội viên, None khi còn trống"""
+        member_busy, trainer_busy = BookingService.busy_intervals(member, trainer, session_date, session_date)
+        if trainer is not None and _overlaps(trainer_busy.get(session_date), start_time, end_time):
+            return 'trainer_conflict'
+        if _overlaps(member_busy.get(session_date), start_time, end_time):
+            return 'member_conflict'
+        return None
+
+    @staticmethod
+    def available_pt_credits(subscription):
+        """Số buổi PT còn đặt được: số buổi còn lại trừ các buổi PT đã đặt nhưng chưa hoàn thành"""
+        booked = WorkoutSession.objects.filter(
+            subscription=subscription, session_type='pt_session', status__in=ACTIVE_STATUSES
+        ).count()
+        return max(subscription.remaining_pt_sessions - booked, 0)
+
+    @staticmethod
+    def book_recurring(member, subscription, rule):
+        """
+        Đặt các buổi tập theo quy tắc (dữ liệu đã qua RecurringSessionSerializer).
+        Trả về (danh sách kết quả từng buổi, số buổi đã tạo). Khi all_or_nothing và có buổi bị từ chối
+        thì không tạo buổi nào.
+        """
+        today = date.today()
+        start_date = rule.get('start_date') or today
+        days = BookingService.expand(rule['weekdays'], start_date, rule['weeks'])
+        trainer = rule.get('trainer')
+        is_pt = rule['session_type'] == 'pt_session'
+        start_time, end_time = rule['start_time'], rule['end_time']
+
+        last_day = today + timedelta(days=booking_setting('MAX_DAYS_AHEAD'))
+        membership_end = getattr(getattr(member, 'member_profile', None), 'membership_end_date', None)
+
+        results = []
+        with transaction.atomic():
+            # Khóa gói tập: các lần đặt lịch đồng thời của cùng hội viên kiểm tra số buổi PT lần lượt
+            subscription = SubscriptionPackage.objects.select_for_update().get(pk=subscription.pk)
+            credits = BookingService.available_pt_credits(subscription) if is_pt else None
+            if trainer is not None:
+                BookingService.lock_trainer(trainer.pk)
+            member_busy, trainer_busy = {}, {}
+            if days:
+                member_busy, trainer_busy = BookingService.busy_intervals(member, trainer, days[0], days[-1])
+
+            accepted = []
+            for day in days:
+                if day < today:
+                    reason = 'past_date'
+                elif day > last_day:
+                    reason = 'beyond_booking_window'
+                elif membership_end and day > membership_end:
+                    reason = 'membership_expired'
+                elif day > subscription.end_date:
+                    reason = 'subscription_expired'
+                elif _overlaps(member_busy.get(day), start_time, end_time):
+                    reason = 'member_conflict'
+                elif trainer is not None and _overlaps(trainer_busy.get(day), start_time, end_time):
+                    reason = 'trainer_conflict'
+                elif is_pt and credits <= 0:
+                    reason = 'insufficient_pt_credits'
+                else:
+                    reason = None
+                    if is_pt:
+                        credits -= 1
+                    accepted.append(day)
+                results.append({
+                    'session_date': day,
+                    'status': 'created' if reason is None else 'rejected',
+                    'reason': reason,
+                    'message': REJECTION_MESSAGES.get(reason),
+                })
+
+            gym = None
+            if not is_pt and accepted:
+                from gymhealth.utils.occupancy_service import OccupancyService
+                # Buổi tự tập được xác nhận ngay: giữ chỗ trong phòng tập cho từng ngày
+                gym = rule.get('gym') or OccupancyService.default_gym()
+                reserved = OccupancyService.reserve_many(gym, accepted, start_time, end_time)
+                for result in results:
+                    if result['status'] == 'created' and result['session_date'] not in reserved:
+                        result.update(status='rejected', reason='gym_full', message=REJECTION_MESSAGES['gym_full'])
+                accepted = [day for day in accepted if day in reserved]
+
+            rejected = len(days) - len(accepted)
+            if not accepted or (rule.get('all_or_nothing') and rejected):
+                # Trả lại các chỗ đã giữ trong phòng tập
+                transaction.set_rollback(True)
+                for result in results:
+                    if result['status'] == 'created':
+                        result['status'] = 'not_created'
+                return results, 0
+
+            # Các buổi tạo cùng lúc dùng chung một phiên bản đồng bộ (bulk_create không gọi save())
+            version = SyncVersion.allocate()
+            sessions = WorkoutSession.objects.bulk_create([
+                WorkoutSession(
+                    member=member, trainer=trainer, subscription=subscription, session_date=day,
+                    start_time=start_time, end_time=end_time, session_type=rule['session_type'],
+                    status='pending' if is_pt else 'confirmed', notes=rule.get('notes') or None,
+                    gym=gym, sync_version=version,
+                ) for day in accepted
+            ])
+            if sessions and sessions[0].pk is None:
+                # MySQL không trả về id sau bulk_create
+                ids = dict(WorkoutSession.objects.filter(member=member, sync_version=version).values_list(
+                    'session_date', 'id'))
+            else:
+                ids = {session.session_date: session.pk for session in sessions}
+            for result in results:
+                if result['status'] == 'created':
+                    result['id'] = ids.get(result['session_date'])
+            for session in sessions:
+                session.pk = ids.get(session.session_date)
+            SessionEventService.record_many(sessions, SessionEvent.CREATED, actor=member)
+
+            def invalidate():
+                from gymhealth.utils.home_service import HomeService
+                from gymhealth.utils.calendar_service import CalendarService
+                HomeService.invalidate(member.pk, 'schedule')
+                if trainer is not None:
+                    HomeService.invalidate(trainer.pk, 'schedule')
+                CalendarService.invalidate(member.pk, trainer.pk if trainer is not None else None)
+
+            transaction.on_commit(invalidate)
+            if trainer is not None:
+                TrainerRankingService.schedule_refresh(trainer.pk)
+
+        logger.info("Recurring booking by member %s: %d created, %d rejected", member.pk, len(accepted), rejected)
+        return results, len(accepted)
+
+    @staticmethod
+    def bulk_update_status(trainer, session_ids, new_status, trainer_notes=None):
+        """
+        PT cập nhật trạng thái nhiều buổi tập cùng lúc. Mỗi buổi được kiểm tra riêng (quyền, trạng thái hiện tại,
+        số buổi PT); các buổi hợp lệ được cập nhật bằng một lệnh UPDATE, các buổi còn lại trả về lý do.
+        Trả về (danh sách kết quả theo thứ tự session_ids, số buổi đã cập nhật).
+        """
+        from gymhealth.utils.realtime import publish_notifications
+
+        session_ids = list(dict.fromkeys(session_ids))
+        outcomes = {}
+        with transaction.atomic():
+            sessions = {
+                session.pk: session for session in WorkoutSession.objects.select_for_update().select_related(
+                    'subscription').filter(pk__in=session_ids)
+            }
+
+            candidates = []
+            for session_id in session_ids:
+                session = sessions.get(session_id)
+                if session is None:
+                    outcomes[session_id] = 'not_found'
+                elif session.trainer_id != trainer.pk:
+                    outcomes[session_id] = 'forbidden'
+                elif session.session_type != 'pt_session':
+                    outcomes[session_id] = 'not_pt_session'
+                elif session.status not in BULK_TRANSITIONS[new_status]:
+                    outcomes[session_id] = 'invalid_transition'
+                elif new_status != 'cancelled' and session.subscription is None:
+                    outcomes[session_id] = 'no_subscription'
+                else:
+                    candidates.append(session)
+
+            # Số buổi PT: buổi đã xác nhận (chưa hoàn thành) giữ chỗ một buổi trong gói
+            subscription_ids = {session.subscription_id for session in candidates if session.subscription_id}
+            confirmed = dict(WorkoutSession.objects.filter(
+                subscription_id__in=subscription_ids, session_type='pt_session', status='confirmed'
+            ).values('subscription_id').annotate(count=Count('id')).values_list('subscription_id', 'count'))
+            remaining = {session.subscription_id: session.subscription.remaining_pt_sessions
+                         for session in candidates if session.subscription_id}
+
+            accepted, used = [], defaultdict(int)
+            for session in sorted(candidates, key=lambda item: (item.session_date, item.start_time, item.pk)):
+                subscription_id = session.subscription_id
+                if new_status == 'confirmed':
+                    if remaining[subscription_id] - confirmed.get(subscription_id, 0) - used[subscription_id] <= 0:
+                        outcomes[session.pk] = 'insufficient_pt_credits'
+                        continue
+                    used[subscription_id] += 1
+                elif new_status == 'completed':
+                    used[subscription_id] += 1
+                outcomes[session.pk] = None
+                accepted.append(session)
+
+            if accepted:
+                version = SyncVersion.allocate()
+                updates = {'status': new_status, 'sync_version': version, 'updated_at': timezone.now()}
+                if trainer_notes:
+                    updates['trainer_notes'] = trainer_notes
+                WorkoutSession.objects.filter(pk__in=[session.pk for session in accepted]).update(**updates)
+                SessionEventService.record_many(accepted, SessionEventService.status_event(new_status),
+                                                actor=trainer, note=trainer_notes)
+
+                if new_status == 'completed':
+                    # Hoàn thành buổi PT trừ một buổi trong gói (giống WorkoutSession.save), không xuống dưới 0
+                    SubscriptionPackage.objects.filter(pk__in=list(used)).update(
+                        remaining_pt_sessions=Case(*[
+                            When(pk=subscription_id, then=Value(max(remaining[subscription_id] - count, 0)))
+                            for subscription_id, count in used.items()
+                        ]),
+                        sync_version=version,
+                    )
+
+                notifications = []
+                for session in accepted:
+                    title, message = status_notification("PT", new_status, session, trainer_notes)
+                    notifications.append(Notification(
+                        user_id=session.member_id, title=title, message=message,
+                        notification_type='session_status_update', related_object_id=session.pk,
+                        sync_version=version,
+                    ))
+                Notification.objects.bulk_create(notifications)
+                publish_notifications(notifications)
+
+                member_ids = {session.member_id for session in accepted}
+
+                def invalidate():
+                    from gymhealth.utils.home_service import HomeService
+                    from gymhealth.utils.calendar_service import CalendarService
+                    for member_id in member_ids:
+                        sections = ['schedule', 'notifications']
+                        if new_status == 'completed':
+                            sections.append('subscription')
+                        HomeService.invalidate(member_id, *sections)
+                    HomeService.invalidate(trainer.pk, 'schedule')
+                    CalendarService.invalidate(trainer.pk, *member_ids)
+
+                transaction.on_commit(invalidate)
+                TrainerRankingService.schedule_refresh(trainer.pk)
+                if new_status == 'cancelled':
+                    from gymhealth.utils.waitlist_service import WaitlistService
+                    WaitlistService.schedule_promotion(*[(trainer.pk, session.session_date) for session in accepted])
+
+        results = [{
+            'id': session_id,
+            'status': 'updated' if outcomes[session_id] is None else 'failed',
+            'reason': outcomes[session_id],
+            'message': REJECTION_MESSAGES.get(outcomes[session_id]),
+        } for session_id in session_ids]
+        logger.info("Bulk status update to %s by trainer %s: %d updated, %d failed",
+                    new_status, trainer.pk, len(accepted), len(session_ids) - len(accepted))
+        return results, len(accepted)
@@ -0,0 +1,188 @@
+import hashlib
+import logging
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max, Count
+from django.utils.html import strip_tags
+
+from gymhealth.models import WorkoutSession
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ALIAS': 'shared',
+    # Giờ của buổi tập được lưu theo giờ địa phương của phòng tập
+    'TIMEZONE': 'Asia/Ho_Chi_Minh',
+    'DAYS_BACK': 30,
+    'DAYS_AHEAD': 90,
+    'MAX_DAYS': 366,
+    'CACHE_TIMEOUT': 3600,
+    'CHUNK_SIZE': 500,
+}
+
+CRLF = '\r\n'
+
+EVENT_STATUS = {
+    'pending': 'TENTATIVE',
+    'rescheduled': 'TENTATIVE',
+    'confirmed': 'CONFIRMED',
+    'completed': 'CONFIRMED',
+    'cancelled': 'CANCELLED',
+}
+
+
+def calendar_setting(name):
+    return getattr(settings, 'CALENDAR_FEED', {}).get(name, DEFAULTS[name])
+
+
+def _cache():
+    return caches[calendar_setting('ALIAS')]
+
+
+def _cache_key(user_id):
+    return f"calendar:{user_id}"
+
+
+def _escape(text):
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n').replace('\r', ''))
+
+
+def _fold(line):
+    """Ngắt dòng dài hơn 75 byte (RFC 5545), dòng tiếp theo bắt đầu bằng một dấu cách"""
+    if len(line.encode()) <= 75:
+        return line + CRLF
+    parts, current, size = [], [], 0
+    for char in line:
+        char_size = len(char.encode())
+        if size + char_size > 75:
+            parts.append(''.join(current))
+            current, size = [' '], 1
+        current.append(char)
+        size += char_size
+    parts.append(''.join(current))
+    return CRLF.join(parts) + CRLF
+
+
+def _utc(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+class CalendarService:
+    """Lịch tập dạng iCalendar (.ics) để đồng bộ vào ứng dụng lịch trên điện thoại"""
+
+    @staticmethod
+    def date_range(params):
+        """(ngày bắt đầu, ngày kết thúc, là khoảng mặc định hay không) từ query string days_back/days_ahead"""
+        try:
+            days_back = int(params.get('days_back', calendar_setting('DAYS_BACK')))
+            days_ahead = int(params.get('days_ahead', calendar_setting('DAYS_AHEAD')))
+        except (TypeError, ValueError):
+            raise ValueError("days_back và days_ahead phải là số nguyên")
+        if days_back < 0 or days_ahead < 0 or days_back + days_ahead > calendar_setting('MAX_DAYS'):
+            raise ValueError(f"Khoảng thời gian tối đa là {calendar_setting('MAX_DAYS')} ngày")
+        is_default = (days_back, days_ahead) == (calendar_setting('DAYS_BACK'), calendar_setting('DAYS_AHEAD'))
+        today = date.today()
+        return today - timedelta(days=days_back), today + timedelta(days=days_ahead), is_default
+
+    @staticmethod
+    def sessions(user, date_from, date_to):
+        if user.is_trainer:
+            queryset = WorkoutSession.objects.filter(trainer=user)
+        else:
+            queryset = WorkoutSession.objects.filter(member=user)
+        return queryset.filter(session_date__range=(date_from, date_to))
+
+    @staticmethod
+    def etag(user, date_from, date_to):
+        """
+        ETag của lịch: thay đổi khi một buổi tập được sửa (updated_at, sync_version), thêm hoặc xóa (số buổi)
+        trong khoảng ngày. Chỉ cần một truy vấn tổng hợp, không đọc từng buổi tập.
+        sync_version tăng ở mọi lần ghi kể cả update() hàng loạt, không phụ thuộc đồng hồ của server.
+        """
+        summary = CalendarService.sessions(user, date_from, date_to).aggregate(
+            last_updated=Max('updated_at'), last_version=Max('sync_version'), count=Count('id'))
+        last_updated = summary['last_updated'].isoformat() if summary['last_updated'] else ''
+        raw = f"{user.pk}:{date_from}:{date_to}:{summary['count']}:{last_updated}:{summary['last_version']}"
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    @staticmethod
+    def event(session, user, tz):
+        start = datetime.combine(session.session_date, session.start_time, tzinfo=tz)
+        end = datetime.combine(session.session_date, session.end_time, tzinfo=tz)
+        if session.session_type != 'pt_session':
+            summary = "Buổi tự tập"
+        elif user.is_trainer:
+            summary = f"Buổi tập PT: {session.member.get_full_name() or session.member.username}"
+        elif session.trainer_id:
+            summary = f"Buổi tập PT với {session.trainer.get_full_name() or session.trainer.username}"
+        else:
+            summary = "Buổi tập PT"
+        description = "\n".join(
+            strip_tags(notes).strip() for notes in (session.notes, session.trainer_notes) if notes)
+
+        lines = [
+            'BEGIN:VEVENT',
+            f'UID:workout-session-{session.pk}@gymhealth',
+            f'DTSTAMP:{_utc(session.updated_at)}',
+            f'LAST-MODIFIED:{_utc(session.updated_at)}',
+            f'DTSTART:{_utc(start)}',
+            f'DTEND:{_utc(end)}',
+            f'SUMMARY:{_escape(summary)}',
+            f'STATUS:{EVENT_STATUS.get(session.status, "TENTATIVE")}',
+        ]
+        if description:
+            lines.append(f'DESCRIPTION:{_escape(description)}')
+        lines.append('END:VEVENT')
+        return ''.join(_fold(line) for line in lines)
+
+    @staticmethod
+    def stream(user, date_from, date_to):
+        """Sinh nội dung .ics theo từng buổi tập (dùng với StreamingHttpResponse)"""
+        tz = ZoneInfo(calendar_setting('TIMEZONE'))
+        yield ''.join(_fold(line) for line in (
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            'PRODID:-//GymHealth//Lich tap//VI',
+            'CALSCALE:GREGORIAN',
+            'METHOD:PUBLISH',
+            f'X-WR-CALNAME:{_escape("Lịch tập GymHealth")}',
+            'REFRESH-INTERVAL;VALUE=DURATION:PT1H',
+            'X-PUBLISHED-TTL:PT1H',
+        ))
+        queryset = CalendarService.sessions(user, date_from, date_to).select_related(
+            'member', 'trainer').order_by('session_date', 'start_time', 'pk')
+        for session in queryset.iterator(chunk_size=calendar_setting('CHUNK_SIZE')):
+            yield CalendarService.event(session, user, tz)
+        yield 'END:VCALENDAR' + CRLF
+
+    @staticmethod
+    def render(user, date_from, date_to, etag):
+        """Nội dung .ics của khoảng mặc định, cache theo người dùng và ETag"""
+        try:
+            cached = _cache().get(_cache_key(user.pk))
+        except Exception:
+            logger.warning("Calendar cache is unavailable", exc_info=True)
+            cached = None
+        if cached and cached[0] == etag:
+            return cached[1]
+
+        body = ''.join(CalendarService.stream(user, date_from, date_to)).encode()
+        try:
+            _cache().set(_cache_key(user.pk), (etag, body), calendar_setting('CACHE_TIMEOUT'))
+        except Exception:
+            logger.warning("Calendar cache is unavailable", exc_info=True)
+        return body
+
+    @staticmethod
+    def invalidate(*user_ids):
+        keys = [_cache_key(user_id) for user_id in user_ids if user_id]
+        if not keys:
+            return
+        try:
+            _cache().delete_many(keys)
+        except Exception:
+            logger.warning("Calendar cache is unavailable", exc_info=True)
@@ -0,0 +1,336 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, IntegrityError
+from django.utils.dateparse import parse_datetime
+
+from gymhealth.models import CheckIn, SubscriptionPackage
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Khóa ký mã QR; máy quét ngoại tuyến được cấp khóa này (không dùng chung SECRET_KEY)
+    'SIGNING_KEY': None,
+    # Thời gian hiệu lực của một mã QR (giây), app tự lấy mã mới trước khi hết hạn
+    'PASS_TTL': 60,
+    # Thời gian chờ tối đa (giây) giữa các lần task ghi lại lượt check-in khi DB lỗi
+    'MAX_RETRY_DELAY': 30.0,
+    # Cache dùng chung giữa các tiến trình, đánh dấu mã QR đã được quét
+    'ALIAS': 'shared',
+    # Bộ đệm lượt check-in chờ ghi: 'redis' (list dùng chung giữa tiến trình web và Celery worker),
+    # 'memory' chỉ trong cùng tiến trình (dev/test), lượt check-in được ghi ngay
+    'BUFFER': 'memory',
+    'BUFFER_REDIS_URL': None,
+    # Số lượt check-in tối đa ghi trong một lệnh insert
+    'BATCH_SIZE': 500,
+    # Task ghi chạy sau lượt quét đầu tiên FLUSH_DELAY giây, các lượt quét trong khoảng đó được ghi cùng lô
+    'FLUSH_DELAY': 2,
+}
+
+PASS_VERSION = 'v1'
+SIGNATURE_BYTES = 16
+
+
+def checkin_setting(name):
+    return getattr(settings, 'CHECKIN', {}).get(name, DEFAULTS[name])
+
+
+def _signing_key():
+    key = checkin_setting('SIGNING_KEY')
+    if key:
+        return key.encode()
+    return hashlib.sha256(f"gymhealth.checkin:{settings.SECRET_KEY}".encode()).digest()
+
+
+def _sign(message):
+    digest = hmac.new(_signing_key(), message.encode(), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+class InvalidPass(Exception):
+    pass
+
+
+class PassAlreadyUsed(InvalidPass):
+    pass
+
+
+def _used_passes():
+    return caches[checkin_setting('ALIAS')]
+
+
+FLUSH_KEY = 'checkin-flush-scheduled'
+
+
+class InMemoryCheckInBuffer:
+    """Bộ đệm trong tiến trình (dev/test); tiến trình khác (Celery worker) không đọc được"""
+    shared = False
+
+    def __init__(self):
+        self._rows = deque()
+        self._lock = threading.Lock()
+
+    def push(self, row):
+        with self._lock:
+            self._rows.append(row)
+
+    def pop(self, count):
+        with self._lock:
+            return [self._rows.popleft() for _ in range(min(count, len(self._rows)))]
+
+    def requeue(self, rows):
+        # Trả các lượt chưa ghi được về đầu bộ đệm để lần ghi sau xử lý trước
+        with self._lock:
+            self._rows.extendleft(reversed(rows))
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class RedisCheckInBuffer:
+    """Bộ đệm là một list trong Redis: tiến trình web thêm vào cuối, task ghi lấy từng lô ở đầu"""
+    shared = True
+    KEY = 'checkin-buffer'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("Cần cài đặt redis để dùng CHECKIN['BUFFER'] = 'redis'")
+        self._client = redis.Redis.from_url(url)
+
+    def push(self, row):
+        self._client.rpush(self.KEY, json.dumps(row))
+
+    def pop(self, count):
+        # LRANGE + LTRIM trong một MULTI: hai task ghi chạy đồng thời không lấy trùng lượt
+        pipeline = self._client.pipeline()
+        pipeline.lrange(self.KEY, 0, count - 1)
+        pipeline.ltrim(self.KEY, count, -1)
+        rows, _ = pipeline.execute()
+        return [json.loads(row) for row in rows]
+
+    def requeue(self, rows):
+        if rows:
+            self._client.lpush(self.KEY, *[json.dumps(row) for row in reversed(rows)])
+
+    def __len__(self):
+        return self._client.llen(self.KEY)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                backend = checkin_setting('BUFFER')
+                if backend == 'redis':
+                    _buffer = RedisCheckInBuffer(checkin_setting('BUFFER_REDIS_URL') or settings.CELERY_BROKER_URL)
+                elif backend == 'memory':
+                    _buffer = InMemoryCheckInBuffer()
+                else:
+                    raise ImproperlyConfigured(f"CHECKIN['BUFFER'] không hợp lệ: {backend}")
+    return _buffer
+
+
+def set_buffer(buffer):
+    """Thay bộ đệm đang dùng (vd: InMemoryCheckInBuffer trong kiểm thử)"""
+    global _buffer
+    _buffer = buffer
+
+
+class CheckInService:
+    """
+    Check-in bằng mã QR ký HMAC. Mã chứa id hội viên, thời điểm hết hạn và quyền lợi còn lại (hạn hội viên,
+    số buổi PT); máy quét kiểm tra chữ ký và thời hạn mà không cần đọc DB. Mỗi mã chỉ dùng được một lần
+    (đánh dấu trong cache dùng chung); lượt check-in được đưa vào bộ đệm và task Celery record_check_ins
+    ghi theo lô (một lệnh insert cho tối đa BATCH_SIZE lượt).
+    """
+
+    @staticmethod
+    def issue_pass(member):
+        """(mã QR, thời điểm hết hạn) cho hội viên; ValueError khi tư cách hội viên không hợp lệ"""
+        member_profile = getattr(member, 'member_profile', None)
+        if member_profile is None or not member_profile.is_membership_valid:
+            raise ValueError("Tư cách hội viên của bạn đã hết hạn hoặc không hợp lệ.")
+
+        today = date.today()
+        remaining_pt = SubscriptionPackage.objects.filter(
+            member=member, status='active', start_date__lte=today, end_date__gte=today,
+        ).order_by('end_date').values_list('remaining_pt_sessions', flat=True).first() or 0
+        membership_end = member_profile.membership_end_date
+        expires = int(time.time()) + checkin_setting('PASS_TTL')
+
+        payload = '.'.join([
+            PASS_VERSION, str(member.pk), str(expires),
+            membership_end.strftime('%Y%m%d') if membership_end else '-',
+            str(remaining_pt), secrets.token_hex(4),
+        ])
+        return f"{payload}.{_sign(payload)}", datetime.fromtimestamp(expires, tz=dt_timezone.utc)
+
+    @staticmethod
+    def verify_pass(token):
+        """Nội dung của mã QR hợp lệ (không đọc DB); InvalidPass khi sai chữ ký, hết hạn hoặc hết hạn hội viên"""
+        try:
+            payload, signature = token.rsplit('.', 1)
+            version, member_id, expires, membership_end, remaining_pt, _ = payload.split('.')
+        except (AttributeError, ValueError):
+            raise InvalidPass("Mã QR không hợp lệ.")
+        if version != PASS_VERSION or not hmac.compare_digest(signature, _sign(payload)):
+            raise InvalidPass("Mã QR không hợp lệ.")
+
+        expires = int(expires)
+        if expires < time.time():
+            raise InvalidPass("Mã QR đã hết hạn, vui lòng làm mới mã trên ứng dụng.")
+        membership_end = None if membership_end == '-' else datetime.strptime(membership_end, '%Y%m%d').date()
+        if membership_end and membership_end < date.today():
+            raise InvalidPass("Tư cách hội viên đã hết hạn.")
+        return {
+            'member_id': int(member_id),
+            'expires_at': datetime.fromtimestamp(expires, tz=dt_timezone.utc),
+            'membership_end_date': membership_end,
+            'remaining_pt_sessions': int(remaining_pt),
+            'signature': signature,
+        }
+
+    @staticmethod
+    def check_in(token, gym_id=None, scanned_by=None):
+        """
+        Kiểm tra mã, đánh dấu mã đã dùng và chuyển lượt check-in cho task ghi. Trả về nội dung mã;
+        PassAlreadyUsed khi mã đã được quét (ở bất kỳ máy quét/tiến trình nào).
+        """
+        data = CheckInService.verify_pass(token)
+        signature = data.pop('signature')
+        now = datetime.now(tz=dt_timezone.utc)
+        timeout = max(int((data['expires_at'] - now).total_seconds()) + 1, 1)
+        try:
+            # cache.add là thao tác nguyên tử: chỉ một lần quét của mỗi mã thêm được khóa
+            first_use = _used_passes().add(f'checkin-pass:{signature}', 1, timeout)
+        except Exception:
+            # Cache lỗi: vẫn mở cửa (mã chỉ có hiệu lực PASS_TTL giây), lượt check-in vẫn được ghi
+            logger.warning("Check-in pass cache unavailable, accepting pass of member %s without reuse check",
+                           data['member_id'])
+            first_use = True
+        if not first_use:
+            raise PassAlreadyUsed("Mã QR đã được sử dụng, vui lòng làm mới mã trên ứng dụng.")
+
+        CheckInService.enqueue({
+            'member_id': data['member_id'], 'gym_id': gym_id, 'scanned_by_id': getattr(scanned_by, 'pk', None),
+            'checked_in_at': now.isoformat(), 'pass_expires_at': data['expires_at'].isoformat(),
+        })
+        return data
+
+    @staticmethod
+    def enqueue(row):
+        """
+        Đưa lượt check-in vào bộ đệm và hẹn task ghi theo lô. Ghi trực tiếp vào DB khi bộ đệm không dùng được.
+        """
+        try:
+            buffer = get_buffer()
+            buffer.push(row)
+        except Exception:
+            logger.warning("Check-in buffer unavailable, recording check-in of member %s directly", row['member_id'],
+                           exc_info=True)
+            CheckInService.record([row])
+            return
+        if not buffer.shared:
+            # Bộ đệm trong tiến trình: Celery worker không đọc được nên ghi ngay tại đây
+            CheckInService._flush_quietly()
+            return
+        CheckInService.schedule_flush()
+
+    @staticmethod
+    def schedule_flush():
+        """
+        Hẹn task record_check_ins sau FLUSH_DELAY giây; chỉ có một lần hẹn đang chờ, các lượt quét tiếp theo
+        được ghi cùng lô. Lần chạy định kỳ mỗi phút vẫn ghi nốt bộ đệm nếu task bị mất.
+        """
+        from gymhealth.tasks import record_check_ins
+        delay = checkin_setting('FLUSH_DELAY')
+        try:
+            if not _used_passes().add(FLUSH_KEY, 1, delay * 10):
+                return
+        except Exception:
+            logger.warning("Check-in cache unavailable, scheduling flush without debounce", exc_info=True)
+        try:
+            record_check_ins.apply_async(countdown=delay)
+        except Exception:
+            logger.warning("Could not schedule check-in flush, recording one batch directly", exc_info=True)
+            CheckInService._flush_quietly(max_batches=1)
+
+    @staticmethod
+    def clear_flush_scheduled():
+        """Bỏ đánh dấu đang chờ để lượt quét sau thời điểm này hẹn một lần ghi mới"""
+        try:
+            _used_passes().delete(FLUSH_KEY)
+        except Exception:
+            logger.warning("Could not clear scheduled check-in flush", exc_info=True)
+
+    @staticmethod
+    def flush(max_batches=None):
+        """
+        Ghi các lượt check-in trong bộ đệm, mỗi lô tối đa BATCH_SIZE lượt bằng một lệnh insert; trả về số lượt
+        đã ghi. DB lỗi thì trả lô đang ghi về bộ đệm rồi ném lại lỗi (task thử lại sau).
+        """
+        buffer = get_buffer()
+        batch_size = checkin_setting('BATCH_SIZE')
+        count = batches = 0
+        while max_batches is None or batches < max_batches:
+            rows = buffer.pop(batch_size)
+            if not rows:
+                break
+            try:
+                count += CheckInService.record(rows)
+            except DatabaseError:
+                buffer.requeue(rows)
+                raise
+            batches += 1
+        return count
+
+    @staticmethod
+    def _flush_quietly(max_batches=None):
+        # Ghi trong request: DB lỗi không làm hỏng lượt quét, các lượt vẫn nằm trong bộ đệm cho lần ghi sau
+        try:
+            CheckInService.flush(max_batches)
+        except DatabaseError:
+            logger.warning("Could not record buffered check-ins, keeping them for the next flush", exc_info=True)
+
+    @staticmethod
+    def record(rows):
+        """Ghi các lượt check-in (dict từ enqueue) bằng một lệnh insert; trả về số lượt đã ghi"""
+        check_ins = [CheckIn(
+            member_id=row['member_id'], gym_id=row['gym_id'], scanned_by_id=row['scanned_by_id'],
+            checked_in_at=parse_datetime(row['checked_in_at']), pass_expires_at=parse_datetime(row['pass_expires_at']),
+        ) for row in rows]
+        try:
+            CheckIn.objects.bulk_create(check_ins)
+        except IntegrityError:
+            # Có lượt tham chiếu hội viên/phòng tập không tồn tại: ghi từng lượt, bỏ các lượt lỗi
+            return CheckInService._insert_each(check_ins)
+        return len(check_ins)
+
+    @staticmethod
+    def _insert_each(check_ins):
+        count = 0
+        for check_in in check_ins:
+            try:
+                check_in.save(force_insert=True)
+                count += 1
+            except IntegrityError:
+                logger.error("Dropped invalid check-in of member %s at gym %s", check_in.member_id, check_in.gym_id)
+        return count
@@ -0,0 +1,257 @@
+import csv
+from datetime import date, timedelta
+
+from django.db.models import ForeignKey, OneToOneField
+
+from gymhealth.models import WorkoutSession, Payment, SubscriptionPackage, TrainingProgress
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class ExportError(ValueError):
+    """Lỗi khi tham số xuất dữ liệu không hợp lệ"""
+
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ExportError(f"Định dạng {name} không hợp lệ. Sử dụng YYYY-MM-DD")
+
+
+def _parse_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ExportError(f"{name} phải là một số")
+
+
+def _filter_choice(queryset, params, param, lookup, choices):
+    value = params.get(param)
+    if value:
+        if value not in dict(choices):
+            raise ExportError(f"Giá trị {param} không hợp lệ: {value}")
+        queryset = queryset.filter(**{lookup: value})
+    return queryset
+
+
+def _filter_date_range(queryset, params, lookup):
+    date_from = params.get('date_from')
+    date_to = params.get('date_to')
+    if date_from:
+        queryset = queryset.filter(**{f'{lookup}__gte': _parse_date(date_from, 'date_from')})
+    if date_to:
+        queryset = queryset.filter(**{f'{lookup}__lte': _parse_date(date_to, 'date_to')})
+    return queryset
+
+
+# Các bộ lọc bên dưới tương ứng với list_filter của các ModelAdmin
+def _filter_sessions(queryset, params):
+    queryset = _filter_choice(queryset, params, 'session_type', 'session_type', WorkoutSession.SESSION_TYPE)
+    queryset = _filter_choice(queryset, params, 'status', 'status', WorkoutSession.SESSION_STATUS)
+    return _filter_date_range(queryset, params, 'session_date')
+
+
+def _filter_payments(queryset, params):
+    queryset = _filter_choice(queryset, params, 'status', 'status', Payment.PAYMENT_STATUS)
+    queryset = _filter_choice(queryset, params, 'payment_method', 'payment_method', Payment.PAYMENT_METHOD)
+    return _filter_date_range(queryset, params, 'payment_date__date')
+
+
+def _filter_subscriptions(queryset, params):
+    membership_status = params.get('membership_status')
+    today = date.today()
+    if membership_status == 'active':
+        queryset = queryset.filter(status='active', end_date__gte=today)
+    elif membership_status == 'expired':
+        queryset = queryset.filter(end_date__lt=today)
+    elif membership_status == 'expiring_soon':
+        queryset = queryset.filter(status='active', end_date__gte=today, end_date__lte=today + timedelta(days=30))
+    elif membership_status:
+        raise ExportError(f"Giá trị membership_status không hợp lệ: {membership_status}")
+
+    queryset = _filter_choice(queryset, params, 'status', 'status', SubscriptionPackage.STATUS_CHOICES)
+    if params.get('package'):
+        queryset = queryset.filter(package_id=_parse_int(params['package'], 'package'))
+    return _filter_date_range(queryset, params, 'start_date')
+
+
+def _filter_progress(queryset, params):
+    if params.get('created_by'):
+        queryset = queryset.filter(created_by_id=_parse_int(params['created_by'], 'created_by'))
+    return _filter_date_range(queryset, params, 'workout_session__session_date')
+
+
+# Mỗi tập dữ liệu: model, danh sách cột (lookup của values_list) và hàm lọc
+DATASETS = {
+    'workout-sessions': {
+        'model': WorkoutSession,
+        'columns': [
+            'id', 'member_id', 'member__username', 'trainer_id', 'trainer__username', 'subscription_id',
+            'session_date', 'start_time', 'end_time', 'session_type', 'status', 'created_at', 'updated_at',
+        ],
+        'filter': _filter_sessions,
+    },
+    'payments': {
+        'model': Payment,
+        'columns': [
+            'id', 'subscription_id', 'subscription__member_id', 'subscription__member__username',
+            'subscription__package__name', 'amount', 'payment_method', 'status', 'transaction_id',
+            'vnpay_transaction_no', 'payment_date', 'confirmed_date', 'created_at', 'updated_at',
+        ],
+        'filter': _filter_payments,
+    },
+    'subscriptions': {
+        'model': SubscriptionPackage,
+        'columns': [
+            'id', 'member_id', 'member__username', 'package_id', 'package__name', 'start_date', 'end_date',
+            'remaining_pt_sessions', 'status', 'applied_promotion_id', 'original_price', 'discounted_price',
+            'created_at',
+        ],
+        'filter': _filter_subscriptions,
+    },
+    'training-progress': {
+        'model': TrainingProgress,
+        'columns': [
+            'id', 'workout_session_id', 'workout_session__session_date', 'health_info__user_id',
+            'health_info__user__username', 'weight', 'body_fat_percentage', 'muscle_mass', 'chest', 'waist',
+            'hips', 'thighs', 'arms', 'cardio_endurance', 'strength_bench', 'strength_squat',
+            'strength_deadlift', 'created_by_id', 'created_at', 'updated_at',
+        ],
+        'filter': _filter_progress,
+    },
+}
+
+
+class _Echo:
+    """Pseudo-buffer cho csv.writer: trả lại dòng vừa ghi thay vì lưu lại"""
+
+    def write(self, value):
+        return value
+
+
+class ExportService:
+    """Xuất dữ liệu dạng luồng (CSV) hoặc dạng cột (Parquet/Arrow) với bộ nhớ cố định"""
+
+    @staticmethod
+    def get_dataset(name):
+        try:
+            return DATASETS[name]
+        except KeyError:
+            raise ExportError(f"Tập dữ liệu không tồn tại. Chọn một trong: {', '.join(DATASETS)}")
+
+    @staticmethod
+    def build_queryset(name, params):
+        """Tạo queryset đã lọc theo các tham số giống list_filter trong admin"""
+        dataset = ExportService.get_dataset(name)
+        queryset = dataset['model'].objects.all()
+        return dataset['filter'](queryset, params)
+
+    @staticmethod
+    def iter_rows(name, queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Duyệt các dòng theo từng khối khóa chính (keyset pagination).
+        Mỗi khối dùng iterator(chunk_size=...) nên trên backend có server-side cursor sẽ không nạp
+        cả khối vào RAM; trên MySQL (driver đệm toàn bộ kết quả) bộ nhớ vẫn bị giới hạn bởi chunk_size.
+        """
+        columns = ExportService.get_dataset(name)['columns']
+        queryset = queryset.order_by('pk').values_list(*columns)
+        last_pk = None
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            count = 0
+            for row in chunk[:chunk_size].iterator(chunk_size=chunk_size):
+                count += 1
+                last_pk = row[0]
+                yield row
+            if count < chunk_size:
+                break
+
+    @staticmethod
+    def stream_csv(name, queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Sinh từng dòng CSV (kể cả dòng tiêu đề) để dùng với StreamingHttpResponse"""
+        writer = csv.writer(_Echo())
+        yield writer.writerow(ExportService.get_dataset(name)['columns'])
+        for row in ExportService.iter_rows(name, queryset, chunk_size):
+            yield writer.writerow(row)
+
+    @staticmethod
+    def write_csv(name, queryset, file_obj, chunk_size=DEFAULT_CHUNK_SIZE):
+        count = -1
+        for line in ExportService.stream_csv(name, queryset, chunk_size):
+            file_obj.write(line)
+            count += 1
+        return count
+
+    @staticmethod
+    def arrow_schema(name):
+        """Suy ra schema Arrow từ kiểu của các field trong model"""
+        import pyarrow as pa
+
+        types = {
+            'AutoField': pa.int64(), 'BigAutoField': pa.int64(), 'IntegerField': pa.int64(),
+            'BigIntegerField': pa.int64(), 'PositiveIntegerField': pa.int64(), 'SmallIntegerField': pa.int64(),
+            'FloatField': pa.float64(), 'BooleanField': pa.bool_(), 'DateField': pa.date32(),
+            'TimeField': pa.time64('us'), 'DateTimeField': pa.timestamp('us', tz='UTC'),
+        }
+        dataset = ExportService.get_dataset(name)
+        fields = []
+        for column in dataset['columns']:
+            field = ExportService._resolve_field(dataset['model'], column)
+            internal_type = field.get_internal_type()
+            if isinstance(field, (ForeignKey, OneToOneField)):
+                arrow_type = pa.int64()
+            elif internal_type == 'DecimalField':
+                arrow_type = pa.decimal128(field.max_digits, field.decimal_places)
+            else:
+                arrow_type = types.get(internal_type, pa.string())
+            fields.append(pa.field(column, arrow_type))
+        return pa.schema(fields)
+
+    @staticmethod
+    def _resolve_field(model, lookup):
+        parts = lookup.split('__')
+        for part in parts[:-1]:
+            model = model._meta.get_field(part).related_model
+        return model._meta.get_field(parts[-1])
+
+    @staticmethod
+    def write_columnar(name, queryset, path, file_format='parquet', chunk_size=DEFAULT_CHUNK_SIZE):
+        """Ghi file Parquet hoặc Arrow IPC theo từng record batch (cần cài pyarrow)"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportError("Cần cài đặt pyarrow để xuất dữ liệu dạng Parquet/Arrow")
+
+        schema = ExportService.arrow_schema(name)
+        if file_format == 'parquet':
+            writer = pq.ParquetWriter(path, schema, compression='snappy')
+        elif file_format == 'arrow':
+            writer = pa.ipc.new_file(path, schema)
+        else:
+            raise ExportError("Định dạng không hỗ trợ. Chọn parquet hoặc arrow")
+
+        count = 0
+        try:
+            batch = []
+            for row in ExportService.iter_rows(name, queryset, chunk_size):
+                batch.append(row)
+                if len(batch) >= chunk_size:
+                    writer.write_batch(ExportService._to_record_batch(schema, batch))
+                    count += len(batch)
+                    batch = []
+            if batch:
+                writer.write_batch(ExportService._to_record_batch(schema, batch))
+                count += len(batch)
+        finally:
+            writer.close()
+        return count
+
+    @staticmethod
+    def _to_record_batch(schema, rows):
+        import pyarrow as pa
+
+        columns = list(zip(*rows))
+        arrays = [pa.array(values, type=field.type) for values, field in zip(columns, schema)]
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
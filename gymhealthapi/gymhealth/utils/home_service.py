@@ -0,0 +1,228 @@
+import logging
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Q
+
+from gymhealth import serializers
+from gymhealth.models import WorkoutSession, SubscriptionPackage, Notification, HealthInfo
+
+logger = logging.getLogger(__name__)
+
+HOME_SECTIONS = ('user', 'subscription', 'notifications', 'schedule', 'health')
+# Các phần chỉ dành cho hội viên
+MEMBER_SECTIONS = ('subscription', 'health')
+# Số thông báo chưa đọc trả về trong màn hình chính (count vẫn là tổng số)
+HOME_UNREAD_LIMIT = 20
+
+DEFAULT_TIMEOUTS = {
+    'subscription': 300,
+    # Thông báo khuyến mãi được tạo bằng bulk_create (không có tín hiệu post_save) nên chỉ cache ngắn
+    'notifications': 30,
+    'schedule': 120,
+    'health': 600,
+}
+
+
+def _cache():
+    return caches[getattr(settings, 'HOME_CACHE', {}).get('ALIAS', 'default')]
+
+
+def _timeout(section):
+    return getattr(settings, 'HOME_CACHE', {}).get('TIMEOUTS', {}).get(section, DEFAULT_TIMEOUTS[section])
+
+
+def _cache_key(section, user_id):
+    key = f"home:{section}:{user_id}"
+    if section == 'schedule':
+        # Lịch thay đổi theo ngày (lịch hôm nay của PT, tuần hiện tại của hội viên)
+        key += f":{datetime.now().date().isoformat()}"
+    return key
+
+
+class HomeService:
+    """Dựng dữ liệu cho màn hình chính của app (Home/TrainerDashboard) trong một request, mỗi phần được cache riêng"""
+
+    @staticmethod
+    def default_sections(user):
+        if user.is_member:
+            return list(HOME_SECTIONS)
+        return [section for section in HOME_SECTIONS if section not in MEMBER_SECTIONS]
+
+    @staticmethod
+    def build(user, sections):
+        data = {}
+        for section in sections:
+            if section == 'user':
+                # Người dùng đã được nạp khi xác thực token, không cần cache riêng
+                data['user'] = serializers.UserSerializer(user).data
+            elif section in MEMBER_SECTIONS and not user.is_member:
+                data[section] = None
+            else:
+                data[section] = HomeService._cached(section, user)
+        return data
+
+    @staticmethod
+    def _cached(section, user):
+        key = _cache_key(section, user.pk)
+        try:
+            value = _cache().get(key)
+        except Exception:
+            logger.warning("Home cache is unavailable", exc_info=True)
+            return HomeService._build_section(section, user)
+        if value is not None:
+            # Phần không có dữ liệu được cache dưới dạng {'data': None}
+            return value['data']
+        value = HomeService._build_section(section, user)
+        try:
+            _cache().set(key, {'data': value}, _timeout(section))
+        except Exception:
+            logger.warning("Home cache is unavailable", exc_info=True)
+        return value
+
+    @staticmethod
+    def _build_section(section, user):
+        if section == 'subscription':
+            return HomeService.active_subscription(user)
+        if section == 'notifications':
+            return HomeService.unread_notifications(user)
+        if section == 'schedule':
+            if user.is_trainer:
+                return HomeService.today_schedule(user)
+            return HomeService.weekly_schedule(user)
+        if section == 'health':
+            health_info = HealthInfo.objects.filter(user=user).first()
+            return dict(serializers.HealthInfoSerializer(health_info).data) if health_info else None
+        raise ValueError(f"Unknown home section: {section}")
+
+    @staticmethod
+    def invalidate(user_id, *sections):
+        """Xóa cache các phần của màn hình chính khi dữ liệu của người dùng thay đổi"""
+        keys = [_cache_key(section, user_id) for section in sections or DEFAULT_TIMEOUTS]
+        try:
+            _cache().delete_many(keys)
+        except Exception:
+            logger.warning("Home cache is unavailable", exc_info=True)
+
+    @staticmethod
+    def invalidate_many(user_ids, *sections):
+        """Như invalidate cho nhiều người dùng (xóa thông báo hàng loạt), một lệnh delete_many"""
+        keys = [_cache_key(section, user_id) for user_id in set(user_ids) for section in sections or DEFAULT_TIMEOUTS]
+        if not keys:
+            return
+        try:
+            _cache().delete_many(keys)
+        except Exception:
+            logger.warning("Home cache is unavailable", exc_info=True)
+
+    @staticmethod
+    def active_subscription(user):
+        subscription = SubscriptionPackage.objects.filter(
+            member=user,
+            status='active',
+            start_date__lte=date.today(),
+            end_date__gte=date.today()
+        ).select_related(
+            'member', 'package__package_type', 'applied_promotion'
+        ).prefetch_related('package__benefits').order_by('-remaining_pt_sessions', '-created_at').first()
+        if subscription is None:
+            return None
+        return dict(serializers.SubscriptionPackageDetailSerializer(subscription).data)
+
+    @staticmethod
+    def unread_notifications(user, limit=HOME_UNREAD_LIMIT):
+        from gymhealth.utils.retention_service import live_cutoff
+
+        unread = Notification.objects.filter(user=user, created_at__gte=live_cutoff(), is_read=False)
+        notifications = list(unread.order_by('-created_at')[:limit])
+        for notification in notifications:
+            # Tất cả thông báo thuộc cùng người dùng: tránh truy vấn lại user cho từng thông báo
+            notification.user = user
+        return {
+            'count': unread.count() if len(notifications) == limit else len(notifications),
+            'results': serializers.NotificationSerializer(notifications, many=True).data,
+        }
+
+    @staticmethod
+    def weekly_schedule(user, week_offset=0, role=None, status_filter=None, request=None):
+        """
+        Lịch tập từ thứ 2 đến thứ 7 của tuần (week_offset so với tuần hiện tại), nhóm theo ngày.
+        request: áp dụng ?fields=/?omit=/?compact=1 của request cho từng buổi tập (không dùng khi cache)
+        """
+        today = datetime.now().date()
+        current_monday = today - timedelta(days=today.isoweekday() - 1)
+        monday = current_monday + timedelta(weeks=week_offset)
+        saturday = monday + timedelta(days=5)
+
+        queryset = WorkoutSession.objects.filter(
+            session_date__gte=monday,
+            session_date__lte=saturday
+        ).select_related(*serializers.WeeklyScheduleSerializer.related_for(request))
+
+        # Lọc theo người dùng
+        if role == 'trainer' and user.is_trainer:
+            queryset = queryset.filter(trainer=user)
+        elif role == 'member' and user.is_member:
+            queryset = queryset.filter(member=user)
+        elif not role:
+            # Mặc định sẽ lọc theo vai trò hiện tại của người dùng
+            if user.is_trainer:
+                queryset = queryset.filter(trainer=user)
+            elif user.is_member:
+                queryset = queryset.filter(member=user)
+
+        if status_filter and status_filter != 'all':
+            queryset = queryset.filter(status=status_filter)
+
+        queryset = queryset.order_by('session_date', 'start_time')
+
+        schedule_by_date = {}
+        for day_offset in range(6):  # Từ thứ 2 đến thứ 7
+            current_date = monday + timedelta(days=day_offset)
+            schedule_by_date[current_date.strftime('%Y-%m-%d')] = {
+                'day_of_week': current_date.isoweekday(),
+                'date': current_date,
+                'sessions': []
+            }
+
+        sessions = list(queryset)
+        data = serializers.WeeklyScheduleSerializer(sessions, many=True, context={'request': request}).data
+        # Nhóm theo ngày của đối tượng: session_date có thể không nằm trong các field được trả về
+        for session, item in zip(sessions, data):
+            date_key = session.session_date.strftime('%Y-%m-%d')
+            if date_key in schedule_by_date:
+                schedule_by_date[date_key]['sessions'].append(item)
+
+        return {
+            "week_info": {
+                "start_date": monday,
+                "end_date": saturday,
+                "week_offset": week_offset,
+                "current_week": week_offset == 0
+            },
+            "schedule": schedule_by_date
+        }
+
+    @staticmethod
+    def today_schedule(trainer):
+        """Lịch tập hôm nay của PT kèm thống kê nhanh theo trạng thái"""
+        today = datetime.now().date()
+        today_sessions = WorkoutSession.objects.filter(
+            trainer=trainer,
+            session_date=today
+        ).select_related('member').order_by('start_time')
+
+        summary = today_sessions.aggregate(
+            total=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            pending=Count('id', filter=Q(status='pending')),
+            confirmed=Count('id', filter=Q(status='confirmed')),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+        )
+
+        return {
+            "date": today,
+            "summary": summary,
+            "sessions": serializers.WorkoutSessionListScheduleSerializer(today_sessions, many=True).data
+        }
@@ -80,8 +80,8 @@ class MoMoService:
                 timeout=30
             )
 
-            logger.info(f"MoMo request: {data}")
-            logger.info(f"MoMo response: {response.json()}")
+            logger.info("MoMo create payment %s: HTTP %s", order_id, response.status_code)
+            logger.debug("MoMo request: %s, response: %s", data, response.text)
 
             return {
                 'success': True,
@@ -91,7 +91,7 @@ class MoMoService:
             }
 
         except Exception as e:
-            logger.error(f"MoMo payment request error: {str(e)}")
+            logger.error("MoMo payment request error: %s", e)
             return {
                 'success': False,
                 'error': str(e)
@@ -123,5 +123,5 @@ class MoMoService:
             return expected_signature == received_signature
 
         except Exception as e:
-            logger.error(f"MoMo signature verification error: {str(e)}")
+            logger.error("MoMo signature verification error: %s", e)
             return False
\ No newline at end of file
@@ -2,7 +2,10 @@ from django.utils import timezone
 from datetime import datetime, timedelta, date
 from django.core.mail import send_mail
 from django.conf import settings
-from gymhealth.models import Notification, WorkoutSession, SubscriptionPackage
+from django.db import transaction
+from gymhealth.models import Notification, WorkoutSession, SubscriptionPackage, SyncVersion, User
+from gymhealth.utils.home_service import HomeService
+from gymhealth.utils.realtime import publish_notifications
 import logging
 
 logger = logging.getLogger(__name__)
@@ -79,6 +82,88 @@ Cảm ơn bạn đã sử dụng dịch vụ của chúng tôi!"""
             logger.error(f"Error creating expiry reminder: {str(e)}")
             return None
 
+    @staticmethod
+    def create_promotion_notifications(promotion, chunk_size=2000):
+        """
+        Tạo thông báo ưu đãi mới cho tất cả hội viên theo từng khối (chạy trong Celery worker, không trong request
+        của admin) rồi đẩy thời gian thực. Hội viên đã có thông báo của promotion này được bỏ qua nên task chạy lại
+        không tạo trùng. Trả về số thông báo đã tạo.
+        """
+        message = f"""
+                <h3>Chúng tôi có ưu đãi mới dành cho bạn!</h3>
+                <p><strong>Tên ưu đãi:</strong> {promotion.title}</p>
+                <p><strong>Mô tả:</strong> {promotion.description}</p>
+                <p><strong>Mã giảm giá:</strong> <code>{promotion.promo_code}</code></p>
+                <p><strong>Hiệu lực từ:</strong> {promotion.valid_from.strftime('%d/%m/%Y %H:%M')}</p>
+                <p><strong>Hiệu lực đến:</strong> {promotion.valid_to.strftime('%d/%m/%Y %H:%M')}</p>
+                <p>Hãy sử dụng ngay để không bỏ lỡ cơ hội này!</p>
+                """
+        members = User.objects.filter(role='MEMBER').order_by('id').values_list('id', flat=True)
+        created_count = 0
+        last_id = 0
+        while True:
+            member_ids = list(members.filter(id__gt=last_id)[:chunk_size])
+            if not member_ids:
+                break
+            last_id = member_ids[-1]
+            promotion_notifications = Notification.objects.filter(
+                user_id__in=member_ids, notification_type='new_promotion', related_object_id=promotion.id)
+            notified = set(promotion_notifications.values_list('user_id', flat=True))
+
+            with transaction.atomic():
+                # bulk_create không gọi save(): cả khối dùng chung một phiên bản đồng bộ
+                sync_version = SyncVersion.allocate()
+                Notification.objects.bulk_create([
+                    Notification(
+                        user_id=member_id,
+                        title=f"Ưu đãi mới: {promotion.title}",
+                        message=message,
+                        notification_type='new_promotion',
+                        related_object_id=promotion.id,
+                        sent=True,
+                        sync_version=sync_version,
+                    )
+                    for member_id in member_ids if member_id not in notified
+                ])
+                # MySQL không trả về id sau bulk_create: đọc lại để payload đẩy cho client có id
+                notifications = list(promotion_notifications.filter(sync_version=sync_version))
+                publish_notifications(notifications)
+            created_count += len(notifications)
+
+        logger.info(f"Created {created_count} promotion notifications for promotion {promotion.id}")
+        return created_count
+
+    @staticmethod
+    def delete(queryset):
+        """
+        Xóa các thông báo trong queryset (trang quản trị) bằng một lệnh DELETE, ghi tombstone đồng bộ theo lô
+        và xóa cache màn hình chính một lần cho mỗi người nhận. Trả về số thông báo đã xóa.
+        """
+        rows = list(queryset.values_list('id', 'user_id', 'created_at'))
+        if not rows:
+            return 0
+        with transaction.atomic():
+            count, _ = Notification.objects.filter(id__in=[row[0] for row in rows]).delete()
+            NotificationService.on_deleted(rows)
+        return count
+
+    @staticmethod
+    def on_deleted(rows):
+        """
+        Cập nhật dữ liệu phụ thuộc sau khi xóa thông báo (gọi trong transaction xóa);
+        rows: các bộ (id thông báo, id người nhận, created_at)
+        """
+        from gymhealth.utils.retention_service import live_cutoff
+        from gymhealth.utils.sync_service import SyncService
+
+        # API đồng bộ chỉ trả về thông báo mới hơn live_cutoff(): app không giữ thông báo cũ hơn nên không cần tombstone
+        cutoff = live_cutoff()
+        SyncService.record_deletions('notifications', [
+            (notification_id, [user_id]) for notification_id, user_id, created_at in rows if created_at >= cutoff
+        ])
+        user_ids = {user_id for _, user_id, _ in rows}
+        transaction.on_commit(lambda: HomeService.invalidate_many(user_ids, 'notifications'))
+
     @staticmethod
     def check_and_create_session_reminders():
         """Kiểm tra và tạo thông báo cho các buổi tập sắp tới (2 tiếng)"""
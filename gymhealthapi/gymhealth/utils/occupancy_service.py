@@ -0,0 +1,168 @@
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from gymhealth.models import Gym, SlotOccupancy, WorkoutSession
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Sức chứa của phòng tập chưa khai báo floor_capacity (None: không giới hạn)
+    'DEFAULT_CAPACITY': None,
+    # Giờ mở cửa: khung giờ đầu tiên và khung giờ sau khung cuối cùng
+    'OPENING_HOURS': (5, 24),
+    # Số ngày tới được đối soát lại bộ đếm từ bảng buổi tập
+    'REBUILD_DAYS_AHEAD': 31,
+    # Giờ của buổi tập được lưu theo giờ địa phương của phòng tập
+    'TIMEZONE': 'Asia/Ho_Chi_Minh',
+}
+
+# Buổi tự tập ở các trạng thái này đang giữ chỗ trong phòng tập
+COUNTED_STATUSES = ('pending', 'confirmed', 'completed')
+
+
+class _SlotFull(Exception):
+    pass
+
+
+def occupancy_setting(name):
+    return getattr(settings, 'GYM_OCCUPANCY', {}).get(name, DEFAULTS[name])
+
+
+def slot_hours(start_time, end_time):
+    """Các khung giờ (giờ bắt đầu) mà buổi tập [start_time, end_time) đi qua, vd: 18:30-19:30 -> [18, 19]"""
+    end_minutes = end_time.hour * 60 + end_time.minute + (1 if end_time.second or end_time.microsecond else 0)
+    return list(range(start_time.hour, (end_minutes + 59) // 60))
+
+
+class OccupancyService:
+    """
+    Giới hạn số hội viên tự tập trong từng khung giờ của phòng tập. Mỗi (phòng tập, ngày, giờ) là một dòng đếm;
+    đặt lịch tăng bộ đếm bằng một lệnh UPDATE ... WHERE count < sức chứa nên hai request đồng thời
+    không thể cùng lấy chỗ cuối cùng.
+    """
+
+    @staticmethod
+    def default_gym():
+        return Gym.objects.order_by('id').first()
+
+    @staticmethod
+    def capacity(gym):
+        if gym is None:
+            return None
+        return gym.floor_capacity if gym.floor_capacity is not None else occupancy_setting('DEFAULT_CAPACITY')
+
+    @staticmethod
+    def counts(session):
+        return (session.session_type == 'self_training' and session.gym_id is not None
+                and session.status in COUNTED_STATUSES)
+
+    @staticmethod
+    def reserve_many(gym, days, start_time, end_time):
+        """
+        Giữ chỗ cho buổi tự tập [start_time, end_time) ở các ngày trong days; trả về tập các ngày giữ chỗ được.
+        Phải gọi trong transaction tạo buổi tập để chỗ được trả lại nếu tạo buổi tập thất bại.
+        """
+        capacity = OccupancyService.capacity(gym)
+        if capacity is None:
+            return set(days)
+        hours = slot_hours(start_time, end_time)
+        SlotOccupancy.objects.bulk_create([
+            SlotOccupancy(gym=gym, date=day, hour=hour) for day in days for hour in hours
+        ], ignore_conflicts=True)
+
+        reserved = set()
+        for day in sorted(days):
+            try:
+                # Savepoint: ngày có một khung giờ đã đầy không giữ chỗ ở các khung giờ còn lại
+                with transaction.atomic():
+                    updated = SlotOccupancy.objects.filter(
+                        gym=gym, date=day, hour__in=hours, count__lt=capacity
+                    ).update(count=F('count') + 1)
+                    if updated != len(hours):
+                        raise _SlotFull
+            except _SlotFull:
+                continue
+            reserved.add(day)
+        return reserved
+
+    @staticmethod
+    def reserve(gym, session_date, start_time, end_time):
+        return session_date in OccupancyService.reserve_many(gym, [session_date], start_time, end_time)
+
+    @staticmethod
+    def release(session):
+        """Trả lại chỗ của buổi tự tập bị xóa hoặc hủy"""
+        if not OccupancyService.counts(session):
+            return
+        SlotOccupancy.objects.filter(
+            gym_id=session.gym_id, date=session.session_date,
+            hour__in=slot_hours(session.start_time, session.end_time), count__gt=0,
+        ).update(count=F('count') - 1)
+
+    @staticmethod
+    def occupancy(gym, day):
+        """Số người đã đặt, sức chứa và số chỗ còn lại của từng khung giờ mở cửa trong ngày (một truy vấn)"""
+        capacity = OccupancyService.capacity(gym)
+        booked = dict(SlotOccupancy.objects.filter(gym=gym, date=day).values_list('hour', 'count'))
+        first_hour, last_hour = occupancy_setting('OPENING_HOURS')
+        slots = []
+        for hour in range(first_hour, last_hour):
+            count = booked.get(hour, 0)
+            slots.append({
+                'hour': hour,
+                'start_time': time(hour),
+                'booked': count,
+                'capacity': capacity,
+                'available': None if capacity is None else max(capacity - count, 0),
+                'is_full': capacity is not None and count >= capacity,
+            })
+        return slots
+
+    @staticmethod
+    def rebuild(date_from=None, date_to=None):
+        """
+        Đối soát bộ đếm với bảng buổi tập (sau khi sửa buổi tập trong trang quản trị hoặc dữ liệu nhập ngoài API).
+        Các dòng đếm trong khoảng ngày bị khóa trong lúc tính lại. Trả về số dòng đếm đã thay đổi.
+        """
+        date_from = date_from or date.today()
+        date_to = date_to or date_from + timedelta(days=occupancy_setting('REBUILD_DAYS_AHEAD'))
+
+        with transaction.atomic():
+            existing = {
+                (row.gym_id, row.date, row.hour): row
+                for row in SlotOccupancy.objects.select_for_update().filter(date__range=(date_from, date_to))
+            }
+            expected = defaultdict(int)
+            sessions = WorkoutSession.objects.filter(
+                session_type='self_training', gym__isnull=False, status__in=COUNTED_STATUSES,
+                session_date__range=(date_from, date_to),
+            ).values_list('gym_id', 'session_date', 'start_time', 'end_time')
+            for gym_id, session_date, start_time, end_time in sessions.iterator(chunk_size=5000):
+                for hour in slot_hours(start_time, end_time):
+                    expected[(gym_id, session_date, hour)] += 1
+
+            changed, created = [], []
+            for key, row in existing.items():
+                count = expected.pop(key, 0)
+                if row.count != count:
+                    row.count = count
+                    changed.append(row)
+            for (gym_id, session_date, hour), count in expected.items():
+                created.append(SlotOccupancy(gym_id=gym_id, date=session_date, hour=hour, count=count))
+            SlotOccupancy.objects.bulk_update(changed, ['count'], batch_size=1000)
+            SlotOccupancy.objects.bulk_create(created, batch_size=1000, ignore_conflicts=True)
+
+        if changed or created:
+            logger.info("Rebuilt gym occupancy %s..%s: %d corrected, %d created",
+                        date_from, date_to, len(changed), len(created))
+        return len(changed) + len(created)
+
+    @staticmethod
+    def local_now():
+        return datetime.now(ZoneInfo(occupancy_setting('TIMEZONE')))
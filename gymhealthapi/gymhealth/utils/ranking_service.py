@@ -0,0 +1,181 @@
+import logging
+import math
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Avg, Count
+from django.utils import timezone
+
+from gymhealth.models import TrainerProfile, TrainerRating, WorkoutSession
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Điểm Bayes: đánh giá trung bình được kéo về PRIOR_MEAN như thể PT đã có thêm PRIOR_COUNT đánh giá,
+    # PT mới có một vài đánh giá 5 sao không vượt PT có hàng trăm đánh giá 4.8
+    'PRIOR_MEAN': 3.5,
+    'PRIOR_COUNT': 5,
+    # Số buổi đã hoàn thành để đạt điểm kinh nghiệm tối đa (thang log)
+    'COMPLETED_SESSIONS_CAP': 200,
+    # Số buổi tối đa một PT nhận trong 7 ngày tới (để tính mức độ còn trống lịch)
+    'WEEKLY_CAPACITY': 40,
+    # Giá theo giờ mà điểm giá còn 0.5
+    'PRICE_REFERENCE': 500000,
+    'WEIGHTS': {'rating': 0.5, 'sessions': 0.2, 'availability': 0.15, 'price': 0.15},
+    'BATCH_SIZE': 500,
+    # Thay đổi của một PT được gom lại: điểm được tính lại (Celery) sau REFRESH_DELAY giây kể từ thay đổi đầu tiên
+    'REFRESH_DELAY': 60,
+    # Cache dùng chung giữa các tiến trình để đánh dấu PT đã có lần tính lại đang chờ
+    'ALIAS': 'default',
+}
+
+
+def ranking_setting(name):
+    return getattr(settings, 'TRAINER_RANKING', {}).get(name, DEFAULTS[name])
+
+
+def _pending_cache():
+    return caches[ranking_setting('ALIAS')]
+
+
+def _pending_key(trainer_id):
+    return f'trainer-rank-refresh:{trainer_id}'
+
+
+VERSION_KEY = 'trainer-rank-version'
+
+
+class TrainerRankingService:
+    """
+    Điểm xếp hạng PT (0-100) lưu sẵn trong TrainerProfile.rank_score: kết hợp đánh giá (Bayes), số buổi đã hoàn thành,
+    mức độ còn trống lịch 7 ngày tới và giá. Danh sách PT sắp xếp theo cột này mà không cần tổng hợp mỗi request.
+    """
+
+    @staticmethod
+    def score(rating_average, rating_count, completed_sessions, booked_next_7_days, hourly_rate):
+        prior_mean, prior_count = ranking_setting('PRIOR_MEAN'), ranking_setting('PRIOR_COUNT')
+        bayesian = (rating_average * rating_count + prior_mean * prior_count) / (rating_count + prior_count)
+        components = {
+            'rating': (bayesian - 1) / 4,
+            'sessions': min(math.log1p(completed_sessions) / math.log1p(ranking_setting('COMPLETED_SESSIONS_CAP')), 1),
+            'availability': 1 - min(booked_next_7_days / ranking_setting('WEEKLY_CAPACITY'), 1),
+            'price': 1 / (1 + float(hourly_rate or 0) / ranking_setting('PRICE_REFERENCE')),
+        }
+        weights = ranking_setting('WEIGHTS')
+        return round(100 * sum(weights[name] * value for name, value in components.items()) / sum(weights.values()), 4)
+
+    @staticmethod
+    def refresh(trainer_ids=None):
+        """
+        Tính lại điểm của các PT trong trainer_ids (None: tất cả) bằng ba truy vấn tổng hợp cho mỗi lô
+        và một lệnh bulk_update. Trả về số hồ sơ đã cập nhật.
+        """
+        profiles = TrainerProfile.objects.only('id', 'user_id', 'hourly_rate').order_by('id')
+        if trainer_ids is not None:
+            trainer_ids = {trainer_id for trainer_id in trainer_ids if trainer_id}
+            if not trainer_ids:
+                return 0
+            profiles = profiles.filter(user_id__in=trainer_ids)
+
+        today = date.today()
+        batch_size = ranking_setting('BATCH_SIZE')
+        count = 0
+        last_id = 0
+        while True:
+            batch = list(profiles.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            user_ids = [profile.user_id for profile in batch]
+
+            ratings = {row['trainer_id']: row for row in TrainerRating.objects.filter(
+                trainer_id__in=user_ids).values('trainer_id').annotate(average=Avg('score'), count=Count('id'))}
+            completed = dict(WorkoutSession.objects.filter(
+                trainer_id__in=user_ids, status='completed'
+            ).values('trainer_id').annotate(count=Count('id')).values_list('trainer_id', 'count'))
+            booked = dict(WorkoutSession.objects.filter(
+                trainer_id__in=user_ids, status__in=['pending', 'confirmed'],
+                session_date__range=(today, today + timedelta(days=6)),
+            ).values('trainer_id').annotate(count=Count('id')).values_list('trainer_id', 'count'))
+
+            now = timezone.now()
+            for profile in batch:
+                rating = ratings.get(profile.user_id)
+                profile.rating_average = round(rating['average'], 2) if rating else 0
+                profile.rating_count = rating['count'] if rating else 0
+                profile.completed_sessions = completed.get(profile.user_id, 0)
+                profile.booked_next_7_days = booked.get(profile.user_id, 0)
+                profile.rank_score = TrainerRankingService.score(
+                    profile.rating_average, profile.rating_count, profile.completed_sessions,
+                    profile.booked_next_7_days, profile.hourly_rate)
+                profile.rank_updated_at = now
+            # bulk_update không phát tín hiệu post_save của hồ sơ PT (không đánh chỉ mục tìm kiếm lại)
+            TrainerProfile.objects.bulk_update(batch, [
+                'rating_average', 'rating_count', 'completed_sessions', 'booked_next_7_days',
+                'rank_score', 'rank_updated_at',
+            ])
+            count += len(batch)
+        if count:
+            TrainerRankingService.bump_version()
+        return count
+
+    @staticmethod
+    def bump_version():
+        """Đánh dấu điểm đã được tính lại: các tiến trình nạp lại dữ liệu suy ra từ TrainerProfile (gợi ý PT)"""
+        try:
+            _pending_cache().set(VERSION_KEY, time.time_ns(), None)
+        except Exception:
+            logger.warning("Could not publish trainer ranking version", exc_info=True)
+
+    @staticmethod
+    def version():
+        """Phiên bản của lần tính điểm gần nhất; None khi cache không có hoặc không dùng được"""
+        try:
+            return _pending_cache().get(VERSION_KEY)
+        except Exception:
+            return None
+
+    @staticmethod
+    def schedule_refresh(*trainer_ids):
+        """
+        Hẹn tính lại điểm của các PT (task Celery, sau REFRESH_DELAY giây) khi transaction hiện tại commit.
+        Request không tính lại điểm; mỗi PT chỉ có một lần tính lại đang chờ, các thay đổi tiếp theo trong
+        khoảng đó được gộp vào lần này. Lần chạy định kỳ hằng đêm vẫn tính lại toàn bộ.
+        """
+        trainer_ids = {trainer_id for trainer_id in trainer_ids if trainer_id}
+        if not trainer_ids:
+            return
+
+        def dispatch():
+            from gymhealth.tasks import refresh_trainer_rankings
+            delay = ranking_setting('REFRESH_DELAY')
+            try:
+                cache = _pending_cache()
+                # Dấu hết hạn sau vài lần REFRESH_DELAY: nếu task bị mất, thay đổi sau đó vẫn hẹn được lần mới
+                pending = [trainer_id for trainer_id in sorted(trainer_ids)
+                           if cache.add(_pending_key(trainer_id), 1, delay * 10)]
+            except Exception:
+                logger.warning("Ranking refresh cache unavailable, refreshing %s without debounce", trainer_ids,
+                               exc_info=True)
+                pending = sorted(trainer_ids)
+            if not pending:
+                return
+            try:
+                refresh_trainer_rankings.apply_async(args=[pending], countdown=delay)
+            except Exception:
+                # Điểm xếp hạng sẽ được tính lại trong lần chạy định kỳ
+                logger.warning("Could not schedule trainer ranking refresh for %s", pending, exc_info=True)
+                TrainerRankingService.clear_pending(pending)
+
+        transaction.on_commit(dispatch)
+
+    @staticmethod
+    def clear_pending(trainer_ids):
+        """Bỏ đánh dấu đang chờ để thay đổi sau thời điểm này hẹn một lần tính lại mới"""
+        try:
+            _pending_cache().delete_many([_pending_key(trainer_id) for trainer_id in trainer_ids])
+        except Exception:
+            logger.warning("Could not clear pending ranking refresh for %s", trainer_ids, exc_info=True)
@@ -0,0 +1,214 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'gymhealth:notifications:'
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """Hàng đợi nhận tin nhắn của một kết nối (WebSocket/SSE), gắn với event loop của kết nối đó"""
+
+    def __init__(self, backplane, user_id, maxsize=SUBSCRIPTION_QUEUE_SIZE):
+        self.backplane = backplane
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def push(self, message):
+        # publish có thể được gọi từ thread khác (view đồng bộ, thread pool của ASGI)
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # Event loop đã đóng: kết nối đã kết thúc
+            self.close()
+
+    def _put(self, message):
+        if self.queue.full():
+            # Client đọc quá chậm: bỏ tin cũ nhất, client có thể tải lại qua API /notifications/
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.backplane.unsubscribe(self)
+
+
+class InMemoryBackplane:
+    """
+    Phân phối tin nhắn trong cùng một tiến trình. Dùng cho môi trường phát triển và kiểm thử
+    (history lưu các tin đã publish); không nhận được tin từ Celery worker hay tiến trình khác.
+    """
+
+    def __init__(self, history_size=100):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self.history = deque(maxlen=history_size)
+
+    def publish(self, user_id, message):
+        self.history.append((user_id, message))
+        self._deliver(user_id, message)
+
+    def publish_many(self, messages):
+        for user_id, message in messages:
+            self.publish(user_id, message)
+
+    def _deliver(self, user_id, message):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.push(message)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self, user_id=None):
+        with self._lock:
+            if user_id is not None:
+                return len(self._subscribers.get(user_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+class RedisBackplane(InMemoryBackplane):
+    """
+    Publish qua Redis pub/sub để tin nhắn từ mọi tiến trình (web, Celery worker) đến được client.
+    Mỗi tiến trình ASGI chỉ mở một kết nối PSUBSCRIBE rồi tự phân phối cho các kết nối của từng user.
+    """
+
+    def __init__(self, url, history_size=100):
+        super().__init__(history_size)
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("Cần cài đặt redis để dùng REALTIME_BACKPLANE = 'redis'")
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+        self._listeners = {}
+
+    def publish(self, user_id, message):
+        self.history.append((user_id, message))
+        self._client.publish(f"{CHANNEL_PREFIX}{user_id}", json.dumps(message, cls=DjangoJSONEncoder))
+
+    def publish_many(self, messages):
+        # Một lượt gửi tới Redis cho cả đợt (vd: thông báo khuyến mãi cho mọi hội viên)
+        pipeline = self._client.pipeline(transaction=False)
+        for user_id, message in messages:
+            self.history.append((user_id, message))
+            pipeline.publish(f"{CHANNEL_PREFIX}{user_id}", json.dumps(message, cls=DjangoJSONEncoder))
+        pipeline.execute()
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        loop = subscription.loop
+        listener = self._listeners.get(loop)
+        if listener is None or listener.done():
+            self._listeners[loop] = loop.create_task(self._listen())
+        return subscription
+
+    async def _listen(self):
+        import redis.asyncio as aioredis
+
+        client = aioredis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+        try:
+            async for item in pubsub.listen():
+                if item.get('type') != 'pmessage':
+                    continue
+                try:
+                    channel = item['channel'].decode() if isinstance(item['channel'], bytes) else item['channel']
+                    user_id = int(channel[len(CHANNEL_PREFIX):])
+                    message = json.loads(item['data'])
+                except (ValueError, TypeError):
+                    logger.warning("Invalid realtime message on %s", item.get('channel'))
+                    continue
+                self._deliver(user_id, message)
+        finally:
+            await pubsub.close()
+            await client.close()
+
+
+_backplane = None
+_backplane_lock = threading.Lock()
+
+
+def get_backplane():
+    global _backplane
+    if _backplane is None:
+        with _backplane_lock:
+            if _backplane is None:
+                backend = getattr(settings, 'REALTIME_BACKPLANE', 'memory')
+                if backend == 'redis':
+                    url = getattr(settings, 'REALTIME_REDIS_URL', None) or settings.CELERY_BROKER_URL
+                    _backplane = RedisBackplane(url)
+                elif backend == 'memory':
+                    _backplane = InMemoryBackplane()
+                else:
+                    raise ImproperlyConfigured(f"REALTIME_BACKPLANE không hợp lệ: {backend}")
+    return _backplane
+
+
+def set_backplane(backplane):
+    """Thay backplane đang dùng (vd: InMemoryBackplane trong kiểm thử)"""
+    global _backplane
+    _backplane = backplane
+
+
+def notification_payload(notification):
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'notification_type': notification.notification_type,
+        'related_object_id': notification.related_object_id,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at,
+    }
+
+
+def _publish(messages):
+    # Lỗi đẩy tin không được làm hỏng request: client vẫn có thể tải thông báo qua API
+    try:
+        backplane = get_backplane()
+    except ImproperlyConfigured:
+        logger.exception("Realtime backplane is not available")
+        return
+    try:
+        if len(messages) == 1:
+            backplane.publish(*messages[0])
+        else:
+            backplane.publish_many(messages)
+    except Exception:
+        logger.exception("Failed to publish %d realtime notifications", len(messages))
+
+
+def publish_notifications(notifications):
+    """Đẩy thông báo tới client sau khi transaction hiện tại commit thành công"""
+    messages = [
+        (notification.user_id, json.loads(json.dumps(notification_payload(notification), cls=DjangoJSONEncoder)))
+        for notification in notifications
+    ]
+    if messages:
+        transaction.on_commit(lambda: _publish(messages))
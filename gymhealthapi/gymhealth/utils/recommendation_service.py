@@ -0,0 +1,264 @@
+import logging
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+
+from gymhealth.models import HealthInfo, TrainerProfile, TrainingProgress, TrainerFeatureSnapshot
+from gymhealth.utils.ranking_service import TrainerRankingService, ranking_setting
+from gymhealth.utils.search_service import fold
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+GOALS = [goal for goal, _ in HealthInfo.GOAL_CHOICES]
+
+# Từ khóa (đã bỏ dấu) trong chuyên môn của PT phù hợp với từng mục tiêu tập luyện
+GOAL_KEYWORDS = {
+    'weight_loss': ('giam can', 'dot mo', 'cardio', 'hiit', 'weight loss', 'fat loss'),
+    'muscle_gain': ('tang co', 'the hinh', 'bodybuilding', 'powerlifting', 'strength', 'suc manh'),
+    'endurance': ('suc ben', 'cardio', 'chay bo', 'running', 'crossfit', 'hiit', 'boxing'),
+    'flexibility': ('yoga', 'pilates', 'gian co', 'linh hoat', 'stretching', 'phuc hoi'),
+    'general_fitness': ('the luc', 'fitness', 'functional', 'tong quat', 'phuc hoi', 'boxing'),
+}
+
+COLUMNS = ([f'specialization_{goal}' for goal in GOALS] + [f'outcome_{goal}' for goal in GOALS]
+           + ['rating', 'capacity'])
+CAPACITY_COLUMN = COLUMNS.index('capacity')
+
+DEFAULTS = {
+    'WEIGHTS': {'specialization': 0.35, 'outcome': 0.25, 'rating': 0.25, 'capacity': 0.15},
+    # Kết quả tập (mức thay đổi chỉ số) được kéo về 0.5 như thể PT có thêm số học viên này
+    'OUTCOME_PRIOR_COUNT': 3,
+    # Mức thay đổi tương đối của chỉ số (vd. giảm 10% cân nặng) được coi là kết quả tốt nhất
+    'OUTCOME_CAP': 0.1,
+    'KEEP_SNAPSHOTS': 7,
+    'LIMIT': 10,
+    'MAX_LIMIT': 50,
+}
+
+
+def recommendation_setting(name):
+    return getattr(settings, 'TRAINER_RECOMMENDATION', {}).get(name, DEFAULTS[name])
+
+
+def _relative_change(first, last, decrease=False):
+    if first is None or last is None or not first:
+        return None
+    change = (last - first) / abs(first)
+    return -change if decrease else change
+
+
+def goal_outcome(goal, first, last):
+    """Mức tiến bộ (tương đối) của hội viên theo mục tiêu, từ bản ghi tiến độ đầu tiên tới cuối cùng với một PT"""
+    if goal == 'weight_loss':
+        return _relative_change(first['weight'], last['weight'], decrease=True)
+    if goal == 'muscle_gain':
+        return _relative_change(first['muscle_mass'], last['muscle_mass'])
+    if goal == 'endurance':
+        return _relative_change(first['cardio_endurance'], last['cardio_endurance'])
+    # Linh hoạt / thể lực tổng quát: không có chỉ số riêng, dùng tỷ lệ mỡ
+    return _relative_change(first['body_fat_percentage'], last['body_fat_percentage'], decrease=True)
+
+
+def specialization_features(specialization):
+    text = f" {fold(specialization)} "
+    return [1.0 if any(keyword in text for keyword in GOAL_KEYWORDS[goal]) else 0.0 for goal in GOALS]
+
+
+class _LoadedSnapshot:
+    """Snapshot đặc trưng đã nạp vào bộ nhớ của process (chỉ nạp lại khi có snapshot mới)"""
+    lock = threading.Lock()
+    snapshot_id = None
+    trainer_ids = None
+    matrix = None
+    # Mức độ trống lịch theo thứ tự của capacity_ids, nạp lại khi điểm xếp hạng được tính lại (capacity_version đổi)
+    capacity_ids = None
+    capacity_version = None
+    capacity = None
+
+
+class RecommendationService:
+    """
+    Gợi ý PT cho hội viên. Đặc trưng của từng PT được tính hằng đêm thành ma trận (build_snapshot); khi có request,
+    điểm của mọi PT là tích vô hướng của ma trận với vector trọng số theo mục tiêu tập của hội viên.
+    """
+
+    @staticmethod
+    def outcome_features(trainer_ids):
+        """Kết quả tập trung bình (0-1) của học viên theo từng mục tiêu, cho mỗi PT: {trainer_id: [theo GOALS]}"""
+        cap = recommendation_setting('OUTCOME_CAP')
+        prior_count = recommendation_setting('OUTCOME_PRIOR_COUNT')
+        sums = defaultdict(lambda: defaultdict(float))
+        counts = defaultdict(lambda: defaultdict(int))
+
+        rows = TrainingProgress.objects.filter(
+            workout_session__trainer_id__in=trainer_ids
+        ).order_by('health_info_id', 'workout_session__trainer_id', 'created_at').values_list(
+            'health_info_id', 'health_info__training_goal', 'workout_session__trainer_id',
+            'weight', 'muscle_mass', 'cardio_endurance', 'body_fat_percentage',
+        )
+
+        def finish(key, goal, first, last):
+            if first is None or first is last:
+                return
+            outcome = goal_outcome(goal, first, last)
+            if outcome is None:
+                return
+            trainer_id = key[1]
+            # Chuẩn hóa về 0-1: 0.5 là không đổi, 1 là đạt mức OUTCOME_CAP
+            sums[trainer_id][goal] += (max(-cap, min(outcome, cap)) + cap) / (2 * cap)
+            counts[trainer_id][goal] += 1
+
+        current_key, current_goal, first, last = None, None, None, None
+        for health_info_id, goal, trainer_id, weight, muscle_mass, cardio, body_fat in rows.iterator(chunk_size=5000):
+            record = {'weight': weight, 'muscle_mass': muscle_mass, 'cardio_endurance': cardio,
+                      'body_fat_percentage': body_fat}
+            key = (health_info_id, trainer_id)
+            if key != current_key:
+                finish(current_key, current_goal, first, last)
+                current_key, current_goal, first = key, goal, record
+            last = record
+        finish(current_key, current_goal, first, last)
+
+        return {
+            trainer_id: [
+                (sums[trainer_id][goal] + 0.5 * prior_count) / (counts[trainer_id][goal] + prior_count)
+                for goal in GOALS
+            ] for trainer_id in trainer_ids
+        }
+
+    @staticmethod
+    def capacity(booked_next_7_days):
+        return 1 - min(booked_next_7_days / ranking_setting('WEEKLY_CAPACITY'), 1)
+
+    @staticmethod
+    def build_snapshot():
+        """Tính đặc trưng của tất cả PT đang hoạt động và lưu thành snapshot mới (chạy hằng đêm)"""
+        profiles = list(TrainerProfile.objects.filter(user__is_active=True, user__role='TRAINER').order_by(
+            'user_id').values_list('user_id', 'specialization', 'rating_average', 'rating_count',
+                                   'booked_next_7_days'))
+        trainer_ids = [row[0] for row in profiles]
+        outcomes = RecommendationService.outcome_features(trainer_ids)
+        prior_mean, prior_count = ranking_setting('PRIOR_MEAN'), ranking_setting('PRIOR_COUNT')
+
+        features = array('f')
+        for trainer_id, specialization, rating_average, rating_count, booked in profiles:
+            bayesian = (rating_average * rating_count + prior_mean * prior_count) / (rating_count + prior_count)
+            features.extend(specialization_features(specialization))
+            features.extend(outcomes[trainer_id])
+            features.append((bayesian - 1) / 4)
+            features.append(RecommendationService.capacity(booked))
+
+        snapshot = TrainerFeatureSnapshot.objects.create(
+            columns=COLUMNS, trainer_ids=array('q', trainer_ids).tobytes(), features=features.tobytes(),
+            trainer_count=len(trainer_ids),
+        )
+        keep = TrainerFeatureSnapshot.objects.order_by('-id').values_list('id', flat=True)[
+               :recommendation_setting('KEEP_SNAPSHOTS')]
+        TrainerFeatureSnapshot.objects.exclude(id__in=list(keep)).delete()
+        logger.info("Built trainer feature snapshot %s for %d trainers", snapshot.pk, len(trainer_ids))
+        return snapshot
+
+    @staticmethod
+    def load_snapshot():
+        """(id PT, ma trận đặc trưng) của snapshot mới nhất; None khi chưa có snapshot"""
+        latest_id = TrainerFeatureSnapshot.objects.order_by('-id').values_list('id', flat=True).first()
+        if latest_id is None:
+            return None
+        with _LoadedSnapshot.lock:
+            if _LoadedSnapshot.snapshot_id != latest_id:
+                snapshot = TrainerFeatureSnapshot.objects.get(pk=latest_id)
+                if snapshot.columns != COLUMNS:
+                    logger.warning("Trainer feature snapshot %s has outdated columns", latest_id)
+                    return None
+                trainer_ids = array('q')
+                trainer_ids.frombytes(bytes(snapshot.trainer_ids))
+                features = array('f')
+                features.frombytes(bytes(snapshot.features))
+                width = len(COLUMNS)
+                if np is not None:
+                    matrix = np.frombuffer(features, dtype=np.float32).reshape(len(trainer_ids), width).copy()
+                else:
+                    matrix = [features[index * width:(index + 1) * width] for index in range(len(trainer_ids))]
+                _LoadedSnapshot.snapshot_id = latest_id
+                _LoadedSnapshot.trainer_ids = list(trainer_ids)
+                _LoadedSnapshot.matrix = matrix
+            return _LoadedSnapshot.trainer_ids, _LoadedSnapshot.matrix
+
+    @staticmethod
+    def load_capacity(trainer_ids):
+        """
+        Mức độ trống lịch của các PT trong snapshot, từ TrainerProfile.booked_next_7_days. Chỉ đọc DB khi điểm xếp hạng
+        vừa được tính lại (TrainerRankingService.version đổi); khi cache không dùng được, nạp lại sau mỗi
+        REFRESH_DELAY giây.
+        """
+        version = TrainerRankingService.version()
+        if version is None:
+            version = ('interval', int(time.monotonic() // ranking_setting('REFRESH_DELAY')))
+        with _LoadedSnapshot.lock:
+            if _LoadedSnapshot.capacity_ids is not trainer_ids or _LoadedSnapshot.capacity_version != version:
+                booked = dict(TrainerProfile.objects.filter(user_id__in=trainer_ids).values_list(
+                    'user_id', 'booked_next_7_days'))
+                capacity = [RecommendationService.capacity(booked.get(trainer_id, 0)) for trainer_id in trainer_ids]
+                _LoadedSnapshot.capacity = np.asarray(capacity, dtype=np.float32) if np is not None else capacity
+                _LoadedSnapshot.capacity_ids = trainer_ids
+                _LoadedSnapshot.capacity_version = version
+            return _LoadedSnapshot.capacity
+
+    @staticmethod
+    def query_vector(goal):
+        weights = recommendation_setting('WEIGHTS')
+        vector = [0.0] * len(COLUMNS)
+        vector[COLUMNS.index(f'specialization_{goal}')] = weights['specialization']
+        vector[COLUMNS.index(f'outcome_{goal}')] = weights['outcome']
+        vector[COLUMNS.index('rating')] = weights['rating']
+        vector[CAPACITY_COLUMN] = weights['capacity']
+        return vector
+
+    @staticmethod
+    def recommend(member, limit=None):
+        """
+        [(trainer_id, điểm, các thành phần điểm)] theo điểm giảm dần cho mục tiêu tập của hội viên.
+        Mức độ trống lịch lấy từ TrainerProfile.booked_next_7_days (load_capacity), không dùng giá trị trong snapshot.
+        """
+        goal = HealthInfo.objects.filter(user=member).values_list('training_goal', flat=True).first()
+        if goal not in GOALS:
+            raise ValueError("Bạn cần cập nhật mục tiêu tập luyện trong thông tin sức khỏe")
+        loaded = RecommendationService.load_snapshot()
+        if loaded is None:
+            return goal, []
+        trainer_ids, matrix = loaded
+        limit = limit or recommendation_setting('LIMIT')
+
+        capacity = RecommendationService.load_capacity(trainer_ids)
+        vector = RecommendationService.query_vector(goal)
+        # Cột trống lịch của snapshot không được dùng: điểm = ma trận x trọng số (trừ cột đó) + trọng số x capacity
+        capacity_weight, vector[CAPACITY_COLUMN] = vector[CAPACITY_COLUMN], 0.0
+
+        if np is not None:
+            scores = matrix @ np.asarray(vector, dtype=np.float32) + np.float32(capacity_weight) * capacity
+            top = np.argsort(-scores, kind='stable')[:limit].tolist()
+            rows = [matrix[index].tolist() for index in top]
+            scores = scores.tolist()
+        else:
+            scores = [sum(value * weight for value, weight in zip(row, vector)) + capacity_weight * capacity[index]
+                      for index, row in enumerate(matrix)]
+            top = sorted(range(len(scores)), key=lambda index: -scores[index])[:limit]
+            rows = [list(matrix[index]) for index in top]
+
+        specialization_index = COLUMNS.index(f'specialization_{goal}')
+        outcome_index = COLUMNS.index(f'outcome_{goal}')
+        rating_index = COLUMNS.index('rating')
+        return goal, [(trainer_ids[index], round(scores[index] * 100, 2), {
+            'specialization_match': bool(row[specialization_index]),
+            'goal_outcome': round(row[outcome_index], 3),
+            'rating': round(row[rating_index], 3),
+            'availability': round(float(capacity[index]), 3),
+        }) for index, row in zip(top, rows)]
@@ -0,0 +1,212 @@
+import json
+import logging
+import zlib
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from gymhealth.models import Notification, NotificationArchive
+from gymhealth.utils.notification_service import NotificationService
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FIELDS = [
+    'id', 'user_id', 'title', 'message', 'notification_type', 'related_object_id', 'is_read',
+    'created_at', 'scheduled_time', 'sent',
+]
+
+
+def live_cutoff():
+    """Mốc thời gian của phần dữ liệu "nóng": API chỉ đọc thông báo mới hơn mốc này"""
+    return timezone.now() - timedelta(days=getattr(settings, 'NOTIFICATION_LIVE_DAYS', 365))
+
+
+def retention_days(notification_type):
+    retention = getattr(settings, 'NOTIFICATION_RETENTION', {})
+    return retention.get(notification_type, getattr(settings, 'NOTIFICATION_RETENTION_DEFAULT_DAYS', 90))
+
+
+class NotificationRetentionService:
+    """Lưu trữ (nén) và xóa thông báo cũ theo thời hạn cấu hình cho từng loại thông báo"""
+
+    @staticmethod
+    def expired_queryset(notification_type, now=None):
+        """Thông báo đã đọc quá thời hạn của loại đó, hoặc bất kỳ thông báo nào cũ hơn phần dữ liệu nóng"""
+        now = now or timezone.now()
+        read_cutoff = now - timedelta(days=retention_days(notification_type))
+        return Notification.objects.filter(notification_type=notification_type).filter(
+            Q(is_read=True, created_at__lt=read_cutoff) | Q(created_at__lt=live_cutoff())
+        )
+
+    @staticmethod
+    def archive_expired(chunk_size=None, dry_run=False):
+        """
+        Chuyển thông báo hết hạn sang bảng NotificationArchive theo từng khối.
+        Mỗi khối được nén và xóa khỏi bảng chính trong cùng một transaction.
+        Trả về dict {notification_type: số thông báo đã lưu trữ}
+        """
+        chunk_size = chunk_size or getattr(settings, 'NOTIFICATION_ARCHIVE_CHUNK_SIZE', 5000)
+        now = timezone.now()
+        result = {}
+
+        for notification_type, _ in Notification.NOTIFICATION_TYPES:
+            queryset = NotificationRetentionService.expired_queryset(notification_type, now)
+            if dry_run:
+                result[notification_type] = queryset.count()
+                continue
+
+            total = 0
+            while True:
+                rows = list(queryset.order_by('id').values(*ARCHIVE_FIELDS)[:chunk_size])
+                if not rows:
+                    break
+                NotificationRetentionService._archive_chunk(notification_type, rows)
+                total += len(rows)
+                if len(rows) < chunk_size:
+                    break
+            result[notification_type] = total
+
+        archived = sum(result.values())
+        if archived and not dry_run:
+            logger.info("Archived %d notifications", archived)
+        return result
+
+    @staticmethod
+    def _archive_chunk(notification_type, rows):
+        ids = [row['id'] for row in rows]
+        created = [row['created_at'] for row in rows]
+        payload = '\n'.join(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) for row in rows)
+
+        with transaction.atomic():
+            NotificationArchive.objects.create(
+                notification_type=notification_type,
+                first_notification_id=ids[0],
+                last_notification_id=ids[-1],
+                created_from=min(created),
+                created_to=max(created),
+                row_count=len(rows),
+                payload=zlib.compress(payload.encode('utf-8'), 6)
+            )
+            # Thêm điều kiện created_at để MySQL chỉ quét các partition liên quan
+            Notification.objects.filter(
+                id__in=ids, created_at__gte=min(created), created_at__lte=max(created)
+            ).delete()
+            NotificationService.on_deleted([(row['id'], row['user_id'], row['created_at']) for row in rows])
+
+    @staticmethod
+    def load_archive(archive):
+        """Giải nén một khối lưu trữ thành danh sách dict (dùng khi cần tra cứu/khôi phục)"""
+        data = zlib.decompress(bytes(archive.payload)).decode('utf-8')
+        return [json.loads(line) for line in data.splitlines() if line]
+
+    # Phân vùng (partition) bảng thông báo theo tháng trên MySQL
+
+    @staticmethod
+    def _month_start(value, offset=0):
+        month = value.month - 1 + offset
+        return date(value.year + month // 12, month % 12 + 1, 1)
+
+    @staticmethod
+    def _partition_definition(month):
+        upper = NotificationRetentionService._month_start(month, 1)
+        return f"PARTITION p{month:%Y%m} VALUES LESS THAN (TO_DAYS('{upper.isoformat()}'))"
+
+    @staticmethod
+    def partition_sql(months_ahead=3):
+        """
+        Tạo câu lệnh SQL chuyển bảng thông báo sang RANGE partition theo tháng của created_at.
+        MySQL yêu cầu: khóa chính phải chứa created_at và bảng partition không được có khóa ngoại,
+        nên khóa ngoại tới user bị bỏ (Django vẫn đảm bảo quan hệ ở tầng ứng dụng).
+        """
+        if connection.vendor != 'mysql':
+            raise ValueError("Chỉ hỗ trợ phân vùng trên MySQL")
+
+        table = Notification._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+                "WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [table]
+            )
+            foreign_keys = [row[0] for row in cursor.fetchall()]
+
+        first = Notification.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        today = timezone.now().date()
+        month = NotificationRetentionService._month_start(first.date() if first else today)
+        last = NotificationRetentionService._month_start(today, months_ahead)
+
+        partitions = []
+        while month <= last:
+            partitions.append(NotificationRetentionService._partition_definition(month))
+            month = NotificationRetentionService._month_start(month, 1)
+        partitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+
+        statements = [f"ALTER TABLE `{table}` DROP FOREIGN KEY `{name}`" for name in foreign_keys]
+        statements.append(f"ALTER TABLE `{table}` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `created_at`)")
+        statements.append(
+            f"ALTER TABLE `{table}` PARTITION BY RANGE (TO_DAYS(`created_at`)) (\n    "
+            + ",\n    ".join(partitions) + "\n)"
+        )
+        return statements
+
+    @staticmethod
+    def existing_partitions():
+        """Danh sách tên partition hiện có (rỗng nếu bảng chưa được phân vùng hoặc không phải MySQL)"""
+        if connection.vendor != 'mysql':
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+                "ORDER BY PARTITION_ORDINAL_POSITION",
+                [Notification._meta.db_table]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def maintain_partitions(months_ahead=3, dry_run=False):
+        """
+        Tách partition pmax để luôn có sẵn partition cho các tháng tới, và xóa các partition tháng cũ
+        đã nằm ngoài phần dữ liệu nóng và không còn dòng nào (đã được lưu trữ hết).
+        Trả về các câu lệnh ALTER TABLE; dry_run chỉ tạo câu lệnh mà không thực thi.
+        """
+        partitions = NotificationRetentionService.existing_partitions()
+        if not partitions:
+            return []
+
+        table = Notification._meta.db_table
+        statements = []
+
+        months = {name for name in partitions if name != 'pmax'}
+        today = timezone.now().date()
+        latest = max(months) if months else ''
+        new_partitions = []
+        for offset in range(months_ahead + 1):
+            month = NotificationRetentionService._month_start(today, offset)
+            # Chỉ thêm các tháng sau partition cuối cùng (REORGANIZE pmax yêu cầu phạm vi tăng dần)
+            if f"p{month:%Y%m}" > latest:
+                new_partitions.append(NotificationRetentionService._partition_definition(month))
+        if new_partitions and 'pmax' in partitions:
+            statements.append(
+                f"ALTER TABLE `{table}` REORGANIZE PARTITION pmax INTO ("
+                + ", ".join(new_partitions) + ", PARTITION pmax VALUES LESS THAN MAXVALUE)"
+            )
+
+        cutoff = NotificationRetentionService._month_start(live_cutoff().date())
+        with connection.cursor() as cursor:
+            for name in sorted(months):
+                if name >= f"p{cutoff:%Y%m}":
+                    break
+                cursor.execute(f"SELECT 1 FROM `{table}` PARTITION (`{name}`) LIMIT 1")
+                if cursor.fetchone() is None:
+                    statements.append(f"ALTER TABLE `{table}` DROP PARTITION `{name}`")
+
+            if not dry_run:
+                for statement in statements:
+                    cursor.execute(statement)
+
+        return statements
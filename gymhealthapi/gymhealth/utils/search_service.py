@@ -0,0 +1,169 @@
+import logging
+import re
+import unicodedata
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, F, Max, Case, When, Value, IntegerField
+
+from gymhealth.models import User, SearchToken, TrainerProfile
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'LIMIT': 20,
+    'MAX_LIMIT': 100,
+    # Số từ tối đa của một câu tìm kiếm (mỗi từ là một điều kiện tiền tố)
+    'MAX_TERMS': 5,
+    'BATCH_SIZE': 1000,
+}
+
+# Trọng số của từng loại field: khớp họ tên xếp trước khớp username, khớp chuyên môn xếp sau cùng
+FIELD_WEIGHTS = {
+    'name': 3,
+    'username': 2,
+    'specialization': 1,
+}
+
+TOKEN_MAX_LENGTH = 64
+
+_token_re = re.compile(r'[a-z0-9]+')
+
+
+def search_setting(name):
+    return getattr(settings, 'SEARCH_INDEX', {}).get(name, DEFAULTS[name])
+
+
+def fold(text):
+    """Chữ thường, bỏ dấu tiếng Việt: 'Nguyễn Đức Thắng' -> 'nguyen duc thang'"""
+    text = (text or '').replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    return ''.join(char for char in text if not unicodedata.combining(char)).lower()
+
+
+def tokenize(text):
+    return [token[:TOKEN_MAX_LENGTH] for token in _token_re.findall(fold(text))]
+
+
+class SearchService:
+    """
+    Tìm người dùng (PT, hội viên) theo họ tên, username và chuyên môn: không phân biệt dấu,
+    mỗi từ trong câu tìm kiếm khớp tiền tố một từ đã đánh chỉ mục.
+    """
+
+    @staticmethod
+    def user_tokens(user, specialization=None):
+        """Các dòng SearchToken của một người dùng (không trùng (field, token))"""
+        sources = [
+            ('name', f"{user.last_name} {user.first_name}"),
+            ('username', user.username),
+        ]
+        if user.role == 'TRAINER':
+            sources.append(('specialization', specialization))
+        tokens = {}
+        for field, text in sources:
+            for token in tokenize(text):
+                tokens.setdefault((field, token), SearchToken(
+                    user_id=user.pk, role=user.role, field=field, token=token, weight=FIELD_WEIGHTS[field]))
+        return list(tokens.values())
+
+    @staticmethod
+    def index_user(user_id):
+        """Đánh chỉ mục lại một người dùng (gọi khi người dùng hoặc hồ sơ PT thay đổi)"""
+        user = User.objects.filter(pk=user_id).first()
+        with transaction.atomic():
+            SearchToken.objects.filter(user_id=user_id).delete()
+            if user is None or not user.is_active:
+                return
+            specialization = TrainerProfile.objects.filter(user_id=user_id).values_list(
+                'specialization', flat=True).first()
+            SearchToken.objects.bulk_create(SearchService.user_tokens(user, specialization))
+
+    @staticmethod
+    def rebuild(role=None, batch_size=None, stdout=None):
+        """
+        Đánh chỉ mục lại toàn bộ (hoặc một vai trò) theo từng lô người dùng; mỗi lô được thay trong một transaction
+        nên tìm kiếm vẫn dùng được trong lúc chạy. Trả về số người dùng đã xử lý.
+        """
+        batch_size = batch_size or search_setting('BATCH_SIZE')
+        users = User.objects.filter(is_active=True)
+        if role:
+            users = users.filter(role=role)
+
+        count = 0
+        last_id = 0
+        while True:
+            batch = list(users.filter(pk__gt=last_id).order_by('pk').only(
+                'id', 'username', 'first_name', 'last_name', 'role')[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            specializations = dict(TrainerProfile.objects.filter(
+                user_id__in=[user.pk for user in batch if user.role == 'TRAINER']
+            ).values_list('user_id', 'specialization'))
+            tokens = []
+            for user in batch:
+                tokens.extend(SearchService.user_tokens(user, specializations.get(user.pk)))
+            with transaction.atomic():
+                SearchToken.objects.filter(user_id__in=[user.pk for user in batch]).delete()
+                SearchToken.objects.bulk_create(tokens, batch_size=batch_size)
+            count += len(batch)
+            if stdout is not None:
+                stdout.write(f"Đã đánh chỉ mục {count} người dùng")
+
+        # Người dùng đã bị khóa không xuất hiện trong kết quả tìm kiếm
+        SearchToken.objects.filter(user__is_active=False).delete()
+        logger.info("Rebuilt search index for %d users", count)
+        return count
+
+    @staticmethod
+    def terms(query):
+        return list(dict.fromkeys(tokenize(query)))[:search_setting('MAX_TERMS')]
+
+    @staticmethod
+    def _matches(terms, role, user_ids=None, fields=None):
+        """
+        Các token khớp, nhóm theo người dùng; term_i là trọng số field khớp tốt nhất với từ thứ i
+        (gấp đôi khi khớp nguyên từ). Chỉ giữ người dùng khớp mọi từ.
+        """
+        # Token đã là chữ thường không dấu; istartswith (LIKE 'abc%') dùng được index (role, token) trên MySQL
+        queryset = SearchToken.objects.filter(role=role).filter(
+            reduce(or_, [Q(token__istartswith=term) for term in terms]))
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        if fields is not None:
+            queryset = queryset.filter(field__in=fields)
+        matches = {
+            f'term_{index}': Max(Case(
+                When(token=term, then=F('weight') * 2),
+                When(token__istartswith=term, then=F('weight')),
+                default=Value(0),
+                output_field=IntegerField(),
+            )) for index, term in enumerate(terms)
+        }
+        return queryset.values('user_id').annotate(**matches).filter(
+            **{f'{name}__gt': 0 for name in matches}), list(matches)
+
+    @staticmethod
+    def ranked(query, role, user_ids=None, limit=None):
+        """[(user_id, điểm)] theo điểm giảm dần, trong một truy vấn GROUP BY"""
+        terms = SearchService.terms(query)
+        if not terms:
+            return []
+        queryset, names = SearchService._matches(terms, role, user_ids)
+        rows = queryset.annotate(score=reduce(lambda left, right: left + right, (F(name) for name in names))).order_by(
+            '-score', 'user_id').values_list('user_id', 'score')
+        if limit is not None:
+            rows = rows[:limit]
+        return list(rows)
+
+    @staticmethod
+    def matching_user_ids(query, role, user_ids=None, fields=None):
+        """Subquery id người dùng khớp câu tìm kiếm (dùng trong filter(..._id__in=...)); fields: chỉ tìm trong các field này"""
+        terms = SearchService.terms(query)
+        if not terms:
+            return SearchToken.objects.none().values('user_id')
+        queryset, _ = SearchService._matches(terms, role, user_ids, fields)
+        return queryset.values('user_id')
@@ -0,0 +1,120 @@
+import logging
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from gymhealth.models import SessionEvent, WorkoutSession
+
+logger = logging.getLogger(__name__)
+
+# Trạng thái mới của buổi tập -> mã sự kiện
+STATUS_EVENTS = {
+    'confirmed': SessionEvent.CONFIRMED,
+    'rescheduled': SessionEvent.RESCHEDULED,
+    'cancelled': SessionEvent.CANCELLED,
+    'completed': SessionEvent.COMPLETED,
+}
+
+EVENT_CODES = {name: code for code, name in SessionEvent.EVENT_NAMES.items()}
+
+
+class SessionEventService:
+    """
+    Nhật ký thay đổi buổi tập (SessionEvent). Sự kiện được ghi trong cùng transaction với thay đổi của buổi tập,
+    nên nhật ký luôn khớp với trạng thái đã commit; thống kê lịch sử đọc bảng này thay vì các dòng buổi tập bị sửa đè.
+    """
+
+    @staticmethod
+    def build(session, event, actor=None, previous=None, note=None, created_at=None, backfilled=False):
+        """SessionEvent (chưa lưu) cho trạng thái hiện tại của session; previous: (ngày, giờ bắt đầu, giờ kết thúc) cũ"""
+        previous_date, previous_start_time, previous_end_time = previous or (None, None, None)
+        return SessionEvent(
+            session_id=session.pk, member_id=session.member_id, trainer_id=session.trainer_id,
+            actor_id=getattr(actor, 'pk', actor), event=event,
+            session_date=session.session_date, start_time=session.start_time, end_time=session.end_time,
+            previous_date=previous_date, previous_start_time=previous_start_time,
+            previous_end_time=previous_end_time, note=note or None,
+            created_at=created_at or timezone.now(), backfilled=backfilled,
+        )
+
+    @staticmethod
+    def record(session, event, actor=None, previous=None, note=None):
+        session_event = SessionEventService.build(session, event, actor, previous, note)
+        session_event.save()
+        return session_event
+
+    @staticmethod
+    def record_many(sessions, event, actor=None, note=None):
+        """Ghi cùng một sự kiện cho nhiều buổi tập bằng một lệnh insert"""
+        now = timezone.now()
+        return SessionEvent.objects.bulk_create([
+            SessionEventService.build(session, event, actor, note=note, created_at=now) for session in sessions
+        ])
+
+    @staticmethod
+    def status_event(new_status):
+        return STATUS_EVENTS.get(new_status)
+
+    @staticmethod
+    def history(session_id):
+        return SessionEvent.objects.filter(session_id=session_id).order_by('created_at', 'id')
+
+    @staticmethod
+    def trainer_history(trainer_id, date_from, date_to, events=None):
+        """Sự kiện của các buổi tập của PT trong khoảng thời gian (theo thời điểm xảy ra sự kiện)"""
+        # So sánh trực tiếp với created_at (không dùng __date) để truy vấn dùng index (trainer, created_at)
+        start = timezone.make_aware(datetime.combine(date_from, time.min))
+        end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+        queryset = SessionEvent.objects.filter(trainer_id=trainer_id, created_at__gte=start, created_at__lt=end)
+        if events:
+            queryset = queryset.filter(event__in=events)
+        return queryset
+
+    @staticmethod
+    def summary(queryset):
+        """Số sự kiện theo loại, một truy vấn GROUP BY"""
+        rows = queryset.order_by().values('event').annotate(count=Count('id')).values_list('event', 'count')
+        return {SessionEvent.EVENT_NAMES[event]: count for event, count in rows}
+
+    @staticmethod
+    def backfill(batch_size=1000, stdout=None):
+        """
+        Dựng nhật ký cho các buổi tập chưa có sự kiện nào (dữ liệu trước khi có nhật ký): sự kiện tạo lúc created_at
+        và sự kiện của trạng thái hiện tại lúc updated_at. Chạy lại nhiều lần không tạo trùng. Trả về số sự kiện đã tạo.
+        """
+        count = 0
+        processed = 0
+        last_id = 0
+        sessions = WorkoutSession.objects.only(
+            'id', 'member_id', 'trainer_id', 'session_date', 'start_time', 'end_time', 'status',
+            'created_at', 'updated_at',
+        ).order_by('id')
+        while True:
+            batch = list(sessions.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            logged = set(SessionEvent.objects.filter(
+                session_id__in=[session.pk for session in batch]).values_list('session_id', flat=True).distinct())
+
+            events = []
+            for session in batch:
+                if session.pk in logged:
+                    continue
+                events.append(SessionEventService.build(
+                    session, SessionEvent.CREATED, created_at=session.created_at, backfilled=True))
+                event = STATUS_EVENTS.get(session.status)
+                if event is not None:
+                    events.append(SessionEventService.build(
+                        session, event, created_at=max(session.updated_at, session.created_at), backfilled=True))
+            with transaction.atomic():
+                SessionEvent.objects.bulk_create(events, batch_size=batch_size)
+            count += len(events)
+            processed += len(batch)
+            if stdout is not None:
+                stdout.write(f"Đã xử lý {processed} buổi tập, tạo {count} sự kiện")
+
+        logger.info("Backfilled %d session events", count)
+        return count
@@ -0,0 +1,262 @@
+from datetime import timedelta
+import logging
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractHour, ExtractWeekDay, TruncDate, TruncMonth
+from django.utils import timezone
+
+from gymhealth.models import (
+    User, WorkoutSession, Payment, Packages, DailySessionStat, DailyRevenueStat, DailyMemberStat,
+    DailyStatsRefresh
+)
+
+logger = logging.getLogger(__name__)
+
+# Khoảng ngày luôn được tính lại mỗi lần chạy: buổi tập có thể được đặt trước tối đa 30 ngày
+# và bị đổi lịch/hủy trong khoảng này nên số liệu của các ngày đó còn thay đổi
+RECENT_DAYS_BACK = 7
+RECENT_DAYS_AHEAD = 31
+# Số ngày xử lý trong một transaction
+DAYS_PER_BATCH = 31
+
+TIME_SLOTS = {
+    'early_morning': (5, 8),  # 5:00 - 8:59
+    'morning': (9, 11),  # 9:00 - 11:59
+    'noon': (12, 13),  # 12:00 - 13:59
+    'afternoon': (14, 16),  # 14:00 - 16:59
+    'evening': (17, 20),  # 17:00 - 20:59
+    'night': (21, 23)  # 21:00 - 23:59
+}
+
+WEEKDAY_NAMES = {
+    1: 'Chủ nhật',
+    2: 'Thứ hai',
+    3: 'Thứ ba',
+    4: 'Thứ tư',
+    5: 'Thứ năm',
+    6: 'Thứ sáu',
+    7: 'Thứ bảy'
+}
+
+
+class StatsService:
+    """Tổng hợp số liệu theo ngày vào các bảng Daily*Stat và đọc lại cho trang thống kê"""
+
+    @staticmethod
+    def refresh(full=False):
+        """
+        Cập nhật bảng thống kê. Chỉ tính lại các ngày có dữ liệu thay đổi kể từ lần chạy trước
+        (dựa trên updated_at) cùng với khoảng ngày gần hiện tại; full=True để tính lại toàn bộ.
+        """
+        started_at = timezone.now()
+        last_run = DailyStatsRefresh.objects.filter(finished_at__isnull=False).first()
+        if last_run is None:
+            full = True
+
+        run = DailyStatsRefresh.objects.create(started_at=started_at, full_rebuild=full)
+
+        if full:
+            session_days = set(WorkoutSession.objects.values_list('session_date', flat=True).distinct())
+            revenue_days = set(
+                Payment.objects.filter(status='completed').annotate(day=TruncDate('payment_date'))
+                .values_list('day', flat=True).distinct()
+            )
+            # Xóa các ngày không còn dữ liệu nguồn
+            DailySessionStat.objects.exclude(date__in=session_days).delete()
+            DailyRevenueStat.objects.exclude(date__in=revenue_days).delete()
+        else:
+            since = last_run.started_at
+            session_days = set(
+                WorkoutSession.objects.filter(updated_at__gte=since)
+                .values_list('session_date', flat=True).distinct()
+            )
+            revenue_days = set(
+                Payment.objects.filter(updated_at__gte=since).annotate(day=TruncDate('payment_date'))
+                .values_list('day', flat=True).distinct()
+            )
+
+        today = timezone.now().date()
+        recent_days = {today + timedelta(days=offset) for offset in range(-RECENT_DAYS_BACK, RECENT_DAYS_AHEAD)}
+        session_days = sorted(session_days | recent_days)
+        revenue_days = sorted(revenue_days | {d for d in recent_days if d <= today})
+
+        for i in range(0, len(session_days), DAYS_PER_BATCH):
+            StatsService.refresh_session_days(session_days[i:i + DAYS_PER_BATCH])
+        for i in range(0, len(revenue_days), DAYS_PER_BATCH):
+            StatsService.refresh_revenue_days(revenue_days[i:i + DAYS_PER_BATCH])
+        StatsService.refresh_member_snapshot(today)
+
+        run.finished_at = timezone.now()
+        run.days_refreshed = len(set(session_days) | set(revenue_days))
+        run.save(update_fields=['finished_at', 'days_refreshed'])
+
+        logger.info("Refreshed daily stats for %d days (full=%s)", run.days_refreshed, full)
+        return run.days_refreshed
+
+    @staticmethod
+    def refresh_session_days(days):
+        rows = WorkoutSession.objects.filter(session_date__in=days).annotate(
+            hour=ExtractHour('start_time')
+        ).values('session_date', 'hour', 'status', 'session_type').annotate(
+            count=Count('id')
+        ).order_by()
+
+        with transaction.atomic():
+            DailySessionStat.objects.filter(date__in=days).delete()
+            DailySessionStat.objects.bulk_create([
+                DailySessionStat(
+                    date=row['session_date'],
+                    hour=row['hour'],
+                    status=row['status'],
+                    session_type=row['session_type'],
+                    session_count=row['count']
+                )
+                for row in rows
+            ])
+
+    @staticmethod
+    def refresh_revenue_days(days):
+        rows = Payment.objects.filter(status='completed').annotate(
+            day=TruncDate('payment_date')
+        ).filter(day__in=days).values(
+            'day', 'subscription__package', 'payment_method'
+        ).annotate(
+            total=Sum('amount'),
+            count=Count('id')
+        ).order_by()
+
+        with transaction.atomic():
+            DailyRevenueStat.objects.filter(date__in=days).delete()
+            DailyRevenueStat.objects.bulk_create([
+                DailyRevenueStat(
+                    date=row['day'],
+                    package_id=row['subscription__package'],
+                    payment_method=row['payment_method'],
+                    total_amount=row['total'] or 0,
+                    payment_count=row['count']
+                )
+                for row in rows
+            ])
+
+    @staticmethod
+    def refresh_member_snapshot(day):
+        rows = User.objects.values('role', 'is_active').annotate(count=Count('id')).order_by()
+
+        with transaction.atomic():
+            DailyMemberStat.objects.filter(date=day).delete()
+            DailyMemberStat.objects.bulk_create([
+                DailyMemberStat(date=day, role=row['role'], is_active=row['is_active'], user_count=row['count'])
+                for row in rows
+            ])
+
+    @staticmethod
+    def get_stats(date_from=None, date_to=None):
+        """Đọc số liệu cho trang thống kê từ các bảng tổng hợp trong khoảng ngày"""
+        sessions = DailySessionStat.objects.all()
+        revenue = DailyRevenueStat.objects.all()
+        members = DailyMemberStat.objects.all()
+        if date_from:
+            sessions = sessions.filter(date__gte=date_from)
+            revenue = revenue.filter(date__gte=date_from)
+        if date_to:
+            sessions = sessions.filter(date__lte=date_to)
+            revenue = revenue.filter(date__lte=date_to)
+            members = members.filter(date__lte=date_to)
+
+        # Người dùng: lấy bản chụp gần nhất trong khoảng
+        snapshot_date = members.order_by('-date').values_list('date', flat=True).first()
+        member_counts = {}
+        for row in members.filter(date=snapshot_date):
+            member_counts[(row.role, row.is_active)] = row.user_count
+
+        def count_role(role, is_active=None):
+            return sum(c for (r, active), c in member_counts.items()
+                       if r == role and (is_active is None or active == is_active))
+
+        user_stats = {
+            'total_members': count_role('MEMBER'),
+            'total_trainers': count_role('TRAINER'),
+            'total_managers': count_role('MANAGER'),
+            'active_members': count_role('MEMBER', True),
+            'snapshot_date': snapshot_date,
+        }
+
+        # Buổi tập theo trạng thái và loại
+        by_status = {row['status']: row['total'] for row in
+                     sessions.values('status').annotate(total=Sum('session_count')).order_by()}
+        by_type = {row['session_type']: row['total'] for row in
+                   sessions.values('session_type').annotate(total=Sum('session_count')).order_by()}
+        workout_stats = {
+            'pending_sessions': by_status.get('pending', 0),
+            'confirmed_sessions': by_status.get('confirmed', 0),
+            'completed_sessions': by_status.get('completed', 0),
+            'cancelled_sessions': by_status.get('cancelled', 0),
+            'pt_sessions': by_type.get('pt_session', 0),
+            'self_training': by_type.get('self_training', 0),
+        }
+
+        used_sessions = sessions.filter(status__in=['confirmed', 'completed'])
+
+        hourly_usage = list(
+            used_sessions.values('hour').annotate(count=Sum('session_count')).order_by('hour')
+        )
+        hourly_data = {item['hour']: item['count'] for item in hourly_usage}
+        time_slot_usage = {slot: 0 for slot in TIME_SLOTS}
+        for slot_name, (start_hour, end_hour) in TIME_SLOTS.items():
+            for hour in range(start_hour, end_hour + 1):
+                time_slot_usage[slot_name] += hourly_data.get(hour, 0)
+
+        weekday_usage = used_sessions.annotate(
+            weekday=ExtractWeekDay('date')
+        ).values('weekday').annotate(count=Sum('session_count')).order_by('weekday')
+        weekday_data = {WEEKDAY_NAMES[item['weekday']]: item['count'] for item in weekday_usage}
+
+        revenue_by_month = list(
+            revenue.annotate(month=TruncMonth('date')).values('month').annotate(
+                total=Sum('total_amount')
+            ).order_by('month')
+        )
+
+        package_totals = {
+            row['package']: row for row in
+            revenue.values('package').annotate(
+                total_subscriptions=Sum('payment_count'),
+                total_revenue=Sum('total_amount')
+            ).order_by()
+        }
+        package_names = dict(Packages.objects.filter(id__in=[k for k in package_totals if k])
+                             .values_list('id', 'name'))
+        package_stats = sorted(
+            [
+                {
+                    'name': package_names.get(package_id, 'Gói đã xóa'),
+                    'total_subscriptions': row['total_subscriptions'],
+                    'total_revenue': row['total_revenue'],
+                }
+                for package_id, row in package_totals.items()
+            ],
+            key=lambda item: item['total_subscriptions'],
+            reverse=True
+        )
+
+        payment_method_stats = list(
+            revenue.values('payment_method').annotate(total=Sum('total_amount')).order_by('-total')
+        )
+
+        total_revenue = revenue.aggregate(total=Sum('total_amount'))['total'] or 0
+
+        last_refresh = DailyStatsRefresh.objects.filter(finished_at__isnull=False).first()
+
+        return {
+            'package_stats': package_stats,
+            'user_stats': user_stats,
+            'workout_stats': workout_stats,
+            'revenue_by_month': revenue_by_month,
+            'hourly_usage': hourly_usage,
+            'time_slot_usage': time_slot_usage,
+            'weekday_usage': weekday_data,
+            'payment_method_stats': payment_method_stats,
+            'total_revenue': total_revenue,
+            'last_refreshed_at': last_refresh.finished_at if last_refresh else None,
+        }
@@ -0,0 +1,233 @@
+import base64
+import binascii
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from gymhealth import serializers
+from gymhealth.models import (WorkoutSession, SubscriptionPackage, TrainingProgress, Notification, HealthInfo,
+                              SyncVersion, SyncTombstone)
+
+logger = logging.getLogger(__name__)
+
+# Thứ tự các loại dữ liệu là một phần của con trỏ đồng bộ (version, loại, id): không đổi thứ tự, chỉ thêm vào cuối
+SYNC_TYPES = ('sessions', 'subscriptions', 'progress', 'notifications')
+TOMBSTONE_RANK = len(SYNC_TYPES)
+# Con trỏ "đã đọc hết phiên bản v"
+END_RANK = TOMBSTONE_RANK + 1
+
+DEFAULTS = {
+    'PAGE_SIZE': 200,
+    'MAX_PAGE_SIZE': 1000,
+    # Phiên bản được cấp trong transaction chưa commit có thể xuất hiện muộn hơn phiên bản lớn hơn nó;
+    # con trỏ trả về không vượt quá phiên bản đã cấp trước mốc này nên các thay đổi đó không bị bỏ sót
+    'SETTLE_SECONDS': 10,
+    # Tombstone được giữ trong số ngày này; con trỏ cũ hơn phải đồng bộ lại từ đầu
+    'TOMBSTONE_DAYS': 30,
+}
+
+
+def _setting(name):
+    return getattr(settings, 'SYNC_API', {}).get(name, DEFAULTS[name])
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+def encode_token(cursor):
+    version, rank, object_id = cursor
+    raw = f"{version}.{rank}.{object_id}.{int(time.time())}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Trả về (con trỏ, thời điểm cấp token); con trỏ là bộ (version, loại, id) của bản ghi cuối cùng đã gửi"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        version, rank, object_id, issued_at = (int(part) for part in raw.split('.'))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidSyncToken(token)
+    if not 0 <= rank <= END_RANK:
+        raise InvalidSyncToken(token)
+    return (version, rank, object_id), issued_at
+
+
+def _after(cursor, rank):
+    """Điều kiện (sync_version, rank, id) > cursor cho loại dữ liệu có thứ tự rank"""
+    version, cursor_rank, object_id = cursor
+    condition = Q(sync_version__gt=version)
+    if rank > cursor_rank:
+        condition |= Q(sync_version=version)
+    elif rank == cursor_rank:
+        condition |= Q(sync_version=version, pk__gt=object_id)
+    return condition
+
+
+class SyncService:
+    """
+    Đồng bộ tăng dần cho app: trả về các bản ghi của người dùng đã thay đổi (và tombstone của bản ghi đã xóa)
+    sau con trỏ since. Mỗi loại dữ liệu được đọc theo index (người sở hữu, sync_version).
+    """
+
+    @staticmethod
+    def owned_querysets(user):
+        """Queryset của từng loại dữ liệu mà người dùng sở hữu, theo vai trò"""
+        from gymhealth.utils.retention_service import live_cutoff
+
+        querysets = {
+            'notifications': Notification.objects.filter(user=user, created_at__gte=live_cutoff()),
+        }
+        if user.is_member:
+            health_info_id = HealthInfo.objects.filter(user=user).values_list('id', flat=True).first()
+            querysets['sessions'] = WorkoutSession.objects.filter(member=user).select_related('member')
+            querysets['subscriptions'] = SubscriptionPackage.objects.filter(member=user).select_related(
+                'member', 'package')
+            querysets['progress'] = TrainingProgress.objects.filter(health_info_id=health_info_id).select_related(
+                'health_info__user', 'created_by', 'workout_session')
+        elif user.is_trainer:
+            querysets['sessions'] = WorkoutSession.objects.filter(trainer=user).select_related('member')
+            querysets['progress'] = TrainingProgress.objects.filter(created_by=user).select_related(
+                'health_info__user', 'created_by', 'workout_session')
+        return querysets
+
+    @staticmethod
+    def serialize(sync_type, objects, user):
+        if sync_type == 'sessions':
+            data = serializers.WorkoutSessionListScheduleSerializer(objects, many=True).data
+        elif sync_type == 'subscriptions':
+            data = serializers.SubscriptionPackageSerializer(objects, many=True).data
+        elif sync_type == 'progress':
+            data = serializers.TrainingProgressSerializer(objects, many=True).data
+        else:
+            for notification in objects:
+                notification.user = user
+            data = serializers.NotificationSerializer(objects, many=True).data
+        for item, obj in zip(data, objects):
+            item['sync_version'] = obj.sync_version
+        return data
+
+    @staticmethod
+    def settled_version():
+        """Phiên bản lớn nhất được cấp trước mốc SETTLE_SECONDS (transaction của nó coi như đã kết thúc)"""
+        cutoff = timezone.now() - timedelta(seconds=_setting('SETTLE_SECONDS'))
+        return SyncVersion.objects.filter(allocated_at__lte=cutoff).order_by('-id').values_list(
+            'id', flat=True).first() or 0
+
+    @staticmethod
+    def changes(user, since=None, limit=None):
+        """
+        Trả về dict: changes/deleted theo loại dữ liệu, next (token cho lần gọi sau), has_more và reset.
+        reset=True khi không có since hoặc since đã quá hạn: app cần thay dữ liệu cục bộ bằng dữ liệu trả về
+        (tiếp tục gọi với next cho tới khi has_more=False).
+        """
+        limit = min(limit or _setting('PAGE_SIZE'), _setting('MAX_PAGE_SIZE'))
+        reset = since is None
+        cursor = (-1, 0, 0)
+        if since is not None:
+            cursor, issued_at = decode_token(since)
+            if issued_at < time.time() - _setting('TOMBSTONE_DAYS') * 86400:
+                reset = True
+                cursor = (-1, 0, 0)
+
+        settled = SyncService.settled_version()
+
+        # Mỗi loại lấy tối đa limit + 1 bản ghi sau con trỏ, gộp lại theo (version, loại, id) rồi cắt còn limit
+        candidates = []
+        querysets = SyncService.owned_querysets(user)
+        for rank, sync_type in enumerate(SYNC_TYPES):
+            if sync_type not in querysets:
+                continue
+            queryset = querysets[sync_type].filter(_after(cursor, rank)).order_by('sync_version', 'pk')
+            for obj in queryset[:limit + 1]:
+                candidates.append(((obj.sync_version, rank, obj.pk), sync_type, obj))
+        if not reset:
+            # Đồng bộ lại từ đầu không cần tombstone: app thay toàn bộ dữ liệu cục bộ
+            tombstones = SyncTombstone.objects.filter(owner=user).filter(_after(cursor, TOMBSTONE_RANK))
+            for tombstone in tombstones.order_by('sync_version', 'pk')[:limit + 1]:
+                candidates.append(((tombstone.sync_version, TOMBSTONE_RANK, tombstone.pk), None, tombstone))
+        candidates.sort(key=lambda candidate: candidate[0])
+        page = candidates[:limit]
+
+        # Con trỏ chỉ tiến tới bản ghi cuối cùng có phiên bản đã ổn định; phần còn lại sẽ được gửi lại lần sau
+        next_cursor = cursor
+        for key, _, _ in page:
+            if key[0] > settled:
+                break
+            next_cursor = key
+        has_more = len(candidates) > limit and bool(page) and next_cursor == page[-1][0]
+        if not has_more and settled > next_cursor[0]:
+            # Không còn thay đổi nào tới phiên bản đã ổn định
+            next_cursor = (settled, END_RANK, 0)
+
+        changes = {sync_type: [] for sync_type in SYNC_TYPES}
+        deleted = {sync_type: [] for sync_type in SYNC_TYPES}
+        for _, sync_type, obj in page:
+            if sync_type is None:
+                deleted[obj.object_type].append(obj.object_id)
+            else:
+                changes[sync_type].append(obj)
+
+        return {
+            'reset': reset,
+            'has_more': has_more,
+            'next': encode_token(next_cursor),
+            'changes': {
+                sync_type: SyncService.serialize(sync_type, objects, user) for sync_type, objects in changes.items()
+            },
+            'deleted': deleted,
+        }
+
+    @staticmethod
+    def owners(sync_type, instance):
+        if sync_type == 'sessions':
+            return [instance.member_id, instance.trainer_id]
+        if sync_type == 'subscriptions':
+            return [instance.member_id]
+        if sync_type == 'progress':
+            member_id = HealthInfo.objects.filter(pk=instance.health_info_id).values_list('user_id', flat=True).first()
+            return [member_id, instance.created_by_id]
+        return [instance.user_id]
+
+    @staticmethod
+    def record_deletion(sync_type, instance):
+        """Ghi tombstone cho từng người sở hữu bản ghi vừa bị xóa (trong cùng transaction với lệnh xóa)"""
+        SyncService.record_deletions(sync_type, [(instance.pk, SyncService.owners(sync_type, instance))])
+
+    @staticmethod
+    def record_deletions(sync_type, deleted):
+        """
+        Ghi tombstone cho nhiều bản ghi vừa bị xóa: một phiên bản và một lệnh insert cho cả lô.
+        deleted: các cặp (id bản ghi, danh sách id người sở hữu). Trả về số tombstone đã ghi.
+        """
+        tombstones = {
+            (owner_id, object_id) for object_id, owner_ids in deleted for owner_id in owner_ids if owner_id
+        }
+        if not tombstones:
+            return 0
+        version = SyncVersion.allocate()
+        SyncTombstone.objects.bulk_create([
+            SyncTombstone(owner_id=owner_id, object_type=sync_type, object_id=object_id, sync_version=version)
+            for owner_id, object_id in tombstones
+        ], batch_size=1000)
+        return len(tombstones)
+
+    @staticmethod
+    def prune():
+        """Xóa tombstone quá hạn và các dòng cấp phát phiên bản cũ (giữ dòng mới nhất để AUTO_INCREMENT không lùi)"""
+        tombstone_cutoff = timezone.now() - timedelta(days=_setting('TOMBSTONE_DAYS'))
+        tombstones, _ = SyncTombstone.objects.filter(deleted_at__lt=tombstone_cutoff).delete()
+
+        latest = SyncVersion.objects.order_by('-id').values_list('id', flat=True).first()
+        versions = 0
+        if latest:
+            versions, _ = SyncVersion.objects.filter(
+                id__lt=latest, allocated_at__lt=timezone.now() - timedelta(days=1)
+            ).delete()
+        if tombstones or versions:
+            logger.info("Pruned %d sync tombstones and %d sync versions", tombstones, versions)
+        return tombstones, versions
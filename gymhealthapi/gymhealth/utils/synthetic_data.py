@@ -0,0 +1,341 @@
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from gymhealth.models import (
+    User, MemberProfile, TrainerProfile, HealthInfo, PackageType, Packages, SubscriptionPackage, Payment,
+    WorkoutSession, TrainingProgress, TrainerRating, GymRating, Gym, Notification
+)
+
+# Số hội viên được xử lý trong một lượt (buổi tập, tiến độ, thông báo của các hội viên này được tạo cùng lúc)
+MEMBER_CHUNK_SIZE = 500
+# Khoảng thời gian của dữ liệu lịch sử và lịch đặt trước
+HISTORY_DAYS = 730
+BOOKING_DAYS_AHEAD = 28
+NOTIFICATION_HISTORY_DAYS = 400
+
+LAST_NAMES = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng', 'Bùi', 'Đỗ',
+              'Hồ', 'Ngô', 'Dương', 'Lý']
+MIDDLE_NAMES = ['Văn', 'Thị', 'Minh', 'Thanh', 'Ngọc', 'Đức', 'Hoài', 'Quốc', 'Gia', 'Bảo']
+FIRST_NAMES = ['An', 'Bình', 'Châu', 'Dũng', 'Giang', 'Hà', 'Hải', 'Hạnh', 'Hùng', 'Khánh', 'Lan', 'Linh',
+               'Long', 'Mai', 'Nam', 'Ngọc', 'Phong', 'Phương', 'Quân', 'Sơn', 'Tâm', 'Thảo', 'Trang', 'Tuấn',
+               'Việt', 'Vy', 'Yến', 'Đạt', 'Đông', 'Ánh']
+SPECIALIZATIONS = ['Giảm cân', 'Tăng cơ', 'Yoga', 'Cardio', 'Boxing', 'Pilates', 'Phục hồi chức năng',
+                   'CrossFit', 'Dinh dưỡng thể hình', 'Powerlifting']
+CATALOG = [
+    # (loại gói, số tháng, giá, số buổi PT)
+    ('Gói 1 tháng', 1, Decimal('500000'), 4),
+    ('Gói 3 tháng', 3, Decimal('1350000'), 12),
+    ('Gói 6 tháng', 6, Decimal('2500000'), 24),
+    ('Gói 12 tháng', 12, Decimal('4500000'), 48),
+]
+PAYMENT_METHODS = (['vnpay', 'momo', 'bank_transfer', 'cash'], [45, 30, 15, 10])
+NOTIFICATION_TYPES = (
+    ['session_reminder', 'subscription_expiry', 'new_promotion', 'payment_confirmation', 'feedback_request',
+     'system'],
+    [50, 8, 20, 8, 10, 4]
+)
+HEALTH_GOALS = [goal for goal, _ in HealthInfo.GOAL_CHOICES]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Tạm tắt auto_now/auto_now_add để bulk_create ghi được thời gian tạo/cập nhật trải đều trong quá khứ"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class SyntheticDataGenerator:
+    """
+    Sinh dữ liệu giả lập với khối lượng gần với môi trường production (hội viên, PT, gói tập, thanh toán,
+    buổi tập, tiến độ, đánh giá, thông báo) bằng bulk_create. Cùng seed sẽ cho cùng một bộ dữ liệu.
+    Tên đăng nhập của người dùng sinh ra có tiền tố prefix để phân biệt với dữ liệu thật.
+    """
+
+    def __init__(self, seed=42, batch_size=5000, prefix='synthetic_', log=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.log = log or (lambda message: None)
+        self.today = timezone.localdate()
+        self.now = timezone.now()
+        self.counts = {}
+        # Mật khẩu chung 'synthetic' (hash một lần thay vì cho từng người dùng)
+        self.password = make_password('synthetic')
+
+    def run(self, members, trainers, sessions, notifications_per_member=20, progress_ratio=0.5,
+            rating_ratio=0.3):
+        packages = self._ensure_catalog()
+        gym_ids = self._ensure_gyms()
+        trainer_ids = self._create_trainers(trainers)
+        # Phân bố hội viên theo PT lệch về một số PT được ưa chuộng
+        trainer_weights = [1 / (rank + 1) ** 0.8 for rank in range(len(trainer_ids))]
+        cum_weights = []
+        total = 0
+        for weight in trainer_weights:
+            total += weight
+            cum_weights.append(total)
+
+        sessions_per_member = sessions / members if members else 0
+        created = 0
+        while created < members:
+            size = min(MEMBER_CHUNK_SIZE, members - created)
+            with transaction.atomic():
+                self._create_member_chunk(
+                    created, size, packages, trainer_ids, cum_weights, gym_ids, sessions_per_member,
+                    notifications_per_member, progress_ratio, rating_ratio
+                )
+            created += size
+            self.log(f"{created}/{members} hội viên, {self.counts.get('workout_sessions', 0)} buổi tập")
+        return self.counts
+
+    def _count(self, name, value):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def _bulk_create(self, model, objects, name):
+        for start in range(0, len(objects), self.batch_size):
+            model.objects.bulk_create(objects[start:start + self.batch_size], batch_size=self.batch_size)
+        self._count(name, len(objects))
+
+    def _random_datetime(self, day, hour_from=6, hour_to=21):
+        moment = datetime.combine(day, time(self.rng.randint(hour_from, hour_to), self.rng.randrange(60)))
+        return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+    def _full_name(self):
+        return self.rng.choice(LAST_NAMES), f"{self.rng.choice(MIDDLE_NAMES)} {self.rng.choice(FIRST_NAMES)}"
+
+    def _user(self, username, role, joined):
+        last_name, first_name = self._full_name()
+        return User(
+            username=username, email=f"{username}@example.com", password=self.password, role=role,
+            first_name=first_name, last_name=last_name, phone_number=f"09{self.rng.randrange(10 ** 8):08d}",
+            gender=self.rng.choice(['Nam', 'Nữ']), date_joined=joined,
+            date_of_birth=self.today - timedelta(days=self.rng.randint(18 * 365, 55 * 365)),
+        )
+
+    def _ensure_catalog(self):
+        packages = []
+        for name, months, price, pt_sessions in CATALOG:
+            package_type, _ = PackageType.objects.get_or_create(name=name, defaults={'duration_months': months})
+            package = Packages.objects.filter(package_type=package_type, price=price).first()
+            if package is None:
+                package = Packages.objects.create(
+                    name=name, package_type=package_type, description=name, price=price,
+                    pt_sessions=pt_sessions, image='image/upload/v1749786536/jhhd6f0e2xe7wiynoplk.jpg'
+                )
+            packages.append(package)
+        return packages
+
+    def _ensure_gyms(self):
+        gym_ids = list(Gym.objects.values_list('id', flat=True)[:5])
+        if not gym_ids:
+            Gym.objects.bulk_create([
+                Gym(name=f"GymHealth cơ sở {index + 1}", address=f"{index + 1} Nguyễn Huệ, TP.HCM",
+                    phone=f"028{index:07d}")
+                for index in range(3)
+            ])
+            gym_ids = list(Gym.objects.values_list('id', flat=True)[:5])
+        return gym_ids
+
+    def _create_trainers(self, count):
+        usernames = [f"{self.prefix}trainer{index:05d}" for index in range(count)]
+        with transaction.atomic():
+            self._bulk_create(User, [
+                self._user(username, 'TRAINER', self.now - timedelta(days=self.rng.randint(30, 1500)))
+                for username in usernames
+            ], 'users')
+            trainer_ids = list(User.objects.filter(username__in=usernames).order_by('id').values_list('id', flat=True))
+            self._bulk_create(TrainerProfile, [
+                TrainerProfile(
+                    user_id=user_id,
+                    specialization=', '.join(self.rng.sample(SPECIALIZATIONS, self.rng.randint(1, 3))),
+                    certification=self.rng.choice(['ACE', 'NASM', 'ISSA', 'NSCA']),
+                    experience_years=self.rng.randint(0, 15),
+                    hourly_rate=Decimal(self.rng.randrange(150, 800, 50) * 1000),
+                )
+                for user_id in trainer_ids
+            ], 'trainer_profiles')
+        return trainer_ids
+
+    def _create_member_chunk(self, offset, size, packages, trainer_ids, cum_weights, gym_ids,
+                             sessions_per_member, notifications_per_member, progress_ratio, rating_ratio):
+        rng = self.rng
+        usernames = [f"{self.prefix}member{index:06d}" for index in range(offset, offset + size)]
+        with explicit_timestamps(MemberProfile, HealthInfo):
+            self._bulk_create(User, [
+                self._user(username, 'MEMBER', self.now - timedelta(days=rng.randint(1, HISTORY_DAYS)))
+                for username in usernames
+            ], 'users')
+            members = list(User.objects.filter(username__in=usernames).order_by('id').values_list('id', 'date_joined'))
+            member_ids = [member_id for member_id, _ in members]
+
+            # Gói tập hiện tại và thanh toán của từng hội viên
+            subscriptions = []
+            for member_id, joined in members:
+                package = rng.choice(packages)
+                start = self.today - timedelta(days=rng.randint(0, 330))
+                end = start + timedelta(days=30 * package.package_type.duration_months)
+                subscriptions.append(SubscriptionPackage(
+                    member_id=member_id, package=package, start_date=start, end_date=end,
+                    remaining_pt_sessions=rng.randint(0, package.pt_sessions),
+                    status='active' if end >= self.today else 'expired',
+                    original_price=package.price, discounted_price=package.price,
+                ))
+            with explicit_timestamps(SubscriptionPackage):
+                for subscription in subscriptions:
+                    subscription.created_at = self._random_datetime(subscription.start_date)
+                self._bulk_create(SubscriptionPackage, subscriptions, 'subscriptions')
+            subscription_rows = SubscriptionPackage.objects.filter(member_id__in=member_ids).values_list(
+                'id', 'member_id', 'start_date', 'end_date', 'discounted_price', 'created_at'
+            )
+            subscription_by_member = {}
+            payments = []
+            for subscription_id, member_id, start, end, price, created_at in subscription_rows:
+                subscription_by_member[member_id] = (subscription_id, end)
+                method = rng.choices(*PAYMENT_METHODS)[0]
+                status = rng.choices(['completed', 'pending', 'failed'], [95, 3, 2])[0]
+                payments.append(Payment(
+                    subscription_id=subscription_id, amount=price, payment_method=method, status=status,
+                    # VNPay yêu cầu vnp_TxnRef là số
+                    transaction_id=f"{subscription_id}{int(created_at.timestamp() * 1000)}",
+                    payment_date=created_at, created_at=created_at, updated_at=created_at,
+                    confirmed_date=created_at + timedelta(minutes=rng.randint(1, 30)) if status == 'completed' else None,
+                ))
+            with explicit_timestamps(Payment):
+                self._bulk_create(Payment, payments, 'payments')
+
+            self._bulk_create(MemberProfile, [
+                MemberProfile(
+                    user_id=member_id, membership_start_date=joined.date(),
+                    membership_end_date=subscription_by_member[member_id][1],
+                    is_active=subscription_by_member[member_id][1] >= self.today,
+                )
+                for member_id, joined in members
+            ], 'member_profiles')
+
+            health_infos = []
+            for member_id, joined in members:
+                height = rng.gauss(165, 8)
+                health_infos.append(HealthInfo(
+                    user_id=member_id, height=round(height, 1),
+                    weight=round(max(40.0, rng.gauss(22, 3) * (height / 100) ** 2), 1),
+                    training_goal=rng.choice(HEALTH_GOALS), health_conditions='',
+                    body_fat_percentage=round(rng.uniform(12, 35), 1),
+                    created_at=joined, updated_at=joined,
+                ))
+            self._bulk_create(HealthInfo, health_infos, 'health_infos')
+
+        primary_trainer = dict(zip(member_ids, rng.choices(trainer_ids, cum_weights=cum_weights, k=len(member_ids))))
+        last_session_id = WorkoutSession.objects.aggregate(last=Max('id'))['last'] or 0
+        self._create_sessions(member_ids, primary_trainer, subscription_by_member, sessions_per_member)
+        self._create_progress(member_ids, last_session_id, progress_ratio)
+        self._create_ratings(member_ids, primary_trainer, gym_ids, rating_ratio)
+        self._create_notifications(member_ids, notifications_per_member)
+
+    def _create_sessions(self, member_ids, primary_trainer, subscription_by_member, sessions_per_member):
+        rng = self.rng
+        sessions = []
+        for member_id in member_ids:
+            trainer_id = primary_trainer[member_id]
+            subscription_id = subscription_by_member[member_id][0]
+            # Mỗi hội viên một số buổi khác nhau, trung bình sessions_per_member; không trùng giờ
+            count = rng.randint(0, round(2 * sessions_per_member))
+            slots = set()
+            for _ in range(count):
+                day = self.today + timedelta(days=rng.randint(-HISTORY_DAYS, BOOKING_DAYS_AHEAD))
+                hour = rng.randint(6, 21)
+                if (day, hour) in slots:
+                    continue
+                slots.add((day, hour))
+                session_type = 'pt_session' if rng.random() < 0.6 else 'self_training'
+                if day > self.today:
+                    status = 'confirmed' if session_type == 'self_training' else rng.choice(['pending', 'confirmed'])
+                else:
+                    status = rng.choices(['completed', 'cancelled', 'rescheduled', 'confirmed'], [78, 12, 5, 5])[0]
+                created_at = self._random_datetime(day - timedelta(days=rng.randint(1, 14)))
+                sessions.append(WorkoutSession(
+                    member_id=member_id, trainer_id=trainer_id if session_type == 'pt_session' else None,
+                    subscription_id=subscription_id, session_date=day, start_time=time(hour),
+                    end_time=time(hour + 1), session_type=session_type, status=status,
+                    created_at=created_at, updated_at=created_at,
+                ))
+        with explicit_timestamps(WorkoutSession):
+            self._bulk_create(WorkoutSession, sessions, 'workout_sessions')
+
+    def _create_progress(self, member_ids, last_session_id, progress_ratio):
+        rng = self.rng
+        health = dict(HealthInfo.objects.filter(user_id__in=member_ids).values_list('user_id', 'id'))
+        weights = dict(HealthInfo.objects.filter(user_id__in=member_ids).values_list('user_id', 'weight'))
+        completed = WorkoutSession.objects.filter(
+            member_id__in=member_ids, id__gt=last_session_id, session_type='pt_session', status='completed'
+        ).order_by('session_date').values_list('id', 'member_id', 'trainer_id', 'session_date')
+        records = []
+        for session_id, member_id, trainer_id, day in completed.iterator(chunk_size=self.batch_size):
+            if rng.random() >= progress_ratio:
+                continue
+            # Cân nặng thay đổi dần theo thời gian
+            weights[member_id] = round(weights[member_id] + rng.uniform(-0.6, 0.4), 1)
+            recorded_at = self._random_datetime(day, 7, 22)
+            records.append(TrainingProgress(
+                workout_session_id=session_id, health_info_id=health[member_id], weight=weights[member_id],
+                body_fat_percentage=round(rng.uniform(12, 35), 1), muscle_mass=round(rng.uniform(25, 45), 1),
+                cardio_endurance=rng.randint(10, 60), strength_bench=round(rng.uniform(20, 120), 1),
+                strength_squat=round(rng.uniform(30, 160), 1), strength_deadlift=round(rng.uniform(40, 200), 1),
+                created_by_id=trainer_id, created_at=recorded_at, updated_at=recorded_at,
+            ))
+        with explicit_timestamps(TrainingProgress):
+            self._bulk_create(TrainingProgress, records, 'training_progress')
+
+    def _create_ratings(self, member_ids, primary_trainer, gym_ids, rating_ratio):
+        rng = self.rng
+        trainer_ratings = []
+        gym_ratings = []
+        for member_id in member_ids:
+            rated_at = self.now - timedelta(days=rng.randint(0, HISTORY_DAYS))
+            if rng.random() < rating_ratio:
+                scores = [min(5, max(1, round(rng.gauss(4.2, 0.8)))) for _ in range(4)]
+                trainer_ratings.append(TrainerRating(
+                    user_id=member_id, trainer_id=primary_trainer[member_id], score=scores[0],
+                    knowledge_score=scores[1], communication_score=scores[2], punctuality_score=scores[3],
+                    anonymous=rng.random() < 0.2, created_at=rated_at, updated_at=rated_at,
+                ))
+            if gym_ids and rng.random() < rating_ratio / 3:
+                scores = [min(5, max(1, round(rng.gauss(4.0, 0.9)))) for _ in range(3)]
+                gym_ratings.append(GymRating(
+                    user_id=member_id, gym_id=rng.choice(gym_ids), score=scores[0], facility_score=scores[1],
+                    service_score=scores[2], created_at=rated_at, updated_at=rated_at,
+                ))
+        with explicit_timestamps(TrainerRating, GymRating):
+            self._bulk_create(TrainerRating, trainer_ratings, 'trainer_ratings')
+            self._bulk_create(GymRating, gym_ratings, 'gym_ratings')
+
+    def _create_notifications(self, member_ids, notifications_per_member):
+        rng = self.rng
+        notifications = []
+        for member_id in member_ids:
+            for _ in range(rng.randint(0, 2 * notifications_per_member)):
+                age = rng.randint(0, NOTIFICATION_HISTORY_DAYS)
+                created_at = self.now - timedelta(days=age, minutes=rng.randrange(24 * 60))
+                notifications.append(Notification(
+                    user_id=member_id, title="Thông báo", message="Nội dung thông báo giả lập",
+                    notification_type=rng.choices(*NOTIFICATION_TYPES)[0],
+                    is_read=age > 7 or rng.random() < 0.3, sent=True, created_at=created_at,
+                ))
+        with explicit_timestamps(Notification):
+            self._bulk_create(Notification, notifications, 'notifications')
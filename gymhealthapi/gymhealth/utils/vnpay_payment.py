@@ -69,7 +69,7 @@ class VNPayUtils:
         # Thêm secure hash vào URL
         payment_url = f"{self.vnpay_url}?{query_string}&vnp_SecureHash={secure_hash}"
 
-        logger.info(f"Created VNPay payment URL for order {order_id}, amount: {amount}")
+        logger.info("Created VNPay payment URL for order %s, amount: %s", order_id, amount)
         return payment_url
 
     def create_secure_hash(self, query_string):
@@ -106,7 +106,8 @@ class VNPayUtils:
         is_valid = hmac.compare_digest(received_hash.upper(), expected_hash.upper())
 
         if not is_valid:
-            logger.warning(f"Invalid VNPay signature. Expected: {expected_hash}, Received: {received_hash}")
+            logger.warning("Invalid VNPay signature for order %s", response_data.get('vnp_TxnRef'))
+            logger.debug("VNPay signature expected: %s, received: %s", expected_hash, received_hash)
             return False, "Invalid signature"
 
         # Kiểm tra response code
@@ -164,7 +165,7 @@ class VNPayUtils:
             response = requests.post(self.api_url, data=params, timeout=30)
             return response.json() if response.status_code == 200 else None
         except Exception as e:
-            logger.error(f"Error querying VNPay transaction: {str(e)}")
+            logger.error("Error querying VNPay transaction: %s", e)
             return None
 
     def get_client_ip(self, request):
@@ -0,0 +1,220 @@
+import logging
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from gymhealth.models import WaitlistEntry, WorkoutSession, SubscriptionPackage, Notification, SessionEvent
+from gymhealth.utils.booking_service import BookingService, ACTIVE_STATUSES, _merge, _overlaps
+from gymhealth.utils.session_event_service import SessionEventService
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Số khung giờ một hội viên được chờ cùng lúc
+    'MAX_ENTRIES_PER_MEMBER': 10,
+}
+
+
+def waitlist_setting(name):
+    return getattr(settings, 'WAITLIST', {}).get(name, DEFAULTS[name])
+
+
+class WaitlistService:
+    """
+    Danh sách chờ khung giờ của PT. Hội viên đăng ký chờ một lần thay vì gọi lại member/register liên tục;
+    khi buổi tập của PT bị hủy hoặc đổi lịch, người chờ lâu nhất có thể vào khung giờ trống được đặt lịch tự động.
+    """
+
+    @staticmethod
+    def active_subscriptions():
+        return SubscriptionPackage.objects.filter(
+            status='active',
+            start_date__lte=date.today(),
+            end_date__gte=date.today(),
+            remaining_pt_sessions__gt=0,
+        ).order_by('end_date', 'id')
+
+    @staticmethod
+    def active_subscription(member):
+        return WaitlistService.active_subscriptions().filter(member=member).first()
+
+    @staticmethod
+    def queue(trainer_id, session_date):
+        """Hàng chờ của PT trong một ngày theo thứ tự đăng ký (dùng index trainer, session_date, status, created_at)"""
+        return WaitlistEntry.objects.filter(
+            trainer_id=trainer_id, session_date=session_date, status='waiting'
+        ).order_by('created_at', 'id')
+
+    @staticmethod
+    def position(entry):
+        """Vị trí (bắt đầu từ 1) của một người đang chờ trong hàng chờ của PT ngày hôm đó"""
+        if entry.status != 'waiting':
+            return None
+        return WaitlistService.queue(entry.trainer_id, entry.session_date).filter(
+            Q(created_at__lt=entry.created_at) | Q(created_at=entry.created_at, id__lt=entry.id)
+        ).count() + 1
+
+    @staticmethod
+    def positions(entries):
+        """
+        {id entry: vị trí} cho các entry đang chờ trong entries, bằng một truy vấn đọc id của các hàng chờ liên quan
+        (mỗi cặp PT, ngày) thay cho một lần COUNT cho mỗi entry như position()
+        """
+        slots = {(entry.trainer_id, entry.session_date) for entry in entries if entry.status == 'waiting'}
+        if not slots:
+            return {}
+        condition = Q()
+        for trainer_id, session_date in slots:
+            condition |= Q(trainer_id=trainer_id, session_date=session_date)
+        rows = WaitlistEntry.objects.filter(condition, status='waiting').order_by(
+            'trainer_id', 'session_date', 'created_at', 'id').values_list('id', 'trainer_id', 'session_date')
+        positions, previous, position = {}, None, 0
+        for entry_id, trainer_id, session_date in rows:
+            position = position + 1 if (trainer_id, session_date) == previous else 1
+            previous = (trainer_id, session_date)
+            positions[entry_id] = position
+        return positions
+
+    @staticmethod
+    def join(member, data):
+        """
+        Đăng ký chờ khung giờ (dữ liệu đã qua WaitlistEntrySerializer). Trả về entry mới;
+        ValueError khi khung giờ đang trống (đặt lịch trực tiếp) hoặc không thể chờ.
+        """
+        trainer, session_date = data['trainer'], data['session_date']
+        start_time, end_time = data['start_time'], data['end_time']
+
+        if WaitlistService.active_subscription(member) is None:
+            raise ValueError("Bạn cần có gói tập còn buổi PT để đăng ký danh sách chờ.")
+        waiting = WaitlistEntry.objects.filter(member=member, status='waiting')
+        if waiting.count() >= waitlist_setting('MAX_ENTRIES_PER_MEMBER'):
+            raise ValueError(f"Bạn chỉ có thể chờ tối đa {waitlist_setting('MAX_ENTRIES_PER_MEMBER')} khung giờ.")
+        if waiting.filter(trainer=trainer, session_date=session_date,
+                          start_time__lt=end_time, end_time__gt=start_time).exists():
+            raise ValueError("Bạn đã đăng ký chờ khung giờ này.")
+
+        member_busy, trainer_busy = BookingService.busy_intervals(member, trainer, session_date, session_date)
+        if _overlaps(member_busy.get(session_date), start_time, end_time):
+            raise ValueError("Bạn đã có lịch tập vào thời gian này.")
+        if not _overlaps(trainer_busy.get(session_date), start_time, end_time):
+            raise ValueError("Huấn luyện viên đang trống vào thời gian này, bạn có thể đặt lịch trực tiếp.")
+
+        return WaitlistEntry.objects.create(
+            member=member, trainer=trainer, session_date=session_date, start_time=start_time, end_time=end_time,
+            notes=data.get('notes') or None,
+        )
+
+    @staticmethod
+    def leave(member, entry_id):
+        """Rời danh sách chờ; False khi không có entry đang chờ tương ứng"""
+        return WaitlistEntry.objects.filter(pk=entry_id, member=member, status='waiting').update(
+            status='cancelled') > 0
+
+    @staticmethod
+    def promote(trainer_id, session_date):
+        """
+        Đặt lịch cho những người chờ vào các khung giờ vừa trống của PT trong ngày, theo thứ tự đăng ký.
+        Lịch của PT được khóa (BookingService.lock_trainer, dùng chung với member/register và register-recurring)
+        trước khi đọc lịch, nên buổi tập được tạo ở đây không trùng với buổi được đặt trực tiếp cùng lúc;
+        hàng chờ cũng được khóa (select_for_update). Gói tập và số buổi PT đã đặt của mọi người chờ được đọc
+        một lần; số truy vấn chỉ tăng theo số người được xếp lịch. Trả về số người được xếp lịch.
+        """
+        if session_date < date.today():
+            return 0
+
+        promoted = []
+        with transaction.atomic():
+            BookingService.lock_trainer(trainer_id)
+            entries = list(WaitlistService.queue(trainer_id, session_date).select_for_update().select_related(
+                'trainer'))
+            if not entries:
+                return 0
+
+            rows = WorkoutSession.objects.filter(
+                Q(trainer_id=trainer_id) | Q(member_id__in={entry.member_id for entry in entries}),
+                session_date=session_date,
+                status__in=ACTIVE_STATUSES,
+            ).values_list('member_id', 'trainer_id', 'start_time', 'end_time')
+            trainer_busy, member_busy = [], {}
+            for member_id, session_trainer_id, start_time, end_time in rows:
+                if session_trainer_id == trainer_id:
+                    trainer_busy.append((start_time, end_time))
+                member_busy.setdefault(member_id, []).append((start_time, end_time))
+            trainer_merged = _merge(trainer_busy)
+            member_merged = {member_id: _merge(busy) for member_id, busy in member_busy.items()}
+
+            # Gói tập dùng để đặt (hết hạn sớm nhất) và số buổi PT còn đặt được của từng người chờ
+            subscriptions = {}
+            for subscription in WaitlistService.active_subscriptions().filter(
+                    member_id__in={entry.member_id for entry in entries}):
+                subscriptions.setdefault(subscription.member_id, subscription)
+            booked = dict(WorkoutSession.objects.filter(
+                subscription__in=subscriptions.values(), session_type='pt_session', status__in=ACTIVE_STATUSES,
+            ).values('subscription_id').annotate(count=Count('id')).values_list('subscription_id', 'count'))
+            credits = {subscription.pk: subscription.remaining_pt_sessions - booked.get(subscription.pk, 0)
+                       for subscription in subscriptions.values()}
+
+            for entry in entries:
+                if _overlaps(trainer_merged, entry.start_time, entry.end_time):
+                    continue
+                if _overlaps(member_merged.get(entry.member_id), entry.start_time, entry.end_time):
+                    continue
+                subscription = subscriptions.get(entry.member_id)
+                if subscription is None or credits[subscription.pk] <= 0:
+                    continue
+
+                session = WorkoutSession.objects.create(
+                    member_id=entry.member_id, trainer_id=trainer_id, subscription=subscription,
+                    session_date=session_date, start_time=entry.start_time, end_time=entry.end_time,
+                    session_type='pt_session', status='pending', notes=entry.notes,
+                )
+                SessionEventService.record(session, SessionEvent.CREATED, note="Đặt lịch tự động từ danh sách chờ")
+                entry.status = 'promoted'
+                entry.promoted_session = session
+                entry.promoted_at = timezone.now()
+                entry.save(update_fields=['status', 'promoted_session', 'promoted_at'])
+                Notification.objects.create(
+                    user_id=entry.member_id,
+                    title="Đã có chỗ trong lịch của PT",
+                    message=f"Khung giờ bạn đăng ký chờ với PT {entry.trainer.get_full_name()} vào ngày "
+                            f"{session_date} lúc {entry.start_time} đã trống. Buổi tập đã được đặt và đang chờ "
+                            f"PT xác nhận.",
+                    notification_type='session_status_update',
+                    related_object_id=session.pk,
+                )
+                trainer_busy.append((entry.start_time, entry.end_time))
+                member_busy.setdefault(entry.member_id, []).append((entry.start_time, entry.end_time))
+                trainer_merged = _merge(trainer_busy)
+                member_merged[entry.member_id] = _merge(member_busy[entry.member_id])
+                credits[subscription.pk] -= 1
+                promoted.append(entry.pk)
+
+        if promoted:
+            logger.info("Promoted waitlist entries %s for trainer %s on %s", promoted, trainer_id, session_date)
+        return len(promoted)
+
+    @staticmethod
+    def schedule_promotion(*slots):
+        """Xếp lịch cho người chờ sau khi transaction hiện tại commit; slots: các cặp (trainer_id, ngày) vừa có chỗ trống"""
+        slots = {(trainer_id, session_date) for trainer_id, session_date in slots if trainer_id}
+        if not slots:
+            return
+
+        def promote():
+            for trainer_id, session_date in slots:
+                try:
+                    WaitlistService.promote(trainer_id, session_date)
+                except Exception:
+                    # Người chờ vẫn còn trong hàng chờ, sẽ được xét ở lần hủy lịch tiếp theo
+                    logger.warning("Could not promote waitlist for trainer %s on %s", trainer_id, session_date,
+                                   exc_info=True)
+
+        transaction.on_commit(promote)
+
+    @staticmethod
+    def expire():
+        """Đánh dấu hết hạn các entry đang chờ của những ngày đã qua; trả về số entry"""
+        return WaitlistEntry.objects.filter(status='waiting', session_date__lt=date.today()).update(status='expired')
@@ -10,13 +10,30 @@ from gymhealth import serializers, perms, paginators
 from rest_framework import viewsets, generics, permissions, status, request, parsers, permissions, filters, mixins
 from gymhealth.models import User, HealthInfo, Packages, Benefit, PackageType, WorkoutSession, MemberProfile, \
     TrainerProfile, Promotion, Notification, TrainingProgress, TrainerRating, GymRating, Gym, \
-    FeedbackResponse, Payment, PaymentReceipt
+    FeedbackResponse, Payment, PaymentReceipt, SyncVersion, CalendarFeedToken, WaitlistEntry, SessionEvent
 from gymhealth.perms import IsOwner, IsProfileOwnerOrManager
 from gymhealth.serializers import TrainerProfileSerializer, MemberProfileSerializer, BenefitSerializer, \
     PackageTypeSerializer, PackageSerializer, PackageDetailSerializer, TrainerListSerializer, SubscriptionPackage
-from django.db.models import Min, Max, Q, Count
+from django.db import transaction
+from django.db.models import Q, Count
 
 from gymhealth.utils.vnpay_payment import VNPayUtils
+from gymhealth.utils.home_service import HomeService, HOME_SECTIONS
+from gymhealth.utils.sync_service import SyncService, InvalidSyncToken
+from gymhealth.utils.booking_service import BookingService, status_notification
+from gymhealth.utils.calendar_service import CalendarService
+from gymhealth.utils.search_service import SearchService, search_setting
+from gymhealth.utils.recommendation_service import RecommendationService, recommendation_setting
+from gymhealth.utils.waitlist_service import WaitlistService
+from gymhealth.utils.occupancy_service import OccupancyService
+from gymhealth.utils.checkin_service import CheckInService, InvalidPass, PassAlreadyUsed, checkin_setting
+from gymhealth.utils.session_event_service import SessionEventService, EVENT_CODES
+from gymhealth.utils.retention_service import live_cutoff
+from gymhealth.utils.export_service import ExportService
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 
 
 
@@ -171,6 +188,221 @@ class HealthInfoViewSet(viewsets.ViewSet):
         serializer.save()
         return Response(serializer.data)
 
+class HomeView(APIView):
+    """
+    Dữ liệu màn hình chính của app trong một request: GET /home/?include=user,subscription,notifications,schedule,health
+    - schedule: lịch tuần hiện tại (hội viên) hoặc lịch hôm nay (PT)
+    - subscription, health chỉ có với hội viên (null với vai trò khác)
+    Mặc định trả về tất cả các phần phù hợp với vai trò của người dùng.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        include = request.query_params.get('include')
+        if include:
+            sections = [section.strip() for section in include.split(',') if section.strip()]
+            invalid = [section for section in sections if section not in HOME_SECTIONS]
+            if invalid:
+                return Response(
+                    {"error": f"Phần không hợp lệ: {', '.join(invalid)}. Các phần hợp lệ: {', '.join(HOME_SECTIONS)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            sections = HomeService.default_sections(request.user)
+
+        return Response(HomeService.build(request.user, sections))
+
+
+class SyncView(APIView):
+    """
+    Đồng bộ tăng dần cho app: GET /sync/?since=<token>&limit=200
+    Trả về các buổi tập, gói tập, tiến độ và thông báo của người dùng đã thay đổi sau since, id các bản ghi đã xóa
+    (deleted) và token next cho lần gọi sau. Không có since (hoặc reset=true trong kết quả): dữ liệu đầy đủ,
+    app thay dữ liệu cục bộ. Gọi tiếp với next khi has_more=true.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 0)) or None
+        except ValueError:
+            return Response({"error": "limit phải là số nguyên"}, status=status.HTTP_400_BAD_REQUEST)
+        if limit is not None and limit < 0:
+            return Response({"error": "limit phải là số nguyên dương"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            data = SyncService.changes(request.user, since=request.query_params.get('since') or None, limit=limit)
+        except InvalidSyncToken:
+            return Response({"error": "Token đồng bộ không hợp lệ, hãy đồng bộ lại từ đầu"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
+
+
+class CalendarFeedTokenView(APIView):
+    """
+    URL lịch .ics của người dùng (thêm vào Google Calendar/Apple Calendar).
+    GET: lấy URL hiện tại; POST: cấp URL mới, URL cũ bị vô hiệu hóa.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def _response(self, request, feed_token):
+        return Response({
+            "token": feed_token.token,
+            "url": request.build_absolute_uri(reverse('calendar-feed', args=[feed_token.token])),
+        })
+
+    def get(self, request):
+        return self._response(request, CalendarFeedToken.for_user(request.user))
+
+    def post(self, request):
+        return self._response(request, CalendarFeedToken.for_user(request.user).regenerate())
+
+
+class CalendarFeedView(APIView):
+    """
+    Lịch tập dạng iCalendar: GET /calendar/<token>.ics?days_back=30&days_ahead=90
+    Xác thực bằng token trong URL. Hỗ trợ If-None-Match: lịch không đổi trả về 304 mà không đọc các buổi tập.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, token):
+        feed_token = CalendarFeedToken.objects.select_related('user').filter(token=token).first()
+        if feed_token is None or not feed_token.user.is_active:
+            raise NotFound("Không tìm thấy lịch.")
+        user = feed_token.user
+
+        try:
+            date_from, date_to, is_default = CalendarService.date_range(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        etag = quote_etag(CalendarService.etag(user, date_from, date_to))
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+
+        content_type = 'text/calendar; charset=utf-8'
+        if is_default:
+            response = HttpResponse(CalendarService.render(user, date_from, date_to, etag), content_type=content_type)
+        else:
+            # Khoảng ngày tùy chọn có thể rất lớn: sinh theo luồng, không cache
+            response = StreamingHttpResponse(CalendarService.stream(user, date_from, date_to),
+                                             content_type=content_type)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        response['Content-Disposition'] = 'inline; filename="gymhealth.ics"'
+        return response
+
+
+class TrainerRecommendationView(APIView):
+    """
+    Gợi ý PT cho hội viên: GET /trainers/recommended/?limit=10
+    Xếp hạng theo mục tiêu tập (HealthInfo.training_goal): chuyên môn phù hợp, kết quả tập của học viên cùng mục tiêu,
+    đánh giá và mức độ trống lịch 7 ngày tới.
+    """
+    permission_classes = [permissions.IsAuthenticated, perms.IsMember]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', recommendation_setting('LIMIT')))
+        except ValueError:
+            return Response({"error": "limit phải là số nguyên"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, recommendation_setting('MAX_LIMIT')))
+
+        try:
+            goal, ranked = RecommendationService.recommend(request.user, limit=limit)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        trainers = User.objects.filter(id__in=[trainer_id for trainer_id, _, _ in ranked],
+                                       is_active=True).select_related('trainer_profile')
+        trainers = {trainer.id: trainer for trainer in trainers}
+        results = []
+        for trainer_id, score, reasons in ranked:
+            if trainer_id in trainers:
+                item = TrainerListSerializer(trainers[trainer_id]).data
+                item['score'] = score
+                item['reasons'] = reasons
+                results.append(item)
+        return Response({"training_goal": goal, "results": results})
+
+
+class CheckInPassView(APIView):
+    """Mã QR check-in của hội viên, hiệu lực trong CHECKIN['PASS_TTL'] giây; app lấy mã mới trước khi hết hạn"""
+    permission_classes = [permissions.IsAuthenticated, perms.IsMember]
+
+    def get(self, request):
+        try:
+            token, expires_at = CheckInService.issue_pass(request.user)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_403_FORBIDDEN)
+        return Response({"pass": token, "expires_at": expires_at, "ttl": checkin_setting('PASS_TTL')})
+
+
+class CheckInView(APIView):
+    """
+    Máy quét ở quầy lễ tân gửi mã QR của hội viên: {"pass": "...", "gym": 1}. Mã được kiểm tra bằng chữ ký,
+    không đọc DB, và chỉ dùng được một lần (quét lại trả về 409); lượt check-in được ghi bởi task Celery
+    nên cửa vẫn mở được khi DB chậm hoặc gặp sự cố.
+    """
+    permission_classes = [permissions.IsAuthenticated, perms.IsManager]
+
+    def post(self, request):
+        token = request.data.get('pass')
+        gym_id = request.data.get('gym')
+        if not token or (gym_id is not None and not str(gym_id).isdigit()):
+            return Response({"allowed": False, "error": "Thiếu mã QR hoặc phòng tập không hợp lệ."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            data = CheckInService.check_in(token, gym_id=int(gym_id) if gym_id is not None else None,
+                                           scanned_by=request.user)
+        except PassAlreadyUsed as e:
+            return Response({"allowed": False, "error": str(e)}, status=status.HTTP_409_CONFLICT)
+        except InvalidPass as e:
+            return Response({"allowed": False, "error": str(e)}, status=status.HTTP_403_FORBIDDEN)
+        return Response({"allowed": True, **data})
+
+
+class UserSearchView(APIView):
+    """
+    Tìm người dùng theo họ tên, username, chuyên môn: GET /search/users/?q=nguyen van&role=TRAINER&limit=20
+    Không phân biệt dấu ("nguyen" khớp "Nguyễn"), mỗi từ khớp phần đầu một từ, kết quả xếp theo mức độ khớp.
+    Tìm hội viên (role=MEMBER): PT chỉ thấy hội viên đã đặt lịch với mình, quản lý thấy tất cả.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        role = request.query_params.get('role', 'TRAINER').upper()
+        try:
+            limit = int(request.query_params.get('limit', search_setting('LIMIT')))
+        except ValueError:
+            return Response({"error": "limit phải là số nguyên"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, search_setting('MAX_LIMIT')))
+
+        user_ids = None
+        if role == 'MEMBER':
+            if request.user.is_trainer:
+                user_ids = WorkoutSession.objects.filter(trainer=request.user).values('member_id')
+            elif not request.user.is_manager:
+                raise PermissionDenied("Bạn không có quyền tìm kiếm hội viên.")
+        elif role != 'TRAINER':
+            return Response({"error": "role phải là TRAINER hoặc MEMBER"}, status=status.HTTP_400_BAD_REQUEST)
+
+        ranked = SearchService.ranked(query, role, user_ids=user_ids, limit=limit)
+        users = User.objects.filter(id__in=[user_id for user_id, _ in ranked]).select_related('trainer_profile')
+        users = {user.id: user for user in users}
+        results = []
+        for user_id, score in ranked:
+            if user_id in users:
+                item = serializers.UserSearchSerializer(users[user_id]).data
+                item['score'] = score
+                results.append(item)
+        return Response({"query": query, "count": len(results), "results": results})
+
+
 class UserProfileView(generics.GenericAPIView):
     # Quyền đã đăng nhập, và sở hữu
     permission_classes = [permissions.IsAuthenticated, perms.IsOwner]
@@ -225,17 +457,23 @@ class TrainerListView(generics.ListAPIView):
     serializer_class = TrainerListSerializer
     permission_classes = [permissions.IsAuthenticated]
     search_fields = ['username', 'first_name', 'last_name', 'trainer_profile__specialization']
-    ordering_fields = ['trainer_profile__experience_years', 'trainer_profile__hourly_rate']
+    ordering_fields = ['score', 'experience_years', 'hourly_rate']
     pagination_class = paginators.ItemPaginator
 
     def get_queryset(self):
         # Lấy tất cả user là TRAINER
         queryset = User.objects.filter(role='TRAINER', is_active=True)
 
+        # Tìm theo họ tên/username/chuyên môn (không phân biệt dấu, khớp đầu từ) qua chỉ mục SearchToken
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = queryset.filter(id__in=SearchService.matching_user_ids(search, 'TRAINER'))
+
         # Lọc PT theo chuyên môn nếu có
         specialization = self.request.query_params.get('specialization')
         if specialization:
-            queryset = queryset.filter(trainer_profile__specialization__icontains=specialization)
+            queryset = queryset.filter(
+                id__in=SearchService.matching_user_ids(specialization, 'TRAINER', fields=['specialization']))
 
         # Lọc PT theo kinh nghiệm nếu có
         min_experience = self.request.query_params.get('min_experience')
@@ -268,6 +506,14 @@ class TrainerListView(generics.ListAPIView):
                 # Xử lý khi định dạng ngày không hợp lệ
                 pass
 
+        # Sắp xếp: ?ordering=score (điểm xếp hạng tính sẵn, cao trước), experience_years, hourly_rate (thêm - để giảm dần)
+        ordering = self.request.query_params.get('ordering')
+        if ordering == 'score':
+            queryset = queryset.order_by('-trainer_profile__rank_score', 'id')
+        elif ordering and ordering.lstrip('-') in ('experience_years', 'hourly_rate'):
+            prefix = '-' if ordering.startswith('-') else ''
+            queryset = queryset.order_by(f"{prefix}trainer_profile__{ordering.lstrip('-')}", 'id')
+
         return queryset.prefetch_related('trainer_profile')
 
 
@@ -580,6 +826,12 @@ class WorkoutSessionViewSet(viewsets.ViewSet):
         #Trả về serializer tương ứng dựa trên action
         if self.action == 'register':
             return serializers.WorkoutSessionCreateSerializer
+        elif self.action == 'register_recurring':
+            return serializers.RecurringSessionSerializer
+        elif self.action == 'bulk_status':
+            return serializers.BulkSessionStatusSerializer
+        elif self.action == 'waitlist':
+            return serializers.WaitlistEntrySerializer
         elif self.action == 'trainer_sessions':
             return serializers.WorkoutSessionListScheduleSerializer
         elif self.action == 'registered_sessions':
@@ -642,14 +894,116 @@ class WorkoutSessionViewSet(viewsets.ViewSet):
         # Xác định status dựa trên loại buổi tập
         initial_status = 'confirmed' if session_type == 'self_training' else 'pending'
 
-        # Lưu dữ liệu với member, subscription và status phù hợp
-        workout_session = serializer.save(
+        data = serializer.validated_data
+        if session_type != 'self_training':
+            # Lưu dữ liệu với member, subscription và status phù hợp
+            with transaction.atomic():
+                # Kiểm tra trùng lịch sau khi khóa lịch của PT (register-recurring và danh sách chờ dùng chung khóa này)
+                if data.get('trainer') is not None:
+                    BookingService.lock_trainer(data['trainer'].pk)
+                self._check_conflict(serializer, data)
+                workout_session = serializer.save(member=request.user, subscription=active_subscription,
+                                                  status=initial_status)
+                SessionEventService.record(workout_session, SessionEvent.CREATED, actor=request.user)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        # Buổi tự tập được xác nhận ngay nên phải giữ chỗ trong phòng tập trước khi lưu
+        gym = data.get('gym') or OccupancyService.default_gym()
+        with transaction.atomic():
+            self._check_conflict(serializer, data)
+            if not OccupancyService.reserve(gym, data['session_date'], data['start_time'], data['end_time']):
+                return Response(
+                    {"error": "Phòng tập đã kín chỗ trong khung giờ này. Vui lòng chọn khung giờ khác."},
+                    status=status.HTTP_409_CONFLICT
+                )
+            workout_session = serializer.save(member=request.user, subscription=active_subscription,
+                                              status=initial_status, gym=gym)
+            SessionEventService.record(workout_session, SessionEvent.CREATED, actor=request.user)
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def _check_conflict(self, serializer, data):
+        """ValidationError khi khung giờ trùng lịch của PT hoặc của hội viên (gọi trong transaction đặt lịch)"""
+        reason = BookingService.conflict(self.request.user, data.get('trainer'), data['session_date'],
+                                         data['start_time'], data['end_time'])
+        if reason is not None:
+            raise ValidationError(serializer.CONFLICT_ERRORS[reason])
+
+    @action(detail=False, methods=['post'], url_path='member/register-recurring', url_name='member-register-recurring',
+            permission_classes=[permissions.IsAuthenticated, perms.IsMember])
+    def register_recurring(self, request):
+        """
+        Đặt lịch lặp lại, vd: {"weekdays": [1, 3, 5], "start_time": "18:00", "end_time": "19:00", "weeks": 8,
+        "session_type": "pt_session", "trainer": 12}. Trả về kết quả của từng buổi; các buổi trùng lịch,
+        ngoài thời hạn hoặc vượt quá số buổi PT còn lại bị từ chối (all_or_nothing=true: không tạo buổi nào).
+        """
+        try:
+            member_profile = request.user.member_profile
+            if not member_profile.is_membership_valid:
+                raise PermissionDenied("Tư cách hội viên của bạn đã hết hạn hoặc không hợp lệ.")
+        except MemberProfile.DoesNotExist:
+            raise PermissionDenied("Bạn chưa có hồ sơ hội viên.")
+
+        serializer = serializers.RecurringSessionSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        rule = serializer.validated_data
+
+        subscriptions = SubscriptionPackage.objects.filter(
             member=request.user,
-            subscription=active_subscription,
-            status=initial_status
+            status='active',
+            start_date__lte=date.today(),
+            end_date__gte=date.today()
         )
+        if rule['session_type'] == 'pt_session':
+            subscriptions = subscriptions.filter(remaining_pt_sessions__gt=0)
+        active_subscription = subscriptions.order_by('end_date').first()
+        if not active_subscription:
+            return Response(
+                {"error": "Bạn chưa có gói tập nào đang hoạt động. Vui lòng đăng ký gói tập trước khi đặt lịch."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results, created = BookingService.book_recurring(request.user, active_subscription, rule)
+        rejected = sum(1 for result in results if result['status'] == 'rejected')
+        response = {"created": created, "rejected": rejected, "results": results}
+        if not created:
+            response["error"] = "Không có buổi tập nào được đặt."
+            return Response(response, status=status.HTTP_409_CONFLICT)
+        return Response(response, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get', 'post'], url_path='member/waitlist', url_name='member-waitlist',
+            permission_classes=[permissions.IsAuthenticated, perms.IsMember])
+    def waitlist(self, request):
+        """
+        GET: các khung giờ đang chờ (kèm vị trí trong hàng chờ) và đã được xếp lịch.
+        POST: đăng ký chờ khung giờ đã kín của PT, vd: {"trainer": 12, "session_date": "2025-06-02",
+        "start_time": "18:00", "end_time": "19:00"}. Khi PT có buổi bị hủy hoặc đổi lịch, người chờ lâu nhất
+        được đặt lịch tự động và nhận thông báo, không cần gọi lại member/register.
+        """
+        if request.method == 'GET':
+            entries = list(WaitlistEntry.objects.filter(
+                member=request.user, status__in=['waiting', 'promoted'], session_date__gte=date.today()
+            ).select_related('trainer').order_by('session_date', 'start_time'))
+            context = {'request': request, 'waitlist_positions': WaitlistService.positions(entries)}
+            return Response(serializers.WaitlistEntrySerializer(entries, many=True, context=context).data)
+
+        serializer = serializers.WaitlistEntrySerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        try:
+            entry = WaitlistService.join(request.user, serializer.validated_data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializers.WaitlistEntrySerializer(entry, context={'request': request}).data,
+                        status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['delete'], url_path=r'member/waitlist/(?P<entry_id>\d+)',
+            url_name='member-waitlist-leave', permission_classes=[permissions.IsAuthenticated, perms.IsMember])
+    def leave_waitlist(self, request, entry_id=None):
+        """Rời danh sách chờ"""
+        if not WaitlistService.leave(request.user, entry_id):
+            raise NotFound("Không tìm thấy khung giờ đang chờ.")
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
     @action(detail=False, methods=['get'], url_path='trainer/pending-session', url_name='trainer_sessions',
             permission_classes=[permissions.IsAuthenticated, perms.IsTrainer])
     def trainer_sessions(self, request):
@@ -667,9 +1021,10 @@ class WorkoutSessionViewSet(viewsets.ViewSet):
         if status_filter != 'all':
             queryset = queryset.filter(status=status_filter)
 
-        queryset = queryset.order_by('session_date', 'start_time')
+        serializer_class = self.get_serializer_class()
+        queryset = queryset.select_related(*serializer_class.related_for(request)).order_by('session_date', 'start_time')
 
-        serializer = self.get_serializer_class()(queryset, many=True)
+        serializer = serializer_class(queryset, many=True, context={'request': request})
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='me/registered-sessions', url_name='member_sessions',
@@ -698,11 +1053,12 @@ class WorkoutSessionViewSet(viewsets.ViewSet):
             queryset = queryset.filter(session_type=session_type)
 
         # Sắp xếp kết quả
-        queryset = queryset.order_by('session_date', 'start_time')
+        serializer_class = self.get_serializer_class()
+        queryset = queryset.select_related(*serializer_class.related_for(request)).order_by('session_date', 'start_time')
 
         # Phân trang kết quả
 
-        serializer = self.get_serializer_class()(queryset, many=True)
+        serializer = serializer_class(queryset, many=True, context={'request': request})
         return Response(serializer.data)
 
     @action(detail=True, methods=['PATCH'], url_path='confirm-session', url_name='confirm_session',
@@ -798,44 +1154,56 @@ class WorkoutSessionViewSet(viewsets.ViewSet):
                 notes = serializer.validated_data.get('member_notes', '')
                 notes_field = 'member_notes'
 
-            # Lưu thông tin cập nhật
-            serializer.save()
-
             # Xác định người nhận thông báo (người còn lại)
             notification_recipient = session.member if request.user.is_trainer else session.trainer
 
             # Tạo tiêu đề và nội dung thông báo
             user_type = "PT" if request.user.is_trainer else "Hội viên"
+            title, message = status_notification(user_type, new_status, session, notes)
 
-            if new_status == 'confirmed':
-                title = f"Buổi tập đã được xác nhận"
-                message = f"{user_type} đã xác nhận buổi tập vào ngày {session.session_date} lúc {session.start_time}."
-            elif new_status == 'cancelled':
-                title = f"Buổi tập đã bị hủy"
-                message = f"{user_type} đã hủy buổi tập vào ngày {session.session_date} lúc {session.start_time}."
-            elif new_status == 'rescheduled':
-                title = f"Đề xuất đổi lịch buổi tập"
-                message = f"{user_type} đề xuất đổi lịch cho buổi tập vào ngày {session.session_date}."
-            elif new_status == 'completed':
-                title = f"Buổi tập hoàn thành"
-                message = f"{user_type} đã hoàn thành buổi tập vào ngày {session.session_date} lúc {session.start_time}."
-
-            if notes:
-                message += f" Ghi chú: {notes}"
-
-            # Tạo thông báo cho người còn lại
-            Notification.objects.create(
-                user=notification_recipient,
-                title=title,
-                message=message,
-                notification_type='session_status_update',
-                related_object_id=session.id
-            )
+            with transaction.atomic():
+                # Lưu thông tin cập nhật và ghi lịch sử (ai đổi trạng thái, lúc nào)
+                serializer.save()
+                SessionEventService.record(session, SessionEventService.status_event(new_status),
+                                           actor=request.user, note=notes)
+
+                # Tạo thông báo cho người còn lại
+                Notification.objects.create(
+                    user=notification_recipient,
+                    title=title,
+                    message=message,
+                    notification_type='session_status_update',
+                    related_object_id=session.id
+                )
+
+                # Khung giờ của PT trống lại: xếp lịch cho người trong danh sách chờ
+                if new_status == 'cancelled' and session.trainer_id:
+                    WaitlistService.schedule_promotion((session.trainer_id, session.session_date))
 
             return Response(serializer.data)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], url_path='trainer/bulk-status', url_name='trainer-bulk-status',
+            permission_classes=[permissions.IsAuthenticated, perms.IsTrainer])
+    def bulk_status(self, request):
+        """
+        PT cập nhật trạng thái nhiều buổi tập: {"session_ids": [1, 2, 3], "status": "confirmed", "trainer_notes": "..."}.
+        Buổi không hợp lệ (không thuộc PT, sai trạng thái, hết buổi PT) không làm hỏng các buổi còn lại;
+        kết quả trả về theo từng id.
+        """
+        serializer = serializers.BulkSessionStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        results, updated = BookingService.bulk_update_status(
+            request.user, data['session_ids'], data['status'], data.get('trainer_notes'))
+        response = {"updated": updated, "failed": len(results) - updated, "results": results}
+        if not updated:
+            response["error"] = "Không có buổi tập nào được cập nhật."
+            return Response(response, status=status.HTTP_409_CONFLICT)
+        return Response(response)
+
     @action(detail=True, methods=['post'], url_path='reschedule', url_name='reschedule-session')
     def reschedule(self, request, pk=None):
         """API để PT đề xuất thời gian mới cho buổi tập"""
@@ -869,6 +1237,7 @@ class WorkoutSessionViewSet(viewsets.ViewSet):
         # Tạo bản ghi lịch sử về việc đổi lịch
         old_date = session.session_date
         old_start = session.start_time
+        old_end = session.end_time
 
         # Cập nhật trạng thái và tạo ghi chú
         reason = serializer.validated_data.get('reason', '')
@@ -882,16 +1251,20 @@ class WorkoutSessionViewSet(viewsets.ViewSet):
         session.end_time = serializer.validated_data['new_end_time']
         session.status = 'rescheduled'
         session.trainer_notes = note
-        session.save()
+        with transaction.atomic():
+            session.save()
+            SessionEventService.record(session, SessionEvent.RESCHEDULED, actor=request.user,
+                                       previous=(old_date, old_start, old_end), note=reason)
 
-        # Tạo thông báo cho hội viên
-        Notification.objects.create(
-            user=session.member,
-            title="Đề xuất thay đổi lịch tập",
-            message=f"PT {request.user.get_full_name()} đã đề xuất đổi lịch tập của bạn sang ngày {serializer.validated_data['new_date']} lúc {serializer.validated_data['new_start_time']}. {reason}",
-            notification_type='session_reminder',
-            related_object_id=session.id
-        )
+            # Tạo thông báo cho hội viên
+            Notification.objects.create(
+                user=session.member,
+                title="Đề xuất thay đổi lịch tập",
+                message=f"PT {request.user.get_full_name()} đã đề xuất đổi lịch tập của bạn sang ngày {serializer.validated_data['new_date']} lúc {serializer.validated_data['new_start_time']}. {reason}",
+                notification_type='session_reminder',
+                related_object_id=session.id
+            )
+            WaitlistService.schedule_promotion((session.trainer_id, old_date))
 
         return Response({
             "detail": "Đã đề xuất lịch tập mới thành công.",
@@ -905,81 +1278,72 @@ class WorkoutSessionViewSet(viewsets.ViewSet):
             }
         }, status=status.HTTP_200_OK)
 
-    @action(detail=False, methods=['get'], url_path='weekly-schedule', url_name='weekly_schedule')
-    def weekly_schedule(self, request):
-        """API để xem lịch tập từ thứ 2 đến thứ 7 của tuần chỉ định"""
-
-        # Lấy tham số tuần (mặc định là tuần hiện tại)
-        week_offset = int(request.query_params.get('week_offset', 0))
-
-        # Lấy thời gian hiện tại
-        today = datetime.now().date()
-
-        # Tính thứ mấy trong tuần (isoweekday: Monday=1, Sunday=7)
-        weekday = today.isoweekday()
-
-        # Tìm ngày thứ 2 (đầu tuần hiện tại)
-        current_monday = today - timedelta(days=weekday - 1)
-
-        # Tính ngày đầu tuần dựa trên offset
-        monday = current_monday + timedelta(weeks=week_offset)
-
-        # Tìm ngày thứ 7 (cuối tuần)
-        saturday = monday + timedelta(days=5)
-
-        # Query lịch tập trong khoảng từ thứ 2 đến thứ 7
-        queryset = WorkoutSession.objects.filter(
-            session_date__gte=monday,
-            session_date__lte=saturday
-        )
-
-        # Lọc theo người dùng
-        user_role = request.query_params.get('role', None)
-        if user_role == 'trainer' and request.user.is_trainer:
-            queryset = queryset.filter(trainer=request.user)
-        elif user_role == 'member' and request.user.is_member:
-            queryset = queryset.filter(member=request.user)
-        elif not user_role:
-            # Mặc định sẽ lọc theo vai trò hiện tại của người dùng
-            if request.user.is_trainer:
-                queryset = queryset.filter(trainer=request.user)
-            elif request.user.is_member:
-                queryset = queryset.filter(member=request.user)
+    @action(detail=True, methods=['get'], url_path='history', url_name='session-history')
+    def history(self, request, pk=None):
+        """Lịch sử buổi tập: ai tạo, xác nhận, đổi lịch (kèm khung giờ cũ), hủy, hoàn thành và lúc nào"""
+        events = list(SessionEventService.history(pk))
+        if not events:
+            raise NotFound("Không tìm thấy lịch sử của buổi tập.")
+        participants = {events[-1].member_id, events[-1].trainer_id}
+        if request.user.pk not in participants and not request.user.is_manager:
+            raise PermissionDenied("Bạn không có quyền xem lịch sử buổi tập này.")
+        return Response(serializers.SessionEventSerializer(events, many=True, context={'request': request}).data)
+
+    @action(detail=False, methods=['get'], url_path='trainer/history', url_name='trainer-history',
+            permission_classes=[permissions.IsAuthenticated, perms.IsTrainerOrManager])
+    def trainer_history(self, request):
+        """
+        Sự kiện của các buổi tập của PT theo thời gian: ?date_from=&date_to= (mặc định 30 ngày gần nhất),
+        ?event=confirmed,cancelled. Quản lý xem của một PT bằng ?trainer=<id>.
+        """
+        if request.user.is_manager:
+            trainer_id = request.query_params.get('trainer')
+            if not trainer_id or not trainer_id.isdigit():
+                return Response({"error": "Vui lòng chọn PT (trainer=<id>)."}, status=status.HTTP_400_BAD_REQUEST)
+            trainer_id = int(trainer_id)
+        else:
+            trainer_id = request.user.pk
 
-        # Lọc theo trạng thái nếu có
-        status_filter = request.query_params.get('status', None)
-        if status_filter and status_filter != 'all':
-            queryset = queryset.filter(status=status_filter)
+        try:
+            date_to = datetime.strptime(request.query_params['date_to'], '%Y-%m-%d').date() \
+                if request.query_params.get('date_to') else date.today()
+            date_from = datetime.strptime(request.query_params['date_from'], '%Y-%m-%d').date() \
+                if request.query_params.get('date_from') else date_to - timedelta(days=30)
+        except ValueError:
+            return Response({"error": "Định dạng ngày không hợp lệ. Sử dụng YYYY-MM-DD"},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-        # Sắp xếp kết quả
-        queryset = queryset.order_by('session_date', 'start_time')
-
-        # Grouped by date
-        schedule_by_date = {}
-        for day_offset in range(6):  # Từ thứ 2 đến thứ 7
-            current_date = monday + timedelta(days=day_offset)
-            schedule_by_date[current_date.strftime('%Y-%m-%d')] = {
-                'day_of_week': current_date.isoweekday(),
-                'date': current_date,
-                'sessions': []
-            }
+        events = None
+        if request.query_params.get('event'):
+            names = [name.strip() for name in request.query_params['event'].split(',') if name.strip()]
+            unknown = [name for name in names if name not in EVENT_CODES]
+            if unknown:
+                return Response({"error": f"Sự kiện không hợp lệ: {', '.join(unknown)}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            events = [EVENT_CODES[name] for name in names]
 
-        # Serialize và nhóm phiên tập theo ngày
-        serializer = self.get_serializer_class()(queryset, many=True)
-        for session in serializer.data:
-            date_key = session['session_date']
-            if date_key in schedule_by_date:
-                schedule_by_date[date_key]['sessions'].append(session)
+        queryset = SessionEventService.trainer_history(trainer_id, date_from, date_to, events)
+        paginator = paginators.ItemPaginator()
+        page = paginator.paginate_queryset(queryset.order_by('-created_at', '-id'), request)
+        response = paginator.get_paginated_response(
+            serializers.SessionEventSerializer(page, many=True, context={'request': request}).data)
+        response.data["statistics"] = {
+            "event_breakdown": SessionEventService.summary(queryset),
+            "date_from": date_from,
+            "date_to": date_to,
+        }
+        return response
 
-        return Response({
-            "week_info": {
-                "start_date": monday,
-                "end_date": saturday,
-                "week_offset": week_offset,
-                "current_week": week_offset == 0
-            },
-            "schedule": schedule_by_date
-        }, status=status.HTTP_200_OK)
+    @action(detail=False, methods=['get'], url_path='weekly-schedule', url_name='weekly_schedule')
+    def weekly_schedule(self, request):
+        """API để xem lịch tập từ thứ 2 đến thứ 7 của tuần chỉ định"""
+        return Response(HomeService.weekly_schedule(
+            request.user,
+            week_offset=int(request.query_params.get('week_offset', 0)),
+            role=request.query_params.get('role', None),
+            status_filter=request.query_params.get('status', None),
+            request=request,
+        ), status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'], url_path='trainer/all-sessions', url_name='trainer_all_sessions',
             permission_classes=[permissions.IsAuthenticated, perms.IsTrainer])
@@ -1024,25 +1388,24 @@ class WorkoutSessionViewSet(viewsets.ViewSet):
             queryset = queryset.filter(session_type=session_type)
 
         if member_name:
-            queryset = queryset.filter(
-                Q(member__first_name__icontains=member_name) |
-                Q(member__last_name__icontains=member_name) |
-                Q(member__username__icontains=member_name)
-            )
+            queryset = queryset.filter(member_id__in=SearchService.matching_user_ids(
+                member_name, 'MEMBER', fields=['name', 'username']))
 
         # Sắp xếp kết quả theo ngày gần nhất trước
         queryset = queryset.order_by('-session_date', 'start_time')
+        # Chỉ join các bảng cần cho những field được trả về (?fields=/?omit=/?compact=1)
+        sessions = queryset.select_related(*serializers.TrainerAllSessionsSerializer.related_for(request))
 
         # Đếm tổng số bản ghi trước khi phân trang
         total_count = queryset.count()
 
         # Sử dụng DRF pagination
         paginator = paginators.ItemPaginator()
-        page = paginator.paginate_queryset(queryset, request)
+        page = paginator.paginate_queryset(sessions, request)
 
         if page is not None:
             # Serialize dữ liệu
-            serializer = serializers.TrainerAllSessionsSerializer(page, many=True)
+            serializer = serializers.TrainerAllSessionsSerializer(page, many=True, context={'request': request})
 
             # Thống kê theo trạng thái (trên toàn bộ queryset, không chỉ trang hiện tại)
             status_stats = queryset.values('status').annotate(count=Count('status'))
@@ -1069,7 +1432,7 @@ class WorkoutSessionViewSet(viewsets.ViewSet):
             return paginated_response
 
         # Fallback nếu pagination không hoạt động (không nên xảy ra)
-        serializer = serializers.TrainerAllSessionsSerializer(queryset, many=True)
+        serializer = serializers.TrainerAllSessionsSerializer(sessions, many=True, context={'request': request})
         return Response({
             "sessions": serializer.data,
             "statistics": {
@@ -1181,35 +1544,7 @@ class WorkoutSessionViewSet(viewsets.ViewSet):
             permission_classes=[permissions.IsAuthenticated, perms.IsTrainer])
     def trainer_today_schedule(self, request):
         """API để PT xem lịch tập hôm nay"""
-
-        today = datetime.now().date()
-
-        # Lấy tất cả buổi tập hôm nay
-        today_sessions = WorkoutSession.objects.filter(
-            trainer=request.user,
-            session_date=today
-        ).order_by('start_time')
-
-        # Thống kê nhanh
-        total_today = today_sessions.count()
-        completed_today = today_sessions.filter(status='completed').count()
-        pending_today = today_sessions.filter(status='pending').count()
-        confirmed_today = today_sessions.filter(status='confirmed').count()
-        cancelled_today = today_sessions.filter(status='cancelled').count()
-
-        serializer = serializers.WorkoutSessionListScheduleSerializer(today_sessions, many=True)
-
-        return Response({
-            "date": today,
-            "summary": {
-                "total": total_today,
-                "completed": completed_today,
-                "pending": pending_today,
-                "confirmed": confirmed_today,
-                "cancelled": cancelled_today
-            },
-            "sessions": serializer.data
-        })
+        return Response(HomeService.today_schedule(request.user))
 
 class TrainingProgressViewSet(viewsets.ViewSet):
     serializer_class = serializers.TrainingProgressSerializer
@@ -1223,13 +1558,14 @@ class TrainingProgressViewSet(viewsets.ViewSet):
 
     def get_queryset(self):
         # PT có thể thấy tất cả bản ghi
+        related = self.get_serializer_class().related_for(self.request)
         if self.request.user.is_trainer:
-            return TrainingProgress.objects.all()
+            return TrainingProgress.objects.select_related(*related)
 
         # Hội viên chỉ thấy bản ghi của mình
         try:
             health_info = HealthInfo.objects.get(user=self.request.user)
-            return TrainingProgress.objects.filter(health_info=health_info)
+            return TrainingProgress.objects.filter(health_info=health_info).select_related(*related)
         except HealthInfo.DoesNotExist:
             return TrainingProgress.objects.none()
 
@@ -1387,7 +1723,7 @@ class TrainingProgressViewSet(viewsets.ViewSet):
         """API để lấy dữ liệu biểu đồ theo thời gian của hội viên"""
         # Kiểm tra quyền - chỉ PT hoặc chính hội viên đó mới xem được
         user = request.user
-        if not user.is_trainer and user.id != member_id:
+        if not user.is_trainer and str(user.id) != str(member_id):
             return Response(
                 {"error": "Bạn không có quyền xem tiến độ của hội viên này"},
                 status=status.HTTP_403_FORBIDDEN
@@ -1396,6 +1732,7 @@ class TrainingProgressViewSet(viewsets.ViewSet):
         try:
             member = User.objects.get(id=member_id, role='MEMBER')
             health_info = HealthInfo.objects.get(user=member)
+            health_info.user = member
 
             # Lấy khoảng thời gian nếu có
             start_date = request.query_params.get('start_date')
@@ -1417,10 +1754,12 @@ class TrainingProgressViewSet(viewsets.ViewSet):
                 except ValueError:
                     pass
 
-            # Sắp xếp theo ngày tăng dần để biểu đồ dễ đọc
-            progress_records = queryset.order_by('workout_session__session_date')
+            # Sắp xếp theo ngày tăng dần để biểu đồ dễ đọc; nạp một lần, thống kê tính trên danh sách đã nạp
+            progress_records = list(
+                queryset.select_related('workout_session').order_by('workout_session__session_date', 'id')
+            )
 
-            if not progress_records.exists():
+            if not progress_records:
                 return Response(
                     {"error": "Không có dữ liệu tiến độ trong khoảng thời gian này"},
                     status=status.HTTP_404_NOT_FOUND
@@ -1441,24 +1780,25 @@ class TrainingProgressViewSet(viewsets.ViewSet):
             serializer = serializers.TrainingProgressChartDataSerializer(progress_records, many=True)
 
             # Tìm min/max để biểu đồ có thể set scale
+            weights = [record.weight for record in progress_records]
             stats = {
                 'weight': {
-                    'min': progress_records.aggregate(Min('weight'))['weight__min'],
-                    'max': progress_records.aggregate(Max('weight'))['weight__max'],
+                    'min': min(weights),
+                    'max': max(weights),
                 }
             }
-            if progress_records.filter(body_fat_percentage__isnull=False).exists():
+            body_fats = [record.body_fat_percentage for record in progress_records
+                         if record.body_fat_percentage is not None]
+            if body_fats:
                 stats['body_fat'] = {
-                    'min': progress_records.filter(body_fat_percentage__isnull=False).aggregate(
-                        Min('body_fat_percentage'))['body_fat_percentage__min'],
-                    'max': progress_records.filter(body_fat_percentage__isnull=False).aggregate(
-                        Max('body_fat_percentage'))['body_fat_percentage__max'],
+                    'min': min(body_fats),
+                    'max': max(body_fats),
                 }
 
             # Tính toán tiến bộ (so sánh giữa bản ghi mới nhất và cũ nhất)
-            if progress_records.count() >= 2:
-                first_record = progress_records.order_by('workout_session__session_date').first()
-                last_record = progress_records.order_by('workout_session__session_date').last()
+            if len(progress_records) >= 2:
+                first_record = progress_records[0]
+                last_record = progress_records[-1]
 
                 progress_stats = {
                     'date_range': {
@@ -1975,7 +2315,8 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 
-logger = logging.getLogger(__name__)
+# Log của các view thanh toán (MoMo, VNPay) được ghi riêng vào payments.log (xem LOGGING trong settings)
+payment_logger = logging.getLogger('gymhealth.payments')
 
 #
 #
@@ -2052,16 +2393,16 @@ class MoMoPaymentService:
                 timeout=30
             )
 
-            # Log để debug
-            logger.info(f"MoMo request data: {json.dumps(data, ensure_ascii=False)}")
-            logger.info(f"MoMo response: {response.text}")
+            # Dữ liệu gửi/nhận chỉ ghi ở mức DEBUG (chứa chữ ký, thông tin đơn hàng)
+            payment_logger.info("MoMo create payment %s: HTTP %s", order_id, response.status_code)
+            payment_logger.debug("MoMo request data: %s, response: %s", data, response.text)
 
             return response.json()
         except requests.RequestException as e:
-            logger.error(f"MoMo API error: {str(e)}")
+            payment_logger.error("MoMo API error: %s", e)
             return None
         except json.JSONDecodeError as e:
-            logger.error(f"MoMo JSON decode error: {str(e)}")
+            payment_logger.error("MoMo JSON decode error: %s", e)
             return None
 
 
@@ -2075,7 +2416,8 @@ class MoMoIPNView(APIView):
         """Xử lý callback từ MoMo sau khi thanh toán"""
         try:
             data = request.data
-            logger.info(f"MoMo IPN received: {data}")
+            payment_logger.info("MoMo IPN received for order %s", data.get('orderId'))
+            payment_logger.debug("MoMo IPN data: %s", data)
 
             # Validate signature
             config = settings.MOMO_CONFIG
@@ -2099,7 +2441,7 @@ class MoMoIPNView(APIView):
             received_signature = data.get('signature', '')
 
             if expected_signature != received_signature:
-                logger.error("Invalid MoMo signature")
+                payment_logger.error("Invalid MoMo signature")
                 return JsonResponse({"status": "error", "message": "Invalid signature"})
 
             # Tìm payment record
@@ -2107,7 +2449,7 @@ class MoMoIPNView(APIView):
             try:
                 payment = Payment.objects.get(transaction_id=order_id)
             except Payment.DoesNotExist:
-                logger.error(f"Payment not found for order_id: {order_id}")
+                payment_logger.error("Payment not found for order_id: %s", order_id)
                 return JsonResponse({"status": "error", "message": "Payment not found"})
 
             # Cập nhật trạng thái thanh toán
@@ -2152,12 +2494,12 @@ class MoMoIPNView(APIView):
                         related_object_id=subscription.id
                     )
                 except Exception as notification_error:
-                    logger.error(f"Failed to create notification: {notification_error}")
+                    payment_logger.error("Failed to create notification: %s", notification_error)
 
-                logger.info(f"Payment {payment.id} completed successfully via MoMo")
+                payment_logger.info("Payment %s completed successfully via MoMo", payment.id)
             else:  # Thất bại
                 payment.status = 'failed'
-                logger.info(f"Payment {payment.id} failed with code: {result_code}")
+                payment_logger.info("Payment %s failed with code: %s", payment.id, result_code)
 
             payment.notes = f"MoMo response: {data.get('message', '')}"
             payment.save()
@@ -2165,7 +2507,7 @@ class MoMoIPNView(APIView):
             return JsonResponse({"status": "success"})
 
         except Exception as e:
-            logger.error(f"MoMo IPN error: {str(e)}")
+            payment_logger.error("MoMo IPN error: %s", e, exc_info=True)
             return JsonResponse({"status": "error", "message": str(e)})
 @method_decorator(csrf_exempt, name='dispatch')
 class MoMoReturnView(APIView):
@@ -2213,19 +2555,19 @@ class PaymentViewSet(viewsets.ViewSet):
         """Lấy danh sách thanh toán của user"""
         payments = Payment.objects.filter(
             subscription__member=request.user
-        ).select_related('subscription', 'subscription__package')
+        ).select_related(*serializers.PaymentSerializer.related_for(request))
 
-        serializer = serializers.PaymentSerializer(payments, many=True)
+        serializer = serializers.PaymentSerializer(payments, many=True, context={'request': request})
         return Response(serializer.data)
 
     def retrieve(self, request, pk=None):
         """Lấy chi tiết một thanh toán"""
         try:
             payment = Payment.objects.select_related(
-                'subscription', 'subscription__package', 'subscription__member'
+                *serializers.PaymentSerializer.related_for(request)
             ).get(id=pk, subscription__member=request.user)
 
-            serializer = serializers.PaymentSerializer(payment)
+            serializer = serializers.PaymentSerializer(payment, context={'request': request})
             return Response(serializer.data)
         except Payment.DoesNotExist:
             return Response(
@@ -2312,7 +2654,7 @@ class PaymentViewSet(viewsets.ViewSet):
             })
 
         except Exception as e:
-            logger.error(f"Error checking VNPay status: {str(e)}")
+            payment_logger.error("Error checking VNPay status: %s", e)
             return Response(
                 {'error': 'Failed to check payment status'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -2340,9 +2682,7 @@ class PaymentViewSet(viewsets.ViewSet):
             # Fix: Xử lý order_info với Unicode
             order_info = str(serializer.validated_data['order_info']).strip()
 
-            # Log để debug
-            logger.info(f"Creating MoMo payment - Order info: {order_info}")
-            logger.info(f"Order info type: {type(order_info)}")
+            payment_logger.debug("Creating MoMo payment %s - Order info: %s", order_id, order_info)
 
             # Tạo payment record
             payment = Payment.objects.create(
@@ -2391,10 +2731,7 @@ class PaymentViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         except Exception as e:
-            logger.error(f"Create MoMo payment error: {str(e)}")
-            logger.error(f"Error type: {type(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            payment_logger.error("Create MoMo payment error: %s", e, exc_info=True)
 
             return Response(
                 {"error": "Có lỗi xảy ra khi tạo thanh toán"},
@@ -2419,7 +2756,7 @@ class CreateVNPayPaymentView(APIView):
         try:
             serializer = serializers.CreateVNPayPaymentSerializer(data=request.data)
             if not serializer.is_valid():
-                logger.error(f"Invalid VNPay data: {serializer.errors}")
+                payment_logger.error("Invalid VNPay data: %s", serializer.errors)
                 return Response(
                     {'error': 'Dữ liệu không hợp lệ', 'details': serializer.errors},
                     status=status.HTTP_400_BAD_REQUEST
@@ -2508,7 +2845,7 @@ class CreateVNPayPaymentView(APIView):
                 ]
 
                 if bank_code not in valid_bank_codes:
-                    logger.warning(f"Invalid bank code: {bank_code}")
+                    payment_logger.warning("Invalid bank code: %s", bank_code)
                     bank_code = None
 
             # Tạo order_id không có ký tự đặc biệt (VNPay loại bỏ dấu gạch dưới)
@@ -2532,14 +2869,9 @@ class CreateVNPayPaymentView(APIView):
                 # Lấy IP client
                 ip_addr = vnpay.get_client_ip(request)
 
-                # Log thông tin debug
-                logger.info(f"Creating VNPay payment:")
-                logger.info(f"- Payment ID: {payment.id}")
-                logger.info(f"- Order ID (transaction_id): {payment.transaction_id}")
-                logger.info(f"- Amount: {amount_decimal}")
-                logger.info(f"- Order Info: '{order_info}'")
-                logger.info(f"- Bank Code: {bank_code}")
-                logger.info(f"- IP Address: {ip_addr}")
+                payment_logger.info("Creating VNPay payment %s (order %s), amount: %s, bank code: %s",
+                            payment.id, payment.transaction_id, amount_decimal, bank_code)
+                payment_logger.debug("VNPay payment %s - Order info: %r, IP address: %s", payment.id, order_info, ip_addr)
 
                 # Tạo URL thanh toán với transaction_id thay vì payment.id
                 try:
@@ -2551,11 +2883,10 @@ class CreateVNPayPaymentView(APIView):
                         bank_code=bank_code
                     )
 
-                    logger.info(f"VNPay payment URL created successfully for payment {payment.id}")
+                    payment_logger.debug("VNPay payment URL created successfully for payment %s", payment.id)
 
                 except Exception as vnpay_error:
-                    logger.error(f"VNPay URL creation failed: {str(vnpay_error)}")
-                    logger.error(f"VNPay error details:", exc_info=True)
+                    payment_logger.error("VNPay URL creation failed: %s", vnpay_error, exc_info=True)
 
                     payment.status = 'failed'
                     payment.notes = f"URL creation failed: {str(vnpay_error)}"
@@ -2577,8 +2908,7 @@ class CreateVNPayPaymentView(APIView):
                 }, status=status.HTTP_201_CREATED)
 
         except Exception as e:
-            logger.error(f"Unexpected error in VNPay payment creation: {str(e)}")
-            logger.error(f"Error traceback:", exc_info=True)
+            payment_logger.error("Unexpected error in VNPay payment creation: %s", e, exc_info=True)
 
             return Response(
                 {
@@ -2601,9 +2931,7 @@ class VNPayIPNView(APIView):
     #     return self.handle_ipn_request(request, request.POST)
 
     def handle_ipn_request(self, request, data_source):
-        logger.info("=== VNPay IPN View Called ===")
-        logger.info(f"Method: {request.method}")
-        logger.info(f"Data: {dict(data_source)}")
+        payment_logger.debug("VNPay IPN %s data: %s", request.method, data_source)
 
         try:
             # Xử lý data từ GET hoặc POST
@@ -2618,17 +2946,17 @@ class VNPayIPNView(APIView):
                     else:
                         ipn_data[key] = value
 
-            logger.info(f"Processed IPN data: {ipn_data}")
+            payment_logger.info("VNPay IPN received for order %s", ipn_data.get('vnp_TxnRef'))
 
             # Kiểm tra nếu không có data (có thể là health check)
             if not ipn_data or 'vnp_TxnRef' not in ipn_data:
-                logger.info("Empty IPN request - possibly health check")
+                payment_logger.info("Empty IPN request - possibly health check")
                 return HttpResponse("00", content_type="text/plain")
 
             # Validate data
             serializer = serializers.VNPayIPNSerializer(data=ipn_data)
             if not serializer.is_valid():
-                logger.error(f"Invalid VNPay IPN data: {serializer.errors}")
+                payment_logger.error("Invalid VNPay IPN data: %s", serializer.errors)
                 return HttpResponse("02", content_type="text/plain")
 
             # Validate signature
@@ -2636,7 +2964,7 @@ class VNPayIPNView(APIView):
             is_valid, message = vnpay.validate_response(ipn_data)
 
             if not is_valid:
-                logger.error(f"Invalid VNPay IPN signature: {message}")
+                payment_logger.error("Invalid VNPay IPN signature: %s", message)
                 return HttpResponse("97", content_type="text/plain")
 
             order_id = serializer.validated_data['vnp_TxnRef']
@@ -2647,28 +2975,24 @@ class VNPayIPNView(APIView):
             # Tìm payment
             try:
                 payment = Payment.objects.get(transaction_id=order_id)
-                logger.info(f"IPN Found payment: {payment.id}, status: {payment.status}")
+                payment_logger.debug("IPN Found payment: %s, status: %s", payment.id, payment.status)
             except Payment.DoesNotExist:
-                logger.error(f"IPN Payment with transaction_id {order_id} not found")
+                payment_logger.error("IPN Payment with transaction_id %s not found", order_id)
                 return HttpResponse("01", content_type="text/plain")
 
             # VNPay trả về số tiền gốc, không cần chia cho 100
             vnpay_amount = float(amount)  # VNPay trả về số tiền gốc
             payment_amount = float(payment.amount)
 
-            logger.info(f"Raw VNPay amount: {amount}")
-            logger.info(f"VNPay amount (no conversion): {vnpay_amount}")
-            logger.info(f"Payment amount in DB: {payment_amount}")
-
-            logger.info(f"Amount comparison: VNPay={vnpay_amount}, Payment={payment_amount}")
+            payment_logger.debug("IPN Amount comparison: VNPay=%s (raw %s), Payment=%s", vnpay_amount, amount, payment_amount)
 
             if abs(payment_amount - vnpay_amount) > 0.01:  # Cho phép sai lệch nhỏ do làm tròn
-                logger.error(f"IPN Amount mismatch: expected {payment_amount}, got {vnpay_amount}")
+                payment_logger.error("IPN Amount mismatch: expected %s, got %s", payment_amount, vnpay_amount)
                 return HttpResponse("04", content_type="text/plain")
 
             # Xử lý thành công - IPN có độ ưu tiên cao hơn Return URL
             if response_code == '00':
-                logger.info("IPN Processing successful payment...")
+                payment_logger.debug("IPN Processing successful payment %s", payment.id)
 
                 with transaction.atomic():
                     # Chỉ update nếu chưa completed
@@ -2706,28 +3030,27 @@ class VNPayIPNView(APIView):
                             notification_type="payment_success"
                         )
 
-                        logger.info(f"IPN: Payment {payment.id} completed successfully")
+                        payment_logger.info("IPN: Payment %s completed successfully", payment.id)
                     else:
-                        logger.info(f"IPN: Payment {payment.id} already processed")
+                        payment_logger.info("IPN: Payment %s already processed", payment.id)
 
                 return HttpResponse("00", content_type="text/plain")
             else:
-                logger.warning(f"IPN Payment failed. Response code: {response_code}")
+                payment_logger.warning("IPN Payment %s failed. Response code: %s", payment.id, response_code)
                 if payment.status == 'pending':
                     payment.status = 'failed'
                     payment.save()
                 return HttpResponse("00", content_type="text/plain")
 
         except Exception as e:
-            logger.error(f"Error processing VNPay IPN: {str(e)}", exc_info=True)
+            payment_logger.error("Error processing VNPay IPN: %s", e, exc_info=True)
             return HttpResponse("99", content_type="text/plain")
 
 
 @method_decorator(csrf_exempt, name='dispatch')
 class VNPayReturnView(APIView):
     def get(self, request):
-        logger.info("=== VNPay Return View Called ===")
-        logger.info(f"GET params: {dict(request.GET)}")
+        payment_logger.debug("VNPay return params: %s", request.GET)
 
         try:
             return_data = {}
@@ -2737,18 +3060,18 @@ class VNPayReturnView(APIView):
                 else:
                     return_data[key] = value
 
-            logger.info(f"Processed return_data: {return_data}")
+            payment_logger.info("VNPay return for order %s", return_data.get('vnp_TxnRef'))
 
             serializer = serializers.VNPayReturnSerializer(data=return_data)
             if not serializer.is_valid():
-                logger.error(f"Invalid VNPay return data: {serializer.errors}")
+                payment_logger.error("Invalid VNPay return data: %s", serializer.errors)
                 return HttpResponseRedirect("/payment/failed?error=invalid_data")
 
             vnpay = VNPayUtils()
             is_valid, message = vnpay.validate_response(return_data)
 
             if not is_valid:
-                logger.error(f"Invalid VNPay signature: {message}")
+                payment_logger.error("Invalid VNPay signature: %s", message)
                 return HttpResponseRedirect("/payment/failed?error=invalid_signature")
 
             order_id = serializer.validated_data['vnp_TxnRef']
@@ -2759,28 +3082,24 @@ class VNPayReturnView(APIView):
             # Tìm payment
             try:
                 payment = Payment.objects.get(transaction_id=order_id)
-                logger.info(f"Found payment: {payment.id}, status: {payment.status}")
+                payment_logger.debug("Found payment: %s, status: %s", payment.id, payment.status)
             except Payment.DoesNotExist:
-                logger.error(f"Payment with transaction_id {order_id} not found")
+                payment_logger.error("Payment with transaction_id %s not found", order_id)
                 return HttpResponseRedirect("/payment/failed?error=payment_not_found")
 
             #VNPay trả về số tiền gốc, không cần chia cho 100
             vnpay_amount = float(amount)  # VNPay trả về số tiền gốc
             payment_amount = float(payment.amount)
 
-            logger.info(f"Raw VNPay amount: {amount}")
-            logger.info(f"VNPay amount (no conversion): {vnpay_amount}")
-            logger.info(f"Payment amount in DB: {payment_amount}")
-
-            logger.info(f"Return Amount comparison: VNPay={vnpay_amount}, Payment={payment_amount}")
+            payment_logger.debug("Return Amount comparison: VNPay=%s (raw %s), Payment=%s", vnpay_amount, amount, payment_amount)
 
             if abs(payment_amount - vnpay_amount) > 0.01:  # Cho phép sai lệch nhỏ do làm tròn
-                logger.error(f"Amount mismatch: expected {payment_amount}, got {vnpay_amount}")
+                payment_logger.error("Amount mismatch: expected %s, got %s", payment_amount, vnpay_amount)
                 return HttpResponseRedirect("/payment/failed?error=amount_mismatch")
 
             #Chỉ xử lý nếu chưa được xử lý (tránh xung đột với IPN)
             if response_code == '00' and payment.status == 'pending':
-                logger.info("Return: Processing successful payment...")
+                payment_logger.debug("Return: Processing successful payment %s", payment.id)
 
                 with transaction.atomic():
                     payment.status = 'completed'
@@ -2817,22 +3136,22 @@ class VNPayReturnView(APIView):
                             notification_type="payment_success"
                         )
 
-                logger.info("Return: Payment processing completed successfully")
+                payment_logger.info("Return: Payment %s completed successfully", payment.id)
                 return HttpResponseRedirect("/payment/success")
 
             elif payment.status == 'completed':
-                logger.info("Return: Payment already processed by IPN")
+                payment_logger.debug("Return: Payment %s already processed by IPN", payment.id)
                 return HttpResponseRedirect("/payment/success")
 
             else:
-                logger.warning(f"Return: Payment failed. Response code: {response_code}")
+                payment_logger.warning("Return: Payment %s failed. Response code: %s", payment.id, response_code)
                 if payment.status == 'pending':
                     payment.status = 'failed'
                     payment.save()
                 return HttpResponseRedirect(f"/payment/failed?error={response_code}")
 
         except Exception as e:
-            logger.error(f"Error in VNPay return: {str(e)}", exc_info=True)
+            payment_logger.error("Error in VNPay return: %s", e, exc_info=True)
             return HttpResponseRedirect("/payment/failed?error=system_error")
 
 
@@ -2842,10 +3161,16 @@ class NotificationViewSet(viewsets.ViewSet, viewsets.GenericViewSet):
     permission_classes = [IsAuthenticated]
     pagination_class = paginators.ItemPaginator
 
+    def get_queryset(self):
+        # Chỉ đọc thông báo của người dùng hiện tại trong phần dữ liệu nóng (partition gần đây),
+        # thông báo cũ hơn đã/ sẽ được chuyển sang NotificationArchive
+        return Notification.objects.filter(user=self.request.user, created_at__gte=live_cutoff()).select_related(
+            *serializers.NotificationSerializer.related_for(self.request))
+
     @action(detail=False, methods=['get'])
     def my(self, request):
         """Trả về thông báo của người dùng hiện tại với phân trang"""
-        notifications = self.get_queryset().filter(user=request.user).order_by('-created_at')
+        notifications = self.get_queryset().order_by('-created_at')
 
         # Áp dụng phân trang nếu được cấu hình
         page = self.paginate_queryset(notifications)
@@ -2878,10 +3203,64 @@ class NotificationViewSet(viewsets.ViewSet, viewsets.GenericViewSet):
     @action(detail=False, methods=['post'])
     def mark_all_as_read(self, request):
         """Đánh dấu tất cả thông báo đã đọc"""
-        updated = self.get_queryset().filter(is_read=False).update(is_read=True)
+        updated = self.get_queryset().filter(is_read=False).update(
+            is_read=True, sync_version=SyncVersion.allocate()
+        )
+        # update() không phát tín hiệu post_save
+        HomeService.invalidate(request.user.id, 'notifications')
         return Response({'status': f'marked {updated} notifications as read'})
 
 class GymListView(generics.ListAPIView, viewsets.ViewSet):
     queryset = Gym.objects.all()
     serializer_class = serializers.GymSerializer
     permission_classes = [permissions.IsAuthenticated]
+
+    @action(detail=True, methods=['get'], url_path='occupancy')
+    def occupancy(self, request, pk=None):
+        """
+        Số hội viên tự tập đã đặt lịch theo từng khung giờ của phòng tập (?date=YYYY-MM-DD, mặc định hôm nay),
+        đọc trực tiếp từ bộ đếm giữ chỗ nên luôn khớp với giới hạn khi đặt lịch.
+        """
+        gym = self.get_object()
+        now = OccupancyService.local_now()
+        day = now.date()
+        if request.query_params.get('date'):
+            try:
+                day = datetime.strptime(request.query_params['date'], '%Y-%m-%d').date()
+            except ValueError:
+                return Response({"error": "date phải có dạng YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+
+        slots = OccupancyService.occupancy(gym, day)
+        current = next((slot for slot in slots if slot['hour'] == now.hour), None) if day == now.date() else None
+        return Response({
+            "gym": gym.id,
+            "date": day,
+            "capacity": OccupancyService.capacity(gym),
+            "current": current,
+            "slots": slots,
+        })
+
+
+#
+# Xuất dữ liệu cho quản lý
+#
+
+
+class ExportView(APIView):
+    """Xuất dữ liệu dạng CSV theo luồng, không nạp toàn bộ bảng vào bộ nhớ"""
+    permission_classes = [IsAuthenticated, perms.IsManager]
+
+    def get(self, request, dataset):
+        try:
+            chunk_size = int(request.query_params.get('chunk_size', 2000))
+            queryset = ExportService.build_queryset(dataset, request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            ExportService.stream_csv(dataset, queryset, chunk_size=max(1, min(chunk_size, 10000))),
+            content_type='text/csv; charset=utf-8'
+        )
+        filename = f"{dataset}-{timezone.now().strftime('%Y%m%d%H%M%S')}.csv"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -13,4 +13,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gymhealthapi.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Import sau khi Django đã được khởi tạo
+from gymhealth.consumers import WEBSOCKET_PATH, websocket_notifications  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # WebSocket thông báo thời gian thực; mọi request HTTP (kể cả SSE) do Django xử lý
+    if scope['type'] == 'websocket':
+        if scope['path'] == WEBSOCKET_PATH:
+            await websocket_notifications(scope, receive, send)
+        else:
+            await receive()
+            await send({'type': 'websocket.close', 'code': 4404})
+        return
+    await django_application(scope, receive, send)
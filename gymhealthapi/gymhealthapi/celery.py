@@ -19,6 +19,42 @@ app.conf.beat_schedule = {
         'task': 'gymhealth.tasks.check_expiry_reminders',
         'schedule': crontab(hour=9, minute=0),
     },
+    'refresh-daily-stats': {
+        'task': 'gymhealth.tasks.refresh_daily_stats',
+        'schedule': crontab(minute='*/15'),
+    },
+    'archive-notifications': {
+        'task': 'gymhealth.tasks.archive_notifications',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'purge-expired-tokens': {
+        'task': 'gymhealth.tasks.purge_expired_tokens',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    'prune-sync-log': {
+        'task': 'gymhealth.tasks.prune_sync_log',
+        'schedule': crontab(hour=4, minute=30),
+    },
+    'refresh-trainer-rankings': {
+        'task': 'gymhealth.tasks.refresh_trainer_rankings',
+        'schedule': crontab(hour=0, minute=10),
+    },
+    'build-trainer-features': {
+        'task': 'gymhealth.tasks.build_trainer_features',
+        'schedule': crontab(hour=0, minute=30),
+    },
+    'expire-waitlist-entries': {
+        'task': 'gymhealth.tasks.expire_waitlist_entries',
+        'schedule': crontab(hour=0, minute=5),
+    },
+    'record-check-ins': {
+        'task': 'gymhealth.tasks.record_check_ins',
+        'schedule': crontab(),
+    },
+    'rebuild-gym-occupancy': {
+        'task': 'gymhealth.tasks.rebuild_gym_occupancy',
+        'schedule': crontab(hour=1, minute=0),
+    },
 }
 
 app.conf.timezone = 'Asia/Ho_Chi_Minh'
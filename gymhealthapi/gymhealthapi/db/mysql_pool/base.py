@@ -0,0 +1,133 @@
+"""
+Backend MySQL có pool kết nối trong tiến trình.
+
+Django chỉ có pool sẵn cho PostgreSQL; backend này giữ lại các kết nối MySQL đã mở (đã qua TCP + xác thực)
+để dùng lại cho request sau thay vì đóng. Cấu hình trong DATABASES:
+
+    'ENGINE': 'gymhealthapi.db.mysql_pool',
+    'CONN_MAX_AGE': 0,  # trả kết nối về pool khi kết thúc request
+    'POOL': {'MAX_SIZE': 10, 'RECYCLE': 3600, 'PING_AFTER': 30},
+"""
+import queue
+import threading
+import time
+
+from django.db.backends.mysql.base import DatabaseWrapper as MySQLDatabaseWrapper
+from django.db.backends.mysql.base import Database
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class _PooledConnection:
+    __slots__ = ('connection', 'created_at', 'last_used')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    def __init__(self, max_size, recycle, ping_after):
+        self.max_size = max_size
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._meta = {}
+
+    def get(self):
+        """Lấy một kết nối còn dùng được trong pool, hoặc None nếu pool rỗng"""
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            now = time.monotonic()
+            if now - item.created_at > self.recycle:
+                self._discard(item.connection)
+                continue
+            if now - item.last_used > self.ping_after:
+                try:
+                    # Không tự kết nối lại: kết nối mới mất trạng thái phiên (isolation level, SQL_AUTO_IS_NULL)
+                    # mà init_connection_state không chạy lại, nên kết nối hỏng bị bỏ và lấy kết nối khác.
+                    # Tham số vị trí vì ping() của mysqlclient không nhận tham số từ khóa
+                    item.connection.ping(False)
+                except Database.Error:
+                    self._discard(item.connection)
+                    continue
+            self._meta[id(item.connection)] = item
+            return item.connection
+
+    def put(self, connection):
+        """Trả kết nối về pool; trả về False nếu pool đầy (khi đó cần đóng kết nối)"""
+        item = self._meta.pop(id(connection), None) or _PooledConnection(connection)
+        item.last_used = time.monotonic()
+        try:
+            self._idle.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def _discard(self, connection):
+        self._meta.pop(id(connection), None)
+        try:
+            connection.close()
+        except Database.Error:
+            pass
+
+    def close_all(self):
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(item.connection)
+
+
+class DatabaseWrapper(MySQLDatabaseWrapper):
+    def _pool_key(self):
+        settings_dict = self.settings_dict
+        return (settings_dict['HOST'], settings_dict['PORT'], settings_dict['NAME'], settings_dict['USER'])
+
+    @property
+    def pool(self):
+        key = self._pool_key()
+        pool = _pools.get(key)
+        if pool is None:
+            options = self.settings_dict.get('POOL') or {}
+            with _pools_lock:
+                pool = _pools.setdefault(key, ConnectionPool(
+                    max_size=options.get('MAX_SIZE', 10),
+                    recycle=options.get('RECYCLE', 3600),
+                    ping_after=options.get('PING_AFTER', 30),
+                ))
+        return pool
+
+    def get_new_connection(self, conn_params):
+        connection = self.pool.get()
+        if connection is not None:
+            return connection
+        return super().get_new_connection(conn_params)
+
+    def init_connection_state(self):
+        # Kết nối lấy từ pool đã được thiết lập (SQL_AUTO_IS_NULL, isolation level) ở lần mở đầu tiên
+        if getattr(self.connection, '_gymhealth_initialized', False):
+            return
+        super().init_connection_state()
+        try:
+            self.connection._gymhealth_initialized = True
+        except AttributeError:
+            pass
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            try:
+                # Không để transaction dang dở lọt sang request sau
+                self.connection.rollback()
+                self.connection.autocommit(True)
+            except Database.Error:
+                return self.connection.close()
+            if not self.pool.put(self.connection):
+                return self.connection.close()
@@ -0,0 +1,122 @@
+"""
+Logging không chặn request: QueueListenerHandler chỉ đưa bản ghi vào hàng đợi, một thread riêng
+ghi ra file/console (định dạng JSON qua JsonFormatter), nên fsync chậm trên ổ đĩa không làm tăng
+thời gian phản hồi của request.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Thuộc tính có sẵn của LogRecord; các thuộc tính khác (truyền qua extra=...) được đưa vào JSON
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Mỗi bản ghi là một dòng JSON: thời gian (UTC), level, logger, message và các field trong extra"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    QueueHandler tự khởi động QueueListener cho các handler đích, khai báo được trong settings.LOGGING:
+
+        'queue': {
+            '()': 'gymhealthapi.log_utils.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+        }
+
+    Khai báo bằng '()' (factory) thay vì 'class': từ Python 3.12, dictConfig xử lý riêng các lớp con của QueueHandler
+    khai báo bằng 'class' và hiểu 'handlers' là danh sách tên handler, không truyền vào __init__.
+    dictConfig tạo handler theo thứ tự tên, nên tên của handler này phải đứng sau tên các handler đích.
+    Hàng đợi có giới hạn: khi thread ghi log không theo kịp, bản ghi mới bị bỏ (đếm trong dropped)
+    thay vì làm request phải chờ hoặc làm đầy bộ nhớ.
+    """
+
+    def __init__(self, handlers, maxsize=10000, respect_handler_level=True):
+        self.maxsize = maxsize
+        self.listener = None
+        self._closed = False
+        super().__init__(queue.Queue(maxsize))
+        self.target_handlers = []
+        # Truy cập theo chỉ số để dictConfig chuyển 'cfg://handlers...' thành handler đã tạo
+        for index in range(len(handlers)):
+            handler = handlers[index]
+            if not isinstance(handler, logging.Handler):
+                raise ValueError(f"Handler đích chưa được tạo: {handler!r} (đặt tên handler queue sau các handler đích)")
+            self.target_handlers.append(handler)
+        self.respect_handler_level = respect_handler_level
+        self.dropped = 0
+        self._start()
+        atexit.register(self._stop)
+        # Thread không tồn tại sau fork (gunicorn --preload, Celery prefork): tạo lại trong tiến trình con
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart_in_child)
+
+    def _start(self):
+        self.listener = QueueListener(
+            self.queue, *self.target_handlers, respect_handler_level=self.respect_handler_level
+        )
+        self.listener.start()
+
+    def _stop(self):
+        if self.listener is not None and self.listener._thread is not None:
+            try:
+                self.listener.stop()
+            except queue.Full:
+                # Hàng đợi đầy khi tắt: thread daemon sẽ kết thúc cùng tiến trình
+                pass
+
+    def _restart_in_child(self):
+        if self._closed:
+            return
+        self.queue = queue.Queue(self.maxsize)
+        self._start()
+
+    def prepare(self, record):
+        # Chỉ ghép message và traceback thành chuỗi (args có thể bị thay đổi sau khi log);
+        # định dạng JSON được thực hiện trong thread ghi log
+        message = record.getMessage()
+        record = copy.copy(record)
+        record.message = message
+        record.msg = message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self._closed = True
+        self._stop()
+        super().close()
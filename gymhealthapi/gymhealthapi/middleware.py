@@ -1,21 +1,301 @@
 # middleware.py
+import contextvars
+import heapq
+import json
+import logging
+import random
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
 
-class VNPayCORSMiddleware(MiddlewareMixin):
-    def process_request(self, request):
-        if request.path.startswith('/payments/vnpay/'):
-            # Log request để debug
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.info(f"VNPay request: {request.method} {request.path}")
-            logger.info(f"Headers: {dict(request.headers)}")
-            logger.info(f"GET params: {dict(request.GET)}")
-            logger.info(f"POST data: {dict(request.POST)}")
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from gymhealthapi import metrics
 
+slow_request_logger = logging.getLogger('gymhealth.slow_requests')
+
+
+class VNPayCORSMiddleware(MiddlewareMixin):
     def process_response(self, request, response):
         if request.path.startswith('/payments/vnpay/'):
             response["Access-Control-Allow-Origin"] = "*"
             response["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
             response["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
             response["Access-Control-Max-Age"] = "86400"
-        return response
\ No newline at end of file
+        return response
+
+
+DEFAULT_COMPRESSION = {
+    # Response nhỏ hơn ngưỡng này không được nén (phần header gzip/brotli và CPU không đáng)
+    'MIN_SIZE': 1024,
+    # Mức 4 nén gần bằng gzip -6 với tốc độ nhanh hơn; mức cao (10-11) chỉ hợp với file tĩnh
+    'BROTLI_QUALITY': 4,
+    'CONTENT_TYPES': ('application/json', 'text/', 'application/javascript', 'application/xml'),
+}
+
+_accept_encoding_re = re.compile(r'\s*([a-z*]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?', re.IGNORECASE)
+
+
+def compression_setting(name):
+    return getattr(settings, 'RESPONSE_COMPRESSION', {}).get(name, DEFAULT_COMPRESSION[name])
+
+
+def accepted_encodings(header):
+    """{encoding: q} từ header Accept-Encoding"""
+    result = {}
+    for part in header.split(','):
+        match = _accept_encoding_re.match(part)
+        if match:
+            try:
+                result[match.group(1).lower()] = float(match.group(2)) if match.group(2) else 1.0
+            except ValueError:
+                continue
+    return result
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Nén response theo Accept-Encoding: brotli (khi đã cài gói brotli) hoặc gzip, chỉ với các kiểu nội dung văn bản
+    (JSON, CSV...) lớn hơn MIN_SIZE. Response dạng stream (xuất dữ liệu) chỉ nén gzip; SSE không bị nén
+    để sự kiện được gửi ngay.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code < 200 or response.status_code == 204:
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(compression_setting('CONTENT_TYPES')):
+            return response
+        if response.streaming and (response.is_async or content_type == 'text/event-stream'):
+            return response
+        if not response.streaming and len(response.content) < compression_setting('MIN_SIZE'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encodings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        use_brotli = (brotli is not None and not response.streaming
+                      and encodings.get('br', 0) > 0 and encodings.get('br', 0) >= encodings.get('gzip', 0))
+        if not use_brotli and encodings.get('gzip', 0) <= 0:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_sequence(
+                response.streaming_content, max_random_bytes=GZipMiddleware.max_random_bytes)
+            del response.headers['Content-Length']
+            encoding = 'gzip'
+        else:
+            if use_brotli:
+                compressed = brotli.compress(response.content, quality=compression_setting('BROTLI_QUALITY'))
+                encoding = 'br'
+            else:
+                compressed = compress_string(response.content, max_random_bytes=GZipMiddleware.max_random_bytes)
+                encoding = 'gzip'
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # ETag của nội dung chưa nén không còn khớp từng byte với nội dung đã nén
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+DEFAULT_PERF_METRICS = {
+    'SAMPLE_RATE': 0.1,  # tỉ lệ request được đo chi tiết (truy vấn DB, cache, SQL chậm nhất)
+    'SLOW_REQUEST_MS': 500,
+    'TOP_SQL': 5,
+    'EXCLUDE_PATHS': ('/metrics', '/static/'),
+    # Tham số chứa dữ liệu nhạy cảm (khớp không phân biệt hoa thường) - giá trị bị thay bằng ***
+    'REDACT_KEYS': ('password', 'token', 'secret', 'signature', 'hash', 'access_key', 'accesskey',
+                    'card', 'otp', 'code'),
+    # Toàn bộ tham số của cổng thanh toán (vnp_*, MoMo) đều bị ẩn
+    'REDACT_PREFIXES': ('vnp_',),
+    'REDACT_PATHS': ('/api/payments/', '/payments/'),
+}
+
+_current_recorder = contextvars.ContextVar('gymhealth_request_recorder', default=None)
+
+
+def perf_setting(name):
+    return getattr(settings, 'PERF_METRICS', {}).get(name, DEFAULT_PERF_METRICS[name])
+
+
+def redact(params, path=''):
+    """Ẩn giá trị các tham số nhạy cảm; trên đường dẫn thanh toán chỉ giữ lại tên tham số"""
+    keys = perf_setting('REDACT_KEYS')
+    prefixes = perf_setting('REDACT_PREFIXES')
+    payment_path = any(path.startswith(prefix) for prefix in perf_setting('REDACT_PATHS'))
+    result = {}
+    for key in params:
+        lowered = key.lower()
+        if payment_path or lowered.startswith(prefixes) or any(word in lowered for word in keys):
+            result[key] = '***'
+        else:
+            result[key] = params.get(key)
+    return result
+
+
+class _RequestRecorder:
+    """Ghi nhận truy vấn DB và lượt đọc cache của một request (chỉ với request được lấy mẫu)"""
+
+    def __init__(self, top_sql):
+        self.query_count = 0
+        self.query_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.top_sql = top_sql
+        self._slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.query_count += 1
+            self.query_time += duration
+            # Chỉ lưu câu SQL có placeholder, không lưu tham số (có thể chứa dữ liệu cá nhân)
+            item = (duration, self.query_count, sql)
+            if len(self._slowest) < self.top_sql:
+                heapq.heappush(self._slowest, item)
+            else:
+                heapq.heappushpop(self._slowest, item)
+
+    def slowest_queries(self):
+        return [
+            {'ms': round(duration * 1000, 2), 'sql': sql[:1000]}
+            for duration, _, sql in sorted(self._slowest, reverse=True)
+        ]
+
+
+def _instrument_cache_backends():
+    """Bọc phương thức get của các cache backend đang cấu hình để đếm hit/miss theo request"""
+    sentinel = object()
+    for alias in getattr(settings, 'CACHES', {}):
+        try:
+            backend_class = type(caches[alias])
+        except Exception:
+            continue
+        if getattr(backend_class.get, '_gymhealth_instrumented', False):
+            continue
+
+        def make_wrapper(original):
+            def get(self, key, default=None, version=None):
+                recorder = _current_recorder.get()
+                if recorder is None:
+                    return original(self, key, default, version)
+                value = original(self, key, sentinel, version)
+                if value is sentinel:
+                    recorder.cache_misses += 1
+                    return default
+                recorder.cache_hits += 1
+                return value
+
+            get._gymhealth_instrumented = True
+            return get
+
+        backend_class.get = make_wrapper(backend_class.get)
+
+
+class RequestMetricsMiddleware:
+    """
+    Đo hiệu năng từng request theo view: thời gian xử lý, kích thước response (mọi request) và
+    số truy vấn/thời gian DB, cache hit/miss (request được lấy mẫu theo SAMPLE_RATE).
+    Số liệu xuất ra /metrics; request chậm hơn SLOW_REQUEST_MS được ghi log JSON kèm các câu SQL chậm nhất.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _instrument_cache_backends()
+
+    def __call__(self, request):
+        if request.path.startswith(perf_setting('EXCLUDE_PATHS')):
+            return self.get_response(request)
+
+        sampled = random.random() < perf_setting('SAMPLE_RATE')
+        recorder = _RequestRecorder(perf_setting('TOP_SQL')) if sampled else None
+
+        start = time.perf_counter()
+        if recorder is not None:
+            token = _current_recorder.set(recorder)
+            try:
+                with self._wrap_databases(recorder):
+                    response = self.get_response(request)
+            finally:
+                _current_recorder.reset(token)
+        else:
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        self._record(request, response, duration, recorder)
+        return response
+
+    @staticmethod
+    def _wrap_databases(recorder):
+        from contextlib import ExitStack
+
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    @staticmethod
+    def _view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.view_name or match._func_path
+
+    def _record(self, request, response, duration, recorder):
+        view = self._view_name(request)
+        metrics.REQUEST_DURATION.observe(duration, view, request.method, str(response.status_code))
+
+        size = None
+        if not response.streaming:
+            size = len(response.content)
+            metrics.RESPONSE_SIZE.observe(size, view)
+
+        if recorder is not None:
+            metrics.REQUEST_DB_QUERIES.observe(recorder.query_count, view)
+            metrics.REQUEST_DB_DURATION.observe(recorder.query_time, view)
+            if recorder.cache_hits:
+                metrics.CACHE_REQUESTS.inc(view, 'hit', amount=recorder.cache_hits)
+            if recorder.cache_misses:
+                metrics.CACHE_REQUESTS.inc(view, 'miss', amount=recorder.cache_misses)
+
+        duration_ms = duration * 1000
+        if duration_ms >= perf_setting('SLOW_REQUEST_MS'):
+            entry = {
+                'event': 'slow_request',
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'query': redact(request.GET, request.path),
+                'status': response.status_code,
+                'duration_ms': round(duration_ms, 2),
+                'response_bytes': size,
+                'user_id': getattr(getattr(request, 'user', None), 'pk', None),
+                'sampled': recorder is not None,
+            }
+            if recorder is not None:
+                entry.update({
+                    'db_queries': recorder.query_count,
+                    'db_ms': round(recorder.query_time * 1000, 2),
+                    'cache_hits': recorder.cache_hits,
+                    'cache_misses': recorder.cache_misses,
+                    'top_sql': recorder.slowest_queries(),
+                })
+            slow_request_logger.warning(json.dumps(entry, ensure_ascii=False, default=str))
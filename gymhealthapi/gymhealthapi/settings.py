@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 from oauthlib.common import CLIENT_ID_CHARACTER_SET
@@ -78,7 +79,12 @@ MOMO_CONFIG = {
     'IPN_URL': 'https://cc89-171-231-61-11.ngrok-free.app/api/payments/momo/ipn/',
 }
 import os
-# Thêm logging chi tiết hơn
+import tempfile
+# Logging: request chỉ đưa bản ghi vào hàng đợi (handler 'queue'), thread riêng ghi ra console và file JSON
+# có xoay vòng. Mức log của từng logger chỉnh qua biến môi trường, vd: GYMHEALTH_LOG_LEVEL_PAYMENTS=DEBUG
+# Mặc định ghi ngoài thư mục mã nguồn; môi trường triển khai đặt GYMHEALTH_LOG_DIR (vd: /var/log/gymhealth)
+LOG_DIR = os.environ.get('GYMHEALTH_LOG_DIR', os.path.join(tempfile.gettempdir(), 'gymhealth'))
+os.makedirs(LOG_DIR, exist_ok=True)
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -87,37 +93,238 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'gymhealthapi.log_utils.JsonFormatter',
+        },
     },
     'handlers': {
-        'file': {
-            'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': 'vnpay.log',
-            'formatter': 'verbose',
-        },
         'console': {
             'level': 'INFO',
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
+        # Xoay vòng theo dung lượng; khi chạy nhiều worker nên để logrotate/agent thu gom log đảm nhận
+        'file': {
+            'level': 'INFO',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.path.join(LOG_DIR, 'gymhealth.log'),
+            'maxBytes': 50 * 1024 * 1024,
+            'backupCount': 10,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'json',
+        },
+        # Log thanh toán (VNPay, MoMo) xoay vòng mỗi ngày, giữ 90 ngày để đối soát
+        'payment_file': {
+            'level': 'INFO',
+            'class': 'logging.handlers.TimedRotatingFileHandler',
+            'filename': os.path.join(LOG_DIR, 'payments.log'),
+            'when': 'midnight',
+            'backupCount': 90,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'json',
+        },
+        # Mỗi dòng là một JSON (request chậm, kèm các câu SQL chậm nhất)
+        'slow_requests_file': {
+            'level': 'WARNING',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.path.join(LOG_DIR, 'slow_requests.log'),
+            'maxBytes': 20 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+        # Tên các handler queue phải đứng sau tên handler đích (dictConfig tạo handler theo thứ tự tên)
+        'queue': {
+            '()': 'gymhealthapi.log_utils.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+        },
+        'queue_payments': {
+            '()': 'gymhealthapi.log_utils.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.payment_file'],
+        },
+        'slow_requests_queue': {
+            '()': 'gymhealthapi.log_utils.QueueListenerHandler',
+            'handlers': ['cfg://handlers.slow_requests_file'],
+        },
     },
     'root': {
-        'handlers': ['console', 'file'],
-        'level': 'INFO',
+        'handlers': ['queue'],
+        'level': 'WARNING',
     },
     'loggers': {
-        'vnpay': {
-            'handlers': ['file', 'console'],
-            'level': 'INFO',
+        'django': {
+            'level': os.environ.get('GYMHEALTH_LOG_LEVEL_DJANGO', 'INFO'),
+        },
+        'django.db.backends': {
+            'level': 'WARNING',
+        },
+        'celery': {
+            'level': os.environ.get('GYMHEALTH_LOG_LEVEL_CELERY', 'INFO'),
+        },
+        'gymhealth': {
+            'level': os.environ.get('GYMHEALTH_LOG_LEVEL', 'INFO'),
+        },
+        # Các view thanh toán (gymhealth/views.py); dữ liệu gửi/nhận từ cổng thanh toán chỉ được log ở mức DEBUG
+        'gymhealth.payments': {
+            'handlers': ['queue_payments'],
+            'level': os.environ.get('GYMHEALTH_LOG_LEVEL_PAYMENTS', 'INFO'),
+            'propagate': False,
+        },
+        'gymhealth.utils.vnpay_payment': {
+            'handlers': ['queue_payments'],
+            'level': os.environ.get('GYMHEALTH_LOG_LEVEL_PAYMENTS', 'INFO'),
+            'propagate': False,
+        },
+        'gymhealth.utils.momo_payment': {
+            'handlers': ['queue_payments'],
+            'level': os.environ.get('GYMHEALTH_LOG_LEVEL_PAYMENTS', 'INFO'),
+            'propagate': False,
+        },
+        'gymhealth.slow_requests': {
+            'handlers': ['slow_requests_queue'],
+            'level': 'WARNING',
             'propagate': False,
-
         },
     },
 }
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': ('oauth2_provider.contrib.rest_framework.OAuth2Authentication',)
+    'DEFAULT_AUTHENTICATION_CLASSES': ('gymhealth.authentication.CachedOAuth2Authentication',),
+    # JSON bằng orjson (gymhealth/renderers.py), tự dùng json chuẩn khi chưa cài orjson
+    'DEFAULT_RENDERER_CLASSES': (
+        'gymhealth.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'gymhealth.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+}
+
+# Nén response (gymhealthapi.middleware.CompressionMiddleware): brotli nếu đã cài gói brotli, nếu không thì gzip
+RESPONSE_COMPRESSION = {
+    'MIN_SIZE': 1024,
+    'BROTLI_QUALITY': 4,
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Cache dùng chung giữa các tiến trình (token đã xác thực)
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/1',
+    },
+}
+
+# Cache từng phần của màn hình chính (/home/), xóa khi dữ liệu thay đổi (gymhealth/signals.py)
+HOME_CACHE = {
+    'ALIAS': 'shared',
+    'TIMEOUTS': {'subscription': 300, 'notifications': 30, 'schedule': 120, 'health': 600},
+}
+
+# API đồng bộ tăng dần cho app (/sync/), xem gymhealth.utils.sync_service
+SYNC_API = {
+    'PAGE_SIZE': 200,
+    'MAX_PAGE_SIZE': 1000,
+    'SETTLE_SECONDS': 10,
+    'TOMBSTONE_DAYS': 30,
+}
+
+# Đặt lịch tập lặp lại (/workout-sessions/member/register-recurring/), xem gymhealth.utils.booking_service
+RECURRING_BOOKING = {
+    'MAX_WEEKS': 12,
+    'MAX_DAYS_AHEAD': 90,
+}
+
+# Giới hạn số hội viên tự tập theo khung giờ (gyms/<id>/occupancy/), xem gymhealth.utils.occupancy_service
+GYM_OCCUPANCY = {
+    'DEFAULT_CAPACITY': None,
+    'OPENING_HOURS': (5, 24),
+    'REBUILD_DAYS_AHEAD': 31,
+    'TIMEZONE': 'Asia/Ho_Chi_Minh',
+}
+
+# Check-in bằng mã QR ký HMAC (checkin/, checkin/pass/), xem gymhealth.utils.checkin_service
+CHECKIN = {
+    # Khóa riêng cho máy quét ngoại tuyến; để trống thì dẫn xuất từ SECRET_KEY
+    'SIGNING_KEY': os.environ.get('CHECKIN_SIGNING_KEY'),
+    'PASS_TTL': 60,
+    'MAX_RETRY_DELAY': 30.0,
+    'ALIAS': 'shared',
+    # Triển khai có Celery worker đặt GYMHEALTH_CHECKIN_BUFFER=redis để lượt check-in được ghi theo lô
+    'BUFFER': os.environ.get('GYMHEALTH_CHECKIN_BUFFER', 'memory'),
+    'BUFFER_REDIS_URL': os.environ.get('GYMHEALTH_CHECKIN_REDIS_URL', CELERY_BROKER_URL),
+    'BATCH_SIZE': 500,
+    'FLUSH_DELAY': 2,
+}
+
+# Danh sách chờ khung giờ của PT (member/waitlist), xem gymhealth.utils.waitlist_service
+WAITLIST = {
+    'MAX_ENTRIES_PER_MEMBER': 10,
+}
+
+# Lịch .ics cho ứng dụng lịch trên điện thoại (/calendar/<token>.ics), xem gymhealth.utils.calendar_service
+CALENDAR_FEED = {
+    'ALIAS': 'shared',
+    'TIMEZONE': 'Asia/Ho_Chi_Minh',
+    'DAYS_BACK': 30,
+    'DAYS_AHEAD': 90,
+    'MAX_DAYS': 366,
+    'CACHE_TIMEOUT': 3600,
+}
+
+# Điểm xếp hạng PT (/trainers/?ordering=score), xem gymhealth.utils.ranking_service
+TRAINER_RANKING = {
+    'PRIOR_MEAN': 3.5,
+    'PRIOR_COUNT': 5,
+    'COMPLETED_SESSIONS_CAP': 200,
+    'WEEKLY_CAPACITY': 40,
+    'PRICE_REFERENCE': 500000,
+    'WEIGHTS': {'rating': 0.5, 'sessions': 0.2, 'availability': 0.15, 'price': 0.15},
+    'REFRESH_DELAY': 60,
+    'ALIAS': 'shared',
+}
+
+# Gợi ý PT cho hội viên (/trainers/recommended/), xem gymhealth.utils.recommendation_service
+TRAINER_RECOMMENDATION = {
+    'WEIGHTS': {'specialization': 0.35, 'outcome': 0.25, 'rating': 0.25, 'capacity': 0.15},
+    'OUTCOME_PRIOR_COUNT': 3,
+    'OUTCOME_CAP': 0.1,
+    'KEEP_SNAPSHOTS': 7,
+    'LIMIT': 10,
+    'MAX_LIMIT': 50,
+}
+
+# Tìm kiếm người dùng không dấu (/search/users/), xem gymhealth.utils.search_service
+# Sau khi triển khai: python manage.py rebuild_search_index
+SEARCH_INDEX = {
+    'LIMIT': 20,
+    'MAX_LIMIT': 100,
+    'MAX_TERMS': 5,
+    'BATCH_SIZE': 1000,
+}
+
+# Đo hiệu năng request (gymhealthapi.middleware.RequestMetricsMiddleware), xem /metrics
+PERF_METRICS = {
+    'SAMPLE_RATE': 0.1,
+    'SLOW_REQUEST_MS': 500,
+    'TOP_SQL': 5,
+}
+METRICS_ALLOWED_IPS = ['127.0.0.1']
+
+# Cache kết quả xác thực access token OAuth2 (gymhealth.authentication.CachedOAuth2Authentication)
+OAUTH2_TOKEN_CACHE = {
+    'ALIAS': 'shared',
+    'TIMEOUT': 300,  # tối đa, luôn nhỏ hơn thời điểm token hết hạn
+    'LOCAL_TIMEOUT': 30,  # LRU trong tiến trình
+    'LOCAL_MAXSIZE': 10000,
+    'WARNING_INTERVAL': 60,  # giây giữa hai lần ghi cảnh báo khi cache dùng chung không truy cập được
 }
 
 
@@ -149,6 +356,27 @@ DEFAULT_FROM_EMAIL = 'Gym Management System <your-email@gmail.com>'
 GYM_NAME = 'Your Gym Name'
 GYM_ADDRESS = 'Địa chỉ phòng gym của bạn'
 
+# Lưu trữ thông báo: số ngày giữ thông báo ĐÃ ĐỌC trong bảng chính theo từng loại
+NOTIFICATION_RETENTION = {
+    'session_reminder': 14,
+    'subscription_expiry': 30,
+    'new_promotion': 30,
+    'payment_confirmation': 180,
+    'feedback_request': 60,
+    'feedback_response': 90,
+    'system': 90,
+}
+NOTIFICATION_RETENTION_DEFAULT_DAYS = 90
+# Thông báo cũ hơn số ngày này (kể cả chưa đọc) không còn hiển thị trong API và sẽ được lưu trữ
+NOTIFICATION_LIVE_DAYS = 365
+NOTIFICATION_ARCHIVE_CHUNK_SIZE = 5000
+
+# Kênh đẩy thông báo thời gian thực (WebSocket/SSE):
+# 'redis' để nhận cả thông báo tạo từ Celery worker, 'memory' chỉ trong cùng tiến trình (dev/test).
+# Triển khai nhiều tiến trình/worker đặt GYMHEALTH_REALTIME_BACKPLANE=redis
+REALTIME_BACKPLANE = os.environ.get('GYMHEALTH_REALTIME_BACKPLANE', 'memory')
+REALTIME_REDIS_URL = os.environ.get('GYMHEALTH_REALTIME_REDIS_URL', CELERY_BROKER_URL)
+
 CELERY_TIMEZONE = 'Asia/Ho_Chi_Minh'
 
 
@@ -164,6 +392,8 @@ cloudinary.config(
     secure=True
 )
 MIDDLEWARE = [
+    'gymhealthapi.middleware.RequestMetricsMiddleware',
+    'gymhealthapi.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -176,14 +406,12 @@ MIDDLEWARE = [
 ]
 AUTH_USER_MODEL = 'gymhealth.User'
 
-import pymysql
 ALLOWED_HOSTS=['*']
 CSRF_TRUSTED_ORIGINS = [
     'https://sandbox.vnpayment.vn',
     'https://ebbd-2402-800-63b8-a6a1-9082-a66b-4ac6-da4f.ngrok-free.app/',  # URL ngrok hiện tại
     'https://sandbox.vnpayment.vn/vnpaygw-sit-testing/order',
 ]
-pymysql.install_as_MySQLdb()
 ROOT_URLCONF = 'gymhealthapi.urls'
 TEMPLATES = [
     {
@@ -205,6 +433,14 @@ WSGI_APPLICATION = 'gymhealthapi.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Driver MySQL: 'pymysql' (thuần Python, mặc định) hoặc 'mysqlclient' (C, nhanh hơn)
+DB_DRIVER = os.environ.get('GYMHEALTH_DB_DRIVER', 'pymysql')
+if DB_DRIVER == 'pymysql':
+    import pymysql
+    pymysql.install_as_MySQLdb()
+elif DB_DRIVER != 'mysqlclient':
+    raise ValueError(f"GYMHEALTH_DB_DRIVER không hợp lệ: {DB_DRIVER}")
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
@@ -214,6 +450,32 @@ DATABASES = {
         'HOST': ''  # mặc định localhost
     }
 }
+
+# Cấu hình production: GYMHEALTH_DB_PROFILE=production
+# - giữ kết nối giữa các request (CONN_MAX_AGE) và kiểm tra kết nối trước khi dùng lại
+# - GYMHEALTH_DB_POOL=1: dùng backend có pool kết nối (gymhealthapi.db.mysql_pool)
+if os.environ.get('GYMHEALTH_DB_PROFILE') == 'production':
+    DATABASES['default'].update({
+        'HOST': os.environ.get('GYMHEALTH_DB_HOST', DATABASES['default']['HOST']),
+        'PORT': os.environ.get('GYMHEALTH_DB_PORT', ''),
+        'CONN_MAX_AGE': int(os.environ.get('GYMHEALTH_DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'charset': 'utf8mb4',
+            'connect_timeout': 5,
+        },
+    })
+    if os.environ.get('GYMHEALTH_DB_POOL') == '1':
+        DATABASES['default'].update({
+            'ENGINE': 'gymhealthapi.db.mysql_pool',
+            # Kết nối được trả về pool ở cuối mỗi request thay vì giữ riêng cho từng thread
+            'CONN_MAX_AGE': 0,
+            'POOL': {
+                'MAX_SIZE': int(os.environ.get('GYMHEALTH_DB_POOL_SIZE', 10)),
+                'RECYCLE': 3600,
+                'PING_AFTER': 30,
+            },
+        })
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -257,6 +519,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 OAUTH2_PROVIDER = {
     'OAUTH2_BACKEND_CLASS': 'oauth2_provider.oauth2_backends.JSONOAuthLibCore',
+    # Refresh token quá 30 ngày bị xóa bởi task purge_expired_tokens
+    'REFRESH_TOKEN_EXPIRE_SECONDS': 30 * 24 * 3600,
 }
 
 CLIENT_ID = 'AybXSAZ8adNhzo3rKcuzxhnts15OmhSsoXzWinQh'
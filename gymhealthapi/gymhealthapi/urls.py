@@ -20,6 +20,7 @@ from gymhealth.admin import admin_site
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from gymhealthapi.metrics import metrics_view
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -46,5 +47,6 @@ urlpatterns = [
             schema_view.with_ui('redoc', cache_timeout=0),
             name='schema-redoc'),
     path('o/', include('oauth2_provider.urls', namespace='oauth2_provider')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 